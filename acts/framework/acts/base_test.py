@@ -16,7 +16,6 @@
 import logging
 import os
 import traceback
-from concurrent.futures import ThreadPoolExecutor
 
 from acts import asserts
 from acts import keys
@@ -25,6 +24,7 @@ from acts import records
 from acts import signals
 from acts import tracelogger
 from acts import utils
+from acts.libs.diagnostics import collector
 
 # Macro strings for test result reporting
 TEST_CASE_TOKEN = "[Test Case]"
@@ -69,6 +69,7 @@ class BaseTestClass(object):
         self.current_test_name = None
         self.log = tracelogger.TraceLogger(self.log)
         self.size_limit_reached = False
+        self._diagnostics = None
         if 'android_devices' in self.__dict__:
             for ad in self.android_devices:
                 if ad.droid:
@@ -170,6 +171,18 @@ class BaseTestClass(object):
         Implementation is optional.
         """
 
+    def _idle_android_devices(self):
+        """Returns the android devices not used by diagnostics tasks.
+
+        Diagnostics of a previous test may still be collected when the
+        "async_bug_report" user param is set. Those devices are skipped
+        rather than waited for, so tests not using them are not delayed.
+        """
+        ads = getattr(self, 'android_devices', [])
+        if not self._diagnostics:
+            return ads
+        return [ad for ad in ads if not self._diagnostics.is_busy(ad.serial)]
+
     def _setup_test(self, test_name):
         """Proxy function to guarantee the base implementation of setup_test is
         called.
@@ -178,7 +191,7 @@ class BaseTestClass(object):
         try:
             # Write test start token to adb log if android device is attached.
             if hasattr(self, 'android_devices'):
-                for ad in self.android_devices:
+                for ad in self._idle_android_devices():
                     if not ad.skip_sl4a:
                         ad.droid.logV("%s BEGIN %s" % (TEST_CASE_TOKEN,
                                                        test_name))
@@ -207,7 +220,7 @@ class BaseTestClass(object):
         self.log.debug('Tearing down test %s' % test_name)
         try:
             # Write test end token to adb log if android device is attached.
-            for ad in self.android_devices:
+            for ad in self._idle_android_devices():
                 ad.droid.logV("%s END %s" % (TEST_CASE_TOKEN, test_name))
         except Exception as e:
             self.log.warning('Unable to send END log command to all devices.')
@@ -675,6 +688,7 @@ class BaseTestClass(object):
             raise e
         finally:
             self._exec_func(self.teardown_class)
+            self._exec_func(self._shutdown_diagnostics)
             self.log.info("Summary for test class %s: %s", self.TAG,
                           self.results.summary_str())
 
@@ -729,29 +743,102 @@ class BaseTestClass(object):
         try:
             max_log_size = int(
                 self.user_params.get("soft_output_size_limit") or "invalid")
-            log_path = getattr(logging, "log_path", None)
-            if log_path:
-                curr_log_size = utils.get_directory_size(log_path)
-                if curr_log_size > max_log_size:
-                    self.log.info(
-                        "Skipping bug report, as we've reached the size limit."
-                    )
-                    self.size_limit_reached = True
-                    return True
+            size_counter = self._get_diagnostics().size_counter
+            if size_counter and size_counter.size > max_log_size:
+                self.log.info(
+                    "Skipping bug report, as we've reached the size limit.")
+                self.size_limit_reached = True
+                return True
         except ValueError:
             pass
         return False
 
+    def _get_diagnostics(self):
+        """Returns the DiagnosticsCollector of this test class.
+
+        The collector is created on first use. The number of diagnostics
+        tasks running at once on the host can be set with the user param
+        "max_concurrent_diagnostics".
+        """
+        if not self._diagnostics:
+            self._diagnostics = collector.DiagnosticsCollector(
+                log=self.log,
+                log_path=getattr(logging, "log_path", None),
+                host_concurrency=int(
+                    self.user_params.get(
+                        "max_concurrent_diagnostics",
+                        collector.DEFAULT_HOST_CONCURRENCY)))
+        return self._diagnostics
+
+    def _shutdown_diagnostics(self):
+        """Waits for the queued diagnostics and stops the collector."""
+        if self._diagnostics:
+            self._diagnostics.shutdown()
+            self._diagnostics = None
+            for ad in getattr(self, 'android_devices', []):
+                ad.set_task_waiter(None)
+
+    def _submit_bug_report(self, ads, test_name, begin_time):
+        """Queues the bug reports and extra logs of devices.
+
+        Args:
+            ads: The AndroidDevice objects to collect diagnostics of.
+            test_name: The name of the test that triggered the collection.
+            begin_time: The epoch time the test started at.
+
+        Returns:
+            The futures of the queued tasks.
+        """
+        diagnostics = self._get_diagnostics()
+        futures = []
+        for ad in ads:
+            futures.append(
+                diagnostics.submit(
+                    ad.serial,
+                    self._ad_take_bugreport,
+                    ad,
+                    test_name,
+                    begin_time,
+                    output_path=ad.log_path))
+            futures.append(
+                diagnostics.submit(
+                    ad.serial,
+                    self._ad_take_extra_logs,
+                    ad,
+                    test_name,
+                    begin_time,
+                    output_path=ad.log_path))
+        return futures
+
     def _take_bug_report(self, test_name, begin_time):
+        """Takes bug reports and extra logs of all the android devices.
+
+        If the user param "async_bug_report" is set, this returns as soon as
+        the collection is queued, see _wait_for_bug_report.
+        """
         if self._skip_bug_report():
             return
 
-        executor = ThreadPoolExecutor(max_workers=10)
-        for ad in getattr(self, 'android_devices', []):
-            executor.submit(self._ad_take_bugreport, ad, test_name, begin_time)
-            executor.submit(self._ad_take_extra_logs, ad, test_name,
-                            begin_time)
-        executor.shutdown()
+        ads = getattr(self, 'android_devices', [])
+        self._submit_bug_report(ads, test_name, begin_time)
+        self._wait_for_bug_report(ads)
+
+    def _wait_for_bug_report(self, ads):
+        """Waits for the diagnostics of devices to be collected.
+
+        If the user param "async_bug_report" is set, each device is only
+        waited for before its next adb call or RPC, so the next test starts
+        while the devices it does not use are still collecting.
+
+        Args:
+            ads: The AndroidDevice objects whose diagnostics were queued.
+        """
+        diagnostics = self._get_diagnostics()
+        if not self.user_params.get("async_bug_report", False):
+            diagnostics.wait([ad.serial for ad in ads])
+            return
+        for ad in ads:
+            ad.set_task_waiter(diagnostics.waiter(ad.serial))
 
     def _reboot_device(self, ad):
         ad.log.info("Rebooting device.")
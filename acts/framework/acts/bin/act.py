@@ -18,14 +18,19 @@ from builtins import str
 
 import argparse
 import multiprocessing
+from multiprocessing import connection
+import os
 import signal
 import sys
+import time
 import traceback
 
 from acts import config_parser
 from acts import keys
+from acts import records
 from acts import signals
 from acts import test_runner
+from acts import test_scheduler
 
 
 def _run_test(parsed_config, test_identifiers, repeat=1):
@@ -113,6 +118,138 @@ def _run_tests_parallel(parsed_configs, test_identifiers, repeat):
             return False
 
 
+def _run_scheduled_tests(parsed_config, conn):
+    """Runs the test classes handed out by _run_tests_distributed.
+
+    This is the function to start the process of each testbed with. It asks
+    for a test class, tells the scheduler it started it, runs it, sends back
+    its result and asks for the next one, until there is none left for this
+    testbed.
+
+    Args:
+        parsed_config: A dict that is a set of configs for one
+                       test_runner.TestRunner.
+        conn: The multiprocessing connection to the scheduler.
+    """
+    runner = None
+    results = records.TestResult()
+    conn.send(None)
+    try:
+        while True:
+            item = conn.recv()
+            if item is None:
+                return
+            item_id, test_identifier = item
+            # An item handed out but not started is given to another testbed
+            # if this one stops, e.g. after a TestAbortAll.
+            conn.send(item_id)
+            if runner is None:
+                runner = _create_test_runner(parsed_config, [test_identifier])
+            runner.run_list = [test_identifier]
+            runner.results = records.TestResult()
+            begin_time = time.time()
+            aborted = False
+            try:
+                runner.run()
+            except signals.TestAbortAll:
+                aborted = True
+            except:
+                print("Exception when executing %s on %s." %
+                      (test_identifier[0], runner.testbed_name))
+                print(traceback.format_exc())
+            results += runner.results
+            conn.send((item_id, time.time() - begin_time, runner.results))
+            if aborted:
+                return
+    finally:
+        if runner:
+            runner.results = results
+            runner.stop()
+        conn.close()
+
+
+def _run_tests_distributed(parsed_configs, test_identifiers, repeat):
+    """Executes each requested test class once, on any free testbed.
+
+    Each testbed runs in its own process, and asks for the next test class
+    when done with the previous one. See acts.test_scheduler for how test
+    classes are matched with testbeds and ordered.
+
+    Args:
+        parsed_configs: A list of dicts, each is a set of configs for one
+                        test_runner.TestRunner.
+        test_identifiers: A list of tuples, each identifies what test case to
+                          run on what test class.
+        repeat: Number of times to iterate the specified tests.
+
+    Returns:
+        True if all tests passed without any error, False otherwise.
+    """
+    log_path = parsed_configs[0][keys.Config.key_log_path.value]
+    os.makedirs(log_path, exist_ok=True)
+    history = test_scheduler.load_history(log_path)
+    scheduler = test_scheduler.TestScheduler(
+        test_identifiers * repeat, history,
+        parsed_configs[0].get(keys.Config.key_test_requirements.value))
+    print("Distributing {} test runs over {} testbeds.".format(
+        len(test_identifiers) * repeat, len(parsed_configs)))
+    workers = {}
+    processes = []
+    for c in parsed_configs:
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(
+            target=_run_scheduled_tests, args=(c, child_conn))
+        process.start()
+        child_conn.close()
+        processes.append(process)
+        # The testbed config, and the id of the item handed out to it and
+        # whether it was started, if any.
+        workers[parent_conn] = (c[keys.Config.key_testbed.value], None, False)
+    while workers:
+        for conn in connection.wait(list(workers)):
+            testbed_config, item_id, started = workers[conn]
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                if item_id is not None and started:
+                    scheduler.lost(item_id, "Testbed %s stopped." %
+                                   testbed_config[
+                                       keys.Config.key_testbed_name.value])
+                elif item_id is not None:
+                    scheduler.requeue(item_id)
+                del workers[conn]
+                continue
+            if item_id is not None and message == item_id:
+                # The testbed started the item.
+                workers[conn] = (testbed_config, item_id, True)
+                continue
+            if message is not None:
+                scheduler.complete(*message)
+            item = scheduler.next_item(testbed_config)
+            try:
+                conn.send(item)
+            except OSError:
+                # The testbed stopped after sending its last result.
+                if item is not None:
+                    scheduler.requeue(item[0])
+                del workers[conn]
+                continue
+            if item is None:
+                del workers[conn]
+            else:
+                workers[conn] = (testbed_config, item[0], False)
+    scheduler.skip_pending("No compatible testbed left to run on.")
+    for process in processes:
+        process.join()
+    history.save()
+    summary_path = os.path.join(log_path, "test_run_summary.json")
+    with open(summary_path, 'w') as f:
+        f.write(scheduler.results.json_str())
+    print("Summary for distributed test run: %s" %
+          scheduler.results.summary_str())
+    return scheduler.results.is_all_pass
+
+
 def _run_tests_sequential(parsed_configs, test_identifiers, repeat):
     """Executes requested tests sequentially.
 
@@ -171,6 +308,13 @@ def main(argv):
         action="store_true",
         help=("If set, tests will be executed on all testbeds in parallel. "
               "Otherwise, tests are executed iteratively testbed by testbed."))
+    parser.add_argument(
+        '-d',
+        '--distribute',
+        action="store_true",
+        help=("If set, each test class is executed once, on the first free "
+              "testbed that has the controllers it requires, instead of on "
+              "every testbed."))
     parser.add_argument(
         '-ci',
         '--campaign_iterations',
@@ -243,7 +387,11 @@ def main(argv):
     test_identifiers = config_parser.parse_test_list(test_list)
 
     # Execute test runners.
-    if args.parallel and len(parsed_configs) > 1:
+    if args.distribute and len(parsed_configs) > 1:
+        print('Distributing tests over testbeds.')
+        exec_result = _run_tests_distributed(
+            parsed_configs, test_identifiers, args.campaign_iterations)
+    elif args.parallel and len(parsed_configs) > 1:
         print('Running tests in parallel.')
         exec_result = _run_tests_parallel(parsed_configs, test_identifiers,
                                           args.campaign_iterations)
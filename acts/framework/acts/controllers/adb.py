@@ -18,8 +18,11 @@ from builtins import str
 
 import logging
 import re
+import shlex
 import shellescape
 
+from acts.controllers.adb_lib import adb_client
+from acts.controllers.adb_lib import persistent_shell
 from acts.libs.proc import job
 
 DEFAULT_ADB_TIMEOUT = 60
@@ -30,6 +33,18 @@ DEVICE_NOT_FOUND_REGEX = re.compile('^error: device (?:\'.*?\' )?not found')
 DEVICE_OFFLINE_REGEX = re.compile('^error: device offline')
 ROOT_USER_ID = '0'
 SHELL_USER_ID = '2000'
+# Read-only properties keep their value until the device reboots.
+CACHED_PROPERTY_PREFIX = 'ro.'
+# adb commands after which cached device state may be stale.
+CACHE_INVALIDATING_COMMANDS = frozenset([
+    'disable-verity', 'enable-verity', 'reboot', 'reboot-bootloader', 'root',
+    'sideload', 'tcpip', 'unroot', 'usb'
+])
+# Shell commands after which cached device state may be stale.
+CACHE_INVALIDATING_SHELL_COMMANDS = ('reboot', 'setprop')
+# A line of the `getprop` output, e.g. "[ro.build.id]: [OPR1.170623.032]".
+PROPERTY_LINE_REGEX = re.compile(
+    r'^\[(?P<name>[^\]]+)\]: \[(?P<value>.*)\]$')
 
 
 def parsing_parcel_output(output):
@@ -71,14 +86,24 @@ class AdbProxy(object):
     """
 
     _SERVER_LOCAL_PORT = None
-
-    def __init__(self, serial="", ssh_connection=None):
+    # Set here so that __getattr__ does not turn them into adb commands.
+    _persistent_shell = None
+    _adb_client = None
+    _cached_properties = None
+    _cached_user_id = None
+
+    def __init__(self, serial="", ssh_connection=None,
+                 use_persistent_shell=False, use_adb_client=False):
         """Construct an instance of AdbProxy.
 
         Args:
             serial: str serial number of Android device from `adb devices`
             ssh_connection: SshConnection instance if the Android device is
                             connected to a remote host that we can reach via SSH.
+            use_persistent_shell: If True, shell commands are run through a
+                            single long-lived `adb shell` process.
+            use_adb_client: If True, shell, forward, push, pull, logcat and
+                            wait-for-device talk to the adb server directly.
         """
         self.serial = serial
         adb_path = self._exec_cmd("which adb")
@@ -104,10 +129,86 @@ class AdbProxy(object):
             adb_cmd.append("-P %d" % local_port)
         self.adb_str = " ".join(adb_cmd)
         self._ssh_connection = ssh_connection
+        if use_persistent_shell:
+            self.enable_persistent_shell()
+        if use_adb_client:
+            self.enable_adb_client()
+
+    def enable_persistent_shell(self):
+        """Runs shell commands through a long-lived `adb shell` process.
+
+        This saves the cost of starting a new adb process for every shell
+        command. Commands issued while the persistent shell is busy with
+        another command fall back to a new adb process.
+        """
+        if self._persistent_shell is None:
+            self._persistent_shell = persistent_shell.PersistentShell(
+                self.adb_str)
+
+    def disable_persistent_shell(self):
+        """Stops the persistent shell, if any."""
+        if self._persistent_shell is not None:
+            self._persistent_shell.close()
+            self._persistent_shell = None
+
+    def enable_adb_client(self):
+        """Speaks the adb server protocol instead of running the adb binary.
+
+        Applies to shell, tcp forwards, single file pushes and pulls, logcat
+        and wait-for-device. Requests the client cannot handle fall back to
+        the adb binary.
+        """
+        if self._adb_client is None:
+            self._adb_client = adb_client.AdbClient(
+                self.serial, port=AdbProxy._SERVER_LOCAL_PORT)
+
+    def disable_adb_client(self):
+        """Goes back to running the adb binary for every command."""
+        self._adb_client = None
+
+    def _try_adb_client(self, method, *args, **kwargs):
+        """Calls a method of the adb client, if enabled.
+
+        Returns:
+            The return value of the request, or None if the adb client is
+            disabled or could not carry out the request.
+        """
+        if self._adb_client is None:
+            return None
+        try:
+            return getattr(self._adb_client, method)(*args, **kwargs)
+        except adb_client.AdbClientError as e:
+            logging.debug('Falling back to the adb binary: %s', e)
+            return None
+
+    def clear_property_cache(self):
+        """Forgets the cached properties and adb user of the device."""
+        self._cached_properties = None
+        self._cached_user_id = None
+
+    def prefetch_properties(self):
+        """Caches every read-only property with a single getprop call."""
+        properties = {}
+        for line in self.shell('getprop').splitlines():
+            match = PROPERTY_LINE_REGEX.match(line.strip())
+            if match and match.group('name').startswith(
+                    CACHED_PROPERTY_PREFIX):
+                properties[match.group('name')] = match.group('value')
+        self._cached_properties = properties
 
     def get_user_id(self):
-        """Returns the adb user. Either 2000 (shell) or 0 (root)."""
-        return self.shell('id -u')
+        """Returns the adb user. Either 2000 (shell) or 0 (root).
+
+        The user is cached until adb is restarted as another user, the device
+        reboots, or wait_for_device() is called, as the device may have
+        rebooted unexpectedly.
+        """
+        if self._cached_user_id is None:
+            user_id = self.shell('id -u')
+            if not user_id.isdigit():
+                return user_id
+            self._cached_user_id = user_id
+        return self._cached_user_id
 
     def is_root(self, user_id=None):
         """Checks if the user is root.
@@ -144,6 +245,7 @@ class AdbProxy(object):
         else:
             self.unroot()
         self.wait_for_device()
+        self.clear_property_cache()
         return self.get_user_id() == user_id
 
     def _exec_cmd(self, cmd, ignore_status=False, timeout=DEFAULT_ADB_TIMEOUT):
@@ -161,6 +263,14 @@ class AdbProxy(object):
             AdbError is raised if adb cannot find the device.
         """
         result = job.run(cmd, ignore_status=True, timeout=timeout)
+        return self._parse_result(cmd, result, ignore_status)
+
+    def _parse_result(self, cmd, result, ignore_status=False):
+        """Returns the output of an adb command from its job.Result.
+
+        Raises:
+            AdbError is raised if adb cannot find the device.
+        """
         ret, out, err = result.exit_status, result.stdout, result.stderr
 
         if DEVICE_OFFLINE_REGEX.match(err):
@@ -210,6 +320,10 @@ class AdbProxy(object):
             self._ssh_connection.create_ssh_tunnel(
                 remote_port, local_port=host_port)
             host_port = remote_port
+        output = self._try_adb_client('forward', 'tcp:%d' % host_port,
+                                      'tcp:%d' % device_port)
+        if output is not None:
+            return output
         return self.forward("tcp:%d tcp:%d" % (host_port, device_port))
 
     def remove_tcp_forward(self, host_port):
@@ -226,6 +340,9 @@ class AdbProxy(object):
                 return
             # The actual port we need to disable via adb is on the remote host.
             host_port = remote_port
+        if self._try_adb_client('remove_forward',
+                                'tcp:%d' % host_port) is not None:
+            return
         self.forward("--remove tcp:%d" % host_port)
 
     def getprop(self, prop_name):
@@ -236,15 +353,43 @@ class AdbProxy(object):
         Args:
             prop_name: A string that is the name of the property to get.
 
+        Read-only properties ('ro.*') are cached until the device reboots.
+
         Returns:
             A string that is the value of the property, or None if the property
             doesn't exist.
         """
-        return self.shell("getprop %s" % prop_name)
+        if not prop_name.startswith(CACHED_PROPERTY_PREFIX):
+            return self.shell("getprop %s" % prop_name)
+        properties = self._cached_properties
+        if properties is None:
+            properties = self._cached_properties = {}
+        if prop_name not in properties:
+            value = self.shell("getprop %s" % prop_name)
+            if not value:
+                # Unset properties may still be set once.
+                return value
+            properties[prop_name] = value
+        return properties[prop_name]
 
     # TODO: This should be abstracted out into an object like the other shell
     # command.
     def shell(self, command, ignore_status=False, timeout=DEFAULT_ADB_TIMEOUT):
+        if command.startswith(CACHE_INVALIDATING_SHELL_COMMANDS):
+            try:
+                return self._shell(command, ignore_status, timeout)
+            finally:
+                self.clear_property_cache()
+        return self._shell(command, ignore_status, timeout)
+
+    def _shell(self, command, ignore_status, timeout):
+        result = self._try_adb_client('shell', command, timeout=timeout)
+        if result is None and self._persistent_shell is not None:
+            result = self._persistent_shell.try_run(command, timeout=timeout)
+        if result is not None:
+            return self._parse_result(
+                ' '.join((self.adb_str, 'shell', command)), result,
+                ignore_status)
         return self._exec_adb_cmd(
             'shell',
             shellescape.quote(command),
@@ -258,13 +403,77 @@ class AdbProxy(object):
              command,
              ignore_status=False,
              timeout=DEFAULT_ADB_PULL_TIMEOUT):
+        paths = self._get_transfer_paths(command)
+        if paths:
+            output = self._try_adb_client('pull', *paths, timeout=timeout)
+            if output is not None:
+                return output
         return self._exec_adb_cmd(
             'pull', command, ignore_status=ignore_status, timeout=timeout)
 
+    def push(self, *args, timeout=DEFAULT_ADB_PULL_TIMEOUT, **kwargs):
+        command = ' '.join(str(elem) for elem in args)
+        paths = self._get_transfer_paths(command)
+        if paths:
+            output = self._try_adb_client('push', *paths, timeout=timeout)
+            if output is not None:
+                return output
+        return self._exec_adb_cmd('push', command, timeout=timeout, **kwargs)
+
+    @staticmethod
+    def _get_transfer_paths(command):
+        """Returns the (source, destination) of a plain push or pull.
+
+        Returns None if the command has options or more than one source,
+        which only the adb binary handles.
+        """
+        try:
+            paths = shlex.split(command)
+        except ValueError:
+            return None
+        if len(paths) != 2 or any(path.startswith('-') for path in paths):
+            return None
+        return tuple(paths)
+
+    def logcat(self, *args, **kwargs):
+        arg_str = ' '.join(str(elem) for elem in args)
+        result = self._try_adb_client(
+            'logcat',
+            arg_str,
+            timeout=kwargs.get('timeout', DEFAULT_ADB_TIMEOUT))
+        if result is not None:
+            return self._parse_result(
+                ' '.join((self.adb_str, 'logcat', arg_str)), result,
+                kwargs.get('ignore_status', False))
+        return self._exec_adb_cmd('logcat', arg_str, **kwargs)
+
+    def wait_for_device(self, *args, **kwargs):
+        """Blocks until the device is online.
+
+        The device may have rebooted while it was away, e.g. after a crash,
+        and adbd then comes back as the shell user, so the cached adb user
+        is dropped.
+        """
+        try:
+            if not args:
+                output = self._try_adb_client(
+                    'wait_for_device',
+                    timeout=kwargs.get('timeout', DEFAULT_ADB_TIMEOUT))
+                if output is not None:
+                    return output
+            arg_str = ' '.join(str(elem) for elem in args)
+            return self._exec_adb_cmd('wait-for-device', arg_str, **kwargs)
+        finally:
+            self._cached_user_id = None
+
     def __getattr__(self, name):
         def adb_call(*args, **kwargs):
             clean_name = name.replace('_', '-')
             arg_str = ' '.join(str(elem) for elem in args)
-            return self._exec_adb_cmd(clean_name, arg_str, **kwargs)
+            try:
+                return self._exec_adb_cmd(clean_name, arg_str, **kwargs)
+            finally:
+                if clean_name in CACHE_INVALIDATING_COMMANDS:
+                    self.clear_property_cache()
 
         return adb_call
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import posixpath
+import socket
+import stat
+import struct
+import time
+
+from acts.libs.proc import job
+
+ADB_SERVER_HOST = '127.0.0.1'
+DEFAULT_ADB_SERVER_PORT = 5037
+# Number of seconds to wait for requests answered by the adb server itself.
+SERVER_TIMEOUT = 10
+# The largest DATA chunk allowed by the sync protocol.
+SYNC_DATA_MAX = 64 * 1024
+
+# Packet ids of the shell v2 protocol.
+SHELL_ID_STDOUT = 1
+SHELL_ID_STDERR = 2
+SHELL_ID_EXIT = 3
+SHELL_ID_CLOSE_STDIN = 4
+# Printed with the exit status after a command run without shell v2, which
+# does not report it.
+EXIT_STATUS_MARKER = b'ACTS_ADB_EXIT_STATUS:'
+
+
+class AdbClientError(Exception):
+    """Raised when the adb server cannot carry out a request.
+
+    Callers are expected to fall back to the adb binary, which reports the
+    failure the way existing code expects.
+    """
+
+
+class _DeadlineSocket(object):
+    """Wraps a socket so all its reads and writes share a single deadline.
+
+    A socket timeout only bounds each call, so a command which keeps printing
+    would never time out.
+    """
+
+    def __init__(self, sock, timeout):
+        self._sock = sock
+        self._deadline = None if timeout is None else time.time() + timeout
+
+    def _update_timeout(self):
+        if self._deadline is None:
+            return
+        time_left = self._deadline - time.time()
+        if time_left <= 0:
+            raise socket.timeout('timed out')
+        self._sock.settimeout(time_left)
+
+    def recv(self, size):
+        self._update_timeout()
+        return self._sock.recv(size)
+
+    def sendall(self, data):
+        self._update_timeout()
+        return self._sock.sendall(data)
+
+    def close(self):
+        self._sock.close()
+
+
+def _recv_exactly(sock, length):
+    """Reads exactly length bytes from a socket.
+
+    Raises:
+        AdbClientError if the socket closes first.
+    """
+    data = bytearray()
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise AdbClientError('The adb server closed the connection.')
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _recv_all(sock):
+    """Reads from a socket until it is closed."""
+    data = bytearray()
+    while True:
+        chunk = sock.recv(SYNC_DATA_MAX)
+        if not chunk:
+            return bytes(data)
+        data.extend(chunk)
+
+
+def _read_length_prefixed(sock):
+    """Reads a string prefixed with its length as 4 hex digits."""
+    length = int(_recv_exactly(sock, 4), 16)
+    return _recv_exactly(sock, length).decode('utf-8', 'replace')
+
+
+class AdbClient(object):
+    """A client for the smart socket protocol of the local adb server.
+
+    Talks to the adb server over TCP like the adb binary does, so shell
+    commands, forwards and file transfers do not need a new adb process.
+    Every request uses its own socket, so requests run concurrently.
+
+    Attributes:
+        serial: The serial of the device, or '' to use the only device.
+        host: The address of the adb server.
+        port: The port of the adb server.
+        _features: The cached set of features supported by the device.
+    """
+
+    def __init__(self, serial='', host=ADB_SERVER_HOST, port=None):
+        self.serial = serial
+        self.host = host
+        self.port = port or int(
+            os.environ.get('ANDROID_ADB_SERVER_PORT', DEFAULT_ADB_SERVER_PORT))
+        self._features = None
+
+    def _connect(self, timeout):
+        """Opens a socket to the adb server."""
+        try:
+            return socket.create_connection((self.host, self.port), timeout)
+        except OSError as e:
+            raise AdbClientError('Unable to reach the adb server on %s:%d: %s'
+                                 % (self.host, self.port, e))
+
+    @staticmethod
+    def _send_request(sock, request):
+        """Sends a length prefixed request and reads its status."""
+        payload = request.encode('utf-8')
+        sock.sendall(('%04x' % len(payload)).encode('ascii') + payload)
+        AdbClient._read_status(sock, request)
+
+    @staticmethod
+    def _read_status(sock, request):
+        """Reads an OKAY or FAIL status.
+
+        Raises:
+            AdbClientError if the adb server did not reply with OKAY.
+        """
+        status = _recv_exactly(sock, 4)
+        if status == b'OKAY':
+            return
+        if status == b'FAIL':
+            raise AdbClientError('adb server failed %s: %s' %
+                                 (request, _read_length_prefixed(sock)))
+        raise AdbClientError('Unexpected reply %r to %s' % (status, request))
+
+    def _host_prefix(self):
+        if self.serial:
+            return 'host-serial:%s:' % self.serial
+        return 'host:'
+
+    def _open_transport(self, timeout):
+        """Opens a socket connected to the device's adbd."""
+        sock = self._connect(timeout)
+        if self.serial:
+            request = 'host:transport:%s' % self.serial
+        else:
+            request = 'host:transport-any'
+        try:
+            self._send_request(sock, request)
+        except:
+            sock.close()
+            raise
+        return sock
+
+    def _run(self, command, timeout, function, *args):
+        """Runs function(sock, *args) on a socket to the device.
+
+        Raises:
+            AdbClientError if the request failed.
+            job.TimeoutError if it did not finish within the timeout.
+        """
+        start_time = time.time()
+        sock = _DeadlineSocket(self._open_transport(timeout), timeout)
+        try:
+            return function(sock, *args)
+        except socket.timeout:
+            raise job.TimeoutError(
+                job.Result(
+                    command=command,
+                    duration=time.time() - start_time,
+                    did_timeout=True))
+        except OSError as e:
+            raise AdbClientError('%s failed: %s' % (command, e))
+        finally:
+            sock.close()
+
+    @property
+    def features(self):
+        """The set of features supported by both the device and adb."""
+        if self._features is None:
+            sock = self._connect(SERVER_TIMEOUT)
+            try:
+                request = self._host_prefix() + 'features'
+                self._send_request(sock, request)
+                features = _read_length_prefixed(sock)
+            except OSError as e:
+                raise AdbClientError('Unable to read features: %s' % e)
+            finally:
+                sock.close()
+            self._features = set(features.split(','))
+        return self._features
+
+    def shell(self, command, timeout=60):
+        """Runs a shell command on the device.
+
+        Args:
+            command: The shell command to run on the device.
+            timeout: Number of seconds to wait for the command to finish.
+
+        Returns:
+            A job.Result of the command. Without the shell v2 protocol, the
+            stderr of the command is part of its stdout, and the exit status
+            is None if the shell was killed before printing it.
+
+        Raises:
+            job.TimeoutError if the command did not finish within the
+            timeout, even if it kept printing.
+        """
+        start_time = time.time()
+        if 'shell_v2' in self.features:
+            service = 'shell,v2,raw:%s' % command
+            read_output = self._read_shell_v2
+        else:
+            # The subshell lets the status be printed even if the command
+            # exits the shell.
+            service = 'shell:(%s\n)\necho %s$?' % (
+                command, EXIT_STATUS_MARKER.decode('ascii'))
+            read_output = self._read_shell
+
+        def run_shell(sock):
+            self._send_request(sock, service)
+            return read_output(sock)
+
+        out, err, exit_status = self._run(command, timeout, run_shell)
+        return job.Result(
+            command=command,
+            stdout=out,
+            stderr=err,
+            exit_status=exit_status,
+            duration=time.time() - start_time)
+
+    @staticmethod
+    def _read_shell(sock):
+        """Reads the output of a legacy shell session and its exit status."""
+        out = _recv_all(sock)
+        index = out.rfind(EXIT_STATUS_MARKER)
+        if index < 0:
+            return out, b'', None
+        exit_status = out[index + len(EXIT_STATUS_MARKER):].strip()
+        out = out[:index]
+        try:
+            return out, b'', int(exit_status)
+        except ValueError:
+            return out, b'', None
+
+    @staticmethod
+    def _read_shell_v2(sock):
+        """Reads the packets of a shell v2 session until the command exits.
+
+        Each packet is a 1 byte id, followed by the little endian 4 byte
+        length of its data.
+        """
+        sock.sendall(struct.pack('<BI', SHELL_ID_CLOSE_STDIN, 0))
+        out = bytearray()
+        err = bytearray()
+        exit_status = None
+        while exit_status is None:
+            header = sock.recv(5)
+            if not header:
+                break
+            if len(header) < 5:
+                header += _recv_exactly(sock, 5 - len(header))
+            packet_id, length = struct.unpack('<BI', header)
+            data = _recv_exactly(sock, length)
+            if packet_id == SHELL_ID_STDOUT:
+                out.extend(data)
+            elif packet_id == SHELL_ID_STDERR:
+                err.extend(data)
+            elif packet_id == SHELL_ID_EXIT:
+                exit_status = data[0]
+        return bytes(out), bytes(err), exit_status
+
+    def logcat(self, arg_str='', timeout=60):
+        """Runs logcat on the device. Returns its job.Result."""
+        return self.shell('logcat %s' % arg_str, timeout=timeout)
+
+    def forward(self, local, remote, timeout=60):
+        """Forwards a local socket to a socket on the device.
+
+        Args:
+            local: The host socket spec, e.g. 'tcp:5000' or 'tcp:0'.
+            remote: The device socket spec, e.g. 'tcp:8080'.
+
+        Returns:
+            The host port that was picked if local is 'tcp:0', or ''.
+        """
+        request = '%sforward:%s;%s' % (self._host_prefix(), local, remote)
+        return self._host_command(request, timeout, local == 'tcp:0')
+
+    def remove_forward(self, local, timeout=60):
+        """Removes the forward of a local socket spec, e.g. 'tcp:5000'."""
+        request = '%skillforward:%s' % (self._host_prefix(), local)
+        return self._host_command(request, timeout)
+
+    def wait_for_device(self, timeout=60):
+        """Blocks until the device is online."""
+        request = '%swait-for-any-device' % self._host_prefix()
+        return self._host_command(request, timeout)
+
+    def _host_command(self, request, timeout, has_reply=False):
+        """Sends a request handled by the adb server itself.
+
+        These requests are acknowledged twice: once when the server accepts
+        the request, and once it has carried it out.
+        """
+        start_time = time.time()
+        sock = _DeadlineSocket(self._connect(timeout), timeout)
+        try:
+            self._send_request(sock, request)
+            self._read_status(sock, request)
+            if has_reply:
+                return _read_length_prefixed(sock)
+            return ''
+        except socket.timeout:
+            raise job.TimeoutError(
+                job.Result(
+                    command=request,
+                    duration=time.time() - start_time,
+                    did_timeout=True))
+        except OSError as e:
+            raise AdbClientError('%s failed: %s' % (request, e))
+        finally:
+            sock.close()
+
+    @staticmethod
+    def _send_sync_request(sock, request_id, path):
+        path = path.encode('utf-8')
+        sock.sendall(struct.pack('<4sI', request_id, len(path)) + path)
+
+    @staticmethod
+    def _stat(sock, path):
+        """Returns the st_mode of a file on the device, or 0 if missing."""
+        AdbClient._send_sync_request(sock, b'STAT', path)
+        reply, mode, _, _ = struct.unpack('<4sIII', _recv_exactly(sock, 16))
+        if reply != b'STAT':
+            raise AdbClientError('Unexpected reply %r to STAT' % reply)
+        return mode
+
+    @staticmethod
+    def _read_sync_failure(sock, length):
+        return _recv_exactly(sock, length).decode('utf-8', 'replace')
+
+    def _open_sync(self, sock):
+        self._send_request(sock, 'sync:')
+
+    def pull(self, remote, local, timeout=180):
+        """Copies a file from the device.
+
+        Directories are not supported, and raise AdbClientError.
+
+        Args:
+            remote: The path of the file on the device.
+            local: The destination file or directory on the host.
+            timeout: Number of seconds to wait for the copy to finish.
+
+        Returns:
+            A summary of the transfer.
+        """
+        start_time = time.time()
+
+        def run_pull(sock):
+            self._open_sync(sock)
+            mode = self._stat(sock, remote)
+            if not mode:
+                raise AdbClientError('%s does not exist.' % remote)
+            if stat.S_ISDIR(mode):
+                raise AdbClientError('%s is a directory.' % remote)
+            destination = local
+            if os.path.isdir(destination):
+                destination = os.path.join(destination,
+                                           posixpath.basename(remote))
+            self._send_sync_request(sock, b'RECV', remote)
+            size = 0
+            with open(destination, 'wb') as f:
+                while True:
+                    reply, length = struct.unpack('<4sI',
+                                                  _recv_exactly(sock, 8))
+                    if reply == b'DATA':
+                        f.write(_recv_exactly(sock, length))
+                        size += length
+                    elif reply == b'DONE':
+                        break
+                    elif reply == b'FAIL':
+                        raise AdbClientError(
+                            self._read_sync_failure(sock, length))
+                    else:
+                        raise AdbClientError(
+                            'Unexpected reply %r to RECV' % reply)
+            self._send_sync_request(sock, b'QUIT', '')
+            return size
+
+        size = self._run('pull %s %s' % (remote, local), timeout, run_pull)
+        return '%s: 1 file pulled. %d bytes in %.3fs' % (
+            remote, size, time.time() - start_time)
+
+    def push(self, local, remote, timeout=180):
+        """Copies a file to the device.
+
+        Directories are not supported, and raise AdbClientError.
+
+        Args:
+            local: The path of the file on the host.
+            remote: The destination file or directory on the device.
+            timeout: Number of seconds to wait for the copy to finish.
+
+        Returns:
+            A summary of the transfer.
+        """
+        start_time = time.time()
+        if not os.path.isfile(local):
+            raise AdbClientError('%s is not a file.' % local)
+        local_stat = os.stat(local)
+
+        def run_push(sock):
+            self._open_sync(sock)
+            destination = remote
+            if remote.endswith('/') or stat.S_ISDIR(self._stat(sock, remote)):
+                destination = posixpath.join(remote, os.path.basename(local))
+            self._send_sync_request(sock, b'SEND', '%s,%d' %
+                                    (destination, local_stat.st_mode))
+            with open(local, 'rb') as f:
+                while True:
+                    chunk = f.read(SYNC_DATA_MAX)
+                    if not chunk:
+                        break
+                    sock.sendall(
+                        struct.pack('<4sI', b'DATA', len(chunk)) + chunk)
+            sock.sendall(
+                struct.pack('<4sI', b'DONE', int(local_stat.st_mtime)))
+            reply, length = struct.unpack('<4sI', _recv_exactly(sock, 8))
+            if reply == b'FAIL':
+                raise AdbClientError(self._read_sync_failure(sock, length))
+            if reply != b'OKAY':
+                raise AdbClientError('Unexpected reply %r to SEND' % reply)
+            self._send_sync_request(sock, b'QUIT', '')
+
+        self._run('push %s %s' % (local, remote), timeout, run_push)
+        return '%s: 1 file pushed. %d bytes in %.3fs' % (
+            local, local_stat.st_size, time.time() - start_time)
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import bisect
+import collections
+import datetime
+import logging
+import os
+import re
+import threading
+import time
+
+from acts import utils
+
+# The suffix of the sidecar file holding the index of a logcat file.
+INDEX_SUFFIX = '.idx'
+# Length of the timestamps of `logcat -v year`, e.g. 2018-05-03 17:39:29.898
+TIMESTAMP_LEN = 23
+# Length of the timestamp prefix that identifies an index entry's second.
+INDEX_KEY_LEN = 19
+TIMESTAMP_REGEX = re.compile(
+    r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{3}$'.encode('ascii'))
+# Number of bytes read at a time while indexing or streaming a range.
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def timestamp_from_epoch(epoch_time):
+    """Converts an epoch time in ms to a `logcat -v year` timestamp."""
+    seconds, ms = divmod(int(epoch_time), 1000)
+    return '%s.%03d' % (datetime.datetime.fromtimestamp(seconds).strftime(
+        '%Y-%m-%d %H:%M:%S'), ms)
+
+
+def _get_timestamp(line):
+    """Returns the timestamp bytes at the start of a logcat line, or None."""
+    timestamp = line[:TIMESTAMP_LEN]
+    if TIMESTAMP_REGEX.match(timestamp):
+        return timestamp
+    return None
+
+
+class LogcatIndex(object):
+    """A sparse index from timestamps to byte offsets in a logcat file.
+
+    The index holds the offset of the first line of every second of log, so
+    that a time range can be read by seeking to the second it starts in. Only
+    bytes appended since the last update are scanned, and the index is saved
+    next to the logcat file so it survives logcat restarts.
+
+    Timestamps are compared as strings, which matches their time order. Lines
+    whose timestamp goes back in time (e.g. after a clock change) are not
+    indexed, so the index always stays sorted.
+
+    Attributes:
+        file_path: The path of the logcat file.
+        index_path: The path of the sidecar index file.
+        _keys: The sorted seconds (timestamps truncated to the second).
+        _offsets: The byte offset of the first line of each second in _keys.
+        _indexed_offset: The number of bytes of the file indexed so far.
+        _lock: A lock protecting the index during updates.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.index_path = file_path + INDEX_SUFFIX
+        self._keys = []
+        self._offsets = []
+        self._indexed_offset = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Loads the sidecar index, if it matches the logcat file."""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            file_size = os.path.getsize(self.file_path)
+        except OSError:
+            return
+        keys = []
+        offsets = []
+        indexed_offset = 0
+        with open(self.index_path, 'r', encoding='ascii') as f:
+            for line in f:
+                key, _, offset = line.rstrip('\n').rpartition(' ')
+                try:
+                    offset = int(offset)
+                except ValueError:
+                    continue
+                if not key:
+                    # The last update's end offset.
+                    indexed_offset = offset
+                    continue
+                keys.append(key)
+                offsets.append(offset)
+        if indexed_offset > file_size:
+            # The logcat file was replaced. Start over.
+            os.remove(self.index_path)
+            return
+        self._keys = keys
+        self._offsets = offsets
+        self._indexed_offset = indexed_offset
+
+    def update(self):
+        """Indexes the lines appended to the logcat file since last update."""
+        with self._lock:
+            if not os.path.exists(self.file_path):
+                return
+            new_entries = []
+            with open(self.file_path, 'rb') as f:
+                f.seek(self._indexed_offset)
+                offset = self._indexed_offset
+                remainder = b''
+                while True:
+                    chunk = f.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    lines = (remainder + chunk).split(b'\n')
+                    # The last piece is an incomplete line, until more is read.
+                    remainder = lines.pop()
+                    for line in lines:
+                        self._index_line(line, offset, new_entries)
+                        offset += len(line) + 1
+            if offset == self._indexed_offset:
+                return
+            self._indexed_offset = offset
+            with open(self.index_path, 'a', encoding='ascii') as f:
+                for key, line_offset in new_entries:
+                    f.write('%s %d\n' % (key, line_offset))
+                f.write(' %d\n' % offset)
+
+    def _index_line(self, line, offset, new_entries):
+        timestamp = _get_timestamp(line)
+        if timestamp is None:
+            return
+        key = timestamp[:INDEX_KEY_LEN].decode('ascii')
+        if self._keys and key <= self._keys[-1]:
+            return
+        self._keys.append(key)
+        self._offsets.append(offset)
+        new_entries.append((key, offset))
+
+    def find_offset(self, begin_time):
+        """Returns an offset at or before the first line at begin_time.
+
+        Args:
+            begin_time: A `logcat -v year` timestamp.
+        """
+        with self._lock:
+            i = bisect.bisect_left(self._keys, begin_time[:INDEX_KEY_LEN])
+            if i == 0:
+                return 0
+            return self._offsets[i - 1]
+
+    def read_range(self, begin_time, end_time=None):
+        """Yields the logcat lines between two timestamps, inclusive.
+
+        Lines without a timestamp are skipped. Only the part of the file from
+        the second containing begin_time is read.
+
+        Args:
+            begin_time: A `logcat -v year` timestamp.
+            end_time: A `logcat -v year` timestamp, or None for no end.
+
+        Yields:
+            The lines as str, including their trailing newline.
+        """
+        self.update()
+        begin = begin_time.encode('ascii')
+        end = end_time.encode('ascii') if end_time else None
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.find_offset(begin_time))
+            for line in f:
+                timestamp = _get_timestamp(line)
+                if timestamp is None or timestamp < begin:
+                    continue
+                if end is not None and timestamp > end:
+                    return
+                if not line.endswith(b'\n'):
+                    line += b'\n'
+                yield line.decode('utf-8', 'replace')
+
+
+class LogcatCapture(object):
+    """A standing `adb logcat` whose output is written by a reader thread.
+
+    The reader appends every line to the logcat file, and optionally keeps
+    the most recent lines in memory, so that recent searches do not have to
+    read the file at all.
+
+    Attributes:
+        file_path: The path of the logcat file.
+        index: The LogcatIndex of the logcat file.
+        proc: The standing adb logcat process.
+        last_timestamp: The timestamp of the last line written, as a str.
+        _first_timestamp: The timestamp of the first line of the file.
+        _recent_lines: A deque of the most recent lines, or None.
+        _reader: The thread writing the output of proc to the file.
+    """
+
+    def __init__(self, file_path, ring_size=0):
+        self.file_path = file_path
+        self.index = LogcatIndex(file_path)
+        self.proc = None
+        self.last_timestamp = None
+        self._first_timestamp = None
+        self._recent_lines = None
+        if ring_size:
+            self._recent_lines = collections.deque(maxlen=ring_size)
+        self._reader = None
+
+    def start(self, cmd):
+        """Starts the adb logcat command and the reader writing its output.
+
+        Args:
+            cmd: The adb logcat command. Its stdout is appended to the file.
+        """
+        self.proc = utils.start_standing_subprocess(cmd)
+        self._reader = threading.Thread(target=self._write_lines)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def stop(self):
+        """Stops the adb logcat process and waits for its output."""
+        utils.stop_standing_subprocess(self.proc)
+        self._reader.join()
+        self.proc = None
+
+    def _write_lines(self):
+        with open(self.file_path, 'ab') as f:
+            for line in iter(self.proc.stdout.readline, b''):
+                f.write(line)
+                f.flush()
+                timestamp = _get_timestamp(line)
+                if timestamp is not None:
+                    self.last_timestamp = timestamp.decode('ascii')
+                    if self._recent_lines is not None:
+                        self._recent_lines.append(
+                            (self.last_timestamp,
+                             line.decode('utf-8', 'replace')))
+
+    def first_timestamp(self):
+        """Returns the timestamp of the first line of the logcat file.
+
+        Returns:
+            The timestamp as a str, or None if nothing was written yet.
+        """
+        if self._first_timestamp is None and os.path.exists(self.file_path):
+            with open(self.file_path, 'rb') as f:
+                for line in f:
+                    timestamp = _get_timestamp(line)
+                    if timestamp is not None:
+                        self._first_timestamp = timestamp.decode('ascii')
+                        break
+        return self._first_timestamp
+
+    def wait_for_timestamp(self, timestamp, timeout=2):
+        """Waits until a line at or after timestamp has been written.
+
+        Returns:
+            True if the line was written within the timeout.
+        """
+        deadline = time.time() + timeout
+        while self.last_timestamp is None or self.last_timestamp < timestamp:
+            if time.time() > deadline or not self._reader.is_alive():
+                return False
+            time.sleep(.05)
+        return True
+
+    def read_range(self, begin_time, end_time=None):
+        """Yields the captured lines between two timestamps, inclusive.
+
+        Served from memory when the recent lines cover begin_time, and from
+        the indexed logcat file otherwise.
+        """
+        recent_lines = list(self._recent_lines or ())
+        if recent_lines and recent_lines[0][0] < begin_time:
+            logging.debug('Reading logcat from the recent lines in memory.')
+            for timestamp, line in recent_lines:
+                if timestamp < begin_time:
+                    continue
+                if end_time is not None and timestamp > end_time:
+                    return
+                yield line
+            return
+        for line in self.index.read_range(begin_time, end_time):
+            yield line
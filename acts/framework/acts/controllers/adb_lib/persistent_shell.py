@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import logging
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+import shellescape
+
+from acts.libs.proc import job
+
+# The exit status adb returns when the connection to the device is lost.
+LOST_CONNECTION_EXIT_STATUS = 255
+
+# Runs a command in its own device-side shell, then writes a marker line with
+# the command's exit status to stdout and a marker line to stderr. The leading
+# echos guarantee the markers start on a new line.
+_FRAMED_COMMAND = ('sh -c {command} </dev/null; __s=$?; '
+                   'echo >&2; echo {sentinel} >&2; '
+                   'echo; echo {sentinel}:$__s\n')
+
+
+def _strip_newline(line):
+    """Removes a trailing newline, which is CRLF on some devices."""
+    for newline in (b'\r\n', b'\n'):
+        if line.endswith(newline):
+            return line[:-len(newline)]
+    return line
+
+
+class PersistentShell(object):
+    """A long-lived `adb shell` process that runs commands one at a time.
+
+    Commands are written to the stdin of the shell, and their output is read
+    until the marker line of the command is found. This avoids spawning a new
+    adb process for every command.
+
+    Each command runs in its own `sh -c` on the device, so it cannot change
+    the state of the persistent shell. The shell is respawned automatically
+    after it exits (e.g. on reboot or adb root) or after a command times out.
+
+    Attributes:
+        adb_str: The adb command prefix, e.g. 'adb -s SERIAL'.
+        _proc: The subprocess.Popen of the running `adb shell`, if any.
+        _stdout: A queue of the lines read from the shell's stdout.
+        _stderr: A queue of the lines read from the shell's stderr.
+        _merged_stderr: True if the device's adbd sends stderr over stdout.
+        _lock: A lock that allows a single command to run at a time.
+    """
+
+    def __init__(self, adb_str):
+        self.adb_str = adb_str
+        self._proc = None
+        self._stdout = None
+        self._stderr = None
+        self._merged_stderr = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_alive(self):
+        """True if the `adb shell` process is running."""
+        return self._proc is not None and self._proc.poll() is None
+
+    def _spawn(self):
+        """Starts a new `adb shell` process and its output readers."""
+        self._proc = subprocess.Popen(
+            '%s shell' % self.adb_str,
+            shell=True,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            preexec_fn=os.setpgrp)
+        self._stdout = self._start_reader(self._proc.stdout)
+        self._stderr = self._start_reader(self._proc.stderr)
+        self._merged_stderr = False
+
+    @staticmethod
+    def _start_reader(stream):
+        """Reads the lines of a stream into a queue on a daemon thread.
+
+        None is put on the queue once the stream is closed.
+        """
+        lines = queue.Queue()
+
+        def read_lines():
+            for line in iter(stream.readline, b''):
+                lines.put(line)
+            lines.put(None)
+
+        reader = threading.Thread(target=read_lines)
+        reader.daemon = True
+        reader.start()
+        return lines
+
+    def close(self):
+        """Kills the `adb shell` process, if any."""
+        with self._lock:
+            self._kill()
+
+    def _kill(self):
+        if self._proc is None:
+            return
+        if self._proc.poll() is None:
+            try:
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            self._proc.wait()
+        self._proc = None
+
+    def try_run(self, command, timeout=60):
+        """Runs a command in the persistent shell, unless it is busy.
+
+        Args:
+            command: The shell command to run on the device.
+            timeout: Number of seconds to wait for the command to finish.
+
+        Returns:
+            A job.Result of the command, or None if another command is
+            currently running in the persistent shell.
+
+        Raises:
+            job.TimeoutError: The command did not finish within the timeout.
+                The shell is killed, and respawned on the next command.
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return self._run(command, timeout)
+        finally:
+            self._lock.release()
+
+    def _run(self, command, timeout):
+        start_time = time.time()
+        deadline = start_time + timeout
+        if not self.is_alive:
+            self._kill()
+            self._spawn()
+        sentinel = 'ACTS_%s' % uuid.uuid4().hex
+        framed = _FRAMED_COMMAND.format(
+            command=shellescape.quote(command), sentinel=sentinel)
+        try:
+            self._proc.stdin.write(framed.encode('utf-8'))
+            self._proc.stdin.flush()
+        except OSError:
+            # The shell died since it was checked. Let the reader report it.
+            pass
+
+        out, exit_status, timed_out = self._read_until_marker(
+            self._stdout, sentinel, deadline)
+        err = b''
+        if not timed_out and exit_status is not None:
+            if not self._merged_stderr:
+                err, _, timed_out = self._read_until_marker(
+                    self._stderr, sentinel, deadline)
+        elif not timed_out:
+            # The shell exited before the command finished.
+            self._proc.wait()
+            err = self._drain(self._stderr)
+            exit_status = self._proc.returncode or LOST_CONNECTION_EXIT_STATUS
+            self._proc = None
+
+        result = job.Result(
+            command=command,
+            stdout=out,
+            stderr=err,
+            exit_status=exit_status,
+            duration=time.time() - start_time,
+            did_timeout=timed_out)
+        logging.debug(result)
+        if timed_out:
+            logging.error('Command %s with %s timeout setting timed out',
+                          command, timeout)
+            self._kill()
+            raise job.TimeoutError(result)
+        return result
+
+    def _read_until_marker(self, lines, sentinel, deadline):
+        """Reads the output of a command up to its marker line.
+
+        Returns:
+            A tuple of (output, exit_status, timed_out). The exit status is
+            None if the stream closed before the marker was read.
+        """
+        marker = sentinel.encode('utf-8')
+        output = []
+        while True:
+            try:
+                line = lines.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                return b''.join(output), None, True
+            if line is None:
+                return b''.join(output), None, False
+            stripped = line.rstrip(b'\r\n')
+            if stripped == marker and lines is self._stdout:
+                # The stderr marker arrived on stdout. The device does not
+                # separate the two streams.
+                self._merged_stderr = True
+                if output and output[-1].strip() == b'':
+                    output.pop()
+                continue
+            if stripped.startswith(marker):
+                exit_status = stripped[len(marker) + 1:]
+                # Drop the newline echoed in front of the marker.
+                if output:
+                    output[-1] = _strip_newline(output[-1])
+                try:
+                    return b''.join(output), int(exit_status or 0), False
+                except ValueError:
+                    return b''.join(output), 0, False
+            output.append(line)
+
+    @staticmethod
+    def _drain(lines):
+        """Returns everything currently queued on a closed stream."""
+        output = []
+        while True:
+            try:
+                line = lines.get(timeout=1)
+            except queue.Empty:
+                break
+            if line is None:
+                break
+            output.append(line)
+        return b''.join(output)
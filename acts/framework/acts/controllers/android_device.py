@@ -19,11 +19,13 @@ from builtins import open
 from datetime import datetime
 
 import collections
+import concurrent.futures
 import logging
 import math
 import os
 import re
 import socket
+import threading
 import time
 
 from acts import logger as acts_logger
@@ -32,9 +34,11 @@ from acts import tracelogger
 from acts import utils
 from acts.controllers import adb
 from acts.controllers import fastboot
+from acts.controllers.adb_lib import logcat_capture
 from acts.controllers.sl4a_lib import sl4a_manager
 from acts.controllers.utils_lib.ssh import connection
 from acts.controllers.utils_lib.ssh import settings
+from acts.libs.proc import host_slot
 
 ACTS_CONTROLLER_CONFIG_NAME = "AndroidDevice"
 ACTS_CONTROLLER_REFERENCE_NAME = "android_devices"
@@ -55,7 +59,19 @@ PULL_TIMEOUT = 300
 PORT_RETRY_COUNT = 3
 IPERF_TIMEOUT = 60
 SL4A_APK_NAME = "com.googlecode.android_scripting"
+# Key name for the number of pipelined SL4A connections in config file.
+ANDROID_DEVICE_SL4A_MULTIPLEXED_CONNECTIONS_KEY = "sl4a_multiplexed_connections"
+# Key name for running adb shell commands over a persistent shell in config.
+ANDROID_DEVICE_ADB_PERSISTENT_SHELL_KEY = "adb_persistent_shell"
+# Key name for talking to the adb server without the adb binary in config.
+ANDROID_DEVICE_ADB_SERVER_PROTOCOL_KEY = "adb_server_protocol"
+# Key name for the number of recent logcat lines kept in memory in config.
+ANDROID_DEVICE_ADB_LOGCAT_RING_SIZE_KEY = "adb_logcat_ring_size"
 WAIT_FOR_DEVICE_TIMEOUT = 180
+# Maximum number of devices brought up at once on a host, across all the
+# ACTS processes sharing its adb server.
+BRING_UP_HOST_CONCURRENCY = 4
+BRING_UP_HOST_SLOT_NAME = 'adb_bring_up'
 ENCRYPTION_WINDOW = "CryptKeeper"
 DEFAULT_DEVICE_PASSWORD = "1111"
 RELEASE_ID_REGEXES = [re.compile(r'\w+\.\d+\.\d+'), re.compile(r'N\w+')]
@@ -95,8 +111,16 @@ def create(configs):
 
     ads[0].log.info('The primary device under test is "%s".' % ads[0].serial)
 
+    # Local devices share one adb server, so a single device list is enough.
+    local_serials = None
     for ad in ads:
-        if not ad.is_connected():
+        if ad._ssh_connection:
+            connected = ad.is_connected()
+        else:
+            if local_serials is None:
+                local_serials = list_adb_devices()
+            connected = ad.serial in local_serials
+        if not connected:
             raise DoesNotExistError(("Android device %s is specified in config"
                                      " but is not attached.") % ad.serial)
     _start_services_on_ads(ads)
@@ -145,32 +169,82 @@ def get_post_job_info(ads):
     return 'Build Info', ads[0].build_info
 
 
+def _bring_up(ad, aborted):
+    """Brings up one AndroidDevice for _start_services_on_ads.
+
+    Args:
+        ad: The AndroidDevice object whose services to start.
+        aborted: A threading.Event set once bring-up failed on any device.
+
+    Returns:
+        True if services were started, False if bring-up was aborted before
+        this device started.
+    """
+    with host_slot.HostSlot(BRING_UP_HOST_CONCURRENCY,
+                            BRING_UP_HOST_SLOT_NAME):
+        if aborted.is_set():
+            return False
+        try:
+            _start_services_timed(ad)
+        except:
+            # Set before the slot is released, so no device starts after.
+            aborted.set()
+            raise
+        return True
+
+
+def _start_services_timed(ad):
+    """Starts the services of an AndroidDevice, logging how long it took."""
+    timings = []
+    begin_time = time.time()
+    if not ad.ensure_screen_on():
+        ad.log.error("User window cannot come up")
+        raise AndroidDeviceError("User window cannot come up")
+    timings.append(("screen on", time.time() - begin_time))
+    if not ad.skip_sl4a:
+        step_time = time.time()
+        if not ad.is_sl4a_installed():
+            ad.log.error("sl4a.apk is not installed")
+            raise AndroidDeviceError("The required sl4a.apk is not installed")
+        timings.append(("sl4a check", time.time() - step_time))
+    step_time = time.time()
+    try:
+        ad.start_services(skip_sl4a=ad.skip_sl4a)
+    except:
+        ad.log.exception("Failed to start some services, abort!")
+        raise
+    timings.append(("services", time.time() - step_time))
+    ad.log.info("Bring-up took %.1fs (%s).",
+                time.time() - begin_time,
+                ", ".join("%s %.1fs" % timing for timing in timings))
+
+
 def _start_services_on_ads(ads):
     """Starts long running services on multiple AndroidDevice objects.
 
-    If any one AndroidDevice object fails to start services, cleans up all
-    existing AndroidDevice objects and their services.
+    Devices are brought up in parallel, at most BRING_UP_HOST_CONCURRENCY at
+    once on the host. If any one AndroidDevice object fails to start
+    services, devices not started yet are skipped, and all the started
+    AndroidDevice objects and their services are cleaned up.
 
     Args:
         ads: A list of AndroidDevice objects whose services to start.
     """
-    running_ads = []
-    for ad in ads:
-        running_ads.append(ad)
-        if not ad.ensure_screen_on():
-            ad.log.error("User window cannot come up")
-            destroy(running_ads)
-            raise AndroidDeviceError("User window cannot come up")
-        if not ad.skip_sl4a and not ad.is_sl4a_installed():
-            ad.log.error("sl4a.apk is not installed")
-            destroy(running_ads)
-            raise AndroidDeviceError("The required sl4a.apk is not installed")
-        try:
-            ad.start_services(skip_sl4a=ad.skip_sl4a)
-        except:
-            ad.log.exception("Failed to start some services, abort!")
-            destroy(running_ads)
-            raise
+    aborted = threading.Event()
+    begin_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(ads)) as executor:
+        futures = [executor.submit(_bring_up, ad, aborted) for ad in ads]
+    errors = [future.exception() for future in futures if future.exception()]
+    if errors:
+        # Devices whose bring-up was skipped have nothing to clean up.
+        destroy([
+            ad for ad, future in zip(ads, futures)
+            if future.exception() or future.result()
+        ])
+        raise errors[0]
+    logging.info("Brought up %d android devices in %.1fs.", len(ads),
+                 time.time() - begin_time)
 
 
 def _parse_device_list(device_list_str, key):
@@ -369,6 +443,8 @@ class AndroidDevice:
         adb_logcat_file_path: A string that's the full path to the adb logcat
                               file collected, if any.
         adb: An AdbProxy object used for interacting with the device via adb.
+            Accessing it first waits for the background tasks using the
+            device, see set_task_waiter.
         fastboot: A FastbootProxy object used for interacting with the device
                   via fastboot.
     """
@@ -385,6 +461,7 @@ class AndroidDevice:
         self._event_dispatchers = {}
         self.adb_logcat_process = None
         self.adb_logcat_file_path = None
+        self._task_waiter = None
         self.adb = adb.AdbProxy(serial, ssh_connection=ssh_connection)
         self.fastboot = fastboot.FastbootProxy(
             serial, ssh_connection=ssh_connection)
@@ -396,6 +473,10 @@ class AndroidDevice:
         self.data_accounting = collections.defaultdict(int)
         self._sl4a_manager = sl4a_manager.Sl4aManager(self.adb)
         self.last_logcat_timestamp = None
+        self._build_info = None
+        self._model = None
+        self._logcat_capture = None
+        self._logcat_index = None
 
     def clean_up(self):
         """Cleans up the AndroidDevice object and releases any resources it
@@ -417,6 +498,14 @@ class AndroidDevice:
             skip_sl4a: Does not attempt to start SL4A if True.
             skip_setup_wizard: Whether or not to skip the setup wizard.
         """
+        if getattr(self, ANDROID_DEVICE_ADB_PERSISTENT_SHELL_KEY, False):
+            self.adb.enable_persistent_shell()
+        if getattr(self, ANDROID_DEVICE_ADB_SERVER_PROTOCOL_KEY, False):
+            self.adb.enable_adb_client()
+        try:
+            self.adb.prefetch_properties()
+        except adb.AdbError:
+            self.log.warning("Failed to prefetch device properties.")
         if skip_setup_wizard:
             self.exit_setup_wizard()
         try:
@@ -441,6 +530,7 @@ class AndroidDevice:
             self.stop_adb_logcat()
         self.terminate_all_sessions()
         self.stop_sl4a()
+        self.adb.disable_persistent_shell()
 
     def is_connected(self):
         out = self.adb.devices()
@@ -458,6 +548,8 @@ class AndroidDevice:
             A dict with the build info of this Android device, or None if the
             device is in bootloader mode.
         """
+        if self._build_info is not None:
+            return dict(self._build_info)
         if self.is_bootloader:
             self.log.error("Device is in fastboot mode, could not get build "
                            "info.")
@@ -476,6 +568,9 @@ class AndroidDevice:
             "build_id": build_id,
             "build_type": self.adb.getprop("ro.build.type")
         }
+        if build_id:
+            self._build_info = info
+            return dict(info)
         return info
 
     @property
@@ -489,15 +584,17 @@ class AndroidDevice:
         """True if adb is running as root for this device.
         """
         try:
-            return "0" == self.adb.shell("id -u")
+            return self.adb.is_root()
         except adb.AdbError:
             # Wait a bit and retry to work around adb flakiness for this cmd.
             time.sleep(0.2)
-            return "0" == self.adb.shell("id -u")
+            return self.adb.is_root()
 
     @property
     def model(self):
         """The Android code name for the device."""
+        if self._model is not None:
+            return self._model
         # If device is in bootloader mode, get mode name from fastboot.
         if self.is_bootloader:
             out = self.fastboot.getvar("product").strip()
@@ -510,14 +607,52 @@ class AndroidDevice:
                     return tokens[1].lower()
             return None
         model = self.adb.getprop("ro.build.product").lower()
-        if model == "sprout":
-            return model
-        else:
-            return self.adb.getprop("ro.product.name").lower()
+        if model != "sprout":
+            model = self.adb.getprop("ro.product.name").lower()
+        if model:
+            self._model = model
+        return model
+
+    def clear_property_cache(self):
+        """Forgets the cached build info, model and device properties.
+
+        Called whenever the device may come back with another build or adb
+        user, e.g. on reboot, adb root and OTA.
+        """
+        self._build_info = None
+        self._model = None
+        self.adb.clear_property_cache()
+
+    @property
+    def adb(self):
+        """The AdbProxy of the device."""
+        self._wait_for_tasks()
+        return self._adb
+
+    @adb.setter
+    def adb(self, adb_proxy):
+        self._adb = adb_proxy
+
+    def set_task_waiter(self, waiter):
+        """Sets what to wait for before the device is used again.
+
+        Background tasks using the device, e.g. bug report collection, are
+        waited for before the next adb call or RPC instead of right after
+        they are started.
+
+        Args:
+            waiter: A function returning once the tasks are done, or None.
+        """
+        self._task_waiter = waiter
+
+    def _wait_for_tasks(self):
+        if self._task_waiter:
+            self._task_waiter()
 
     @property
     def droid(self):
         """Returns the RPC Service of the first Sl4aSession created."""
+        self._wait_for_tasks()
         if len(self._sl4a_manager.sessions) > 0:
             session_id = sorted(self._sl4a_manager.sessions.keys())[0]
             return self._sl4a_manager.sessions[session_id].rpc_client
@@ -527,6 +662,7 @@ class AndroidDevice:
     @property
     def ed(self):
         """Returns the event dispatcher of the first Sl4aSession created."""
+        self._wait_for_tasks()
         if len(self._sl4a_manager.sessions) > 0:
             session_id = sorted(self._sl4a_manager.sessions.keys())[0]
             return self._sl4a_manager.sessions[
@@ -583,6 +719,7 @@ class AndroidDevice:
         """
         self.adb.root()
         self.adb.wait_for_device()
+        self.clear_property_cache()
 
     def get_droid(self, handle_event=True):
         """Create an sl4a connection to the device.
@@ -592,6 +729,9 @@ class AndroidDevice:
         returned to the caller as well.
         If sl4a server is not started on the device, try to start it.
 
+        If the device config sets "sl4a_multiplexed_connections", the droid
+        pipelines concurrent RPCs over that many shared connections.
+
         Args:
             handle_event: True if this droid session will need to handle
                 events.
@@ -610,13 +750,20 @@ class AndroidDevice:
             >>> ad = AndroidDevice()
             >>> droid, ed = ad.get_droid()
         """
-        session = self._sl4a_manager.create_session()
+        session = self._sl4a_manager.create_session(
+            multiplexed_connections=self._sl4a_multiplexed_connections)
         droid = session.rpc_client
         if handle_event:
             ed = session.get_event_dispatcher()
             return droid, ed
         return droid
 
+    @property
+    def _sl4a_multiplexed_connections(self):
+        """The number of pipelined SL4A connections set in the config."""
+        return int(
+            getattr(self, ANDROID_DEVICE_SL4A_MULTIPLEXED_CONNECTIONS_KEY, 0))
+
     def get_package_pid(self, package_name):
         """Gets the pid for a given package. Returns None if not running.
         Args:
@@ -662,17 +809,22 @@ class AndroidDevice:
         """
         return self._sl4a_manager.sessions[droid.uid].get_event_dispatcher()
 
-    def _is_timestamp_in_range(self, target, log_begin_time, log_end_time):
-        low = acts_logger.logline_timestamp_comparator(log_begin_time,
-                                                       target) <= 0
-        high = acts_logger.logline_timestamp_comparator(log_end_time,
-                                                        target) >= 0
-        return low and high
+    def _get_logcat_index(self):
+        """Returns the LogcatIndex of the current adb logcat file."""
+        if self._logcat_capture is not None:
+            return self._logcat_capture.index
+        if (self._logcat_index is None or
+                self._logcat_index.file_path != self.adb_logcat_file_path):
+            self._logcat_index = logcat_capture.LogcatIndex(
+                self.adb_logcat_file_path)
+        return self._logcat_index
 
     def cat_adb_log(self, tag, begin_time):
         """Takes an excerpt of the adb logcat log from a certain time point to
         current time.
 
+        The logcat file is indexed by time, so only the excerpt is read.
+
         Args:
             tag: An identifier of the time period, usualy the name of a test.
             begin_time: Epoch time of the beginning of the time period.
@@ -694,29 +846,9 @@ class AndroidDevice:
         out_name = tag + out_name
         full_adblog_path = os.path.join(adb_excerpt_path, out_name)
         with open(full_adblog_path, 'w', encoding='utf-8') as out:
-            in_file = self.adb_logcat_file_path
-            with open(in_file, 'r', encoding='utf-8', errors='replace') as f:
-                in_range = False
-                while True:
-                    line = None
-                    try:
-                        line = f.readline()
-                        if not line:
-                            break
-                    except:
-                        continue
-                    line_time = line[:acts_logger.log_line_timestamp_len]
-                    if not acts_logger.is_valid_logline_timestamp(line_time):
-                        continue
-                    if self._is_timestamp_in_range(line_time, log_begin_time,
-                                                   log_end_time):
-                        in_range = True
-                        if not line.endswith('\n'):
-                            line += '\n'
-                        out.write(line)
-                    else:
-                        if in_range:
-                            break
+            out.writelines(self._get_logcat_index().read_range(
+                logcat_capture.timestamp_from_epoch(begin_time),
+                log_end_time))
 
     def start_adb_logcat(self, cont_logcat_file=False):
         """Starts a standing adb logcat collection in separate subprocesses and
@@ -754,10 +886,20 @@ class AndroidDevice:
             begin_at = '-T "%s"' % self.last_logcat_timestamp
         else:
             begin_at = '-T 1'
+        ring_size = int(
+            getattr(self, ANDROID_DEVICE_ADB_LOGCAT_RING_SIZE_KEY, 0))
         # TODO(markdr): Pull 'adb -s %SERIAL' from the AdbProxy object.
-        cmd = "adb -s {} logcat {} -v year {} >> {}".format(
-            self.serial, begin_at, extra_params, logcat_file_path)
-        self.adb_logcat_process = utils.start_standing_subprocess(cmd)
+        cmd = "adb -s {} logcat {} -v year {}".format(self.serial, begin_at,
+                                                      extra_params)
+        if ring_size:
+            self._logcat_capture = logcat_capture.LogcatCapture(
+                logcat_file_path, ring_size=ring_size)
+            self._logcat_capture.start(cmd)
+            self.adb_logcat_process = self._logcat_capture.proc
+        else:
+            self._logcat_capture = None
+            self.adb_logcat_process = utils.start_standing_subprocess(
+                "{} >> {}".format(cmd, logcat_file_path))
         self.adb_logcat_file_path = logcat_file_path
 
     def stop_adb_logcat(self):
@@ -774,7 +916,10 @@ class AndroidDevice:
         next_line = logcat_output.find('\n')
         self.last_logcat_timestamp = logcat_output[next_line + 1:
                                                    next_line + 24]
-        utils.stop_standing_subprocess(self.adb_logcat_process)
+        if self._logcat_capture is not None:
+            self._logcat_capture.stop()
+        else:
+            utils.stop_standing_subprocess(self.adb_logcat_process)
         self.adb_logcat_process = None
 
     def get_apk_uid(self, apk_name):
@@ -1005,7 +1150,9 @@ class AndroidDevice:
             existing uid to a new session.
         """
         session = self._sl4a_manager.create_session(
-            max_connections=max_connections, server_port=server_port)
+            max_connections=max_connections,
+            server_port=server_port,
+            multiplexed_connections=self._sl4a_multiplexed_connections)
 
         self._sl4a_manager.sessions[session.uid] = session
         return session.rpc_client
@@ -1095,6 +1242,9 @@ class AndroidDevice:
             try:
                 completed = self.adb.getprop("sys.boot_completed")
                 if completed == '1':
+                    # The device may have rebooted without being asked to,
+                    # so what was cached before may be stale.
+                    self.clear_property_cache()
                     return
             except adb.AdbError:
                 # adb shell calls may fail during certain period of booting
@@ -1120,10 +1270,12 @@ class AndroidDevice:
         """
         if self.is_bootloader:
             self.fastboot.reboot()
+            self.clear_property_cache()
             return
         self.terminate_all_sessions()
         self.log.info("Rebooting")
         self.adb.reboot()
+        self.clear_property_cache()
         self.wait_for_boot_completion()
         self.root_adb()
         if stop_at_lock_screen:
@@ -1164,14 +1316,16 @@ class AndroidDevice:
               "time_stamp": "2017-05-03 17:39:29.898",
               "datetime_obj": datetime object}]
         """
-        cmd_option = '-b all -v year -d'
-        if begin_time:
-            log_begin_time = acts_logger.epoch_to_log_line_timestamp(
-                begin_time)
-            cmd_option = '%s -t "%s"' % (cmd_option, log_begin_time)
-        out = self.adb.logcat(
-            '%s | grep "%s"' % (cmd_option, matching_string),
-            ignore_status=True)
+        out = self._search_captured_logcat(matching_string, begin_time)
+        if out is None:
+            cmd_option = '-b all -v year -d'
+            if begin_time:
+                log_begin_time = acts_logger.epoch_to_log_line_timestamp(
+                    begin_time)
+                cmd_option = '%s -t "%s"' % (cmd_option, log_begin_time)
+            out = self.adb.logcat(
+                '%s | grep "%s"' % (cmd_option, matching_string),
+                ignore_status=True)
         if not out: return []
         result = []
         logs = re.findall(r'(\S+\s\S+)(.*%s.*)' % re.escape(matching_string),
@@ -1186,6 +1340,40 @@ class AndroidDevice:
             })
         return result
 
+    def _search_captured_logcat(self, matching_string, begin_time=None):
+        """Searches the lines captured by the standing adb logcat.
+
+        The capture starts at the end of the device buffers (or where the
+        last capture stopped), so it only answers searches from a begin_time
+        it covers. It waits for the capture to catch up with the device, so
+        that the lines logged before the search are included.
+
+        Returns:
+            The matching lines, or None if the capture cannot answer the
+            search, e.g. because it does not include all buffers or it
+            started after begin_time.
+        """
+        capture = self._logcat_capture
+        if capture is None or not self.is_adb_logcat_on or not begin_time:
+            return None
+        if getattr(self, ANDROID_DEVICE_ADB_LOGCAT_PARAM_KEY,
+                   "-b all") != "-b all":
+            return None
+        begin = logcat_capture.timestamp_from_epoch(begin_time)
+        first_timestamp = capture.first_timestamp()
+        if first_timestamp is None or begin < first_timestamp:
+            return None
+        last_lines = self.adb.logcat('-b all -t 1 -v year', ignore_status=True)
+        for line in last_lines.splitlines():
+            # Skips the "--------- beginning of <buffer>" lines.
+            if not line[:1].isdigit():
+                continue
+            last_timestamp = line[:logcat_capture.TIMESTAMP_LEN]
+            if not capture.wait_for_timestamp(last_timestamp):
+                return None
+        return ''.join(line for line in capture.read_range(begin)
+                       if matching_string in line)
+
     def get_ipv4_address(self, interface='wlan0', timeout=5):
         for timer in range(0, timeout):
             try:
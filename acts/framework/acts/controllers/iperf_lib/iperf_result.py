@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Parses iperf3 JSON logs, including logs still being written.
+
+An iperf3 server log holds one JSON object per client run when the server is
+started with -J, or one JSON event per line (start, interval, end) with
+--json-stream. Both are read as a sequence of top level JSON objects, so a
+log can be parsed while iperf is still running, and logs of several runs
+give one IPerfRun each.
+
+Usage:
+    reader = IPerfLogReader(log_path)
+    while iperf_running():
+        rates = reader.poll()  # MB/s of the intervals received since.
+    for run in reader.runs:
+        print(run.avg_receive_rate, run.std_deviation)
+"""
+
+import codecs
+import json
+import re
+
+import numpy
+
+# Initial number of intervals a run has room for before growing.
+INITIAL_INTERVAL_CAPACITY = 64
+
+# iperf writes -nan for some values it could not measure, e.g. the jitter of a
+# run without packets, which is not valid JSON. It is read as 0.
+_NAN = '-nan'
+# Inside an object, the tokens which matter to find where it ends. A lone
+# quote is a string whose end has not been read yet.
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|"|[{}]')
+
+
+def _bps_to_mbytes(bps):
+    return bps / 8 / 1024 / 1024
+
+
+class JsonObjectStream(object):
+    """Splits text fed piece by piece into its top level JSON objects.
+
+    Text outside of objects, e.g. an error line printed by an interrupted
+    iperf, is skipped. Objects fed whole are decoded directly; the end of an
+    object fed in several pieces is searched for in each piece once.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._nan_prefix = ''
+        self._scan_pos = 0
+        self._depth = 0
+
+    def _replace_nan(self, text):
+        """Replaces -nan in text, keeping back a -nan cut by its end."""
+        text = self._nan_prefix + text
+        self._nan_prefix = ''
+        for size in range(len(_NAN) - 1, 0, -1):
+            if text.endswith(_NAN[:size]):
+                self._nan_prefix = text[-size:]
+                text = text[:-size]
+                break
+        return text.replace(_NAN, '0')
+
+    def feed(self, text):
+        """Adds text to the stream.
+
+        Args:
+            text: The next piece of the stream.
+
+        Returns:
+            The list of the objects completed by text, decoded.
+
+        Raises:
+            ValueError: A complete object is not valid JSON.
+        """
+        self._buffer += self._replace_nan(text)
+        objects = []
+        pos = self._scan_pos
+        start = 0
+        while True:
+            if self._depth == 0:
+                start = self._buffer.find('{', pos)
+                if start < 0:
+                    start = pos = len(self._buffer)
+                    break
+                try:
+                    obj, pos = self._decoder.raw_decode(self._buffer, start)
+                    objects.append(obj)
+                    continue
+                except ValueError:
+                    # Not complete yet, find its end as more text arrives.
+                    pass
+                self._depth = 1
+                pos = start + 1
+                continue
+            match = _TOKEN_RE.search(self._buffer, pos)
+            if match is None:
+                pos = len(self._buffer)
+                break
+            token = match.group()
+            if token == '"':
+                pos = match.start()
+                break
+            pos = match.end()
+            if token == '{':
+                self._depth += 1
+            elif token == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    objects.append(json.loads(self._buffer[start:pos]))
+        # Drops the text before the object being read.
+        self._buffer = self._buffer[start:]
+        self._scan_pos = pos - start
+        return objects
+
+
+class _GrowingArray(object):
+    """A float array appended to one value at a time, in amortized O(1)."""
+
+    def __init__(self, values=()):
+        values = numpy.asarray(values, dtype=float)
+        self._data = numpy.empty(
+            max(INITIAL_INTERVAL_CAPACITY, len(values)), dtype=float)
+        self._data[:len(values)] = values
+        self._size = len(values)
+
+    def append(self, value):
+        if self._size == len(self._data):
+            data = numpy.empty(2 * len(self._data), dtype=float)
+            data[:self._size] = self._data
+            self._data = data
+        self._data[self._size] = value
+        self._size += 1
+
+    @property
+    def values(self):
+        """A view of the values appended so far."""
+        return self._data[:self._size]
+
+
+class IPerfRun(object):
+    """The result of one iperf client run.
+
+    Statistics over the intervals are computed once and cached until more
+    intervals are added.
+
+    Attributes:
+        result: The JSON output of iperf for the run. For --json-stream logs,
+            the events are gathered into the same layout as with -J.
+    """
+
+    def __init__(self, result=None):
+        self.result = result if result is not None else {}
+        self._rates = _GrowingArray(
+            numpy.fromiter(
+                (interval['sum']['bits_per_second']
+                 for interval in self.result.get('intervals', [])),
+                dtype=float))
+        self._cache = {}
+
+    def add_event(self, event):
+        """Adds one --json-stream event to the run.
+
+        Args:
+            event: A decoded event, with its name in 'event' and its content
+                in 'data'.
+
+        Returns:
+            The MB/s of the interval if event is an interval, else None.
+        """
+        name, data = event['event'], event.get('data')
+        if name != 'interval':
+            self.result[name] = data
+            return None
+        self.result.setdefault('intervals', []).append(data)
+        bps = data['sum']['bits_per_second']
+        self._rates.append(bps)
+        self._cache.clear()
+        return _bps_to_mbytes(bps)
+
+    def _cached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def _has_data(self):
+        """Checks if the iperf result has valid throughput data.
+
+        Returns:
+            True if the result contains throughput data. False otherwise.
+        """
+        return ('end' in self.result) and ('sum_received' in self.result["end"]
+                                           or 'sum' in self.result["end"])
+
+    def get_json(self):
+        """
+        Returns:
+            The raw json output from iPerf.
+        """
+        return self.result
+
+    @property
+    def error(self):
+        if 'error' not in self.result:
+            return None
+        return self.result['error']
+
+    @property
+    def avg_rate(self):
+        """Average UDP rate in MB/s over the entire run.
+
+        This is the average UDP rate observed at the terminal the iperf result
+        is pulled from. According to iperf3 documentation this is calculated
+        based on bytes sent and thus is not a good representation of the
+        quality of the link. If the result is not from a success run, this
+        property is None.
+        """
+        if not self._has_data() or 'sum' not in self.result['end']:
+            return None
+        bps = self.result['end']['sum']['bits_per_second']
+        return _bps_to_mbytes(bps)
+
+    @property
+    def avg_receive_rate(self):
+        """Average receiving rate in MB/s over the entire run.
+
+        This data may not exist if iperf was interrupted. If the result is not
+        from a success run, this property is None.
+        """
+        if not self._has_data() or 'sum_received' not in self.result['end']:
+            return None
+        bps = self.result['end']['sum_received']['bits_per_second']
+        return _bps_to_mbytes(bps)
+
+    @property
+    def avg_send_rate(self):
+        """Average sending rate in MB/s over the entire run.
+
+        This data may not exist if iperf was interrupted. If the result is not
+        from a success run, this property is None.
+        """
+        if not self._has_data() or 'sum_sent' not in self.result['end']:
+            return None
+        bps = self.result['end']['sum_sent']['bits_per_second']
+        return _bps_to_mbytes(bps)
+
+    @property
+    def interval_rates(self):
+        """Received rate in MB/s of each interval read so far.
+
+        Unlike instantaneous_rates, this is available while the run is still
+        going on.
+
+        Returns:
+            A read-only numpy array.
+        """
+
+        def compute():
+            rates = _bps_to_mbytes(self._rates.values)
+            rates.flags.writeable = False
+            return rates
+
+        return self._cached('interval_rates', compute)
+
+    @property
+    def instantaneous_rates(self):
+        """Instantaneous received rate in MB/s over entire run.
+
+        This data may not exist if iperf was interrupted. If the result is not
+        from a success run, this property is None.
+        """
+        if not self._has_data():
+            return None
+        return self._cached('instantaneous_rates',
+                            lambda: self.interval_rates.tolist())
+
+    @property
+    def std_deviation(self):
+        """Standard deviation of rates in MB/s over entire run.
+
+        This data may not exist if iperf was interrupted. If the result is not
+        from a success run, this property is None.
+        """
+        return self.get_std_deviation(0)
+
+    def get_std_deviation(self, iperf_ignored_interval):
+        """Standard deviation of rates in MB/s over entire run.
+
+        This data may not exist if iperf was interrupted. If the result is not
+        from a success run, this property is None. A configurable number of
+        beginning (and the single last) intervals are ignored in the
+        calculation as they are inaccurate (e.g. the last is from a very small
+        interval)
+
+        Args:
+            iperf_ignored_interval: number of iperf interval to ignored in
+            calculating standard deviation
+        """
+        if not self._has_data():
+            return None
+
+        def compute():
+            rates = self.interval_rates[iperf_ignored_interval:-1]
+            if len(rates) < 2:
+                raise ZeroDivisionError(
+                    'Less than two intervals to compute the deviation of.')
+            return float(numpy.std(rates, ddof=1))
+
+        return self._cached(('std_deviation', iperf_ignored_interval),
+                            compute)
+
+
+class IPerfLogReader(object):
+    """Reads the runs of an iperf log incrementally.
+
+    Each poll reads the bytes written to the log since the previous one, so
+    the log can be followed while iperf is still writing it.
+
+    Attributes:
+        runs: The IPerfRun of each run read so far. The last one may still be
+            going on if the log is in --json-stream format.
+    """
+
+    def __init__(self, result_path):
+        self.runs = []
+        self._result_path = result_path
+        self._offset = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._stream = JsonObjectStream()
+
+    def poll(self):
+        """Reads what was written to the log since the previous poll.
+
+        Returns:
+            A numpy array of the rates in MB/s of the intervals read, across
+            runs. Only --json-stream logs have intervals before a run ends.
+        """
+        with open(self._result_path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        self._offset += len(data)
+        rates = []
+        for obj in self._stream.feed(self._decoder.decode(data)):
+            rates.extend(self._add_object(obj))
+        return numpy.array(rates, dtype=float)
+
+    def _add_object(self, obj):
+        """Adds one object of the log to the runs.
+
+        Args:
+            obj: A decoded -J run result or --json-stream event.
+
+        Returns:
+            The list of the rates in MB/s of the intervals in obj.
+        """
+        if 'event' not in obj:
+            run = IPerfRun(obj)
+            self.runs.append(run)
+            return run.interval_rates.tolist()
+        if obj['event'] == 'start' or not self.runs:
+            self.runs.append(IPerfRun())
+        rate = self.runs[-1].add_event(obj)
+        return [] if rate is None else [rate]
+
+
+def read_runs(result_path):
+    """Reads all the runs of an iperf log.
+
+    Args:
+        result_path: The path of the iperf JSON log.
+
+    Returns:
+        A list of IPerfRun, one per run in the log.
+    """
+    reader = IPerfLogReader(result_path)
+    reader.poll()
+    return reader.runs
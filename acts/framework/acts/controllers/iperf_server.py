@@ -14,12 +14,11 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
-import json
 import logging
-import math
 import os
 from acts import utils
 from acts.controllers import android_device
+from acts.controllers.iperf_lib import iperf_result
 from acts.controllers.utils_lib.ssh import connection
 from acts.controllers.utils_lib.ssh import settings
 
@@ -66,138 +65,23 @@ def destroy(objs):
             pass
 
 
-class IPerfResult(object):
+class IPerfResult(iperf_result.IPerfRun):
     def __init__(self, result_path):
         """ Loads iperf result from file.
 
         Loads iperf result from JSON formatted server log. File can be accessed
-        before or after server is stopped. Note that only the first JSON object
-        will be loaded and this funtion is not intended to be used with files
-        containing multiple iperf client runs.
-        """
-        try:
-            with open(result_path, 'r') as f:
-                iperf_output = f.readlines()
-                if "}\n" in iperf_output:
-                    iperf_output = iperf_output[0:
-                                                iperf_output.index("}\n") + 1]
-                iperf_string = ''.join(iperf_output)
-                iperf_string = iperf_string.replace("-nan", '0')
-                self.result = json.loads(iperf_string)
-        except ValueError:
-            with open(result_path, 'r') as f:
-                # Possibly a result from interrupted iperf run, skip first line
-                # and try again.
-                lines = f.readlines()[1:]
-                self.result = json.loads(''.join(lines))
-
-    def _has_data(self):
-        """Checks if the iperf result has valid throughput data.
-
-        Returns:
-            True if the result contains throughput data. False otherwise.
-        """
-        return ('end' in self.result) and ('sum_received' in self.result["end"]
-                                           or 'sum' in self.result["end"])
-
-    def get_json(self):
-        """
-        Returns:
-            The raw json output from iPerf.
-        """
-        return self.result
-
-    @property
-    def error(self):
-        if 'error' not in self.result:
-            return None
-        return self.result['error']
-
-    @property
-    def avg_rate(self):
-        """Average UDP rate in MB/s over the entire run.
-
-        This is the average UDP rate observed at the terminal the iperf result
-        is pulled from. According to iperf3 documentation this is calculated
-        based on bytes sent and thus is not a good representation of the
-        quality of the link. If the result is not from a success run, this
-        property is None.
-        """
-        if not self._has_data() or 'sum' not in self.result['end']:
-            return None
-        bps = self.result['end']['sum']['bits_per_second']
-        return bps / 8 / 1024 / 1024
-
-    @property
-    def avg_receive_rate(self):
-        """Average receiving rate in MB/s over the entire run.
-
-        This data may not exist if iperf was interrupted. If the result is not
-        from a success run, this property is None.
-        """
-        if not self._has_data() or 'sum_received' not in self.result['end']:
-            return None
-        bps = self.result['end']['sum_received']['bits_per_second']
-        return bps / 8 / 1024 / 1024
-
-    @property
-    def avg_send_rate(self):
-        """Average sending rate in MB/s over the entire run.
-
-        This data may not exist if iperf was interrupted. If the result is not
-        from a success run, this property is None.
-        """
-        if not self._has_data() or 'sum_sent' not in self.result['end']:
-            return None
-        bps = self.result['end']['sum_sent']['bits_per_second']
-        return bps / 8 / 1024 / 1024
-
-    @property
-    def instantaneous_rates(self):
-        """Instantaneous received rate in MB/s over entire run.
-
-        This data may not exist if iperf was interrupted. If the result is not
-        from a success run, this property is None.
-        """
-        if not self._has_data():
-            return None
-        intervals = [
-            interval["sum"]["bits_per_second"] / 8 / 1024 / 1024
-            for interval in self.result["intervals"]
-        ]
-        return intervals
-
-    @property
-    def std_deviation(self):
-        """Standard deviation of rates in MB/s over entire run.
-
-        This data may not exist if iperf was interrupted. If the result is not
-        from a success run, this property is None.
-        """
-        return self.get_std_deviation(0)
-
-    def get_std_deviation(self, iperf_ignored_interval):
-        """Standard deviation of rates in MB/s over entire run.
-
-        This data may not exist if iperf was interrupted. If the result is not
-        from a success run, this property is None. A configurable number of
-        beginning (and the single last) intervals are ignored in the
-        calculation as they are inaccurate (e.g. the last is from a very small
-        interval)
-
-        Args:
-            iperf_ignored_interval: number of iperf interval to ignored in
-            calculating standard deviation
-        """
-        if not self._has_data():
-            return None
-        instantaneous_rates = self.instantaneous_rates[iperf_ignored_interval:
-                                                       -1]
-        avg_rate = math.fsum(instantaneous_rates) / len(instantaneous_rates)
-        sqd_deviations = [(rate - avg_rate)**2 for rate in instantaneous_rates]
-        std_dev = math.sqrt(
-            math.fsum(sqd_deviations) / (len(sqd_deviations) - 1))
-        return std_dev
+        before or after server is stopped. Note that only the first run will
+        be loaded; use iperf_result.read_runs for files containing multiple
+        iperf client runs, or iperf_result.IPerfLogReader to follow a log
+        while iperf is still running.
+
+        Raises:
+            ValueError: The file holds no complete iperf result.
+        """
+        runs = iperf_result.read_runs(result_path)
+        if not runs:
+            raise ValueError('No iperf result in %s' % result_path)
+        super(IPerfResult, self).__init__(runs[0].result)
 
 
 class IPerfServer():
@@ -25,7 +25,8 @@ import select
 import struct
 import sys
 import time
-import collections
+
+import numpy as np
 
 # http://pyserial.sourceforge.net/
 # On ubuntu, apt-get install python3-pyserial
@@ -35,9 +36,16 @@ import acts.signals
 
 from acts import utils
 from acts.controllers import android_device
+from acts.controllers.monsoon_lib import data_file
+from acts.controllers.monsoon_lib import sampling
+from acts.controllers.monsoon_lib import serial_reader
 
 ACTS_CONTROLLER_CONFIG_NAME = "Monsoon"
 ACTS_CONTROLLER_REFERENCE_NAME = "monsoons"
+# Number of batches native samples are decoded and averaged in every second.
+SAMPLE_BATCHES_PER_SECOND = 10
+# Seconds of samples written at once when streaming samples to a file.
+STREAM_CHUNK_SECONDS = 1
 
 
 def create(configs):
@@ -84,6 +92,8 @@ class MonsoonProxy(object):
         self._coarse_ref = self._fine_ref = self._coarse_zero = 0
         self._fine_zero = self._coarse_scale = self._fine_scale = 0
         self._last_seq = 0
+        self._reader = None
+        self.dropped_packets = 0
         self.start_voltage = 0
         self.serial = serialno
 
@@ -302,7 +312,22 @@ class MonsoonProxy(object):
     def CollectData(self):
         """Return some current samples. Call StartDataCollection() first.
         """
-        while 1:  # loop until we get data or a timeout
+        return self.CollectDataArray().tolist()
+
+    def CollectDataArray(self, min_samples=1):
+        """Return current samples as a numpy array of Amps.
+
+        Call StartDataCollection() first. Packets are read until at least
+        min_samples samples are collected, and calibrated in batches, which
+        is much cheaper per sample than calibrating packet by packet.
+
+        Args:
+            min_samples: The minimum number of samples to return.
+        """
+        chunks = []
+        pending = []
+        collected = 0
+        while collected < min_samples:  # loop until we get data or a timeout
             _bytes = self._ReadPacket()
             if not _bytes:
                 raise MonsoonError("Data collection failed due to empty data")
@@ -312,14 +337,13 @@ class MonsoonProxy(object):
                 continue
 
             seq, _type, x, y = struct.unpack("BBBB", _bytes[:4])
-            data = [
-                struct.unpack(">hhhh", _bytes[x:x + 8])
-                for x in range(4,
-                               len(_bytes) - 8, 8)
-            ]
+            data = sampling.decode_records(_bytes)
 
             if self._last_seq and seq & 0xF != (self._last_seq + 1) & 0xF:
                 logging.warning("Data sequence skipped, lost packet?")
+                # Sequence numbers wrap every 16 packets, so this is a lower
+                # bound of the number of packets lost.
+                self.dropped_packets += (seq - self._last_seq - 1) & 0xF
             self._last_seq = seq
 
             if _type == 0:
@@ -327,20 +351,20 @@ class MonsoonProxy(object):
                     logging.warning(
                         "Waiting for calibration, dropped data packet.")
                     continue
-                out = []
-                for main, usb, aux, voltage in data:
-                    if main & 1:
-                        coarse = ((main & ~1) - self._coarse_zero)
-                        out.append(coarse * self._coarse_scale)
-                    else:
-                        out.append((main - self._fine_zero) * self._fine_scale)
-                return out
-            elif _type == 1:
-                self._fine_zero = data[0][0]
-                self._coarse_zero = data[1][0]
-            elif _type == 2:
-                self._fine_ref = data[0][0]
-                self._coarse_ref = data[1][0]
+                pending.append(data[:, 0])
+                collected += len(data)
+                continue
+            elif _type in (1, 2):
+                # Samples read so far use the calibration they came with.
+                if pending:
+                    chunks.append(self._Calibrate(pending))
+                    pending = []
+                if _type == 1:
+                    self._fine_zero = int(data[0][0])
+                    self._coarse_zero = int(data[1][0])
+                else:
+                    self._fine_ref = int(data[0][0])
+                    self._coarse_ref = int(data[1][0])
             else:
                 logging.warning("Discarding data packet type=0x%02x", _type)
                 continue
@@ -351,6 +375,45 @@ class MonsoonProxy(object):
                     self._coarse_ref - self._coarse_zero)
             if self._fine_ref != self._fine_zero:
                 self._fine_scale = 0.0332 / (self._fine_ref - self._fine_zero)
+        if pending:
+            chunks.append(self._Calibrate(pending))
+        return np.concatenate(chunks)
+
+    def _Calibrate(self, readings):
+        """Calibrate a list of main channel reading arrays into Amps.
+        """
+        return sampling.calibrate(
+            np.concatenate(readings), self._fine_zero, self._fine_scale,
+            self._coarse_zero, self._coarse_scale)
+
+    def StartReader(self, buffer_size=serial_reader.DEFAULT_BUFFER_SIZE):
+        """Start reading the serial port on a dedicated thread.
+
+        Until StopReader() is called, packets are read from the buffer the
+        thread fills, so slow processing of samples does not overrun the
+        device. Only data packets should be expected while the reader runs;
+        call StartDataCollection() first and StopReader() before sending
+        any other command.
+
+        Args:
+            buffer_size: The size in bytes of the buffer of the thread.
+        """
+        self._reader = serial_reader.SerialReader(
+            self.ser, buffer_size=buffer_size, timeout=self.ser.timeout)
+        self._reader.start()
+
+    def StopReader(self):
+        """Stop the reader thread started by StartReader().
+
+        Returns:
+            The number of times the reader waited on a full buffer.
+        """
+        if not self._reader:
+            return 0
+        self._reader.stop()
+        stalls = self._reader.stalls
+        self._reader = None
+        return stalls
 
     def _SendStruct(self, fmt, *args):
         """Pack a struct (without length or checksum) and send it.
@@ -366,21 +429,22 @@ class MonsoonProxy(object):
     def _ReadPacket(self):
         """Read a single data record as a string (without length or checksum).
         """
-        len_char = self.ser.read(1)
+        read = self._reader.read if self._reader else self.ser.read
+        len_char = read(1)
         if not len_char:
             raise MonsoonError("Reading from serial port timed out")
 
         data_len = ord(len_char)
         if not data_len:
             return ""
-        result = self.ser.read(int(data_len))
+        result = read(int(data_len))
         result = bytearray(result)
         if len(result) != data_len:
             raise MonsoonError(
                 "Length mismatch, expected %d bytes, got %d bytes.", data_len,
                 len(result))
         body = result[:-1]
-        checksum = (sum(struct.unpack("B" * len(body), body)) + data_len) % 256
+        checksum = (sum(body) + data_len) % 256
         if result[-1] != checksum:
             raise MonsoonError(
                 "Invalid checksum from serial port! Expected %s, got %s",
@@ -410,7 +474,9 @@ class MonsoonProxy(object):
 class MonsoonData(object):
     """A class for reporting power measurement data from monsoon.
 
-    Data means the measured current value in Amps.
+    Data means the measured current value in Amps. The data points and
+    timestamps are kept in numpy arrays, which are memory-mapped when the
+    data is loaded from a binary file.
     """
     # Number of digits for long rounding.
     lr = 8
@@ -423,15 +489,18 @@ class MonsoonData(object):
         """Instantiates a MonsoonData object.
 
         Args:
-            data_points: A list of current values in Amp (float).
-            timestamps: A list of epoch timestamps (int).
+            data_points: A list or array of current values in Amp (float).
+            timestamps: A list or array of epoch timestamps (int).
             hz: The hertz at which the data points are measured.
             voltage: The voltage at which the data points are measured.
             offset: The number of initial data points to discard
                 in calculations.
         """
+        data_points = np.asarray(data_points)
+        if data_points.dtype.kind != 'f':
+            data_points = data_points.astype(np.float64)
         self._data_points = data_points
-        self._timestamps = timestamps
+        self._timestamps = np.asarray(timestamps)
         self.offset = offset
         num_of_data_pt = len(self._data_points)
         if self.offset >= num_of_data_pt:
@@ -443,6 +512,11 @@ class MonsoonData(object):
         self.hz = hz
         self.voltage = voltage
         self.tag = None
+        # Lower bound of the number of packets lost while sampling.
+        self.dropped_packets = 0
+        # Statistics of self.data_points, see _get_cache().
+        self._cache = {}
+        self._cache_source = None
         self._validate_data()
 
     @property
@@ -452,16 +526,52 @@ class MonsoonData(object):
         len_data_pt = len(self.data_points)
         if len_data_pt == 0:
             return 0
-        cur = sum(self.data_points) * 1000 / len_data_pt
+        cur = self._sum_data_points() * 1000 / len_data_pt
         return round(cur, self.sr)
 
     @property
     def total_charge(self):
         """Total charged used in the unit of mAh.
         """
-        charge = (sum(self.data_points) / self.hz) * 1000 / 3600
+        charge = (self._sum_data_points() / self.hz) * 1000 / 3600
         return round(charge, self.sr)
 
+    def _sum_data_points(self):
+        return float(self._get_cumsum()[-1])
+
+    def _get_cache(self):
+        """Returns the dict caching statistics of self.data_points.
+
+        The cache is dropped whenever self.data_points is replaced, e.g. by
+        update_offset().
+        """
+        if self._cache_source is not self.data_points:
+            self._cache = {}
+            self._cache_source = self.data_points
+        return self._cache
+
+    def _get_cumsum(self):
+        """Returns the cumulative sums of the data points, starting with 0.
+
+        Sums are accumulated in float64, in data point order, so the sum of
+        any range of data points is the difference of two elements.
+        """
+        cache = self._get_cache()
+        if 'cumsum' not in cache:
+            cumsum = np.zeros(len(self.data_points) + 1)
+            np.cumsum(self.data_points, dtype=np.float64, out=cumsum[1:])
+            cache['cumsum'] = cumsum
+        return cache['cumsum']
+
+    def _get_sorted(self):
+        cache = self._get_cache()
+        if 'sorted' not in cache:
+            cache['sorted'] = np.sort(self.data_points)
+        return cache['sorted']
+
+    def _seconds_to_points(self, seconds):
+        return int(round(seconds * self.hz))
+
     @property
     def total_power(self):
         """Total power used.
@@ -554,6 +664,96 @@ class MonsoonData(object):
                 results.append(MonsoonData.from_string(data_str))
         return results
 
+    def _binary_header(self):
+        return {
+            'hz': self.hz,
+            'voltage': self.voltage,
+            'offset': self.offset,
+            'tag': self.tag,
+            'dropped_packets': self.dropped_packets
+        }
+
+    @staticmethod
+    def save_to_binary_file(monsoon_data, file_path):
+        """Save multiple MonsoonData objects to a binary file.
+
+        Currents are stored as float32 and timestamps as uint32, see
+        monsoon_lib.data_file for the format.
+
+        Args:
+            monsoon_data: A list of MonsoonData objects to write to a binary
+                file.
+            file_path: The full path of the file to save to, including the file
+                name.
+        """
+        if not monsoon_data:
+            raise MonsoonError("Attempting to write empty Monsoon data to "
+                               "file, abort")
+        utils.create_dir(os.path.dirname(file_path))
+        with open(file_path, 'ab') as f:
+            for md in monsoon_data:
+                data_file.write_record(f, md._binary_header(), md._data_points,
+                                       md._timestamps)
+
+    @staticmethod
+    def _from_record(header, currents, timestamps):
+        md = MonsoonData(currents, timestamps, header['hz'],
+                         header['voltage'], header['offset'])
+        md.tag = header['tag']
+        md.dropped_packets = header['dropped_packets']
+        return md
+
+    @staticmethod
+    def from_binary_file(file_path, mmap=True):
+        """Load MonsoonData objects from a binary file generated by
+        MonsoonData.save_to_binary_file or Monsoon.take_samples.
+
+        A measurement whose streaming was interrupted is loaded up to the
+        last chunk written.
+
+        Args:
+            file_path: The full path of the file load from, including the file
+                name.
+            mmap: If True, the data is memory-mapped instead of read into
+                memory.
+
+        Returns:
+            A list of MonsoonData objects.
+        """
+        try:
+            records = data_file.read_records(
+                file_path, mmap=mmap, allow_truncated=True)
+        except ValueError as e:
+            raise MonsoonError("Invalid Monsoon data file: %s" % e)
+        return [MonsoonData._from_record(*record) for record in records]
+
+    @staticmethod
+    def from_file(file_path):
+        """Load MonsoonData objects from a binary or a text file.
+
+        Args:
+            file_path: The full path of a file generated by either
+                MonsoonData.save_to_binary_file or
+                MonsoonData.save_to_text_file.
+
+        Returns:
+            A list of MonsoonData objects.
+        """
+        if data_file.is_data_file(file_path):
+            return MonsoonData.from_binary_file(file_path)
+        return MonsoonData.from_text_file(file_path)
+
+    @staticmethod
+    def convert_text_file_to_binary(text_file_path, binary_file_path):
+        """Convert a file written by save_to_text_file to a binary file.
+
+        Args:
+            text_file_path: The path of the text file to read.
+            binary_file_path: The path of the binary file to write.
+        """
+        MonsoonData.save_to_binary_file(
+            MonsoonData.from_text_file(text_file_path), binary_file_path)
+
     def _validate_data(self):
         """Verifies that the data points contained in the class are valid.
         """
@@ -571,7 +771,14 @@ class MonsoonData(object):
         Args:
             new_offset: The new offset.
         """
+        if not 0 <= new_offset < len(self._data_points):
+            raise MonsoonError(
+                ("Offset number (%d) must be smaller than the "
+                 "number of data points (%d).") % (new_offset,
+                                                   len(self._data_points)))
         self.offset = new_offset
+        # Slicing arrays does not copy the data. Cached statistics are
+        # dropped, since they were computed on the previous slice.
         self.data_points = self._data_points[self.offset:]
         self.timestamps = self._timestamps[self.offset:]
 
@@ -582,8 +789,8 @@ class MonsoonData(object):
             A list of tuples in the format of (timestamp, data)
         """
         result = []
-        for t, d in zip(self.timestamps, self.data_points):
-            result.append(t, round(d, self.lr))
+        for t, d in zip(self.timestamps.tolist(), self.data_points.tolist()):
+            result.append((t, round(d, self.lr)))
         return result
 
     def get_average_record(self, n):
@@ -596,15 +803,126 @@ class MonsoonData(object):
         Returns:
             A list of average current values.
         """
-        history_deque = collections.deque()
-        averages = []
-        for d in self.data_points:
-            history_deque.appendleft(d)
-            if len(history_deque) > n:
-                history_deque.pop()
-            avg = sum(history_deque) / len(history_deque)
-            averages.append(round(avg, self.lr))
-        return averages
+        return np.round(self.get_rolling_average(n), self.lr).tolist()
+
+    def get_rolling_average(self, n):
+        """Returns the average over the last n data points at each point.
+
+        The first n - 1 averages are over all the data points so far.
+
+        Args:
+            n: Number of data points to average over.
+
+        Returns:
+            An array of average currents in Amps.
+        """
+        cumsum = self._get_cumsum()
+        ends = np.arange(1, len(cumsum))
+        starts = np.maximum(ends - n, 0)
+        return (cumsum[ends] - cumsum[starts]) / (ends - starts)
+
+    def get_percentiles(self, percentiles):
+        """Returns percentiles of the data points.
+
+        Args:
+            percentiles: A percentile or a list of percentiles, in [0, 100].
+
+        Returns:
+            The current in Amps at each percentile, as a float or an array.
+        """
+        sorted_points = self._get_sorted()
+        if not len(sorted_points):
+            raise MonsoonError("No data points to compute percentiles of.")
+        # Linear interpolation between the closest ranks, like np.percentile,
+        # without partitioning the data points again.
+        ranks = np.asarray(percentiles, dtype=np.float64) / 100 * (
+            len(sorted_points) - 1)
+        lower = np.floor(ranks).astype(np.int64)
+        upper = np.minimum(lower + 1, len(sorted_points) - 1)
+        low_values = sorted_points[lower].astype(np.float64)
+        return low_values + (sorted_points[upper] - low_values) * (
+            ranks - lower)
+
+    def get_window_averages(self, window_sec):
+        """Returns the average current of consecutive time windows.
+
+        A last window shorter than window_sec is left out.
+
+        Args:
+            window_sec: The length of the windows in seconds.
+
+        Returns:
+            An array of average currents in Amps, one per window.
+        """
+        size = self._seconds_to_points(window_sec)
+        if size <= 0:
+            raise MonsoonError("Window of %ss is shorter than a data point." %
+                               window_sec)
+        sums = self._get_cumsum()[::size]
+        return np.diff(sums) / size
+
+    def get_window_energy(self, window_sec):
+        """Returns the energy used in consecutive time windows.
+
+        Args:
+            window_sec: The length of the windows in seconds.
+
+        Returns:
+            An array of energies in mW*s, one per window.
+        """
+        window_sec = self._seconds_to_points(window_sec) / self.hz
+        return (self.get_window_averages(window_sec) * 1000 * self.voltage *
+                window_sec)
+
+    def _get_segment_bounds(self, event_times, before, after):
+        starts = np.round(
+            (np.asarray(event_times, dtype=np.float64) - before) *
+            self.hz).astype(np.int64)
+        length = self._seconds_to_points(before + after)
+        ends = starts + length
+        if len(starts) and (starts.min() < 0
+                            or ends.max() > len(self.data_points)):
+            raise MonsoonError("Segments must be within the %d data points." %
+                               len(self.data_points))
+        return starts, length
+
+    def get_segments(self, event_times, before, after):
+        """Returns the data points around events.
+
+        Args:
+            event_times: The times of the events, in seconds since the first
+                data point.
+            before: The number of seconds to include before each event.
+            after: The number of seconds to include after each event.
+
+        Returns:
+            A 2D array with one row of data points per event.
+        """
+        starts, length = self._get_segment_bounds(event_times, before, after)
+        windows = np.lib.stride_tricks.as_strided(
+            self.data_points,
+            shape=(max(len(self.data_points) - length + 1, 0), length),
+            strides=self.data_points.strides * 2,
+            writeable=False)
+        return windows[starts]
+
+    def get_segment_averages(self, event_times, before, after):
+        """Returns the average current around events.
+
+        Args:
+            event_times: The times of the events, in seconds since the first
+                data point.
+            before: The number of seconds to include before each event.
+            after: The number of seconds to include after each event.
+
+        Returns:
+            An array of average currents in Amps, one per event.
+        """
+        starts, length = self._get_segment_bounds(event_times, before, after)
+        if length <= 0:
+            raise MonsoonError("Segments must be at least a data point long.")
+        cumsum = self._get_cumsum()
+        return (cumsum[starts + length] - cumsum[starts]) / length
 
     def _header(self):
         strs = [""]
@@ -627,7 +945,7 @@ class MonsoonData(object):
         strs = []
         strs.append(self._header())
         strs.append("Time" + ' ' * 7 + "Amp")
-        for t, d in zip(self.timestamps, self.data_points):
+        for t, d in zip(self.timestamps.tolist(), self.data_points.tolist()):
             strs.append("{} {}".format(t, round(d, self.sr)))
         return "\n".join(strs)
 
@@ -649,6 +967,10 @@ class Monsoon(object):
         self.dev = self.mon.ser.name
         self.serial = serial
         self.dut = None
+        # Size of the buffer of the serial reader thread used by
+        # take_samples, or 0 to read the serial port from the sampling loop.
+        self.reader_buffer_size = 0
+        self._sample_listeners = []
 
     def attach_device(self, dut):
         """Attach the controller object for the Device Under Test (DUT)
@@ -699,7 +1021,38 @@ class Monsoon(object):
         """
         return self.mon.GetStatus()
 
-    def take_samples(self, sample_hz, sample_num, sample_offset=0, live=False):
+    def add_sample_listener(self, listener):
+        """Registers a function called with each batch of samples taken.
+
+        Listeners are called by take_samples on the sampling thread, about
+        every 1/SAMPLE_BATCHES_PER_SECOND seconds, with two numpy arrays:
+        the currents in Amps and their epoch timestamps. They should return
+        quickly; exceptions they raise are logged and ignored.
+
+        Args:
+            listener: A function taking (currents, timestamps).
+        """
+        self._sample_listeners.append(listener)
+
+    def remove_sample_listener(self, listener):
+        """Unregisters a function registered with add_sample_listener."""
+        self._sample_listeners.remove(listener)
+
+    def _publish_samples(self, currents, timestamps):
+        for listener in list(self._sample_listeners):
+            try:
+                listener(currents, timestamps)
+            except Exception:
+                self.log.exception("Monsoon sample listener %s failed.",
+                                   listener)
+
+    def take_samples(self,
+                     sample_hz,
+                     sample_num,
+                     sample_offset=0,
+                     live=False,
+                     stream_path=None,
+                     tag=None):
         """Take samples of the current value supplied by monsoon.
 
         This is the actual measurement for power consumption. This function
@@ -711,6 +1064,10 @@ class Monsoon(object):
             offset: The number of initial data points to discard in MonsoonData
                 calculations. sample_num is extended by offset to compensate.
             live: Print each sample in console as measurement goes on.
+            stream_path: If given, samples are appended to this binary data
+                file while they are taken instead of being kept in memory, and
+                the returned MonsoonData is memory-mapped from the file.
+            tag: The tag of the returned MonsoonData.
 
         Returns:
             A MonsoonData object representing the data obtained in this
@@ -726,65 +1083,89 @@ class Monsoon(object):
         status = self.mon.GetStatus()
         native_hz = status["sampleRate"] * 1000
 
+        writer = None
+        if stream_path:
+            utils.create_dir(os.path.dirname(stream_path))
+            writer = data_file.StreamWriter(
+                stream_path, {
+                    'hz': sample_hz,
+                    'voltage': voltage,
+                    'offset': sample_offset,
+                    'tag': tag,
+                    'dropped_packets': 0
+                },
+                chunk_size=max(int(sample_hz * STREAM_CHUNK_SECONDS), 1))
+
         # Collect and average samples as specified
         self.mon.StartDataCollection()
+        dropped_packets = self.mon.dropped_packets
+        if self.reader_buffer_size:
+            self.mon.StartReader(buffer_size=self.reader_buffer_size)
 
-        # In case sample_hz doesn't divide native_hz exactly, use this
-        # invariant: 'offset' = (consumed samples) * sample_hz -
-        # (emitted samples) * native_hz
-        # This is the error accumulator in a variation of Bresenham's
-        # algorithm.
-        emitted = offset = 0
-        collected = []
-        # past n samples for rolling average
-        history_deque = collections.deque()
+        # Samples are averaged in blocks of native samples; see
+        # sampling.Decimator for how sample_hz and native_hz are reconciled.
+        decimator = sampling.Decimator(native_hz, sample_hz)
         current_values = []
         timestamps = []
+        emitted = 0
 
         try:
-            last_flush = time.time()
             while emitted < sample_num or sample_num == -1:
-                # The number of raw samples to consume before emitting the next
-                # output
-                need = int((native_hz - offset + sample_hz - 1) / sample_hz)
-                if need > len(collected):  # still need more input samples
-                    samples = self.mon.CollectData()
-                    if not samples:
-                        break
-                    collected.extend(samples)
+                samples = self.mon.CollectDataArray(
+                    min_samples=native_hz // SAMPLE_BATCHES_PER_SECOND)
+                if not samples.size:
+                    break
+                limit = None
+                if sample_num != -1:
+                    limit = sample_num - emitted
+                values = decimator.decimate(samples, limit=limit)
+                if not values.size:
+                    continue
+                this_time = int(time.time())
+                times = np.full(len(values), this_time, dtype=np.int64)
+                emitted += len(values)
+                if live:
+                    for this_sample in values.tolist():
+                        self.log.info("%s %s", this_time, this_sample)
+                if writer:
+                    writer.header['dropped_packets'] = (
+                        self.mon.dropped_packets - dropped_packets)
+                    writer.append(values, times)
                 else:
-                    # Have enough data, generate output samples.
-                    # Adjust for consuming 'need' input samples.
-                    offset += need * sample_hz
-                    # maybe multiple, if sample_hz > native_hz
-                    while offset >= native_hz:
-                        # TODO(angli): Optimize "collected" operations.
-                        this_sample = sum(collected[:need]) / need
-                        this_time = int(time.time())
-                        timestamps.append(this_time)
-                        if live:
-                            self.log.info("%s %s", this_time, this_sample)
-                        current_values.append(this_sample)
-                        sys.stdout.flush()
-                        offset -= native_hz
-                        emitted += 1  # adjust for emitting 1 output sample
-                    collected = collected[need:]
-                    now = time.time()
-                    if now - last_flush >= 0.99:  # flush every second
-                        sys.stdout.flush()
-                        last_flush = now
+                    current_values.append(values)
+                    timestamps.append(times)
+                self._publish_samples(values, times)
         except Exception as e:
             pass
+        stalls = self.mon.StopReader()
         self.mon.StopDataCollection()
+        dropped_packets = self.mon.dropped_packets - dropped_packets
+        if dropped_packets or stalls:
+            self.log.warning(
+                "Lost at least %d packets while sampling, the serial reader "
+                "waited on a full buffer %d times.", dropped_packets, stalls)
+        if writer:
+            writer.header['dropped_packets'] = dropped_packets
+            offset, count = writer.close()
+            if not count:
+                return None
+            try:
+                return MonsoonData._from_record(
+                    *data_file.read_record(stream_path, offset))
+            except:
+                return None
         try:
-            return MonsoonData(
-                current_values,
-                timestamps,
+            data = MonsoonData(
+                np.concatenate(current_values) if current_values else [],
+                np.concatenate(timestamps) if timestamps else [],
                 sample_hz,
                 voltage,
                 offset=sample_offset)
         except:
             return None
+        data.tag = tag
+        data.dropped_packets = dropped_packets
+        return data
 
     @utils.timeout(60)
     def usb(self, state):
@@ -976,7 +1357,7 @@ class Monsoon(object):
         except Exception as e:
             raise MonsoonError("Error happened trying to reconnect DUT")
 
-    def measure_power(self, hz, duration, tag, offset=30):
+    def measure_power(self, hz, duration, tag, offset=30, stream_path=None):
         """Measure power consumption of the attached device.
 
         Because it takes some time for the device to calm down after the usb
@@ -988,6 +1369,8 @@ class Monsoon(object):
             duration: Number of seconds to take samples for in each step.
             offset: The number of seconds of initial data to discard.
             tag: A string that's the name of the collected data group.
+            stream_path: If given, the binary data file samples are streamed
+                to while they are taken, see take_samples.
 
         Returns:
             A MonsoonData object with the measured power data.
@@ -996,7 +1379,8 @@ class Monsoon(object):
         oset = offset * hz
         data = None
         try:
-            data = self.take_samples(hz, num, sample_offset=oset)
+            data = self.take_samples(
+                hz, num, sample_offset=oset, stream_path=stream_path, tag=tag)
             if not data:
                 raise MonsoonError(
                     ("No data was collected in measurement %s.") % tag)
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""A compact binary file format for Monsoon measurement data.
+
+A file is a sequence of records, one per measurement. Each record is:
+
+    MAGIC                     8 bytes
+    header length             uint32, little endian
+    header                    JSON object, space padded to 8 byte alignment
+    currents                  float32[count], little endian, in Amps
+    timestamps                uint32[count], little endian, epoch seconds
+
+The header holds the sample count and the measurement parameters. The
+arrays are memory-mapped when a file is loaded, so opening a long capture
+does not read or parse every sample.
+
+A measurement streamed to disk by StreamWriter is written as one record too.
+Until the writer is closed, its header holds "streaming": true, the count of
+the currents written so far, and its timestamps are kept in a side file.
+read_records recovers such a record if the writer was interrupted.
+"""
+
+import json
+import logging
+import os
+import shutil
+import struct
+
+import numpy as np
+
+MAGIC = b'MONSOON\x00'
+VERSION = 1
+# The extension of binary data files.
+FILE_EXTENSION = '.msd'
+# Appended to the path of a data file to get the file holding the timestamps
+# of the measurement being streamed to it.
+TIMESTAMPS_SUFFIX = '.timestamps'
+CURRENT_DTYPE = np.dtype('<f4')
+TIMESTAMP_DTYPE = np.dtype('<u4')
+_LENGTH_FORMAT = '<I'
+_PREFIX_SIZE = len(MAGIC) + struct.calcsize(_LENGTH_FORMAT)
+_ALIGNMENT = 8
+# Room left in the header of a stream for its values to grow, e.g. the count.
+_STREAM_HEADER_RESERVE = 64
+# Default number of samples StreamWriter writes at once.
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def is_data_file(file_path):
+    """Returns whether a file starts like a binary data file."""
+    with open(file_path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _encode_header(header, count, size=None):
+    """Encodes a record header.
+
+    Args:
+        header: A dict of JSON serializable measurement parameters.
+        count: The number of samples of the record.
+        size: The size to pad the header to. Defaults to the smallest size
+            keeping the arrays aligned.
+
+    Returns:
+        The bytes of the header.
+
+    Raises:
+        ValueError: The header does not fit in size.
+    """
+    header_bytes = json.dumps(
+        dict(header, version=VERSION, count=count),
+        sort_keys=True).encode('utf-8')
+    if size is None:
+        size = len(header_bytes) + (
+            -(_PREFIX_SIZE + len(header_bytes)) % _ALIGNMENT)
+    if len(header_bytes) > size:
+        raise ValueError('The header does not fit in %d bytes.' % size)
+    return header_bytes + b' ' * (size - len(header_bytes))
+
+
+def write_record(f, header, currents, timestamps):
+    """Writes a record to a file opened in binary mode.
+
+    Args:
+        f: The file object to write to.
+        header: A dict of JSON serializable measurement parameters.
+        currents: A sequence of currents in Amps.
+        timestamps: A sequence of epoch timestamps in seconds, as many as
+            currents.
+    """
+    header_bytes = _encode_header(header, len(currents))
+    f.write(MAGIC)
+    f.write(struct.pack(_LENGTH_FORMAT, len(header_bytes)))
+    f.write(header_bytes)
+    f.write(np.asarray(currents, dtype=CURRENT_DTYPE).tobytes())
+    f.write(np.asarray(timestamps, dtype=TIMESTAMP_DTYPE).tobytes())
+
+
+def _load_array(file_path, dtype, offset, count, mmap):
+    if not count:
+        return np.empty(0, dtype=dtype)
+    if mmap:
+        return np.memmap(
+            file_path, dtype=dtype, mode='r', offset=offset, shape=(count, ))
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        return np.fromfile(f, dtype=dtype, count=count)
+
+
+class _TruncatedError(Exception):
+    """Raised when a record ends before its header says it should."""
+
+
+class _UnclosedStreamError(Exception):
+    """Raised when a record is still being written by a StreamWriter."""
+
+    def __init__(self, header, currents_offset):
+        super(_UnclosedStreamError, self).__init__()
+        self.header = header
+        self.currents_offset = currents_offset
+
+
+def read_records(file_path, mmap=True, allow_truncated=False):
+    """Reads the records of a binary data file.
+
+    Args:
+        file_path: The path of the file.
+        mmap: If True, the arrays are read-only memory maps of the file.
+            Otherwise they are read into memory.
+        allow_truncated: If True, a last record that was not completely
+            written, e.g. because the writer crashed, is ignored. A stream
+            whose writer was not closed is recovered up to the last chunk
+            written, its timestamps being read from the side file.
+
+    Returns:
+        A list of (header, currents, timestamps) tuples.
+
+    Raises:
+        ValueError: The file is not a valid binary data file.
+    """
+    records = []
+    with open(file_path, 'rb') as f:
+        while True:
+            try:
+                record = _read_record(f, file_path, mmap)
+            except _TruncatedError:
+                if not allow_truncated:
+                    raise ValueError('%s is truncated.' % file_path)
+                logging.warning('Ignoring the truncated last record of %s.',
+                                file_path)
+                break
+            except _UnclosedStreamError as e:
+                if not allow_truncated:
+                    raise ValueError(
+                        '%s ends with a stream that was not closed.' %
+                        file_path)
+                logging.warning('Recovering the unclosed stream of %s.',
+                                file_path)
+                try:
+                    records.append(
+                        _recover_stream(file_path, e.header,
+                                        e.currents_offset, mmap))
+                except _TruncatedError:
+                    logging.warning('The timestamps of the stream are lost.')
+                break
+            if record is None:
+                break
+            records.append(record)
+    return records
+
+
+def read_record(file_path, offset, mmap=True):
+    """Reads the record starting at offset in a binary data file.
+
+    Args:
+        file_path: The path of the file.
+        offset: The offset of the record, as returned by StreamWriter.close.
+        mmap: If True, the arrays are read-only memory maps of the file.
+            Otherwise they are read into memory.
+
+    Returns:
+        A (header, currents, timestamps) tuple.
+
+    Raises:
+        ValueError: There is no complete record at offset.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        try:
+            record = _read_record(f, file_path, mmap)
+        except (_TruncatedError, _UnclosedStreamError):
+            record = None
+    if record is None:
+        raise ValueError('%s has no complete record at offset %d.' %
+                         (file_path, offset))
+    return record
+
+
+def _read_record(f, file_path, mmap):
+    magic = f.read(len(MAGIC))
+    if not magic:
+        return None
+    if len(magic) < len(MAGIC) and MAGIC.startswith(magic):
+        raise _TruncatedError()
+    if magic != MAGIC:
+        raise ValueError('%s is not a Monsoon data file.' % file_path)
+    length_bytes = f.read(struct.calcsize(_LENGTH_FORMAT))
+    if len(length_bytes) != struct.calcsize(_LENGTH_FORMAT):
+        raise _TruncatedError()
+    header_length = struct.unpack(_LENGTH_FORMAT, length_bytes)[0]
+    header_bytes = f.read(header_length)
+    if len(header_bytes) != header_length:
+        raise _TruncatedError()
+    header = json.loads(header_bytes.decode('utf-8'))
+    if header.get('version') != VERSION:
+        raise ValueError('Unsupported Monsoon data file version %s.' %
+                         header.get('version'))
+    if header.get('streaming'):
+        raise _UnclosedStreamError(header, f.tell())
+    count = header['count']
+    currents_offset = f.tell()
+    timestamps_offset = currents_offset + count * CURRENT_DTYPE.itemsize
+    end = timestamps_offset + count * TIMESTAMP_DTYPE.itemsize
+    f.seek(0, 2)
+    if f.tell() < end:
+        raise _TruncatedError()
+    f.seek(end)
+    return (header,
+            _load_array(file_path, CURRENT_DTYPE, currents_offset, count,
+                        mmap),
+            _load_array(file_path, TIMESTAMP_DTYPE, timestamps_offset, count,
+                        mmap))
+
+
+def _recover_stream(file_path, header, currents_offset, mmap):
+    """Reads what an interrupted StreamWriter had written.
+
+    The count in the header is only updated once the samples it counts are
+    written to both files, so both hold at least count samples.
+    """
+    timestamps_path = file_path + TIMESTAMPS_SUFFIX
+    count = header['count']
+    if not os.path.exists(timestamps_path) or (
+            os.path.getsize(timestamps_path) < count *
+            TIMESTAMP_DTYPE.itemsize):
+        raise _TruncatedError()
+    header = dict(header)
+    del header['streaming']
+    return (header,
+            _load_array(file_path, CURRENT_DTYPE, currents_offset, count,
+                        mmap),
+            _load_array(timestamps_path, TIMESTAMP_DTYPE, 0, count, mmap))
+
+
+class StreamWriter(object):
+    """Appends the samples of a measurement to a binary data file.
+
+    The measurement is written as one record while it is taken: currents are
+    appended after the header, and timestamps to a side file until close()
+    moves them after the currents. Samples are buffered until chunk_size of
+    them are available, then written, and the count in the header updated,
+    so at most a chunk of samples is lost if the process dies.
+
+    Attributes:
+        file_path: The path of the file, which is appended to.
+        header: The header of the record. Changes are written with the next
+            chunk.
+        chunk_size: The number of samples written at once.
+        count: The number of samples appended so far.
+        offset: The offset of the record in the file.
+    """
+
+    def __init__(self, file_path, header, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.file_path = file_path
+        self.header = dict(header)
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._written = 0
+        self._currents = []
+        self._timestamps = []
+        self._buffered = 0
+        # Append mode would not allow updating the header in place.
+        open(file_path, 'ab').close()
+        self._file = open(file_path, 'r+b')
+        self.offset = self._file.seek(0, os.SEEK_END)
+        self._timestamps_path = file_path + TIMESTAMPS_SUFFIX
+        self._timestamps_file = open(self._timestamps_path, 'wb')
+        self._header_size = len(
+            _encode_header(self._stream_header(), 0)) + _STREAM_HEADER_RESERVE
+        self._file.write(MAGIC)
+        self._file.write(struct.pack(_LENGTH_FORMAT, self._header_size))
+        self._write_header(self._stream_header())
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+
+    def _stream_header(self):
+        return dict(self.header, streaming=True)
+
+    def _write_header(self, header):
+        """Writes header over the header of the record."""
+        position = self._file.tell()
+        self._file.seek(self.offset + _PREFIX_SIZE)
+        self._file.write(
+            _encode_header(header, self._written, self._header_size))
+        self._file.seek(position)
+
+    def append(self, currents, timestamps):
+        """Appends samples, writing a chunk if enough are buffered.
+
+        Args:
+            currents: A sequence of currents in Amps.
+            timestamps: A sequence of epoch timestamps in seconds, as many as
+                currents.
+        """
+        self._currents.append(np.asarray(currents, dtype=CURRENT_DTYPE))
+        self._timestamps.append(np.asarray(timestamps, dtype=TIMESTAMP_DTYPE))
+        self._buffered += len(currents)
+        self.count += len(currents)
+        if self._buffered >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered samples, then updates the header."""
+        if not self._buffered:
+            return
+        self._file.write(np.concatenate(self._currents).tobytes())
+        self._timestamps_file.write(np.concatenate(self._timestamps).tobytes())
+        self._file.flush()
+        self._timestamps_file.flush()
+        self._written += self._buffered
+        self._write_header(self._stream_header())
+        self._file.flush()
+        self._currents = []
+        self._timestamps = []
+        self._buffered = 0
+
+    def close(self):
+        """Completes the record and closes the files.
+
+        The timestamps are copied after the currents, so the arrays of the
+        record are contiguous. A measurement without samples leaves the file
+        as it was.
+
+        Returns:
+            A tuple (offset, count) of the offset of the record, to read it
+            with read_record, and its number of samples.
+        """
+        self.flush()
+        self._timestamps_file.close()
+        if self._written:
+            with open(self._timestamps_path, 'rb') as f:
+                shutil.copyfileobj(f, self._file)
+            self._write_header(self.header)
+        else:
+            self._file.truncate(self.offset)
+        self._file.close()
+        os.remove(self._timestamps_path)
+        return self.offset, self._written
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Min/max/mean envelopes of a current trace at several levels of detail.
+
+Plotting every sample of a long capture makes huge and slow plots. An
+envelope splits the samples into buckets and keeps the minimum, maximum,
+sum and count of each bucket, so spikes stay visible and averages over any
+run of buckets are exact. Each level of a pyramid merges `factor` buckets of
+the level below, so all levels are computed in a single pass over the data.
+"""
+
+import collections
+
+import numpy as np
+
+# Number of buckets of a level merged into one bucket of the next level.
+DEFAULT_FACTOR = 4
+# Levels are added until one has at most this many buckets.
+DEFAULT_MIN_BUCKETS = 1000
+
+Envelope = collections.namedtuple(
+    'Envelope', ['bucket_size', 'times', 'mins', 'maxs', 'sums', 'counts'])
+Envelope.__doc__ = """The envelope of a trace at one level of detail.
+
+Attributes:
+    bucket_size: The number of samples in each bucket. The last bucket may
+        hold fewer.
+    times: The time of the first sample of each bucket, in seconds.
+    mins: The minimum of each bucket.
+    maxs: The maximum of each bucket.
+    sums: The sum of each bucket, in float64.
+    counts: The number of samples in each bucket.
+"""
+
+
+def _merge(envelope, factor, hz):
+    """Merges every factor buckets of an envelope into one."""
+    starts = np.arange(0, len(envelope.sums), factor)
+    bucket_size = envelope.bucket_size * factor
+    return Envelope(bucket_size,
+                    np.arange(len(starts)) * bucket_size / hz,
+                    np.minimum.reduceat(envelope.mins, starts),
+                    np.maximum.reduceat(envelope.maxs, starts),
+                    np.add.reduceat(envelope.sums, starts),
+                    np.add.reduceat(envelope.counts, starts))
+
+
+def build_pyramid(values,
+                  hz,
+                  factor=DEFAULT_FACTOR,
+                  min_buckets=DEFAULT_MIN_BUCKETS):
+    """Builds the envelopes of a trace, from finest to coarsest.
+
+    The first level has one sample per bucket, and the last one has at most
+    min_buckets buckets.
+
+    Args:
+        values: An array of samples.
+        hz: The sample rate of values.
+        factor: The number of buckets merged into one at each level.
+        min_buckets: The maximum number of buckets of the coarsest level.
+
+    Returns:
+        A list of Envelope objects.
+    """
+    values = np.asarray(values)
+    levels = [
+        Envelope(1,
+                 np.arange(len(values)) / hz, values, values,
+                 values.astype(np.float64), np.ones(len(values), np.int64))
+    ]
+    while len(levels[-1].sums) > min_buckets:
+        levels.append(_merge(levels[-1], factor, hz))
+    return levels
+
+
+def select_levels(levels, max_points):
+    """Returns the levels with at most max_points buckets.
+
+    The coarsest level is always included.
+    """
+    return [
+        level for level in levels[:-1] if len(level.sums) <= max_points
+    ] + levels[-1:]
+
+
+def _window(envelope, start_time, end_time):
+    """Returns the bounds of the buckets overlapping a time range."""
+    begin = max(int(np.searchsorted(envelope.times, start_time, 'right')) - 1,
+                0)
+    end = int(np.searchsorted(envelope.times, end_time, 'left'))
+    return begin, max(begin, end)
+
+
+def select_window(levels, start_time, end_time, max_points):
+    """Picks the finest level showing a time range in at most max_points.
+
+    Args:
+        levels: A list of Envelope objects, from finest to coarsest.
+        start_time: The start of the range in seconds.
+        end_time: The end of the range in seconds.
+        max_points: The maximum number of buckets to show.
+
+    Returns:
+        A (index, begin, end) tuple of the index of the level in levels and
+        the bounds of its buckets overlapping the range. The coarsest level
+        is picked if no level fits.
+    """
+    for index, level in enumerate(levels):
+        begin, end = _window(level, start_time, end_time)
+        if end - begin <= max_points:
+            return index, begin, end
+    return (len(levels) - 1, ) + _window(levels[-1], start_time, end_time)
+
+
+def range_stats(envelope, start_time, end_time):
+    """Computes statistics of the buckets starting in a time range.
+
+    Args:
+        envelope: An Envelope.
+        start_time: The start of the range in seconds, inclusive.
+        end_time: The end of the range in seconds, exclusive.
+
+    Returns:
+        A (mean, minimum, maximum, count) tuple, or None if the range holds no
+        bucket.
+    """
+    begin, end = np.searchsorted(envelope.times, [start_time, end_time])
+    if begin >= end:
+        return None
+    count = int(envelope.counts[begin:end].sum())
+    return (envelope.sums[begin:end].sum() / count,
+            envelope.mins[begin:end].min(), envelope.maxs[begin:end].max(),
+            count)
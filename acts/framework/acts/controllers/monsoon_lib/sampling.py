@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""NumPy helpers turning raw Monsoon data packets into current samples."""
+
+import numpy as np
+
+# Size of the header of a data packet: seq, type and two unused bytes.
+PACKET_HEADER_SIZE = 4
+# Size of a record in a data packet: main, usb, aux and voltage as >h.
+RECORD_SIZE = 8
+RECORD_DTYPE = np.dtype('>i2')
+
+
+def decode_records(packet):
+    """Decodes the records of a data packet.
+
+    The packet body ends with a byte that is not part of any record, so the
+    last record is only decoded if the body holds at least one more byte.
+
+    Args:
+        packet: The body of a data packet, without length or checksum.
+
+    Returns:
+        An int16 array of shape (n, 4) with the main, usb, aux and voltage
+        readings of each record.
+    """
+    count = max(0, (len(packet) - PACKET_HEADER_SIZE - 1) // RECORD_SIZE)
+    records = np.frombuffer(
+        packet,
+        dtype=RECORD_DTYPE,
+        count=count * 4,
+        offset=PACKET_HEADER_SIZE)
+    return records.reshape(count, 4)
+
+
+def calibrate(main, fine_zero, fine_scale, coarse_zero, coarse_scale):
+    """Converts main channel readings to currents in Amps.
+
+    Readings with the lowest bit set are coarse readings, the others are
+    fine readings.
+
+    Args:
+        main: An integer array of main channel readings.
+        fine_zero: The zero reading of the fine range.
+        fine_scale: Amps per unit of the fine range.
+        coarse_zero: The zero reading of the coarse range.
+        coarse_scale: Amps per unit of the coarse range.
+
+    Returns:
+        A float64 array of currents.
+    """
+    main = np.asarray(main)
+    coarse = (main & 1).astype(bool)
+    main = main.astype(np.float64)
+    currents = (main - fine_zero) * fine_scale
+    # Clearing the lowest bit of an odd reading subtracts one from it.
+    currents[coarse] = (main[coarse] - 1 - coarse_zero) * coarse_scale
+    return currents
+
+
+class Decimator(object):
+    """Down-samples the native Monsoon sample stream to a requested rate.
+
+    Every output sample is the average of a block of consecutive input
+    samples. Block boundaries are chosen so that after consuming c input
+    samples, floor(c * sample_hz / native_hz) output samples have been
+    emitted, which is the schedule of the error accumulator loop previously
+    used by Monsoon.take_samples. If sample_hz is higher than native_hz,
+    input samples are repeated.
+
+    Input can be fed in chunks of any size; samples that do not complete a
+    block are kept until the next call.
+
+    Attributes:
+        native_hz: The rate of the input samples.
+        sample_hz: The rate of the output samples.
+        consumed: The number of input samples consumed so far. When
+            up-sampling, the last consumed sample is kept for repeating.
+        emitted: The number of output samples emitted so far.
+    """
+
+    def __init__(self, native_hz, sample_hz):
+        self.native_hz = native_hz
+        self.sample_hz = sample_hz
+        self.consumed = 0
+        self.emitted = 0
+        self._pending = np.empty(0)
+
+    def _block_end(self, k):
+        """Returns the number of input samples consumed by output k."""
+        return np.ceil(k * self.native_hz / self.sample_hz).astype(np.int64)
+
+    def decimate(self, samples, limit=None):
+        """Consumes input samples and returns the completed output samples.
+
+        Args:
+            samples: A sequence of input samples.
+            limit: If given, at most this many output samples are returned.
+                Input samples beyond the last returned one are kept.
+
+        Returns:
+            A float64 array of output samples.
+        """
+        pending = np.concatenate((self._pending,
+                                  np.asarray(samples, dtype=np.float64)))
+        available = self.consumed + len(pending)
+        last = int(available * self.sample_hz // self.native_hz)
+        if limit is not None:
+            last = min(last, self.emitted + limit)
+        if last <= self.emitted:
+            self._pending = pending
+            return np.empty(0)
+        k = np.arange(self.emitted + 1, last + 1, dtype=np.int64)
+        ends = self._block_end(k) - self.consumed
+        if self.sample_hz > self.native_hz:
+            result = pending[ends - 1]
+            # The last input sample may be repeated by the next output.
+            consumed = int(ends[-1]) - 1
+        else:
+            starts = np.concatenate(([0], ends[:-1]))
+            result = (np.add.reduceat(pending[:ends[-1]], starts) /
+                      (ends - starts))
+            consumed = int(ends[-1])
+        self.consumed += consumed
+        self.emitted = last
+        self._pending = pending[consumed:]
+        return result
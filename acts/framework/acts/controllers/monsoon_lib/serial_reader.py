@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import logging
+import threading
+import time
+
+# Default size of the buffer holding bytes read from the serial port. At
+# about 50KB/s of Monsoon data, this is more than a minute of samples.
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+# Maximum number of bytes read from the serial port at once.
+MAX_READ_SIZE = 64 * 1024
+# Seconds the reader waits between checks for space in a full buffer.
+FULL_BUFFER_WAIT = 0.001
+# Seconds the consumer waits between checks for new bytes.
+DATA_WAIT = 0.01
+
+
+class RingBuffer(object):
+    """A preallocated byte ring buffer for one producer and one consumer.
+
+    The read and write positions only grow, and each is only advanced by one
+    side, so the producer and consumer threads do not need a lock.
+
+    Attributes:
+        capacity: The size of the buffer in bytes.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buffer = bytearray(capacity)
+        self._read_pos = 0
+        self._write_pos = 0
+
+    @property
+    def available(self):
+        """The number of bytes written and not read yet."""
+        return self._write_pos - self._read_pos
+
+    @property
+    def free(self):
+        """The number of bytes that can be written without overwriting."""
+        return self.capacity - self.available
+
+    def write(self, data):
+        """Appends bytes to the buffer. Called by the producer only.
+
+        Args:
+            data: The bytes to append, at most self.free of them.
+        """
+        size = len(data)
+        start = self._write_pos % self.capacity
+        first = min(size, self.capacity - start)
+        self._buffer[start:start + first] = data[:first]
+        self._buffer[:size - first] = data[first:]
+        self._write_pos += size
+
+    def read(self, size):
+        """Removes and returns bytes from the buffer. Called by the consumer.
+
+        Args:
+            size: The maximum number of bytes to read.
+
+        Returns:
+            A bytearray of at most size bytes.
+        """
+        size = min(size, self.available)
+        start = self._read_pos % self.capacity
+        first = min(size, self.capacity - start)
+        data = self._buffer[start:start + first] + self._buffer[:size - first]
+        self._read_pos += size
+        return data
+
+
+class SerialReader(object):
+    """Reads a serial port on a dedicated thread into a RingBuffer.
+
+    The thread reads everything the port has buffered at once, so it keeps
+    up with the device regardless of how long the consumer takes to process
+    data. The consumer calls read() instead of reading the port.
+
+    Attributes:
+        ser: The serial port to read.
+        buffer: The RingBuffer holding the bytes read.
+        timeout: Seconds read() waits for the bytes requested.
+        stalls: The number of times the reader waited for the consumer to
+            free space in a full buffer.
+    """
+
+    def __init__(self, ser, buffer_size=DEFAULT_BUFFER_SIZE, timeout=1):
+        self.ser = ser
+        self.buffer = RingBuffer(buffer_size)
+        self.timeout = timeout
+        self.stalls = 0
+        self._data_ready = threading.Event()
+        self._stopped = threading.Event()
+        self._error = None
+        self._thread = None
+
+    def start(self):
+        """Starts the reader thread."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._read_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops the reader thread. Unread bytes are kept in the buffer."""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _read_loop(self):
+        try:
+            while not self._stopped.is_set():
+                size = min(max(self.ser.in_waiting, 1), MAX_READ_SIZE,
+                           self.buffer.capacity)
+                data = self.ser.read(size)
+                if not data:
+                    continue
+                if len(data) > self.buffer.free:
+                    self.stalls += 1
+                    logging.warning('Monsoon read buffer is full, waiting.')
+                    while (len(data) > self.buffer.free
+                           and not self._stopped.is_set()):
+                        time.sleep(FULL_BUFFER_WAIT)
+                    if self._stopped.is_set():
+                        return
+                self.buffer.write(data)
+                self._data_ready.set()
+        except Exception as e:
+            logging.exception('Error reading from the Monsoon serial port.')
+            self._error = e
+        finally:
+            self._data_ready.set()
+
+    def read(self, size):
+        """Reads bytes from the buffer, like serial.Serial.read.
+
+        Args:
+            size: The number of bytes to read.
+
+        Returns:
+            A bytearray of size bytes, or fewer if they did not arrive within
+            the timeout.
+
+        Raises:
+            The exception that stopped the reader thread, if any.
+        """
+        deadline = time.time() + self.timeout
+        data = self.buffer.read(size)
+        while len(data) < size:
+            if self._error:
+                raise self._error
+            if self._thread is None or time.time() > deadline:
+                break
+            self._data_ready.wait(DATA_WAIT)
+            self._data_ready.clear()
+            # Bytes are taken as they come in, so reads larger than the
+            # buffer complete too.
+            data += self.buffer.read(size - len(data))
+        return data
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""An asyncio client for SL4A sessions.
+
+This module uses the async/await syntax, so it needs Python 3.5 or newer.
+Sl4aSession only imports it when an async client is asked for.
+"""
+import asyncio
+import json
+import re
+import threading
+
+from acts import logger
+from acts.controllers.sl4a_lib import rpc_client
+from acts.controllers.sl4a_lib import rpc_connection
+
+# The number of milliseconds each eventWait call of an event stream blocks.
+EVENT_WAIT_MS = 50000
+# The longest response line read from SL4A, in bytes. asyncio defaults to
+# 64 KiB, which responses such as long lists of scan results exceed.
+STREAM_LIMIT = 256 * 1024 * 1024
+
+_event_loop_thread = None
+_event_loop_thread_lock = threading.Lock()
+
+
+class EventLoopThread(object):
+    """An asyncio event loop running forever on a daemon thread.
+
+    A single EventLoopThread can drive the AsyncRpcClients of every device,
+    while synchronous code submits coroutines to it.
+
+    Attributes:
+        loop: The asyncio event loop.
+        thread: The thread running the loop.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name='Sl4aEventLoop')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, coroutine, timeout=None):
+        """Runs a coroutine on the loop and blocks until it is done.
+
+        Returns:
+            The value returned by the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine,
+                                                self.loop).result(timeout)
+
+
+def get_event_loop_thread():
+    """Returns the EventLoopThread shared by all SyncRpcClients."""
+    global _event_loop_thread
+    with _event_loop_thread_lock:
+        if _event_loop_thread is None:
+            _event_loop_thread = EventLoopThread()
+        return _event_loop_thread
+
+
+class AsyncRpcClient(object):
+    """An asyncio client for an SL4A session.
+
+    Speaks the same JSON-lines protocol as RpcConnection. All RPCs share a
+    single socket: requests are pipelined, and a reader task hands each
+    response to the coroutine awaiting the matching request id.
+
+    >>> client = session.get_async_client()
+    >>> name = await client.bluetoothGetLocalName()
+    >>> async with client.events('BleScan.*') as events:
+    >>>     async for event in events:
+    >>>         ...
+
+    Attributes:
+        adb: A reference to the AdbProxy of the AndroidDevice.
+        ports: The Sl4aPorts of the forwarded SL4A server port.
+        uid: The SL4A session ID.
+        log: The logger for this AsyncRpcClient.
+        _owns_forward: True if the forwarded port is removed on close.
+        _reader: The asyncio StreamReader of the socket.
+        _writer: The asyncio StreamWriter of the socket.
+        _loop: The event loop the socket was opened on.
+        _loop_thread_ident: The ident of the thread running _loop.
+        _open_lock: An asyncio.Lock that prevents opening the socket twice.
+        _read_task: The task reading responses from the socket.
+        _pending: A dict of request id => Future awaiting its response.
+        _ticket_counter: The id of the last request sent.
+    """
+
+    def __init__(self, adb, ports, uid=rpc_connection.UNKNOWN_UID,
+                 owns_forward=True):
+        """Creates an AsyncRpcClient. The socket is opened on first use.
+
+        Args:
+            adb: A reference to the AdbProxy of the AndroidDevice.
+            ports: The Sl4aPorts whose forwarded_port reaches the SL4A server.
+            uid: The SL4A session ID. UNKNOWN_UID to create a new session.
+            owns_forward: Whether to remove the forwarded port on close.
+        """
+        self.adb = adb
+        self.ports = ports
+        self.uid = uid
+        self._owns_forward = owns_forward
+        self._reader = None
+        self._writer = None
+        self._loop = None
+        self._loop_thread_ident = None
+        self._open_lock = None
+        self._read_task = None
+        self._pending = {}
+        self._ticket_counter = 0
+
+        def _log_formatter(message):
+            """Defines the formatting used in the logger."""
+            return '[Async RPC|%s|%s] %s' % (self.adb.serial, self.uid,
+                                             message)
+
+        self.log = logger.create_logger(_log_formatter)
+
+    @property
+    def is_open(self):
+        return self._writer is not None
+
+    async def open(self):
+        """Opens the socket and initiates or continues the SL4A session."""
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        async with self._open_lock:
+            if self.is_open:
+                return
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    '127.0.0.1', self.ports.forwarded_port,
+                    limit=STREAM_LIMIT),
+                rpc_client.SOCKET_TIMEOUT)
+            if self.uid != rpc_connection.UNKNOWN_UID:
+                start_command = rpc_connection.Sl4aConnectionCommand.CONTINUE
+            else:
+                start_command = rpc_connection.Sl4aConnectionCommand.INIT
+            writer.write(
+                json.dumps({
+                    'cmd': start_command,
+                    'uid': self.uid
+                }).encode('utf8') + b'\n')
+            resp = await asyncio.wait_for(reader.readline(),
+                                          rpc_client.SOCKET_TIMEOUT)
+            if not resp:
+                writer.close()
+                raise rpc_client.Sl4aProtocolError(
+                    rpc_client.Sl4aProtocolError.NO_RESPONSE_FROM_HANDSHAKE)
+            result = json.loads(str(resp, encoding='utf8'))
+            if result['status']:
+                self.uid = result['uid']
+            else:
+                self.log.warning(
+                    'UID not received for connection %s.' % self.ports)
+            self._reader = reader
+            self._writer = writer
+            self._loop = asyncio.get_event_loop()
+            self._loop_thread_ident = threading.get_ident()
+            self._read_task = self._loop.create_task(self._read_responses())
+            self.log.debug('Created connection over: %s.' % self.ports)
+
+    async def rpc(self, method, *args, timeout=None):
+        """Sends an rpc to sl4a and waits for its result.
+
+        Args:
+            method: str, The name of the method to execute.
+            args: any, The args to send to sl4a.
+            timeout: The amount of time to wait for a response.
+
+        Returns:
+            The result of the rpc.
+
+        Raises:
+            Sl4aProtocolError: Something went wrong with the sl4a protocol.
+            Sl4aConnectionError: The connection to SL4A was lost.
+            Sl4aApiError: The rpc went through, however executed with errors.
+            asyncio.TimeoutError: No response was received within the timeout.
+        """
+        if not self.is_open:
+            await self.open()
+        if self._read_task.done():
+            raise rpc_client.Sl4aConnectionError(
+                'The connection over %s has been closed.' % self.ports)
+        self._ticket_counter += 1
+        ticket = self._ticket_counter
+        future = self._loop.create_future()
+        self._pending[ticket] = future
+        request = json.dumps({'id': ticket, 'method': method, 'params': args})
+        try:
+            self._writer.write(request.encode('utf8') + b'\n')
+            await self._writer.drain()
+        except OSError as e:
+            self._pending.pop(ticket, None)
+            raise rpc_client.Sl4aConnectionError(e)
+        self.log.debug('Sent: %s' % request)
+        try:
+            result = await asyncio.wait_for(
+                future, timeout or rpc_client.SOCKET_TIMEOUT)
+        finally:
+            self._pending.pop(ticket, None)
+
+        if result['error']:
+            err_msg = 'RPC call %s to device failed with error %s' % (
+                method, result['error'])
+            self.log.error(err_msg)
+            raise rpc_client.Sl4aApiError(err_msg)
+        return result['result']
+
+    async def _read_responses(self):
+        """Reads responses and resolves their futures until disconnected."""
+        error = rpc_client.Sl4aProtocolError(
+            rpc_client.Sl4aProtocolError.NO_RESPONSE_FROM_SERVER)
+        while True:
+            try:
+                response = await self._reader.readline()
+            except (OSError, ValueError) as e:
+                # ValueError is raised for lines longer than STREAM_LIMIT,
+                # after which the stream can not be resynchronized.
+                error = rpc_client.Sl4aConnectionError(e)
+                break
+            if not response:
+                break
+            self.log.debug('Received: %s', response)
+            try:
+                result = json.loads(str(response, encoding='utf8'))
+                future = self._pending.pop(result['id'], None)
+            except (ValueError, KeyError, TypeError):
+                self.log.error('Received malformed response %s' % response)
+                continue
+            if future is not None and not future.done():
+                future.set_result(result)
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def events(self, regex_pattern='.*', timeout=None):
+        """Returns an async iterator over the SL4A events matching a pattern.
+
+        Events are read over a second socket, so that the blocking eventWait
+        calls do not delay the RPCs of this client. Do not use this while the
+        session's EventDispatcher is polling, as every event is only delivered
+        to one of them.
+
+        The socket is closed once the stream ends or fails. To stop reading
+        earlier, use the stream as an async context manager:
+
+        >>> async with client.events('BleScan.*') as events:
+        >>>     async for event in events:
+        >>>         ...
+
+        Args:
+            regex_pattern: The regular expression pattern that an event name
+                should match in order to be yielded.
+            timeout: Number of seconds without a matching event after which
+                the stream stops. Never stops if None.
+
+        Returns:
+            An EventStream yielding the events in the order SL4A sent them.
+        """
+        return EventStream(self, regex_pattern, timeout)
+
+    async def close(self):
+        """Closes the socket, failing any RPCs still in flight."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._read_task is not None:
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+            self._read_task = None
+        if self._owns_forward:
+            self.adb.remove_tcp_forward(self.ports.forwarded_port)
+            self._owns_forward = False
+
+    def close_threadsafe(self, timeout=None):
+        """Closes the client from any thread.
+
+        Blocks until the client is closed, unless called from the thread of
+        its event loop, e.g. by a callback. Blocking there would deadlock the
+        loop, so the close is only scheduled.
+
+        Args:
+            timeout: The number of seconds to wait for the close.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            # The socket was never opened, or its loop is gone.
+            if self._owns_forward:
+                self.adb.remove_tcp_forward(self.ports.forwarded_port)
+                self._owns_forward = False
+        elif not loop.is_running():
+            loop.run_until_complete(self.close())
+        elif threading.get_ident() == self._loop_thread_ident:
+            loop.create_task(self.close())
+        else:
+            asyncio.run_coroutine_threadsafe(self.close(),
+                                             loop).result(timeout)
+
+    def __getattr__(self, name):
+        """Wrapper for python magic to turn method calls into RPC calls."""
+
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        async def rpc_call(*args, **kwargs):
+            return await self.rpc(name, *args, **kwargs)
+
+        return rpc_call
+
+
+class EventStream(object):
+    """An async iterator over the SL4A events whose names match a pattern.
+
+    This is a plain async iterator rather than an async generator, which
+    would need Python 3.6.
+
+    Attributes:
+        client: The AsyncRpcClient of the session the events are read from.
+        _pattern: The compiled regex the event names must match.
+        _timeout: Number of seconds without a matching event after which the
+            stream stops. Never stops if None.
+        _stream: The AsyncRpcClient reading the events over its own socket.
+        _deadline: The loop time at which the stream stops, or None.
+        _closed: True once the stream ended or was closed.
+    """
+
+    def __init__(self, client, regex_pattern, timeout):
+        self.client = client
+        self._pattern = re.compile(regex_pattern)
+        self._timeout = timeout
+        self._stream = None
+        self._deadline = None
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            event = await self._next_event()
+        except BaseException:
+            await self.close()
+            raise
+        if event is None:
+            await self.close()
+            raise StopAsyncIteration
+        return event
+
+    async def _next_event(self):
+        """Returns the next matching event, or None once timed out."""
+        loop = asyncio.get_event_loop()
+        if self._stream is None:
+            if not self.client.is_open:
+                await self.client.open()
+            self._stream = AsyncRpcClient(
+                self.client.adb,
+                self.client.ports,
+                uid=self.client.uid,
+                owns_forward=False)
+            if self._timeout is not None:
+                self._deadline = loop.time() + self._timeout
+        while True:
+            wait_ms = EVENT_WAIT_MS
+            if self._deadline is not None:
+                time_left = self._deadline - loop.time()
+                if time_left <= 0:
+                    return None
+                wait_ms = min(wait_ms, int(time_left * 1000))
+            event = await self._stream.rpc(
+                'eventWait',
+                wait_ms,
+                timeout=wait_ms / 1000 + rpc_client.SOCKET_TIMEOUT)
+            if not event or 'name' not in event:
+                continue
+            if self._pattern.match(event['name']):
+                if self._deadline is not None:
+                    self._deadline = loop.time() + self._timeout
+                return event
+
+    async def close(self):
+        """Stops the stream and closes its socket."""
+        self._closed = True
+        if self._stream is not None:
+            stream, self._stream = self._stream, None
+            await stream.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+
+class SyncRpcClient(object):
+    """A synchronous facade over an AsyncRpcClient.
+
+    Every call blocks the calling thread while the RPC runs on the shared
+    EventLoopThread, so existing synchronous tests can share one event loop
+    across all devices.
+
+    Attributes:
+        async_client: The AsyncRpcClient the calls are made on.
+        _loop_thread: The EventLoopThread running the calls.
+    """
+
+    def __init__(self, async_client, loop_thread=None):
+        self.async_client = async_client
+        self._loop_thread = loop_thread or get_event_loop_thread()
+
+    def rpc(self, method, *args, timeout=None):
+        """Sends an rpc to sl4a and blocks until its result is returned."""
+        return self._loop_thread.run(
+            self.async_client.rpc(method, *args, timeout=timeout))
+
+    def close(self):
+        """Closes the underlying AsyncRpcClient."""
+        self._loop_thread.run(self.async_client.close())
+
+    def __getattr__(self, name):
+        """Wrapper for python magic to turn method calls into RPC calls."""
+
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        def rpc_call(*args, **kwargs):
+            return self.rpc(name, *args, **kwargs)
+
+        return rpc_call
@@ -15,6 +15,8 @@
 #   limitations under the License.
 
 from concurrent.futures import ThreadPoolExecutor
+import collections
+import heapq
 import queue
 import re
 import threading
@@ -36,6 +38,127 @@ class DuplicateError(EventDispatcherError):
     """Raise when two event handlers have been assigned to an event name."""
 
 
+# Eviction policies for full event queues.
+# Evicts the oldest stored event to make room for the new one.
+DROP_OLDEST = 'drop_oldest'
+# Discards the new event, keeping the stored ones.
+DROP_NEWEST = 'drop_newest'
+EVICTION_POLICIES = (DROP_OLDEST, DROP_NEWEST)
+
+
+class EventLimits(object):
+    """The limits on how many events of a name are stored, and for how long.
+
+    Attributes:
+        max_events: The maximum number of stored events. None for no limit.
+        eviction_policy: The policy applied once max_events is reached. One of
+            EVICTION_POLICIES.
+        ttl: The number of seconds an event is kept after it has been received.
+            None to keep events until they are popped.
+    """
+
+    def __init__(self, max_events=None, eviction_policy=DROP_OLDEST,
+                 ttl=None):
+        if eviction_policy not in EVICTION_POLICIES:
+            raise ValueError('Unknown eviction policy %s. Expected one of %s.'
+                             % (eviction_policy, EVICTION_POLICIES))
+        self.max_events = max_events
+        self.eviction_policy = eviction_policy
+        self.ttl = ttl
+
+
+class _EventQueue(object):
+    """The stored events of a single name, oldest first.
+
+    Iterating over the queue yields the events. Each event is stored along
+    with the time and the dispatcher-wide sequence number of its arrival.
+
+    Attributes:
+        name: The name of the events in this queue.
+        limits: The EventLimits of this queue.
+        _entries: A deque of (arrival_time, sequence_number, event) tuples.
+        _on_change: A function (queue, delta, head_changed) called after the
+            number of events changed by delta, with head_changed True if the
+            oldest event is not the same anymore.
+    """
+
+    def __init__(self, name, limits, on_change):
+        self.name = name
+        self.limits = limits
+        self._entries = collections.deque()
+        self._on_change = on_change
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return (event for _, _, event in self._entries)
+
+    @property
+    def oldest_sequence_number(self):
+        """The sequence number of the oldest event, or None if empty."""
+        return self._entries[0][1] if self._entries else None
+
+    def append(self, event, arrival_time, sequence_number):
+        self._entries.append((arrival_time, sequence_number, event))
+        self._on_change(self, 1, len(self._entries) == 1)
+
+    def popleft(self):
+        event = self._entries.popleft()[2]
+        self._on_change(self, -1, True)
+        return event
+
+    def remove(self, event):
+        """Removes the given event object from the queue."""
+        for index, entry in enumerate(self._entries):
+            if entry[2] is event:
+                del self._entries[index]
+                self._on_change(self, -1, index == 0)
+                return
+        raise ValueError('Event is not stored in this queue.')
+
+    def clear(self):
+        count = len(self._entries)
+        self._entries.clear()
+        if count:
+            self._on_change(self, -count, True)
+
+    def expire(self, now):
+        """Drops the events older than the ttl. Returns the number dropped."""
+        if self.limits.ttl is None:
+            return 0
+        expired = 0
+        while self._entries and now - self._entries[0][0] > self.limits.ttl:
+            self._entries.popleft()
+            expired += 1
+        if expired:
+            self._on_change(self, -expired, True)
+        return expired
+
+
+class _EventWaiter(object):
+    """A thread waiting for events whose names match a given filter.
+
+    Attributes:
+        matches: A function (str) => bool that returns True if events of the
+            given name may satisfy this waiter.
+        _wakeup: A threading.Event set when a matching event arrives.
+    """
+
+    def __init__(self, matches):
+        self.matches = matches
+        self._wakeup = threading.Event()
+
+    def notify(self):
+        """Wakes up the waiting thread."""
+        self._wakeup.set()
+
+    def wait(self, timeout):
+        """Blocks until notified or timed out. Never times out if None."""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+
 class EventDispatcher:
     """A class for managing the events for an SL4A Session.
 
@@ -46,22 +169,77 @@ class EventDispatcher:
                   running.
         _executor: The thread pool executor for running event handlers and
                    polling.
-        _event_dict: A dictionary of str eventName = Queue<Event> eventQueue
+        _event_dict: A dictionary of str eventName => _EventQueue, holding
+                     the stored events of each name in arrival order.
+        _event_limits: A dictionary of str eventName => EventLimits for the
+                       event names that do not use default_limits.
+        _sequence_number: The number of events stored so far. Used to find the
+                          oldest stored event across all queues.
+        _event_count: The number of events stored across all queues.
+        _queue_heads: A heap of (sequence_number, eventName) of the oldest
+                      event of each queue. Entries of events that left their
+                      queue are skipped when found at the top.
+        _last_expiry: The last time all queues were checked for expired
+                      events.
+        _dropped: A Counter of eventName => number of events evicted or
+                  discarded because a limit was reached.
+        _expired: A Counter of eventName => number of events dropped because
+                  their ttl ran out.
         _handlers: A dictionary of str eventName => (lambda, args) handler
         _lock: A lock that prevents multiple reads/writes to the event queues.
+        _waiters: A list of _EventWaiters blocked on the arrival of events.
+        default_limits: The EventLimits of every event name without limits of
+                        its own. See set_event_limits().
+        max_events: The maximum number of events stored across all names.
+                    None for no limit.
+        eviction_policy: The policy applied once max_events is reached.
         log: The EventDispatcher's logger.
     """
 
     DEFAULT_TIMEOUT = 60
+    DEFAULT_MAX_EVENTS_PER_NAME = 10000
+    DEFAULT_MAX_EVENTS = 100000
+
+    def __init__(self,
+                 serial,
+                 rpc_client,
+                 max_events_per_name=DEFAULT_MAX_EVENTS_PER_NAME,
+                 max_events=DEFAULT_MAX_EVENTS,
+                 eviction_policy=DROP_OLDEST,
+                 event_ttl=None):
+        """Creates an EventDispatcher.
 
-    def __init__(self, serial, rpc_client):
+        Args:
+            serial: The serial of the device.
+            rpc_client: The rpc client for that session.
+            max_events_per_name: The maximum number of stored events of a
+                single name. None for no limit.
+            max_events: The maximum number of stored events across all names.
+                None for no limit.
+            eviction_policy: The policy applied when either limit is reached.
+                One of EVICTION_POLICIES.
+            event_ttl: The number of seconds an unconsumed event is kept. None
+                to keep events until they are popped.
+        """
         self._serial = serial
         self._rpc_client = rpc_client
         self._started = False
         self._executor = None
         self._event_dict = {}
+        self._event_limits = {}
+        self._sequence_number = 0
+        self._event_count = 0
+        self._queue_heads = []
+        self._last_expiry = time.time()
+        self._dropped = collections.Counter()
+        self._expired = collections.Counter()
         self._handlers = {}
         self._lock = threading.RLock()
+        self._waiters = []
+        self.default_limits = EventLimits(max_events_per_name,
+                                          eviction_policy, event_ttl)
+        self.max_events = max_events
+        self.eviction_policy = self.default_limits.eviction_policy
 
         def _log_formatter(message):
             """Defines the formatting used in the logger."""
@@ -105,14 +283,176 @@ class EventDispatcher:
             if event_name in self._handlers:
                 self.handle_subscribed_event(event_obj, event_name)
             else:
-                self._lock.acquire()
-                if event_name in self._event_dict:  # otherwise, cache event
-                    self._event_dict[event_name].put(event_obj)
+                self._store_event(event_obj, event_name)
+
+    def _store_event(self, event_obj, event_name):
+        """Stores an event and wakes up the threads waiting on its name.
+
+        The per-name and global limits are enforced before the event is
+        stored. Events dropped to stay within the limits are counted in the
+        event stats.
+        """
+        now = time.time()
+        with self._lock:
+            self._expire_events(now)
+            e_queue = self.get_event_q(event_name)
+            max_per_name = e_queue.limits.max_events
+            if max_per_name is not None and len(e_queue) >= max_per_name:
+                if not self._make_room(e_queue, e_queue.limits.eviction_policy,
+                                       event_name):
+                    return
+            if (self.max_events is not None
+                    and self._event_count >= self.max_events):
+                if not self._make_room(self._get_oldest_queue(),
+                                       self.eviction_policy, event_name):
+                    return
+            self._sequence_number += 1
+            e_queue.append(event_obj, now, self._sequence_number)
+            for waiter in self._waiters:
+                if waiter.matches(event_name):
+                    waiter.notify()
+
+    def _make_room(self, e_queue, eviction_policy, event_name):
+        """Makes room for a new event according to the eviction policy.
+
+        Args:
+            e_queue: The _EventQueue to evict the oldest event from.
+            eviction_policy: One of EVICTION_POLICIES.
+            event_name: The name of the new event.
+
+        Returns:
+            True if the new event should be stored, False if it is discarded.
+        """
+        if eviction_policy == DROP_NEWEST or e_queue is None or not e_queue:
+            dropped_name = event_name
+            stored = False
+        else:
+            dropped_name = e_queue.name
+            e_queue.popleft()
+            stored = True
+        if not self._dropped[dropped_name]:
+            self.log.warning('Event storage limit reached. Dropping %s events.'
+                             % dropped_name)
+        self._dropped[dropped_name] += 1
+        return stored
+
+    def _on_queue_change(self, e_queue, delta, head_changed):
+        """Keeps the event count and the queue heads of a changed queue."""
+        self._event_count += delta
+        if not head_changed or not e_queue:
+            return
+        heapq.heappush(self._queue_heads,
+                       (e_queue.oldest_sequence_number, e_queue.name))
+        # Rebuilds the heap once it is mostly made of outdated heads, which
+        # keeps it within a few entries per queue at an amortized O(1) cost.
+        if len(self._queue_heads) > 2 * len(self._event_dict) + 16:
+            self._queue_heads = [(q.oldest_sequence_number, name)
+                                 for name, q in self._event_dict.items() if q]
+            heapq.heapify(self._queue_heads)
+
+    def _get_oldest_queue(self):
+        """Returns the _EventQueue holding the oldest stored event."""
+        while self._queue_heads:
+            sequence_number, name = self._queue_heads[0]
+            e_queue = self._event_dict.get(name)
+            if (e_queue is not None
+                    and e_queue.oldest_sequence_number == sequence_number):
+                return e_queue
+            heapq.heappop(self._queue_heads)
+        return None
+
+    def _expire_events(self, now):
+        """Drops the events whose ttl ran out, at most once per second."""
+        if now - self._last_expiry < 1:
+            return
+        self._last_expiry = now
+        for name, q in self._event_dict.items():
+            self._expire_queue(name, q, now)
+
+    def _expire_queue(self, event_name, e_queue, now):
+        """Drops the events of a single queue whose ttl ran out."""
+        expired = e_queue.expire(now)
+        if expired:
+            self._expired[event_name] += expired
+
+    def set_event_limits(self,
+                         event_name,
+                         max_events=None,
+                         eviction_policy=DROP_OLDEST,
+                         ttl=None):
+        """Sets the storage limits for a single event name.
+
+        Args:
+            event_name: The name of the events to limit.
+            max_events: The maximum number of stored events of this name. None
+                for no limit.
+            eviction_policy: The policy applied once max_events is reached.
+                One of EVICTION_POLICIES.
+            ttl: The number of seconds an unconsumed event of this name is
+                kept. None to keep events until they are popped.
+        """
+        limits = EventLimits(max_events, eviction_policy, ttl)
+        with self._lock:
+            self._event_limits[event_name] = limits
+            self.get_event_q(event_name).limits = limits
+
+    def get_event_stats(self):
+        """Returns the statistics of the stored and dropped events.
+
+        Returns:
+            A dict with the keys:
+                stored: The number of events currently stored.
+                dropped: A dict of event name => number of events dropped
+                    because a storage limit was reached.
+                expired: A dict of event name => number of events dropped
+                    because their ttl ran out.
+        """
+        with self._lock:
+            return {
+                'stored': self._event_count,
+                'dropped': dict(self._dropped),
+                'expired': dict(self._expired),
+            }
+
+    def _wait_for(self, matches, take, timeout):
+        """Waits until take() finds the stored events it is looking for.
+
+        take() is called with the lock held, once immediately and then every
+        time an event whose name satisfies matches() arrives.
+
+        Args:
+            matches: A function (str) => bool, filtering the names of the
+                events that can satisfy take().
+            take: A function that removes and returns the desired events from
+                the store, or returns a falsy value if they are not there yet.
+            timeout: Number of seconds to wait. Never times out if None.
+
+        Returns:
+            The value returned by take(), or None if timed out.
+        """
+        waiter = _EventWaiter(matches)
+        with self._lock:
+            result = take()
+            if result or timeout == 0:
+                return result
+            self._waiters.append(waiter)
+        deadline = None if timeout is None else time.time() + timeout
+        try:
+            while True:
+                if deadline is None:
+                    waiter.wait(None)
                 else:
-                    q = queue.Queue()
-                    q.put(event_obj)
-                    self._event_dict[event_name] = q
-                self._lock.release()
+                    time_left = deadline - time.time()
+                    if time_left <= 0:
+                        return None
+                    waiter.wait(time_left)
+                with self._lock:
+                    result = take()
+                    if result:
+                        return result
+        finally:
+            with self._lock:
+                self._waiters.remove(waiter)
 
     def register_handler(self, handler, event_name, args):
         """Registers an event handler.
@@ -168,6 +508,11 @@ class EventDispatcher:
             return
         self._started = False
         self._executor.shutdown(wait=True)
+        stats = self.get_event_stats()
+        if stats['dropped'] or stats['expired']:
+            self.log.warning('Events dropped at storage limits: %s. Events '
+                             'expired: %s.' % (stats['dropped'],
+                                               stats['expired']))
         self.clear_all_events()
 
     def pop_event(self, event_name, timeout=DEFAULT_TIMEOUT):
@@ -193,25 +538,15 @@ class EventDispatcher:
             raise IllegalStateError(
                 'Dispatcher needs to be started before popping.')
 
-        e_queue = self.get_event_q(event_name)
-
-        if not e_queue:
-            raise IllegalStateError(
-                'Failed to get an event queue for {}'.format(event_name))
+        def take():
+            e_queue = self.get_event_q(event_name)
+            return e_queue.popleft() if e_queue else None
 
-        try:
-            # Block for timeout
-            if timeout:
-                return e_queue.get(True, timeout)
-            # Non-blocking poll for event
-            elif timeout == 0:
-                return e_queue.get(False)
-            else:
-                # Block forever on event wait
-                return e_queue.get(True)
-        except queue.Empty:
+        event = self._wait_for(lambda name: name == event_name, take, timeout)
+        if event is None:
             raise queue.Empty('Timeout after {}s waiting for event: {}'.format(
                 timeout, event_name))
+        return event
 
     def wait_for_event(self,
                        event_name,
@@ -221,10 +556,11 @@ class EventDispatcher:
                        **kwargs):
         """Wait for an event that satisfies a predicate to appear.
 
-        Continuously pop events of a particular name and check against the
-        predicate until an event that satisfies the predicate is popped or
+        Check events of a particular name against the predicate as they
+        arrive, until an event that satisfies the predicate is popped or
         timed out. Note this will remove all the events of the same name that
-        do not satisfy the predicate in the process.
+        do not satisfy the predicate in the process, unless
+        consume_ignored_events is False.
 
         Args:
             event_name: Name of the event to be popped.
@@ -240,32 +576,35 @@ class EventDispatcher:
             The event that satisfies the predicate.
 
         Raises:
+            IllegalStateError: Raised if called before the dispatcher starts
+                polling.
             queue.Empty: Raised if no event that satisfies the predicate was
                 found before time out.
         """
-        deadline = time.time() + timeout
-        ignored_events = []
+        if not self._started:
+            raise IllegalStateError(
+                'Dispatcher needs to be started before popping.')
         consume_events = kwargs.pop('consume_ignored_events', True)
-        while True:
-            event = None
-            try:
-                event = self.pop_event(event_name, 1)
-                if not consume_events:
-                    ignored_events.append(event)
-            except queue.Empty:
-                pass
-
-            if event and predicate(event, *args, **kwargs):
-                for ignored_event in ignored_events:
-                    self.get_event_q(event_name).put(ignored_event)
-                return event
-
-            if time.time() > deadline:
-                for ignored_event in ignored_events:
-                    self.get_event_q(event_name).put(ignored_event)
-                raise queue.Empty(
-                    'Timeout after {}s waiting for event: {}'.format(
-                        timeout, event_name))
+
+        def take():
+            e_queue = self.get_event_q(event_name)
+            if consume_events:
+                while e_queue:
+                    event = e_queue.popleft()
+                    if predicate(event, *args, **kwargs):
+                        return event
+                return None
+            for event in e_queue:
+                if predicate(event, *args, **kwargs):
+                    e_queue.remove(event)
+                    return event
+            return None
+
+        event = self._wait_for(lambda name: name == event_name, take, timeout)
+        if event is None:
+            raise queue.Empty('Timeout after {}s waiting for event: {}'.format(
+                timeout, event_name))
+        return event
 
     def pop_events(self, regex_pattern, timeout, freq=1):
         """Pop events whose names match a regex pattern.
@@ -281,6 +620,8 @@ class EventDispatcher:
                 should match in order to be popped.
             timeout: Number of seconds to wait for events in case no event
                 matching the condition exits when the function is called.
+            freq: Unused. Kept for backwards compatibility; waiting threads are
+                woken up as soon as a matching event arrives.
 
         Returns:
             results: Pop events whose names match a regex pattern.
@@ -294,14 +635,10 @@ class EventDispatcher:
         if not self._started:
             raise IllegalStateError(
                 "Dispatcher needs to be started before popping.")
-        deadline = time.time() + timeout
-        while True:
-            # TODO: fix the sleep loop
-            results = self._match_and_pop(regex_pattern)
-            if len(results) != 0 or time.time() > deadline:
-                break
-            time.sleep(freq)
-        if len(results) == 0:
+        pattern = re.compile(regex_pattern)
+        results = self._wait_for(
+            pattern.match, lambda: self._match_and_pop(pattern), timeout)
+        if not results:
             raise queue.Empty('Timeout after {}s waiting for event: {}'.format(
                 timeout, regex_pattern))
 
@@ -312,33 +649,35 @@ class EventDispatcher:
         match (in a sense of regular expression) regex_pattern.
         """
         results = []
-        self._lock.acquire()
-        for name in self._event_dict.keys():
-            if re.match(regex_pattern, name):
-                q = self._event_dict[name]
-                if q:
-                    try:
-                        results.append(q.get(False))
-                    except queue.Empty:
-                        pass
-        self._lock.release()
+        with self._lock:
+            now = time.time()
+            for name, q in self._event_dict.items():
+                if q and re.match(regex_pattern, name):
+                    self._expire_queue(name, q, now)
+                    if q:
+                        results.append(q.popleft())
         return results
 
     def get_event_q(self, event_name):
         """Obtain the queue storing events of the specified name.
 
-        If no event of this name has been polled, wait for one to.
+        If no event of this name has been polled, an empty queue is created.
+        Events whose ttl ran out are dropped from the queue first.
 
-        Returns: A queue storing all the events of the specified name.
+        Returns: A queue storing all the events of the specified name, oldest
+            first.
         """
-        self._lock.acquire()
-        if (event_name not in self._event_dict
-                or self._event_dict[event_name] is None):
-            self._event_dict[event_name] = queue.Queue()
-        self._lock.release()
-
-        event_queue = self._event_dict[event_name]
-        return event_queue
+        with self._lock:
+            e_queue = self._event_dict.get(event_name)
+            if e_queue is None:
+                e_queue = _EventQueue(
+                    event_name,
+                    self._event_limits.get(event_name, self.default_limits),
+                    self._on_queue_change)
+                self._event_dict[event_name] = e_queue
+            else:
+                self._expire_queue(event_name, e_queue, time.time())
+            return e_queue
 
     def handle_subscribed_event(self, event_obj, event_name):
         """Execute the registered handler of an event.
@@ -417,16 +756,13 @@ class EventDispatcher:
         if not self._started:
             raise IllegalStateError(("Dispatcher needs to be started before "
                                      "popping."))
-        results = []
-        try:
-            self._lock.acquire()
-            while True:
-                e = self._event_dict[event_name].get(block=False)
-                results.append(e)
-        except (queue.Empty, KeyError):
+        with self._lock:
+            e_queue = self.get_event_q(event_name)
+            if not e_queue:
+                return []
+            results = list(e_queue)
+            e_queue.clear()
             return results
-        finally:
-            self._lock.release()
 
     def clear_events(self, event_name):
         """Clear all events of a particular name.
@@ -434,17 +770,12 @@ class EventDispatcher:
         Args:
             event_name: Name of the events to be popped.
         """
-        self._lock.acquire()
-        try:
-            q = self.get_event_q(event_name)
-            q.queue.clear()
-        except queue.Empty:
-            return
-        finally:
-            self._lock.release()
+        with self._lock:
+            self.get_event_q(event_name).clear()
 
     def clear_all_events(self):
         """Clear all event queues and their cached events."""
-        self._lock.acquire()
-        self._event_dict.clear()
-        self._lock.release()
+        with self._lock:
+            self._event_dict.clear()
+            self._event_count = 0
+            self._queue_heads = []
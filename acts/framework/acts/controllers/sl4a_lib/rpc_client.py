@@ -1,13 +1,19 @@
 import json
+import socket
 import threading
 
 import time
 from concurrent import futures
 
 from acts import logger
+from acts.controllers.sl4a_lib import rpc_multiplexer
 
 SOCKET_TIMEOUT = 60
 
+# RPCs that block on the server until an event arrives. These are never sent
+# over a multiplexed connection, where they would stall every RPC behind them.
+BLOCKING_RPCS = frozenset(['eventWait', 'eventWaitFor'])
+
 # The Session UID when a UID has not been received yet.
 UNKNOWN_UID = -1
 
@@ -39,6 +45,81 @@ class MissingSl4AError(Sl4aException):
     """An error raised when an Sl4aClient is created without SL4A installed."""
 
 
+class RpcBatch(object):
+    """Collects RPC calls to be sent to SL4A in a single round trip.
+
+    Calls made on a batch are not sent until the batch is executed. Each call
+    immediately returns a Future holding the call's own result or error.
+
+    >>> with rpc_client.batch() as batch:
+    >>>     name = batch.bluetoothGetLocalName()
+    >>>     batch.bluetoothDisableBLE()
+    >>> name.result()
+
+    Attributes:
+        _rpc_client: The RpcClient to send the batch over.
+        _calls: A list of (method, args, future) tuples not yet sent.
+    """
+
+    def __init__(self, rpc_client):
+        self._rpc_client = rpc_client
+        self._calls = []
+
+    def __len__(self):
+        return len(self._calls)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        else:
+            self.cancel()
+
+    def rpc(self, method, *args):
+        """Adds an rpc to the batch.
+
+        Args:
+            method: str, The name of the method to execute.
+            args: any, The args to send to sl4a.
+
+        Returns:
+            A Future for the result of the rpc.
+        """
+        future = futures.Future()
+        self._calls.append((method, args, future))
+        return future
+
+    def execute(self, timeout=None):
+        """Sends all collected calls and resolves their futures.
+
+        Args:
+            timeout: The amount of time to wait for all responses.
+
+        Raises:
+            Sl4aProtocolError: Something went wrong with the sl4a protocol.
+            Sl4aConnectionError: The connection failed during the batch.
+        """
+        calls, self._calls = self._calls, []
+        if calls:
+            self._rpc_client._send_batch(calls, timeout=timeout)
+
+    def cancel(self):
+        """Drops all collected calls without sending them."""
+        for _, _, future in self._calls:
+            future.cancel()
+        self._calls = []
+
+    def __getattr__(self, name):
+        """Wrapper for python magic to turn method calls into RPC calls."""
+
+        def rpc_call(*args):
+            return self.rpc(name, *args)
+
+        return rpc_call
+
+
 class RpcClient(object):
     """An RPC client capable of processing multiple RPCs concurrently.
 
@@ -46,9 +127,12 @@ class RpcClient(object):
         _free_connections: A list of all idle RpcConnections.
         _working_connections: A list of all working RpcConnections.
         _lock: A lock used for accessing critical memory.
+        _multiplexers: A list of all RpcMultiplexers shared by in-flight RPCs.
         max_connections: The maximum number of RpcConnections at a time.
             Increasing or decreasing the number of max connections does NOT
             modify the thread pool size being used for self.future RPC calls.
+        multiplexed_connections: The maximum number of sockets shared by
+            pipelined RPCs. If 0, every RPC checks out its own connection.
         _log: The logger for this RpcClient.
     """
     """The default value for the maximum amount of connections for a client."""
@@ -86,7 +170,8 @@ class RpcClient(object):
                  serial,
                  on_error_callback,
                  _create_connection_func,
-                 max_connections=None):
+                 max_connections=None,
+                 multiplexed_connections=0):
         """Creates a new RpcClient object.
 
         Args:
@@ -97,6 +182,10 @@ class RpcClient(object):
                 new session.
             max_connections: The maximum number of connections the RpcClient
                 can have.
+            multiplexed_connections: The number of connections that many
+                concurrent RPCs may share by pipelining their requests. If 0,
+                each RPC uses a connection of its own. Blocking RPCs (see
+                BLOCKING_RPCS) always use a connection of their own.
         """
         self._serial = serial
         self.on_error = on_error_callback
@@ -113,6 +202,8 @@ class RpcClient(object):
         self._log = logger.create_logger(_log_formatter)
 
         self._working_connections = []
+        self._multiplexers = []
+        self.multiplexed_connections = multiplexed_connections
         if max_connections is None:
             self.max_connections = RpcClient.DEFAULT_MAX_CONNECTION
         else:
@@ -128,14 +219,16 @@ class RpcClient(object):
                 '%s connections are still active, and waiting on '
                 'responses.Closing these connections now.' % len(
                     self._working_connections))
-        connections = self._free_connections + self._working_connections
+        self.is_alive = False
+        connections = (self._free_connections + self._working_connections +
+                       self._multiplexers)
         for connection in connections:
             self._log.debug(
                 'Closing connection over ports %s' % connection.ports)
             connection.close()
         self._free_connections = []
         self._working_connections = []
-        self.is_alive = False
+        self._multiplexers = []
 
     def _get_free_connection(self):
         """Returns a free connection to be used for an RPC call.
@@ -198,6 +291,9 @@ class RpcClient(object):
             Sl4aProtocolError: Something went wrong with the sl4a protocol.
             Sl4aApiError: The rpc went through, however executed with errors.
         """
+        if self.multiplexed_connections and method not in BLOCKING_RPCS:
+            return self._multiplexed_rpc(method, args, timeout, retries)
+
         connection = self._get_free_connection()
         ticket = connection.get_new_ticket()
 
@@ -239,7 +335,15 @@ class RpcClient(object):
                 connection.set_timeout(SOCKET_TIMEOUT)
             self._release_working_connection(connection)
         result = json.loads(str(response, encoding='utf8'))
+        return self._process_result(method, ticket, result)
 
+    def _process_result(self, method, ticket, result):
+        """Returns the value of a decoded RPC response.
+
+        Raises:
+            Sl4aApiError: The rpc went through, however executed with errors.
+            Sl4aProtocolError: The response does not belong to the request.
+        """
         if result['error']:
             err_msg = 'RPC call %s to device failed with error %s' % (
                 method, result['error'])
@@ -251,6 +355,138 @@ class RpcClient(object):
             raise Sl4aProtocolError(Sl4aProtocolError.MISMATCHED_API_ID)
         return result['result']
 
+    def batch(self):
+        """Returns an RpcBatch that sends its calls in one round trip.
+
+        All requests of the batch are written to a single connection in one
+        write, and the responses are matched to the calls by their ids.
+        """
+        return RpcBatch(self)
+
+    def _send_batch(self, calls, timeout=None):
+        """Sends a list of calls over one connection in a single write.
+
+        Args:
+            calls: A list of (method, args, future) tuples. Each future is
+                resolved with the result or error of its own call.
+            timeout: The amount of time to wait for each response.
+
+        Raises:
+            Sl4aProtocolError: Something went wrong with the sl4a protocol.
+            Sl4aConnectionError: The connection failed during the batch.
+        """
+        connection = self._get_free_connection()
+        if timeout:
+            connection.set_timeout(timeout)
+        tickets = [connection.get_new_ticket() for _ in calls]
+        requests = [
+            json.dumps({
+                'id': ticket,
+                'method': method,
+                'params': args
+            }) for ticket, (method, args, _) in zip(tickets, calls)
+        ]
+        results = {}
+        try:
+            connection.send_requests(requests)
+            self._log.debug('Sent batch: %s' % requests)
+            for _ in calls:
+                response = connection.get_response()
+                self._log.debug('Received: %s', response)
+                if not response:
+                    self.on_error(connection)
+                    raise Sl4aProtocolError(
+                        Sl4aProtocolError.NO_RESPONSE_FROM_SERVER)
+                result = json.loads(str(response, encoding='utf8'))
+                results[result['id']] = result
+        except BrokenPipeError as e:
+            if self.is_alive:
+                self._log.error('Exception %s happened while communicating to '
+                                'SL4A.', e)
+                self.on_error(connection)
+            else:
+                self._log.warning('The connection was killed during cleanup:')
+                self._log.warning(e)
+            error = Sl4aConnectionError(e)
+            for _, _, future in calls:
+                future.set_exception(error)
+            raise error
+        except Exception as e:
+            for _, _, future in calls:
+                future.set_exception(e)
+            raise
+        finally:
+            if timeout:
+                connection.set_timeout(SOCKET_TIMEOUT)
+            self._release_working_connection(connection)
+
+        for ticket, (method, _, future) in zip(tickets, calls):
+            # A missing id is reported the same way as a mismatched one.
+            result = results.get(ticket, {'id': None, 'error': None})
+            try:
+                future.set_result(
+                    self._process_result(method, ticket, result))
+            except Sl4aException as e:
+                future.set_exception(e)
+
+    def _get_multiplexer(self):
+        """Returns the least busy RpcMultiplexer, creating one if needed.
+
+        A new multiplexer is only opened while fewer than
+        multiplexed_connections exist and every existing one is busy. Dead
+        multiplexers are closed, which releases their socket and port
+        forward.
+        """
+        with self._lock:
+            dead = [m for m in self._multiplexers if not m.is_alive]
+            self._multiplexers = [
+                m for m in self._multiplexers if m.is_alive
+            ]
+        for multiplexer in dead:
+            multiplexer.close()
+        with self._lock:
+            idle = [m for m in self._multiplexers if m.pending_count == 0]
+            if idle:
+                return idle[0]
+            if len(self._multiplexers) < self.multiplexed_connections:
+                multiplexer = rpc_multiplexer.RpcMultiplexer(
+                    self._create_connection_func(self.uid))
+                self._multiplexers.append(multiplexer)
+                return multiplexer
+            return min(self._multiplexers, key=lambda m: m.pending_count)
+
+    def _multiplexed_rpc(self, method, args, timeout, retries):
+        """Sends an rpc to sl4a over a shared, pipelined connection.
+
+        See rpc() for the description of the arguments.
+        """
+        timeout = timeout or SOCKET_TIMEOUT
+        for i in range(1, retries + 1):
+            multiplexer = self._get_multiplexer()
+            try:
+                ticket, future = multiplexer.send(method, args)
+                result = future.result(timeout)
+            except futures.TimeoutError:
+                multiplexer.cancel(ticket)
+                self._log.error('RPC method %s timed out after %ss.', method,
+                                timeout)
+                raise socket.timeout('timed out')
+            except (Sl4aConnectionError, Sl4aProtocolError) as e:
+                if not self.is_alive:
+                    self._log.warning('The connection was killed during '
+                                      'cleanup: %s', e)
+                    raise
+                if i < retries:
+                    self._log.warning(
+                        'No response for RPC method %s on iteration %s',
+                        method, i)
+                    continue
+                self._log.error('Exception %s happened while communicating '
+                                'to SL4A.', e)
+                self.on_error(multiplexer)
+                raise
+            return self._process_result(method, ticket, result)
+
     @property
     def future(self):
         """Returns a magic function that returns a future running an RPC call.
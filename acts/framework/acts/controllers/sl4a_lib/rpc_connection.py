@@ -125,6 +125,12 @@ class RpcConnection(object):
         self._socket_file.write(request.encode('utf8') + b'\n')
         self._socket_file.flush()
 
+    def send_requests(self, requests):
+        """Sends multiple requests over the connection in a single write."""
+        self._socket_file.write(b''.join(
+            request.encode('utf8') + b'\n' for request in requests))
+        self._socket_file.flush()
+
     def get_response(self):
         """Returns the first response sent back to the client."""
         data = self._socket_file.readline()
@@ -132,5 +138,10 @@ class RpcConnection(object):
 
     def close(self):
         """Closes the connection gracefully."""
+        try:
+            # Wakes up any thread blocked on reading from this connection.
+            self._client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
         self._client_socket.close()
         self.adb.remove_tcp_forward(self.ports.forwarded_port)
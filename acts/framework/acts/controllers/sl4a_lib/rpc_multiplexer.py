@@ -0,0 +1,181 @@
+#!/usr/bin/env python3.4
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import json
+import threading
+from concurrent import futures
+
+from acts import logger
+from acts.controllers.sl4a_lib import rpc_client
+
+
+class RpcMultiplexer(object):
+    """Shares a single RpcConnection between many in-flight RPCs.
+
+    Requests are written to the connection as soon as they are made, without
+    waiting for the responses of earlier requests. A single reader thread
+    reads every response off of the socket and hands it to the caller waiting
+    on the matching request id.
+
+    Note that the SL4A server executes the requests of a single connection in
+    the order they were received, so a long-blocking RPC will delay every RPC
+    queued behind it on the same multiplexer.
+
+    Attributes:
+        connection: The opened RpcConnection shared by all requests.
+        is_alive: False once the connection has been closed or has failed.
+            A failed multiplexer still has to be closed to release the
+            connection.
+        log: The logger for this RpcMultiplexer.
+        _pending: A dict of request id => Future awaiting its response.
+        _pending_lock: A lock guarding _pending and is_alive.
+        _write_lock: A lock preventing interleaved writes to the socket.
+        _reader: The thread reading responses from the connection.
+    """
+
+    def __init__(self, connection):
+        """Creates a new RpcMultiplexer and starts its reader thread.
+
+        Args:
+            connection: An opened RpcConnection. The multiplexer takes
+                ownership of the connection.
+        """
+        self.connection = connection
+        self.is_alive = True
+        self._closed = False
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        def _log_formatter(message):
+            """Defines the formatting used in the logger."""
+            return '[RPC Multiplexer|%s|%s] %s' % (
+                self.connection.adb.serial, self.connection.uid, message)
+
+        self.log = logger.create_logger(_log_formatter)
+
+        # The reader blocks until a response arrives. Timeouts are enforced
+        # per request by the callers instead.
+        self.connection.set_timeout(None)
+        self._reader = threading.Thread(
+            target=self._read_responses,
+            name='RpcMultiplexer %s' % self.connection.ports)
+        self._reader.daemon = True
+        self._reader.start()
+
+    @property
+    def ports(self):
+        """The Sl4aPorts of the underlying connection."""
+        return self.connection.ports
+
+    @property
+    def pending_count(self):
+        """The number of requests still waiting on a response."""
+        return len(self._pending)
+
+    def send(self, method, args):
+        """Sends an RPC request without waiting for its response.
+
+        Args:
+            method: str, The name of the method to execute.
+            args: The args to send to sl4a.
+
+        Returns:
+            A tuple of (ticket, future). The future's result is the decoded
+            JSON response sent back by SL4A for this ticket.
+
+        Raises:
+            Sl4aConnectionError if the connection is no longer usable.
+        """
+        ticket = self.connection.get_new_ticket()
+        future = futures.Future()
+        with self._pending_lock:
+            if not self.is_alive:
+                raise rpc_client.Sl4aConnectionError(
+                    'The multiplexed connection over %s has been closed.' %
+                    self.ports)
+            self._pending[ticket] = future
+
+        request = json.dumps({'id': ticket, 'method': method, 'params': args})
+        try:
+            with self._write_lock:
+                self.connection.send_request(request)
+        except OSError as e:
+            self._fail_pending(rpc_client.Sl4aConnectionError(e))
+            raise rpc_client.Sl4aConnectionError(e)
+        self.log.debug('Sent: %s' % request)
+        return ticket, future
+
+    def cancel(self, ticket):
+        """Stops waiting for the response of the given ticket.
+
+        If the response arrives later, it is discarded.
+        """
+        with self._pending_lock:
+            self._pending.pop(ticket, None)
+
+    def _read_responses(self):
+        """Reads responses and resolves their futures until disconnected."""
+        error = rpc_client.Sl4aProtocolError(
+            rpc_client.Sl4aProtocolError.NO_RESPONSE_FROM_SERVER)
+        while True:
+            try:
+                response = self.connection.get_response()
+            except (OSError, ValueError) as e:
+                # ValueError is raised when reading from a closed file.
+                if self.is_alive:
+                    self.log.warning('Lost connection to SL4A: %s' % e)
+                error = rpc_client.Sl4aConnectionError(e)
+                break
+            if not response:
+                break
+            self.log.debug('Received: %s', response)
+            try:
+                result = json.loads(str(response, encoding='utf8'))
+                ticket = result['id']
+            except (ValueError, KeyError, TypeError):
+                self.log.error('Received malformed response %s' % response)
+                continue
+
+            with self._pending_lock:
+                future = self._pending.pop(ticket, None)
+            if future is None:
+                self.log.warning(
+                    'Discarding response for unknown or cancelled id %s.' %
+                    ticket)
+                continue
+            future.set_result(result)
+        self._fail_pending(error)
+
+    def _fail_pending(self, error):
+        """Marks the multiplexer dead and fails every pending request."""
+        with self._pending_lock:
+            self.is_alive = False
+            pending = self._pending
+            self._pending = {}
+        for future in pending.values():
+            future.set_exception(error)
+
+    def close(self):
+        """Closes the connection, failing any requests still in flight.
+
+        Closing more than once has no effect.
+        """
+        with self._pending_lock:
+            self.is_alive = False
+            if self._closed:
+                return
+            self._closed = True
+        self.connection.close()
@@ -24,6 +24,8 @@ from acts.controllers.sl4a_lib import error_reporter
 
 ATTEMPT_INTERVAL = .25
 MAX_WAIT_ON_SERVER_SECONDS = 5
+# Seconds between checks for a new server port done on the device itself.
+DEVICE_POLL_INTERVAL = .05
 
 _SL4A_LAUNCH_SERVER_CMD = (
     'am startservice -a com.googlecode.android_scripting.action.LAUNCH_SERVER '
@@ -62,6 +64,19 @@ _SL4A_USER_FIND_PORT_CMD = (
     # Only grab the port
     'sed s/.*://g')
 
+# Launches a server and waits on the device for a new SL4A port to open, then
+# prints all of SL4A's ports. Polling on the device costs one adb round trip
+# instead of one per attempt.
+_SL4A_LAUNCH_AND_FIND_PORT_CMD = (
+    '%(launch_cmd)s > /dev/null; '
+    'i=0; '
+    'while [ $i -lt %(attempts)d ]; do '
+    '[ -n "$(%(find_cmd)s %(known_ports_filter)s)" ] && break; '
+    'sleep %(interval)s; '
+    'i=$((i+1)); '
+    'done; '
+    '%(find_cmd)s')
+
 # The command that begins the SL4A ScriptingLayerService.
 _SL4A_START_SERVICE_CMD = (
     'am startservice '
@@ -113,6 +128,7 @@ class Sl4aManager(object):
             lambda msg: '[SL4A Manager|%s] %s' % (adb.serial, msg))
         self.sessions = {}
         self._started = False
+        self._find_port_cmd = None
         self.error_reporter = error_reporter.ErrorReporter(
             'SL4A %s' % adb.serial)
 
@@ -131,6 +147,10 @@ class Sl4aManager(object):
     def start_sl4a_server(self, device_port, try_interval=ATTEMPT_INTERVAL):
         """Opens a server socket connection on SL4A.
 
+        The server is launched and its port found in a single adb shell call.
+        If that does not find the port, the ports are polled until
+        MAX_WAIT_ON_SERVER_SECONDS have passed.
+
         Args:
             device_port: The expected port for SL4A to open on. Note that in
                 many cases, this will be different than the port returned by
@@ -144,40 +164,67 @@ class Sl4aManager(object):
         Raises:
             Sl4aConnectionError if SL4A's opened port cannot be found.
         """
+        begin_time = time.time()
         # Launch a server through SL4A.
-        self.adb.shell(_SL4A_LAUNCH_SERVER_CMD % device_port)
+        port = self._launch_server_and_find_port(device_port)
 
         # There is a chance that the server has not come up yet by the time the
         # launch command has finished. Try to read get the listening port again
         # after a small amount of time.
-        time_left = MAX_WAIT_ON_SERVER_SECONDS
-        while time_left > 0:
+        time_left = MAX_WAIT_ON_SERVER_SECONDS - (time.time() - begin_time)
+        while port is None and time_left > 0:
             port = self._get_open_listening_port()
             if port is None:
                 time.sleep(try_interval)
                 time_left -= try_interval
-            else:
-                return port
+        if port is not None:
+            self.log.info('Started SL4A server on port %s in %.2fs.' %
+                          (port, time.time() - begin_time))
+            return port
 
         raise rpc_client.Sl4aConnectionError(
             'Unable to find a valid open port for a new server connection. '
             'Expected port: %s. Open ports: %s' % (device_port,
                                                    self._sl4a_ports))
 
+    def _launch_server_and_find_port(self, device_port):
+        """Launches a server and returns its port, or None if not found."""
+        with self._listen_for_port_lock:
+            known_ports = sorted(self._sl4a_ports)
+        known_ports_filter = ''
+        if known_ports:
+            known_ports_filter = '| grep -v -x %s' % ' '.join(
+                '-e %s' % port for port in known_ports)
+        command = _SL4A_LAUNCH_AND_FIND_PORT_CMD % {
+            'launch_cmd': _SL4A_LAUNCH_SERVER_CMD % device_port,
+            'attempts': int(MAX_WAIT_ON_SERVER_SECONDS / DEVICE_POLL_INTERVAL),
+            'find_cmd': self._get_all_ports_command(),
+            'known_ports_filter': known_ports_filter,
+            'interval': DEVICE_POLL_INTERVAL
+        }
+        return self._claim_port(self.adb.shell(command).split())
+
     def _get_all_ports_command(self):
-        """Returns the list of all ports from the command to get ports."""
+        """Returns the list of all ports from the command to get ports.
+
+        The command is cached until all sessions are terminated, so root is
+        not checked again on every attempt.
+        """
+        if self._find_port_cmd:
+            return self._find_port_cmd
         is_root = True
         if not self.adb.is_root():
             is_root = self.adb.ensure_root()
 
         if is_root:
-            return _SL4A_ROOT_FIND_PORT_CMD
+            self._find_port_cmd = _SL4A_ROOT_FIND_PORT_CMD
         else:
             # TODO(markdr): When root is unavailable, search logcat output for
             #               the port the server has opened.
             self.log.warning('Device cannot be put into root mode. SL4A '
                              'server connections cannot be verified.')
-            return _SL4A_USER_FIND_PORT_CMD
+            self._find_port_cmd = _SL4A_USER_FIND_PORT_CMD
+        return self._find_port_cmd
 
     def _get_all_ports(self):
         return self.adb.shell(self._get_all_ports_command()).split()
@@ -187,7 +234,13 @@ class Sl4aManager(object):
 
         Will return none if no port is found.
         """
-        possible_ports = self._get_all_ports()
+        return self._claim_port(self._get_all_ports())
+
+    def _claim_port(self, possible_ports):
+        """Marks the first port not known yet as in use and returns it.
+
+        Will return none if all the ports are known.
+        """
         self.log.debug('SL4A Ports found: %s' % possible_ports)
 
         # Acquire the lock. We lock this method because if multiple threads
@@ -244,7 +297,8 @@ class Sl4aManager(object):
     def create_session(self,
                        max_connections=None,
                        client_port=0,
-                       server_port=None):
+                       server_port=None,
+                       multiplexed_connections=0):
         """Creates an SL4A server with the given ports if possible.
 
         The ports are not guaranteed to be available for use. If the port
@@ -256,6 +310,8 @@ class Sl4aManager(object):
             server_port: The port on the Android device.
             max_connections: The max number of client connections for the
                 session.
+            multiplexed_connections: The number of connections shared by
+                pipelined RPCs. If 0, each RPC uses its own connection.
 
         Returns:
             A new Sl4aServer instance.
@@ -275,7 +331,8 @@ class Sl4aManager(object):
             server_port,
             self.obtain_sl4a_server,
             self.diagnose_failure,
-            max_connections=max_connections)
+            max_connections=max_connections,
+            multiplexed_connections=multiplexed_connections)
         self.sessions[session.uid] = session
         return session
 
@@ -302,3 +359,5 @@ class Sl4aManager(object):
                 'Unable to close all un-managed servers! Server ports that are '
                 'still open are %s' % self._get_open_listening_port())
         self._sl4a_ports = set()
+        # The device may be rebooted or lose root before the next session.
+        self._find_port_cmd = None
@@ -34,6 +34,7 @@ class Sl4aSession(object):
     """An object that tracks the state of an SL4A Session.
 
     Attributes:
+        _async_client: The AsyncRpcClient instance, if any, for this session.
         _event_dispatcher: The EventDispatcher instance, if any, for this
             session.
         _terminate_lock: A lock that prevents race conditions for multiple
@@ -53,7 +54,8 @@ class Sl4aSession(object):
                  device_port,
                  get_server_port_func,
                  on_error_callback,
-                 max_connections=None):
+                 max_connections=None,
+                 multiplexed_connections=0):
         """Creates an SL4A Session.
 
         Args:
@@ -65,7 +67,12 @@ class Sl4aSession(object):
                 server for its first connection.
             device_port: The SL4A server port to be used as a hint for which
                 SL4A server to connect to.
+            max_connections: The max number of client connections for the
+                session.
+            multiplexed_connections: The number of connections shared by
+                pipelined RPCs. See rpc_client.RpcClient.
         """
+        self._async_client = None
         self._event_dispatcher = None
         self._terminate_lock = threading.Lock()
         self._terminated = False
@@ -88,7 +95,8 @@ class Sl4aSession(object):
             self.adb.serial,
             self.diagnose_failure,
             connection_creator,
-            max_connections=max_connections)
+            max_connections=max_connections,
+            multiplexed_connections=multiplexed_connections)
 
     def _rpc_connection_creator(self, host_port):
         def create_client(uid):
@@ -143,6 +151,41 @@ class Sl4aSession(object):
                 self, self.rpc_client)
         return self._event_dispatcher
 
+    def get_async_client(self):
+        """Returns the asyncio AsyncRpcClient for this Sl4aSession.
+
+        The client shares the SL4A session of rpc_client, over a port
+        forwarded for its own use.
+        """
+        # Imported here, as async_rpc_client needs Python 3.5 or newer.
+        from acts.controllers.sl4a_lib import async_rpc_client
+        if self._async_client is None:
+            ports = sl4a_ports.Sl4aPorts(0, 0, self.server_port)
+            ports.server_port = self.obtain_server_port(ports.server_port)
+            ports.forwarded_port = int(
+                self.adb.tcp_forward(0, ports.server_port))
+            self._async_client = async_rpc_client.AsyncRpcClient(
+                self.adb, ports, uid=self.uid)
+        return self._async_client
+
+    def get_sync_client(self):
+        """Returns a blocking facade over the AsyncRpcClient.
+
+        The RPCs run on the event loop shared by all devices.
+        """
+        from acts.controllers.sl4a_lib import async_rpc_client
+        return async_rpc_client.SyncRpcClient(self.get_async_client())
+
+    def events(self, regex_pattern='.*', timeout=None):
+        """Returns an async iterator over the events of this session.
+
+        >>> async for event in session.events('BleScan.*'):
+        >>>     ...
+
+        See AsyncRpcClient.events() for the arguments.
+        """
+        return self.get_async_client().events(regex_pattern, timeout)
+
     def _create_client_side_connection(self, ports):
         """Creates and connects the client socket to the forward device port.
 
@@ -205,4 +248,15 @@ class Sl4aSession(object):
                 self._terminated = True
                 if self._event_dispatcher:
                     self._event_dispatcher.close()
+                if self._async_client:
+                    self._close_async_client()
                 self.rpc_client.terminate()
+
+    def _close_async_client(self):
+        """Closes the AsyncRpcClient on the loop it was opened on."""
+        client = self._async_client
+        self._async_client = None
+        try:
+            client.close_threadsafe(SOCKET_TIMEOUT)
+        except Exception as e:
+            self.log.warning('Unable to close the async client: %s' % e)
@@ -36,6 +36,8 @@ class Config(enum.Enum):
     key_random = "random"
     key_test_case_iterations = "test_case_iterations"
     key_test_failure_tracebacks = "test_failure_tracebacks"
+    key_async_logging = "async_logging"
+    key_test_requirements = "test_requirements"
     # Config names for controllers packaged in ACTS.
     key_android_device = "AndroidDevice"
     key_chameleon_device = "ChameleonDevice"
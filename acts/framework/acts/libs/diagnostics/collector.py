@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Run-scoped collection of failure diagnostics (bugreports, logs, zips).
+
+Diagnostics are collected on worker threads, so the test runner does not
+have to block on them. Tasks talking to devices hold one of a fixed number
+of host-wide slots, implemented as lock files shared by every ACTS process
+on the host, so parallel test runs do not overload the adb server.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from acts import utils
+from acts.libs.proc import host_slot
+
+# Default number of diagnostics tasks running at once on a host.
+DEFAULT_HOST_CONCURRENCY = 4
+# Default number of worker threads of a DiagnosticsCollector.
+DEFAULT_MAX_WORKERS = 10
+# Name of the host slots shared by diagnostics tasks.
+HOST_SLOT_NAME = 'diagnostics'
+# Seconds after which LogSizeCounter walks the whole log tree again.
+DEFAULT_RESYNC_INTERVAL = 600
+
+# Tells whether the current thread is running a diagnostics task.
+_task_context = threading.local()
+
+
+class LogSizeCounter(object):
+    """Keeps track of the size of a log directory without walking it often.
+
+    The whole tree is walked once, then the size is updated by re-measuring
+    only the subdirectories that diagnostics write to. Other writers, such as
+    adb logcat, are accounted for by walking the whole tree again every
+    resync_interval seconds.
+
+    Attributes:
+        log_path: The root of the log tree.
+        resync_interval: Seconds between walks of the whole tree.
+    """
+
+    def __init__(self, log_path, resync_interval=DEFAULT_RESYNC_INTERVAL):
+        self.log_path = log_path
+        self.resync_interval = resync_interval
+        self._lock = threading.Lock()
+        self._total = None
+        self._synced_at = 0
+        self._sizes = {}
+
+    def _resync(self):
+        self._total = utils.get_directory_size(self.log_path)
+        self._synced_at = time.time()
+        self._sizes = {}
+
+    @property
+    def size(self):
+        """The size of the log tree in bytes."""
+        with self._lock:
+            if (self._total is None
+                    or time.time() - self._synced_at > self.resync_interval):
+                self._resync()
+            return self._total
+
+    def track(self, path):
+        """Records the size of a directory before diagnostics write to it."""
+        with self._lock:
+            if path not in self._sizes:
+                self._sizes[path] = utils.get_directory_size(path)
+
+    def update(self, path):
+        """Adds the growth of a tracked directory to the size."""
+        with self._lock:
+            new_size = utils.get_directory_size(path)
+            if self._total is not None:
+                self._total += new_size - self._sizes.get(path, new_size)
+            self._sizes[path] = new_size
+
+
+class DiagnosticsCollector(object):
+    """Runs diagnostics tasks in the background for a test class.
+
+    Attributes:
+        log: The logger to report errors to.
+        host_concurrency: The number of host-wide slots tasks share.
+        lock_dir: The directory of the host slot lock files, or None for the
+            host_slot default.
+        size_counter: A LogSizeCounter of the log tree, or None.
+    """
+
+    def __init__(self,
+                 log=logging,
+                 log_path=None,
+                 max_workers=DEFAULT_MAX_WORKERS,
+                 host_concurrency=DEFAULT_HOST_CONCURRENCY,
+                 lock_dir=None):
+        self.log = log
+        self.host_concurrency = host_concurrency
+        self.lock_dir = lock_dir
+        self.size_counter = LogSizeCounter(log_path) if log_path else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Compressing is CPU and disk bound, so it does not take host slots
+        # and runs one archive at a time.
+        self._compressor = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def _run(self, func, args, output_path):
+        _task_context.running = True
+        try:
+            with host_slot.HostSlot(
+                    self.host_concurrency, HOST_SLOT_NAME,
+                    lock_dir=self.lock_dir):
+                try:
+                    return func(*args)
+                finally:
+                    if self.size_counter and output_path:
+                        self.size_counter.update(output_path)
+        finally:
+            _task_context.running = False
+
+    def submit(self, key, func, *args, output_path=None):
+        """Queues a task talking to a device.
+
+        Args:
+            key: The key the task is waited on by, e.g. a device serial.
+            func: The function to call.
+            *args: The arguments of func.
+            output_path: The directory the task writes to, if any, whose
+                growth is added to the size counter.
+
+        Returns:
+            The concurrent.futures.Future of the task.
+        """
+        if self.size_counter and output_path:
+            self.size_counter.track(output_path)
+        future = self._executor.submit(self._run, func, args, output_path)
+        self._add_pending(key, future)
+        return future
+
+    def compress(self, src_dir, file_name, after=()):
+        """Queues zipping a directory into file_name.zip and removing it.
+
+        Args:
+            src_dir: The directory to compress.
+            file_name: The path of the archive, without the .zip extension.
+            after: Futures of the tasks writing to src_dir, which are
+                waited for first.
+
+        Returns:
+            The concurrent.futures.Future of the compression.
+        """
+
+        def _compress():
+            wait(after)
+            if not os.path.isdir(src_dir):
+                return
+            self.log.info("Zip folder %s to %s.zip", src_dir, file_name)
+            shutil.make_archive(file_name, "zip", src_dir)
+            shutil.rmtree(src_dir)
+
+        future = self._compressor.submit(_compress)
+        self._add_pending(None, future)
+        return future
+
+    def _add_pending(self, key, future):
+        with self._lock:
+            self._pending.setdefault(key, set()).add(future)
+        future.add_done_callback(lambda f: self._remove_pending(key, f))
+
+    def _remove_pending(self, key, future):
+        if future.exception():
+            self.log.error("Diagnostics task failed: %s", future.exception())
+        with self._lock:
+            futures = self._pending.get(key, set())
+            futures.discard(future)
+            if not futures:
+                self._pending.pop(key, None)
+
+    def wait(self, keys=None):
+        """Waits for queued tasks to complete.
+
+        Args:
+            keys: The keys of the tasks to wait for. All tasks are waited for
+                if None. Failures of tasks are logged, not raised.
+        """
+        with self._lock:
+            if keys is None:
+                keys = list(self._pending)
+            futures = set()
+            for key in keys:
+                futures.update(self._pending.get(key, ()))
+        wait(futures)
+
+    def is_busy(self, key):
+        """Returns whether tasks queued with key are not done yet."""
+        with self._lock:
+            return bool(self._pending.get(key))
+
+    def waiter(self, key):
+        """Returns a function waiting for the tasks queued with key.
+
+        The function returns at once when called by a task of this
+        collector, so it can be given to AndroidDevice.set_task_waiter
+        without blocking the tasks using the device.
+        """
+
+        def _wait():
+            if not getattr(_task_context, 'running', False):
+                self.wait([key])
+
+        return _wait
+
+    def shutdown(self):
+        """Waits for all tasks and stops the worker threads."""
+        self.wait()
+        self._executor.shutdown()
+        self._compressor.shutdown()
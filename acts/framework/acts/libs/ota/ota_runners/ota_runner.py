@@ -39,6 +39,8 @@ class OtaRunner(object):
         self.android_device.stop_services()
         log.info('Beginning tool.')
         self.ota_tool.update(self)
+        # The device now runs another build.
+        self.android_device.clear_property_cache()
         log.info('Tool finished. Waiting for boot completion.')
         self.android_device.wait_for_boot_completion()
         new_info = self.android_device.adb.getprop('ro.build.fingerprint')
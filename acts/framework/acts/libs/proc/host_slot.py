@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Limits how many operations of a kind run at once on a host.
+
+Slots are lock files shared by every ACTS process on the host, so the limit
+holds across parallel test runs, e.g. to protect the shared adb server.
+"""
+
+import fcntl
+import os
+import time
+
+# Directory and name pattern of the slot lock files.
+SLOT_LOCK_DIR = '/tmp'
+SLOT_LOCK_NAME = 'acts_%s_slot_%d.lock'
+# Name of the directory of a user's slots in SLOT_LOCK_DIR, used when the
+# shared lock files can not be opened.
+USER_LOCK_DIR_NAME = 'acts_slots_%d'
+# Seconds between attempts to acquire a slot.
+SLOT_POLL_INTERVAL = 0.2
+
+
+class HostSlot(object):
+    """One of a fixed number of named slots shared by the processes of a host.
+
+    Usage:
+        with HostSlot(4, 'diagnostics'):
+            ad.take_bug_report(test_name, begin_time)
+
+    Attributes:
+        count: The number of slots.
+        name: The name of the slots, which operations limited together share.
+        lock_dir: The directory of the lock files.
+    """
+
+    def __init__(self, count, name, lock_dir=None):
+        self.count = count
+        self.name = name
+        self.lock_dir = lock_dir or SLOT_LOCK_DIR
+        self._fd = None
+
+    def _try_slots(self, lock_dir):
+        """Tries to take one of the slots in lock_dir.
+
+        Returns:
+            True if a slot was taken, False if all the slots are busy, or
+            None if none of the lock files could be opened.
+        """
+        opened = False
+        for i in range(self.count):
+            path = os.path.join(lock_dir, SLOT_LOCK_NAME % (self.name, i))
+            try:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+            except PermissionError:
+                # Created by another user, e.g. with a restrictive umask.
+                continue
+            opened = True
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (BlockingIOError, PermissionError):
+                os.close(fd)
+                continue
+            try:
+                # Lets the runs of other users open the file too.
+                os.fchmod(fd, 0o666)
+            except OSError:
+                pass
+            self._fd = fd
+            return True
+        return False if opened else None
+
+    def acquire(self):
+        """Blocks until a slot is free and takes it.
+
+        If no lock file of the shared directory can be opened, the slots of
+        a directory of the current user are used instead, which only limits
+        the runs of that user.
+        """
+        lock_dir = self.lock_dir
+        while True:
+            taken = self._try_slots(lock_dir)
+            if taken:
+                return
+            if taken is None and lock_dir == self.lock_dir:
+                lock_dir = os.path.join(self.lock_dir,
+                                        USER_LOCK_DIR_NAME % os.getuid())
+                os.makedirs(lock_dir, mode=0o700, exist_ok=True)
+                continue
+            time.sleep(SLOT_POLL_INTERVAL)
+
+    def release(self):
+        """Frees the slot taken by acquire()."""
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *_):
+        self.release()
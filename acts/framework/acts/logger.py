@@ -18,7 +18,9 @@ from __future__ import print_function
 
 import datetime
 import logging
+import logging.handlers
 import os
+import queue
 import re
 import sys
 
@@ -131,7 +133,8 @@ def get_log_file_timestamp(delta=None):
     return _get_timestamp("%Y-%m-%d-%Y_%H-%M-%S-%f", delta)
 
 
-def _setup_test_logger(log_path, prefix=None, filename=None):
+def _setup_test_logger(log_path, prefix=None, filename=None,
+                       async_logging=False):
     """Customizes the root logger for a test run.
 
     The logger object has a stream handler and a file handler. The stream
@@ -143,6 +146,8 @@ def _setup_test_logger(log_path, prefix=None, filename=None):
         prefix: A prefix for each log line in terminal.
         filename: Name of the log file. The default is the time the logger
                   is requested.
+        async_logging: If True, records are formatted and written by a
+                       QueueListener thread instead of the logging thread.
     """
     log = logging.getLogger()
     kill_test_logger(log)
@@ -172,24 +177,48 @@ def _setup_test_logger(log_path, prefix=None, filename=None):
         os.path.join(log_path, 'test_run_error.txt'))
     fh_error.setFormatter(f_formatter)
     fh_error.setLevel(logging.WARNING)
-    log.addHandler(ch)
-    log.addHandler(fh)
-    log.addHandler(fh_info)
-    log.addHandler(fh_error)
+    handlers = [ch, fh, fh_info, fh_error]
+    if async_logging:
+        log.addHandler(_create_queue_handler(handlers))
+    else:
+        for handler in handlers:
+            log.addHandler(handler)
     log.log_path = log_path
     logging.log_path = log_path
 
 
+def _create_queue_handler(handlers):
+    """Returns a QueueHandler whose records are handled on another thread.
+
+    The QueueListener passing the records to the given handlers is started,
+    and kept as the listener attribute of the QueueHandler.
+    """
+    log_queue = queue.Queue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.listener = listener
+    return queue_handler
+
+
 def kill_test_logger(logger):
     """Cleans up a test logger object by removing all of its handlers.
 
+    Records still queued for a QueueListener are written out first.
+
     Args:
         logger: The logging object to clean up.
     """
     for h in list(logger.handlers):
         logger.removeHandler(h)
-        if isinstance(h, logging.FileHandler):
-            h.close()
+        handlers = [h]
+        if isinstance(h, logging.handlers.QueueHandler):
+            h.listener.stop()
+            handlers = h.listener.handlers
+        for handler in handlers:
+            if isinstance(handler, logging.FileHandler):
+                handler.close()
 
 
 def create_latest_log_alias(actual_path):
@@ -204,7 +233,8 @@ def create_latest_log_alias(actual_path):
     os.symlink(actual_path, link_path)
 
 
-def setup_test_logger(log_path, prefix=None, filename=None):
+def setup_test_logger(log_path, prefix=None, filename=None,
+                      async_logging=False):
     """Customizes the root logger for a test run.
 
     Args:
@@ -212,11 +242,13 @@ def setup_test_logger(log_path, prefix=None, filename=None):
         prefix: A prefix for each log line in terminal.
         filename: Name of the files. The default is the time the objects
             are requested.
+        async_logging: If True, log records are written by a background
+            thread, so that logging calls do not wait on terminal or file I/O.
     """
     if filename is None:
         filename = get_log_file_timestamp()
     create_dir(log_path)
-    logger = _setup_test_logger(log_path, prefix, filename)
+    logger = _setup_test_logger(log_path, prefix, filename, async_logging)
     create_latest_log_alias(log_path)
 
 
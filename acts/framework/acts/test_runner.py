@@ -129,7 +129,11 @@ class TestRunner(object):
             self.test_configs[keys.Config.key_log_path.value],
             self.testbed_name, start_time)
         self.log_path = os.path.abspath(l_path)
-        logger.setup_test_logger(self.log_path, self.testbed_name)
+        logger.setup_test_logger(
+            self.log_path,
+            self.testbed_name,
+            async_logging=self.test_configs.get(
+                keys.Config.key_async_logging.value, False))
         self.log = logging.getLogger()
         self.controller_registry = {}
         if self.test_configs.get(keys.Config.key_random.value):
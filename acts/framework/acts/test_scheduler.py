@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Distributes test classes over a pool of testbeds.
+
+Each requested test class is a work item that runs once, on whichever
+compatible testbed asks for work first. Items with the longest historical
+duration are handed out first, so a long test class does not start last and
+hold up the run.
+
+A testbed is compatible with a test class if it has the controllers the
+class requires, as declared by the "test_requirements" config entry, e.g.
+
+    "test_requirements": {
+        "WifiRvr*": {"AndroidDevice": 1, "Attenuator": 4},
+        "BtCarHfpTest": {"AndroidDevice": 2}
+    }
+
+Test classes without requirements can run on any testbed.
+"""
+
+import fnmatch
+import json
+import logging
+import os
+
+from acts import keys
+from acts import records
+from acts import signals
+
+# Name of the file in the log path holding the durations of past runs.
+DURATIONS_FILE_NAME = 'test_class_durations.json'
+# Weight of the newest duration in the average kept by DurationHistory.
+DURATION_WEIGHT = 0.5
+
+
+def item_key(test_identifier):
+    """Returns the name a test identifier is known by in the history."""
+    test_cls_name, test_case_names = test_identifier
+    if not test_case_names:
+        return test_cls_name
+    return '%s:%s' % (test_cls_name, ','.join(test_case_names))
+
+
+def testbed_capabilities(testbed_config):
+    """Counts the controllers of a testbed.
+
+    Args:
+        testbed_config: The config of the testbed.
+
+    Returns:
+        A dict mapping controller config names to the number of controllers,
+        or to None if the config does not tell, e.g. "AndroidDevice": "*".
+    """
+    capabilities = {}
+    for name, value in testbed_config.items():
+        if name == keys.Config.key_testbed_name.value:
+            continue
+        if isinstance(value, list):
+            capabilities[name] = len(value)
+        elif isinstance(value, str):
+            capabilities[name] = None
+        else:
+            capabilities[name] = 1
+    return capabilities
+
+
+def is_compatible(requirements, testbed_config):
+    """Returns whether a testbed has the controllers a test class needs.
+
+    Args:
+        requirements: A dict mapping controller config names to the minimum
+            number of controllers needed.
+        testbed_config: The config of the testbed.
+    """
+    capabilities = testbed_capabilities(testbed_config)
+    for name, count in requirements.items():
+        if name not in capabilities:
+            return False
+        if capabilities[name] is not None and capabilities[name] < count:
+            return False
+    return True
+
+
+class DurationHistory(object):
+    """The durations of test classes in past runs, saved as JSON.
+
+    Attributes:
+        path: The path of the JSON file.
+        durations: A dict mapping item keys to durations in seconds.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.durations = {}
+        try:
+            with open(path, 'r') as f:
+                self.durations = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def get(self, test_identifier):
+        """Returns the expected duration of a test, or None if unknown."""
+        return self.durations.get(item_key(test_identifier))
+
+    def record(self, test_identifier, duration):
+        """Adds the duration of a test run to the history."""
+        key = item_key(test_identifier)
+        previous = self.durations.get(key)
+        if previous is not None:
+            duration = (DURATION_WEIGHT * duration +
+                        (1 - DURATION_WEIGHT) * previous)
+        self.durations[key] = duration
+
+    def save(self):
+        """Writes the history to its file."""
+        with open(self.path, 'w') as f:
+            json.dump(self.durations, f, indent=4, sort_keys=True)
+
+
+class TestScheduler(object):
+    """Hands out test classes to testbeds and merges their results.
+
+    The scheduler itself does not run anything; callers ask it for work for
+    a testbed with next_item() and report back with complete(), lost() or
+    requeue().
+
+    Attributes:
+        results: The merged records.TestResult of all the testbeds.
+        history: The DurationHistory used to order the items.
+    """
+
+    def __init__(self, test_identifiers, history, requirements=None):
+        """
+        Args:
+            test_identifiers: A list of (test class, test cases) tuples, one
+                per work item.
+            history: A DurationHistory.
+            requirements: A dict mapping test class name patterns to the
+                controllers they require.
+        """
+        self.history = history
+        self.requirements = requirements or {}
+        self.results = records.TestResult()
+        self._pending = sorted(enumerate(test_identifiers), key=self._priority)
+        self._running = {}
+
+    def _priority(self, item):
+        """Sorts items by decreasing expected duration, then by id.
+
+        Unknown durations go first, since they might be the longest.
+        """
+        duration = self.history.get(item[1])
+        return (-float('inf') if duration is None else -duration, item[0])
+
+    def _requirements_of(self, test_identifier):
+        requirements = {}
+        for pattern, needs in sorted(self.requirements.items()):
+            if fnmatch.fnmatch(test_identifier[0], pattern):
+                requirements.update(needs)
+        return requirements
+
+    @property
+    def done(self):
+        """True if no item is pending or running."""
+        return not self._pending and not self._running
+
+    def next_item(self, testbed_config):
+        """Takes the longest pending item a testbed can run.
+
+        Args:
+            testbed_config: The config of the testbed asking for work.
+
+        Returns:
+            An (item id, test identifier) tuple, or None if no pending item
+            is compatible with the testbed.
+        """
+        for item in self._pending:
+            if is_compatible(
+                    self._requirements_of(item[1]), testbed_config):
+                self._pending.remove(item)
+                self._running[item[0]] = item[1]
+                return item
+        return None
+
+    def complete(self, item_id, duration, result):
+        """Records the result of an item.
+
+        Args:
+            item_id: The id next_item returned with the item.
+            duration: The seconds the item took to run.
+            result: The records.TestResult of the item.
+        """
+        test_identifier = self._running.pop(item_id)
+        self.history.record(test_identifier, duration)
+        self.results += result
+
+    def lost(self, item_id, reason):
+        """Records an item whose testbed stopped before it completed."""
+        test_identifier = self._running.pop(item_id)
+        self._add_record(test_identifier,
+                         records.TestResultRecord.test_unknown,
+                         signals.TestFailure(reason))
+
+    def requeue(self, item_id):
+        """Puts back an item whose testbed stopped before starting it."""
+        self._pending.append((item_id, self._running.pop(item_id)))
+        self._pending.sort(key=self._priority)
+
+    def skip_pending(self, reason):
+        """Records the items left pending as skipped."""
+        for _, test_identifier in self._pending:
+            self._add_record(test_identifier,
+                             records.TestResultRecord.test_skip,
+                             signals.TestSkip(reason))
+        self._pending = []
+
+    def _add_record(self, test_identifier, end_func, signal):
+        record = records.TestResultRecord('*all*', test_identifier[0])
+        record.test_begin()
+        end_func(record, signal)
+        self.results.add_record(record)
+        logging.warning('%s %s: %s', record.result, test_identifier[0],
+                        signal.details)
+
+
+def load_history(log_path):
+    """Loads the DurationHistory kept in a log path."""
+    return DurationHistory(os.path.join(log_path, DURATIONS_FILE_NAME))
@@ -19,6 +19,8 @@ import logging
 import numpy
 import operator
 
+import acts.test_utils.audio_analysis_lib.sliding_window as sliding_window
+
 # The default block size of pattern matching.
 ANOMALY_DETECTION_BLOCK_SIZE = 120
 
@@ -40,6 +42,10 @@ PATTERN_MATCHING_THRESHOLD = 0.85
 # Window size for peak detection.
 PEAK_WINDOW_SIZE_HZ = 20
 
+# The maximum number of test blocks cross-correlated with the golden signal
+# at once. Bounds the memory used by anomaly_detection.
+_PATTERN_MATCHING_BATCH_SIZE = 4096
+
 
 class RMSTooSmallError(Exception):
     """Error when signal RMS is too small."""
@@ -67,6 +73,33 @@ def normalize_signal(signal, saturate_value):
     return signal / float(saturate_value)
 
 
+class NormalizedSignal(object):
+    """A signal normalized with respect to the saturate value as it is read.
+
+    Unlike normalize_signal, which converts the whole signal at once, only
+    the slices being read are converted. This keeps memory-mapped recordings
+    out of memory in the chunked analysis functions.
+    """
+
+    def __init__(self, signal, saturate_value):
+        """Initializes a NormalizedSignal.
+
+        Args:
+            signal: A 1-D array-like object for one-channel PCM data, e.g. a
+                       row of AudioRawData.channel_data.
+            saturate_value: The maximum value that the PCM data might be.
+        """
+        self._signal = signal
+        self._saturate_value = float(saturate_value)
+
+    def __len__(self):
+        return len(self._signal)
+
+    def __getitem__(self, key):
+        return (numpy.asarray(self._signal[key], dtype=numpy.float64) /
+                self._saturate_value)
+
+
 def spectral_analysis(signal,
                       rate,
                       min_peak_ratio=DEFAULT_MIN_PEAK_RATIO,
@@ -104,13 +137,7 @@ def spectral_analysis(signal,
         raise EmptyDataError('Signal data is empty')
 
     signal_rms = numpy.linalg.norm(signal) / numpy.sqrt(len(signal))
-    logging.debug('signal RMS = %s', signal_rms)
-
-    # If RMS is too small, set dominant frequency and coefficient to 0.
-    if signal_rms < MEANINGFUL_RMS_THRESHOLD:
-        logging.warning(
-            'RMS %s is too small to be meaningful. Set frequency to 0.',
-            signal_rms)
+    if _rms_too_small(signal_rms):
         return [(0, 0)]
 
     logging.debug('Doing spectral analysis ...')
@@ -126,12 +153,103 @@ def spectral_analysis(signal,
 
     # y_f is complex so consider its absolute value for magnitude.
     abs_y_f = numpy.abs(y_f)
+    return _spectral_peaks(x_f, abs_y_f, min_peak_ratio, peak_window_size_hz)
+
+
+def chunked_spectral_analysis(signal,
+                              rate,
+                              chunk_size,
+                              min_peak_ratio=DEFAULT_MIN_PEAK_RATIO,
+                              peak_window_size_hz=PEAK_WINDOW_SIZE_HZ):
+    """Gets the dominant frequencies by averaging the spectra of chunks.
+
+    Unlike spectral_analysis, which transforms the whole signal at once, only
+    chunk_size samples are read at a time, so this works on memory-mapped
+    recordings of any length. The signal is split into chunks overlapping by
+    half, and the windowed magnitude spectra of the chunks are averaged
+    (Welch's method). The frequency resolution is rate / chunk_size.
+
+    Args:
+        signal: A 1-D array-like object for one-channel PCM data, normalized
+                   to [-1, 1], e.g. a NormalizedSignal.
+        rate: Sampling rate in samples per second. Example inputs: 44100,
+        48000
+        chunk_size: The number of samples in a chunk.
+        min_peak_ratio: Refer to spectral_analysis.
+        peak_window_size_hz: Refer to spectral_analysis.
+
+    Returns:
+        The same list of tuples as spectral_analysis.
+
+    """
+    length = len(signal)
+    if length <= chunk_size:
+        return spectral_analysis(
+            numpy.asarray(signal[:], dtype=numpy.float64), rate,
+            min_peak_ratio, peak_window_size_hz)
+
+    starts = list(range(0, length - chunk_size + 1, chunk_size // 2))
+    if starts[-1] + chunk_size < length:
+        starts.append(length - chunk_size)
+
+    window = numpy.hanning(chunk_size)
+    abs_y_f = numpy.zeros(chunk_size // 2 + 1)
+    sum_of_squares, covered = 0.0, 0
+    for start in starts:
+        chunk = numpy.asarray(
+            signal[start:start + chunk_size], dtype=numpy.float64)
+        # Overlapping samples are only counted once in the RMS.
+        not_covered = chunk[covered - start:]
+        sum_of_squares += numpy.dot(not_covered, not_covered)
+        covered = start + chunk_size
+        abs_y_f += numpy.abs(numpy.fft.rfft(chunk * window))
+    abs_y_f *= 2.0 / chunk_size / len(starts)
+
+    if _rms_too_small(numpy.sqrt(sum_of_squares / length)):
+        return [(0, 0)]
+    x_f = _rfft_freq(chunk_size, rate)
+    return _spectral_peaks(x_f, abs_y_f, min_peak_ratio, peak_window_size_hz)
+
+
+def _rms_too_small(signal_rms):
+    """Checks if the RMS of a signal is too small to be meaningful.
+
+    Args:
+        signal_rms: The RMS of a signal normalized to [-1, 1].
+
+    Returns:
+        True if signal_rms is less than MEANINGFUL_RMS_THRESHOLD.
+
+    """
+    logging.debug('signal RMS = %s', signal_rms)
+
+    # If RMS is too small, set dominant frequency and coefficient to 0.
+    if signal_rms < MEANINGFUL_RMS_THRESHOLD:
+        logging.warning(
+            'RMS %s is too small to be meaningful. Set frequency to 0.',
+            signal_rms)
+        return True
+    return False
+
+
+def _spectral_peaks(x_f, abs_y_f, min_peak_ratio, peak_window_size_hz):
+    """Finds the peaks of a magnitude spectrum.
+
+    Args:
+        x_f: The frequency in Hz of each coefficient.
+        abs_y_f: The magnitude of each coefficient. Coefficients below the
+                    threshold are set to 0 in place.
+        min_peak_ratio: Refer to spectral_analysis.
+        peak_window_size_hz: Refer to spectral_analysis.
+
+    Returns:
+        The list of tuples returned by spectral_analysis.
+
+    """
     threshold = max(abs_y_f) * min_peak_ratio
 
     # Suppresses all coefficients that are below threshold.
-    for i in range(len(abs_y_f)):
-        if abs_y_f[i] < threshold:
-            abs_y_f[i] = 0
+    abs_y_f[abs_y_f < threshold] = 0
 
     # Gets the peak detection window size in indice.
     # x_f[1] is the frequency difference per index.
@@ -299,15 +417,27 @@ def anomaly_detection(signal,
 
     golden_y = _generate_golden_pattern(rate, freq, block_size)
 
-    results = []
-
-    for start in range(0, len(signal), int(block_size / 2)):
-        end = start + block_size
-        test_signal = signal[start:end]
-        matched = _moving_pattern_matching(golden_y, test_signal, threshold)
-        if not matched:
-            results.append(start)
-
+    step = int(block_size / 2)
+    starts = numpy.arange(0, len(signal), step)
+    # Blocks at the end of the signal are shorter than block_size. They are
+    # matched separately, since the blocks of a batch share one length.
+    full_starts = starts[starts + block_size <= len(signal)]
+    matched = []
+    # Only the samples of one batch are read at a time, so the signal may be
+    # a memory-mapped recording.
+    for i in range(0, len(full_starts), _PATTERN_MATCHING_BATCH_SIZE):
+        batch_starts = full_starts[i:i + _PATTERN_MATCHING_BATCH_SIZE]
+        segment = numpy.asarray(
+            signal[batch_starts[0]:batch_starts[-1] + block_size],
+            dtype=numpy.float64)
+        blocks = sliding_window.strided_windows(segment, block_size, step)
+        matched.append(_match_blocks(golden_y, blocks, threshold))
+    for start in starts[len(full_starts):]:
+        block = numpy.asarray(signal[start:], dtype=numpy.float64)
+        matched.append(
+            _match_blocks(golden_y, block[numpy.newaxis], threshold))
+
+    results = starts[~numpy.concatenate(matched)] if matched else []
     results = [float(x) / rate for x in results]
 
     return results
@@ -366,30 +496,96 @@ def _moving_pattern_matching(golden_signal, test_signal, threshold):
     if len(golden_signal) < len(test_signal):
         raise ValueError('Test signal is longer than golden signal')
 
-    block_length = len(test_signal)
-    number_of_movings = len(golden_signal) - block_length + 1
-    correlation_indices = []
-    for moving_index in range(number_of_movings):
-        # Cuts one block of golden signal from start index.
-        # The block length is the same as test signal.
-        start = moving_index
-        end = start + block_length
-        golden_signal_block = golden_signal[start:end]
-        try:
-            correlation_index = _get_correlation_index(golden_signal_block,
-                                                       test_signal)
-        except TestSignalNormTooSmallError:
-            logging.info(
-                'Caught one block of test signal that has no meaningful norm')
-            return False
-        correlation_indices.append(correlation_index)
-
-    # Checks if the maximum correlation index is high enough.
-    max_corr = max(correlation_indices)
-    if max_corr < threshold:
-        logging.debug('Got one unmatched block with max_corr: %s', max_corr)
-        return False
-    return True
+    test_signal = numpy.asarray(test_signal, dtype=numpy.float64)
+    return bool(
+        _match_blocks(golden_signal, test_signal[numpy.newaxis, :],
+                      threshold)[0])
+
+
+def _sliding_norms(signal, length):
+    """Computes the norm of every window of a signal.
+
+    Uses a cumulative sum of squares, so each norm costs O(1).
+
+    Args:
+        signal: A 1-D array.
+        length: The length of the windows.
+
+    Returns:
+        A 1-D array of len(signal) - length + 1 norms, the norm of the window
+        starting at each index.
+    """
+    squares = numpy.concatenate(([0.0], numpy.cumsum(numpy.square(signal))))
+    # Rounding errors can make the difference of sums slightly negative.
+    return numpy.sqrt(numpy.maximum(squares[length:] - squares[:-length], 0))
+
+
+def _sliding_dot_products(golden_signal, blocks):
+    """Computes the dot products of blocks with every window of a signal.
+
+    All the offsets of all the blocks are computed at once, as the
+    convolution of the golden signal with the reversed blocks, using FFT.
+
+    Args:
+        golden_signal: A 1-D array.
+        blocks: A 2-D array with one block per row, no longer than
+            golden_signal.
+
+    Returns:
+        A 2-D array where element [i, k] is the dot product of block i with
+        golden_signal[k:k + block length].
+    """
+    block_length = blocks.shape[1]
+    golden_length = len(golden_signal)
+    fft_size = 1 << (golden_length + block_length - 2).bit_length()
+    golden_fft = numpy.fft.rfft(golden_signal, fft_size)
+    blocks_fft = numpy.fft.rfft(blocks[:, ::-1], fft_size, axis=1)
+    convolution = numpy.fft.irfft(blocks_fft * golden_fft, fft_size, axis=1)
+    return convolution[:, block_length - 1:golden_length]
+
+
+def _match_blocks(golden_signal, blocks, threshold):
+    """Checks if each test block is similar to any block of golden_signal.
+
+    This is _moving_pattern_matching for many test blocks of one length at
+    once. The correlation index of a test block and a golden block is the
+    same as computed by _get_correlation_index.
+
+    Args:
+        golden_signal: A 1-D array for golden signal.
+        blocks: A 2-D array with one test block per row.
+        threshold: The threshold of correlation index to be judge as matched.
+
+    Returns:
+        A 1-D boolean array, True for the matched blocks.
+
+    Raises:
+        GoldenSignalNormTooSmallError: if a golden block compared with a test
+            block has too small a norm.
+    """
+    golden_norms = _sliding_norms(golden_signal, blocks.shape[1])
+    test_norms = numpy.sqrt(numpy.einsum('ij,ij->i', blocks, blocks))
+    # The first golden block is checked before the test block, and the other
+    # golden blocks after it, like _moving_pattern_matching used to.
+    meaningful = test_norms > _MINIMUM_SIGNAL_NORM
+    if golden_norms[0] <= _MINIMUM_SIGNAL_NORM or (
+            meaningful.any() and golden_norms.min() <= _MINIMUM_SIGNAL_NORM):
+        raise GoldenSignalNormTooSmallError(
+            'No meaningful data as norm is too small.')
+    for _ in range(numpy.count_nonzero(~meaningful)):
+        logging.info(
+            'Caught one block of test signal that has no meaningful norm')
+
+    matched = numpy.zeros(len(blocks), dtype=bool)
+    if not meaningful.any():
+        return matched
+    dot_products = _sliding_dot_products(golden_signal, blocks[meaningful])
+    max_corr = (dot_products / golden_norms).max(axis=1) / test_norms[
+        meaningful]
+    for corr in max_corr[max_corr < threshold]:
+        logging.debug('Got one unmatched block with max_corr: %s', corr)
+    matched[meaningful] = max_corr >= threshold
+    return matched
 
 
 class GoldenSignalNormTooSmallError(Exception):
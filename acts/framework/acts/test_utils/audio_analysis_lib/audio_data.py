@@ -90,23 +90,54 @@ class AudioRawData(object):
         """Reads samples from binary and fills channel_data.
 
         Reads samples of fixed width from binary string into a numpy array
-        and shapes them into each channel.
+        and shapes them into each channel. The array shares the memory of
+        binary.
 
         Args:
             binary: A string containing binary data.
         """
-        sample_format_dict = SAMPLE_FORMATS[self.sample_format]
+        # Reads data from a string into 1-D array.
+        np_array = numpy.frombuffer(binary, dtype=self._get_dtype())
+        self._fill_channel_data(np_array)
 
-        # The data type used in numpy fromstring function. For example,
-        # <i4 for 32-bit signed int.
-        np_dtype = '%s%d' % (sample_format_dict['dtype_str'],
-                             sample_format_dict['size_bytes'])
+    def read_file(self, filename, offset=0, n_frames=None):
+        """Memory-maps the samples in a file and fills channel_data.
 
-        # Reads data from a string into 1-D array.
-        np_array = numpy.fromstring(binary, dtype=np_dtype)
+        Samples are only read from the file when they are accessed, so
+        recordings larger than the memory can be analyzed chunk by chunk.
+
+        Args:
+            filename: The file containing the samples.
+            offset: The offset in bytes of the first sample in the file.
+            n_frames: The number of frames to read. If None, reads the
+                      frames up to the end of the file.
+        """
+        shape = None
+        if n_frames is not None:
+            shape = (n_frames * self.channel, )
+        np_array = numpy.memmap(
+            filename,
+            dtype=self._get_dtype(),
+            mode='r',
+            offset=offset,
+            shape=shape)
+        self._fill_channel_data(np_array)
+
+    def _get_dtype(self):
+        """Gets the numpy data type of a sample, e.g. <i4 for 32-bit int."""
+        sample_format_dict = SAMPLE_FORMATS[self.sample_format]
+        return '%s%d' % (sample_format_dict['dtype_str'],
+                         sample_format_dict['size_bytes'])
+
+    def _fill_channel_data(self, np_array):
+        """Shapes the interleaved samples in np_array into each channel.
 
-        n_frames = len(np_array) / self.channel
+        Args:
+            np_array: A 1-D numpy array of interleaved samples.
+        """
+        n_frames = len(np_array) // self.channel
         # Reshape np_array into an array of shape (n_frames, channel).
-        np_array = np_array.reshape(int(n_frames), self.channel)
+        np_array = np_array[:n_frames * self.channel].reshape(
+            n_frames, self.channel)
         # Transpose np_arrya so it becomes of shape (channel, n_frames).
         self.channel_data = np_array.transpose()
@@ -16,11 +16,13 @@
 """This module provides utilities to detect some artifacts and measure the
     quality of audio."""
 
+import collections
 import logging
 import math
 import numpy
 
 import acts.test_utils.audio_analysis_lib.audio_analysis as audio_analysis
+import acts.test_utils.audio_analysis_lib.sliding_window as sliding_window
 
 # The input signal should be one sine wave with fixed frequency which
 # can have silence before and/or after sine wave.
@@ -139,6 +141,17 @@ NEAR_DATA_START_OR_END_SECS = 0.01
 # sine wave. | d | is determined by NEAR_SINE_START_OR_END_SECS.
 NEAR_SINE_START_OR_END_SECS = 0.01
 
+# The length of the chunks read at a time by chunked_quality_measurement.
+# Also the frequency resolution of its spectral analysis is 1 / this value.
+DEFAULT_CHUNK_SECS = 10
+
+# The Hilbert analysis and block averages of a chunk of the signal, cut to the
+# samples of [offset, offset + len(amplitude)).
+_Chunk = collections.namedtuple('_Chunk', [
+    'offset', 'amplitude', 'left_block_amplitude', 'right_block_amplitude',
+    'block_amplitude', 'block_frequency_delta'
+])
+
 
 class SineWaveNotFound(Exception):
     """Error when there's no sine wave found in the signal"""
@@ -177,9 +190,9 @@ def hilbert(x):
         h[1:(N + 1) // 2] = 2
 
     if len(x.shape) > 1:
-        ind = [newaxis] * x.ndim
+        ind = [numpy.newaxis] * x.ndim
         ind[axis] = slice(None)
-        h = h[ind]
+        h = h[tuple(ind)]
     x = numpy.fft.ifft(Xf * h, axis=axis)
     return x
 
@@ -197,13 +210,9 @@ def noised_sine_wave(frequency, rate, noise_level):
         A sine wave with specified noise level.
 
     """
-    wave = []
-    for index in range(0, rate * 2):
-        sample = 2.0 * math.pi * frequency * float(index) / float(rate)
-        sine_wave = math.sin(sample)
-        noise = noise_level * numpy.random.standard_normal()
-        wave.append(sine_wave + noise)
-    return wave
+    sample = 2.0 * math.pi * frequency * numpy.arange(rate * 2) / float(rate)
+    noise = noise_level * numpy.random.standard_normal(rate * 2)
+    return numpy.sin(sample) + noise
 
 
 def average_teager_value(wave, amplitude):
@@ -220,15 +229,28 @@ def average_teager_value(wave, amplitude):
         Average teager value.
 
     """
-    teager_value, length = 0, len(wave)
-    for i in range(1, length - 1):
-        ith_teager_value = abs(wave[i] * wave[i] - wave[i - 1] * wave[i + 1])
-        ith_teager_value *= max(1, abs(wave[i]))
-        teager_value += ith_teager_value
-    teager_value = (float(teager_value) / length) / (amplitude**2)
+    teager_value = _teager_sum(wave)
+    teager_value = (teager_value / len(wave)) / (amplitude**2)
     return teager_value
 
 
+def _teager_sum(wave):
+    """Sums the teager value of each sample of wave but the first and last.
+
+    Args:
+        wave: Wave to apply teager operator.
+
+    Returns:
+        The sum of teager values.
+
+    """
+    wave = numpy.asarray(wave, dtype=float)
+    middle = wave[1:-1]
+    teager_values = numpy.abs(middle * middle - wave[:-2] * wave[2:])
+    teager_values *= numpy.maximum(1, numpy.abs(middle))
+    return float(numpy.sum(teager_values))
+
+
 def noise_level(amplitude, frequency, rate, teager_value_of_input):
     """Computes the noise level compared with standard_noise.
 
@@ -309,16 +331,32 @@ def hilbert_analysis(signal, rate, block_size):
     #       |-----|=====|=====|-----|           |-----|=====|=====|
     #                   |-----|=====|=====|-----|
     # Specially, beginning and ending part may not have ignored part.
+    signal = numpy.asarray(signal, dtype=float)
     length = len(signal)
-    result = []
+    result = numpy.empty(length, dtype=complex)
+
+    # Segments which have both ignored parts have the same size, so they are
+    # transformed together as rows of a strided view of the signal.
+    # They are the blocks in [batch_start, batch_end).
+    batch_start = -(-half_hilbert_block // hilbert_block) * hilbert_block
+    batch_end = (length - half_hilbert_block) // hilbert_block * hilbert_block
+    if batch_start < batch_end:
+        segments = sliding_window.strided_windows(
+            signal[batch_start - half_hilbert_block:],
+            hilbert_block + 2 * half_hilbert_block, hilbert_block)
+        temp = hilbert(segments[:(batch_end - batch_start) // hilbert_block])
+        temp = temp[:, half_hilbert_block:half_hilbert_block + hilbert_block]
+        result[batch_start:batch_end] = temp.ravel()
+
     for left_border in range(0, length, hilbert_block):
+        if batch_start <= left_border < batch_end:
+            continue
         right_border = min(length, left_border + hilbert_block)
         temp_left_border = max(0, left_border - half_hilbert_block)
         temp_right_border = min(length, right_border + half_hilbert_block)
         temp = hilbert(signal[temp_left_border:temp_right_border])
-        for index in range(left_border, right_border):
-            result.append(temp[index - temp_left_border])
-    result = numpy.asarray(result)
+        result[left_border:right_border] = temp[
+            left_border - temp_left_border:right_border - temp_left_border]
     amplitude = numpy.abs(result)
     phase = numpy.unwrap(numpy.angle(result))
     frequency = numpy.diff(phase) / (2.0 * numpy.pi) * rate
@@ -349,41 +387,29 @@ def find_block_average_value(arr, side_block_size, block_size):
                                  right_block_average_array,
                                  block_average_array)
     """
-    length = len(arr)
-    left_border, right_border = 0, 1
-    left_block_sum = arr[0]
-    right_block_sum = arr[0]
-    left_average_array = numpy.zeros(length)
-    right_average_array = numpy.zeros(length)
-    block_average_array = numpy.zeros(length)
-    for index in range(0, length):
-        while left_border < index - side_block_size:
-            left_block_sum -= arr[left_border]
-            left_border += 1
-        while right_border < min(length, index + side_block_size):
-            right_block_sum += arr[right_border]
-            right_border += 1
-
-        left_average_value = float(left_block_sum) / (index - left_border + 1)
-        right_average_value = float(right_block_sum) / (right_border - index)
-        left_average_array[index] = left_average_value
-        right_average_array[index] = right_average_value
-
-        if index + 1 < length:
-            left_block_sum += arr[index + 1]
-        right_block_sum -= arr[index]
-    left_border, right_border = 0, 1
-    block_sum = 0
-    for index in range(0, length):
-        while left_border < index - block_size / 2:
-            block_sum -= arr[left_border]
-            left_border += 1
-        while right_border < min(length, index + block_size / 2):
-            block_sum += arr[right_border]
-            right_border += 1
-
-        average_value = float(block_sum) / (right_border - left_border)
-        block_average_array[index] = average_value
+    return _block_average_values(arr, side_block_size, block_size, arr[0])
+
+
+def _block_average_values(arr, side_block_size, block_size, first_value):
+    """Finds the block averages of find_block_average_value.
+
+    Args:
+        arr: The array to be computed.
+        side_block_size: the size of the left_block and right_block.
+        block_size: the size of the block.
+        first_value: The first value of the whole array arr is part of.
+
+    Returns:
+        Refer to find_block_average_value.
+    """
+    windows = sliding_window.SlidingWindows(arr)
+    left_average_array = windows.means(side_block_size, 1)
+    right_average_array = windows.means(0, side_block_size)
+    block_sums, block_counts = windows.sums(block_size // 2,
+                                            block_size - block_size // 2)
+    # The block sums have always left out the first sample, which the
+    # thresholds above were tuned with.
+    block_average_array = (block_sums - first_value) / block_counts
     return (left_average_array, right_average_array, block_average_array)
 
 
@@ -413,18 +439,117 @@ def find_start_end_index(dominant_frequency, block_frequency_delta, block_size,
     """
     length = len(block_frequency_delta)
 
-    # Finds the start/end time index of playing based on dominant frequency
-    start_index, end_index = length - 1, 0
-    for index in range(0, length):
-        left_border = max(0, index - block_size / 2)
-        right_border = min(length - 1, index + block_size / 2)
-        frequency_error = block_frequency_delta[index] / dominant_frequency
-        if frequency_error < frequency_error_threshold:
-            start_index = min(start_index, left_border)
-            end_index = max(end_index, right_border + 1)
+    # Finds the start/end time index of playing based on dominant frequency.
+    # The borders of the blocks grow with the index, so only the first and the
+    # last block within the sine wave matter.
+    frequency_error = numpy.asarray(block_frequency_delta) / dominant_frequency
+    indices = numpy.flatnonzero(frequency_error < frequency_error_threshold)
+    if not len(indices):
+        return (length - 1, 0)
+    return _start_end_index(indices[0], indices[-1], length, block_size)
+
+
+def _start_end_index(first_index, last_index, length, block_size):
+    """Finds start and end index of sine wave from the blocks within it.
+
+    Args:
+        first_index: The first index whose block is within the sine wave.
+        last_index: The last index whose block is within the sine wave.
+        length: The length of block_frequency_delta.
+        block_size: Block size in samples.
+
+    Returns:
+        A tuple composed of (start_index, end_index)
+
+    """
+    start_index = min(length - 1, max(0, int(first_index) - block_size / 2))
+    end_index = max(0, min(length - 1, int(last_index) + block_size / 2) + 1)
     return (start_index, end_index)
 
 
+class _EventGrouper(object):
+    """Groups the indices where an artifact is detected into events.
+
+    An index closer than same_event_samples to the previous detected index
+    belongs to the same event. Indices may be added in several calls, e.g.
+    chunk by chunk, as long as they keep increasing.
+
+    Attributes:
+        events: A list of [first_index, last_index] of each event.
+    """
+
+    def __init__(self, same_event_samples):
+        self.same_event_samples = same_event_samples
+        self.events = []
+
+    def add(self, indices):
+        """Adds the indices where the artifact is detected.
+
+        Args:
+            indices: Sorted array of indices greater than the ones added
+                        before.
+        """
+        if not len(indices):
+            return
+        starts = numpy.flatnonzero(
+            numpy.diff(indices) >= self.same_event_samples) + 1
+        first_indices = indices[numpy.concatenate(([0], starts))].tolist()
+        last_indices = indices[numpy.concatenate((starts - 1, [-1]))].tolist()
+        if (self.events and first_indices[0] - self.events[-1][1] <
+                self.same_event_samples):
+            first_indices.pop(0)
+            self.events[-1][1] = last_indices.pop(0)
+        self.events.extend(
+            [first, last] for first, last in zip(first_indices, last_indices))
+
+
+def _index_to_time(index, rate):
+    """Converts an index of the zero padded signal to seconds."""
+    return float(index) / rate - APPEND_ZEROS_SECS
+
+
+def _noise_mask(index, length, start_index, end_index, block_amplitude,
+                average_amplitude, rate, noise_amplitude_threshold):
+    """Finds the indices with noise before/after sine wave.
+
+    Args:
+        index: Array of the indices to check.
+        length: The length of the signal.
+        block_amplitude: Average amplitude of the block of each index in
+                            index.
+        Others: Refer to noise_detection.
+
+    Returns:
+        A boolean array, True where there is noise.
+
+    """
+    is_noise = block_amplitude > average_amplitude * noise_amplitude_threshold
+    # Ignore noise too close to the beginning or the end of sine wave.
+    # Check the docstring of NEAR_SINE_START_OR_END_SECS.
+    is_noise &= ~(((start_index - rate * NEAR_SINE_START_OR_END_SECS) <= index)
+                  & (index < end_index + rate * NEAR_SINE_START_OR_END_SECS))
+    # Ignore noise too close to the beginning or the end of original data.
+    # Check the docstring of NEAR_DATA_START_OR_END_SECS.
+    is_noise &= (index / rate >
+                 NEAR_DATA_START_OR_END_SECS + APPEND_ZEROS_SECS)
+    is_noise &= ((length - index) / rate >
+                 NEAR_DATA_START_OR_END_SECS + APPEND_ZEROS_SECS)
+    return is_noise
+
+
+def _noise_result(events, start_index, rate):
+    """Splits noise events into noise before and after playing."""
+    noise_before_playing, noise_after_playing = [], []
+    for first, last in events:
+        noise_time_point = _index_to_time(first, rate)
+        duration = _index_to_time(last + 1, rate) - noise_time_point
+        if noise_time_point < _index_to_time(start_index, rate):
+            noise_before_playing.append((noise_time_point, duration))
+        else:
+            noise_after_playing.append((noise_time_point, duration))
+    return (noise_before_playing, noise_after_playing)
+
+
 def noise_detection(start_index, end_index, block_amplitude, average_amplitude,
                     rate, noise_amplitude_threshold):
     """Detects noise before/after sine wave.
@@ -452,53 +577,81 @@ def noise_detection(start_index, end_index, block_amplitude, average_amplitude,
 
     """
     length = len(block_amplitude)
-    amplitude_threshold = average_amplitude * noise_amplitude_threshold
-    same_event_samples = rate * DEFAULT_SAME_EVENT_SECS
+    index = numpy.arange(length)
+    is_noise = _noise_mask(index, length, start_index, end_index,
+                           numpy.asarray(block_amplitude), average_amplitude,
+                           rate, noise_amplitude_threshold)
+    events = _EventGrouper(rate * DEFAULT_SAME_EVENT_SECS)
+    events.add(index[is_noise])
+    return _noise_result(events.events, start_index, rate)
 
-    # Detects noise before playing.
-    noise_time_point = []
-    last_noise_end_time_point = []
-    previous_noise_index = None
-    times = 0
-    for index in range(0, length):
-        # Ignore noise too close to the beginning or the end of sine wave.
-        # Check the docstring of NEAR_SINE_START_OR_END_SECS.
-        if ((start_index - rate * NEAR_SINE_START_OR_END_SECS) <= index and
-            (index < end_index + rate * NEAR_SINE_START_OR_END_SECS)):
-            continue
 
-        # Ignore noise too close to the beginning or the end of original data.
-        # Check the docstring of NEAR_DATA_START_OR_END_SECS.
-        if (float(index) / rate <=
-                NEAR_DATA_START_OR_END_SECS + APPEND_ZEROS_SECS):
-            continue
-        if (float(length - index) / rate <=
-                NEAR_DATA_START_OR_END_SECS + APPEND_ZEROS_SECS):
-            continue
-        if block_amplitude[index] > amplitude_threshold:
-            same_event = False
-            if previous_noise_index:
-                same_event = (index - previous_noise_index
-                              ) < same_event_samples
-            if not same_event:
-                index_start_sec = float(index) / rate - APPEND_ZEROS_SECS
-                index_end_sec = float(index + 1) / rate - APPEND_ZEROS_SECS
-                noise_time_point.append(index_start_sec)
-                last_noise_end_time_point.append(index_end_sec)
-                times += 1
-            index_end_sec = float(index + 1) / rate - APPEND_ZEROS_SECS
-            last_noise_end_time_point[times - 1] = index_end_sec
-            previous_noise_index = index
+def _sine_wave_window(start_index, end_index, *arrays):
+    """Cuts the sine wave out of the arrays of the signal.
 
-    noise_before_playing, noise_after_playing = [], []
-    for i in range(times):
-        duration = last_noise_end_time_point[i] - noise_time_point[i]
-        if noise_time_point[i] < float(start_index) / rate - APPEND_ZEROS_SECS:
-            noise_before_playing.append((noise_time_point[i], duration))
-        else:
-            noise_after_playing.append((noise_time_point[i], duration))
+    Args:
+        start_index: Start index of sine wave.
+        end_index: End index of sine wave.
+        arrays: Arrays with one value for each index of the signal.
 
-    return (noise_before_playing, noise_after_playing)
+    Returns:
+        A list of the indices of the sine wave, followed by the values of each
+            array at these indices.
+
+    """
+    window = slice(int(start_index), int(end_index))
+    index = numpy.arange(int(start_index), int(end_index))
+    return [index] + [numpy.asarray(arr)[window] for arr in arrays]
+
+
+def _delay_mask(index, start_index, end_index, block_amplitude,
+                average_amplitude, dominant_frequency, rate,
+                left_block_amplitude, right_block_amplitude,
+                block_frequency_delta, delay_amplitude_threshold,
+                frequency_error_threshold):
+    """Finds the indices with delay during playing.
+
+    Args:
+        index: Array of the indices to check, within the sine wave.
+        block_amplitude, left_block_amplitude, right_block_amplitude,
+        block_frequency_delta: The values of each index in index.
+        Others: Refer to delay_detection.
+
+    Returns:
+        A boolean array, True where there is delay.
+
+    """
+    start_time = _index_to_time(start_index, rate)
+    end_time = _index_to_time(end_index, rate)
+    now_time = index / rate - APPEND_ZEROS_SECS
+    is_candidate = (
+        (block_amplitude <= average_amplitude * delay_amplitude_threshold) &
+        (numpy.abs(now_time - start_time) >= NEAR_START_OR_END_SECS) &
+        (numpy.abs(now_time - end_time) >= NEAR_START_OR_END_SECS))
+
+    # If amplitude less than its left/right side and small enough,
+    # it will be considered as a delay.
+    amp_threshold = average_amplitude * delay_amplitude_threshold
+    left_threshold = delay_amplitude_threshold * left_block_amplitude
+    amp_threshold = numpy.minimum(amp_threshold, left_threshold)
+    right_threshold = delay_amplitude_threshold * right_block_amplitude
+    amp_threshold = numpy.minimum(amp_threshold, right_threshold)
+
+    frequency_error = block_frequency_delta / dominant_frequency
+
+    amplitude_too_small = block_amplitude < amp_threshold
+    frequency_not_match = frequency_error > frequency_error_threshold
+    return is_candidate & (amplitude_too_small | frequency_not_match)
+
+
+def _delay_result(events, rate):
+    """Converts delay events to (time, duration) tuples."""
+    delay_list = []
+    for first, last in events:
+        delay_time_point = _index_to_time(first, rate)
+        duration = _index_to_time(last + 1, rate) - delay_time_point
+        delay_list.append((delay_time_point, duration))
+    return delay_list
 
 
 def delay_detection(start_index, end_index, block_amplitude, average_amplitude,
@@ -541,57 +694,58 @@ def delay_detection(start_index, end_index, block_amplitude, average_amplitude,
               where time and duration are in seconds.
 
     """
-    delay_time_points = []
-    last_delay_end_time_points = []
-    previous_delay_index = None
-    times = 0
-    same_event_samples = rate * DEFAULT_SAME_EVENT_SECS
-    start_time = float(start_index) / rate - APPEND_ZEROS_SECS
-    end_time = float(end_index) / rate - APPEND_ZEROS_SECS
-    for index in range(int(start_index), int(end_index)):
-        if block_amplitude[
-                index] > average_amplitude * delay_amplitude_threshold:
-            continue
-        now_time = float(index) / rate - APPEND_ZEROS_SECS
-        if abs(now_time - start_time) < NEAR_START_OR_END_SECS:
-            continue
-        if abs(now_time - end_time) < NEAR_START_OR_END_SECS:
-            continue
-        # If amplitude less than its left/right side and small enough,
-        # it will be considered as a delay.
-        amp_threshold = average_amplitude * delay_amplitude_threshold
-        left_threshold = delay_amplitude_threshold * left_block_amplitude[
-            index]
-        amp_threshold = min(amp_threshold, left_threshold)
-        right_threshold = delay_amplitude_threshold * right_block_amplitude[
-            index]
-        amp_threshold = min(amp_threshold, right_threshold)
-
-        frequency_error = block_frequency_delta[index] / dominant_frequency
-
-        amplitude_too_small = block_amplitude[index] < amp_threshold
-        frequency_not_match = frequency_error > frequency_error_threshold
-
-        if amplitude_too_small or frequency_not_match:
-            same_event = False
-            if previous_delay_index:
-                same_event = (index - previous_delay_index
-                              ) < same_event_samples
-            if not same_event:
-                index_start_sec = float(index) / rate - APPEND_ZEROS_SECS
-                index_end_sec = float(index + 1) / rate - APPEND_ZEROS_SECS
-                delay_time_points.append(index_start_sec)
-                last_delay_end_time_points.append(index_end_sec)
-                times += 1
-            previous_delay_index = index
-            index_end_sec = float(index + 1) / rate - APPEND_ZEROS_SECS
-            last_delay_end_time_points[times - 1] = index_end_sec
+    index, block, left, right, delta = _sine_wave_window(
+        start_index, end_index, block_amplitude, left_block_amplitude,
+        right_block_amplitude, block_frequency_delta)
+    is_delay = _delay_mask(index, start_index, end_index, block,
+                           average_amplitude, dominant_frequency, rate, left,
+                           right, delta, delay_amplitude_threshold,
+                           frequency_error_threshold)
+    events = _EventGrouper(rate * DEFAULT_SAME_EVENT_SECS)
+    events.add(index[is_delay])
+    return _delay_result(events.events, rate)
+
+
+def _burst_mask(index, start_index, end_index, block_amplitude,
+                average_amplitude, dominant_frequency, rate,
+                left_block_amplitude, right_block_amplitude,
+                block_frequency_delta, burst_amplitude_threshold,
+                frequency_error_threshold):
+    """Finds the indices with burst during playing.
 
-    delay_list = []
-    for i in range(len(delay_time_points)):
-        duration = last_delay_end_time_points[i] - delay_time_points[i]
-        delay_list.append((delay_time_points[i], duration))
-    return delay_list
+    Args:
+        index: Array of the indices to check, within the sine wave.
+        block_amplitude, left_block_amplitude, right_block_amplitude,
+        block_frequency_delta: The values of each index in index.
+        Others: Refer to burst_detection.
+
+    Returns:
+        A boolean array, True where there is burst.
+
+    """
+    is_candidate = (
+        (block_amplitude > average_amplitude * DEFAULT_BURST_TOO_SMALL) &
+        (numpy.abs(index - start_index) >= rate * NEAR_START_OR_END_SECS) &
+        (numpy.abs(index - end_index) >= rate * NEAR_START_OR_END_SECS))
+
+    # If amplitude higher than its left/right side and large enough,
+    # it will be considered as a burst.
+    amp_threshold = average_amplitude * DEFAULT_BURST_TOO_SMALL
+    left_threshold = burst_amplitude_threshold * left_block_amplitude
+    amp_threshold = numpy.maximum(amp_threshold, left_threshold)
+    right_threshold = burst_amplitude_threshold * right_block_amplitude
+    amp_threshold = numpy.maximum(amp_threshold, right_threshold)
+
+    frequency_error = block_frequency_delta / dominant_frequency
+
+    amplitude_too_large = block_amplitude > amp_threshold
+    frequency_not_match = frequency_error > frequency_error_threshold
+    return is_candidate & (amplitude_too_large | frequency_not_match)
+
+
+def _burst_result(events, rate):
+    """Converts burst events to the times they start."""
+    return [_index_to_time(first, rate) for first, _ in events]
 
 
 def burst_detection(start_index, end_index, block_amplitude, average_amplitude,
@@ -632,42 +786,66 @@ def burst_detection(start_index, end_index, block_amplitude, average_amplitude,
               where time is in seconds.
 
     """
-    burst_time_points = []
-    previous_burst_index = None
-    same_event_samples = rate * DEFAULT_SAME_EVENT_SECS
-    for index in range(int(start_index), int(end_index)):
-        # If amplitude higher than its left/right side and large enough,
-        # it will be considered as a burst.
-        if block_amplitude[
-                index] <= average_amplitude * DEFAULT_BURST_TOO_SMALL:
-            continue
-        if abs(index - start_index) < rate * NEAR_START_OR_END_SECS:
-            continue
-        if abs(index - end_index) < rate * NEAR_START_OR_END_SECS:
-            continue
-        amp_threshold = average_amplitude * DEFAULT_BURST_TOO_SMALL
-        left_threshold = burst_amplitude_threshold * left_block_amplitude[
-            index]
-        amp_threshold = max(amp_threshold, left_threshold)
-        right_threshold = burst_amplitude_threshold * right_block_amplitude[
-            index]
-        amp_threshold = max(amp_threshold, right_threshold)
+    index, block, left, right, delta = _sine_wave_window(
+        start_index, end_index, block_amplitude, left_block_amplitude,
+        right_block_amplitude, block_frequency_delta)
+    is_burst = _burst_mask(index, start_index, end_index, block,
+                           average_amplitude, dominant_frequency, rate, left,
+                           right, delta, burst_amplitude_threshold,
+                           frequency_error_threshold)
+    events = _EventGrouper(rate * DEFAULT_SAME_EVENT_SECS)
+    events.add(index[is_burst])
+    return _burst_result(events.events, rate)
+
+
+def _volume_change_masks(index, start_index, end_index, average_amplitude,
+                         rate, left_block_amplitude, right_block_amplitude,
+                         volume_changing_amplitude_threshold):
+    """Finds the indices with increasing and decreasing volume.
 
-        frequency_error = block_frequency_delta[index] / dominant_frequency
+    Args:
+        index: Array of the indices to check, within the sine wave.
+        left_block_amplitude, right_block_amplitude: The values of each index
+                                                       in index.
+        Others: Refer to changing_volume_detection.
 
-        amplitude_too_large = block_amplitude[index] > amp_threshold
-        frequency_not_match = frequency_error > frequency_error_threshold
+    Returns:
+        A tuple of boolean arrays (is_rising, is_falling).
 
-        if amplitude_too_large or frequency_not_match:
-            same_event = False
-            if previous_burst_index:
-                same_event = index - previous_burst_index < same_event_samples
-            if not same_event:
-                burst_time_points.append(
-                    float(index) / rate - APPEND_ZEROS_SECS)
-            previous_burst_index = index
+    """
+    amplitude_threshold = average_amplitude * DEFAULT_VOLUME_CHANGE_TOO_SMALL
+    # Skips if amplitude is too small or if changing is from start or end time.
+    is_candidate = (
+        (left_block_amplitude >= amplitude_threshold) &
+        (right_block_amplitude >= amplitude_threshold) &
+        (numpy.abs(start_index - index) / rate >= NEAR_START_OR_END_SECS) &
+        (numpy.abs(end_index - index) / rate >= NEAR_START_OR_END_SECS))
+
+    delta_margin = numpy.where(
+        left_block_amplitude > 0,
+        volume_changing_amplitude_threshold * left_block_amplitude,
+        volume_changing_amplitude_threshold)
+    is_rising = is_candidate & (
+        right_block_amplitude > left_block_amplitude + delta_margin)
+    is_falling = is_candidate & (
+        right_block_amplitude < left_block_amplitude - delta_margin)
+    return is_rising, is_falling
+
+
+def _volume_change_result(rising_events, falling_events, rate):
+    """Merges rising and falling events into a list of volume changes."""
+    changing_events = [(first, +1) for first, _ in rising_events]
+    changing_events.extend((first, -1) for first, _ in falling_events)
+    changing_events.sort(key=lambda event: event[0])
 
-    return burst_time_points
+    # Combines consecutive increasing/decreasing event.
+    combined_changing_events, prev = [], 0
+    for first, flag in changing_events:
+        if flag == prev:
+            continue
+        combined_changing_events.append((_index_to_time(first, rate), flag))
+        prev = flag
+    return combined_changing_events
 
 
 def changing_volume_detection(start_index, end_index, average_amplitude, rate,
@@ -705,58 +883,18 @@ def changing_volume_detection(start_index, end_index, average_amplitude, rate,
             decreasing.
 
     """
-    length = len(left_block_amplitude)
+    index, left, right = _sine_wave_window(
+        start_index, end_index, left_block_amplitude, right_block_amplitude)
+    is_rising, is_falling = _volume_change_masks(
+        index, start_index, end_index, average_amplitude, rate, left, right,
+        volume_changing_amplitude_threshold)
 
     # Detects rising and/or falling volume.
-    previous_rising_index, previous_falling_index = None, None
-    changing_time = []
-    changing_events = []
-    amplitude_threshold = average_amplitude * DEFAULT_VOLUME_CHANGE_TOO_SMALL
-    same_event_samples = rate * DEFAULT_SAME_EVENT_SECS
-    for index in range(int(start_index), int(end_index)):
-        # Skips if amplitude is too small.
-        if left_block_amplitude[index] < amplitude_threshold:
-            continue
-        if right_block_amplitude[index] < amplitude_threshold:
-            continue
-        # Skips if changing is from start or end time
-        if float(abs(start_index - index)) / rate < NEAR_START_OR_END_SECS:
-            continue
-        if float(abs(end_index - index)) / rate < NEAR_START_OR_END_SECS:
-            continue
-
-        delta_margin = volume_changing_amplitude_threshold
-        if left_block_amplitude[index] > 0:
-            delta_margin *= left_block_amplitude[index]
-
-        increasing_threshold = left_block_amplitude[index] + delta_margin
-        decreasing_threshold = left_block_amplitude[index] - delta_margin
-
-        if right_block_amplitude[index] > increasing_threshold:
-            same_event = False
-            if previous_rising_index:
-                same_event = index - previous_rising_index < same_event_samples
-            if not same_event:
-                changing_time.append(float(index) / rate - APPEND_ZEROS_SECS)
-                changing_events.append(+1)
-            previous_rising_index = index
-        if right_block_amplitude[index] < decreasing_threshold:
-            same_event = False
-            if previous_falling_index:
-                same_event = index - previous_falling_index < same_event_samples
-            if not same_event:
-                changing_time.append(float(index) / rate - APPEND_ZEROS_SECS)
-                changing_events.append(-1)
-            previous_falling_index = index
-
-    # Combines consecutive increasing/decreasing event.
-    combined_changing_events, prev = [], 0
-    for i in range(len(changing_events)):
-        if changing_events[i] == prev:
-            continue
-        combined_changing_events.append((changing_time[i], changing_events[i]))
-        prev = changing_events[i]
-    return combined_changing_events
+    rising = _EventGrouper(rate * DEFAULT_SAME_EVENT_SECS)
+    rising.add(index[is_rising])
+    falling = _EventGrouper(rate * DEFAULT_SAME_EVENT_SECS)
+    falling.add(index[is_falling])
+    return _volume_change_result(rising.events, falling.events, rate)
 
 
 def quality_measurement(
@@ -881,7 +1019,8 @@ def quality_measurement(
                   float(start_index) / rate - APPEND_ZEROS_SECS,
                   float(end_index) / rate - APPEND_ZEROS_SECS)
 
-    sum_of_amplitude = float(sum(amplitude[int(start_index):int(end_index)]))
+    sum_of_amplitude = float(
+        numpy.sum(amplitude[int(start_index):int(end_index)]))
     # Finds average amplitude of sine wave.
     average_amplitude = sum_of_amplitude / (end_index - start_index)
 
@@ -917,6 +1056,13 @@ def quality_measurement(
     noise = noise_level(average_amplitude, dominant_frequency, rate,
                         teager_value)
 
+    return _quality_report(noise_before_playing, noise_after_playing, delays,
+                           burst_time_points, volume_changes, noise)
+
+
+def _quality_report(noise_before_playing, noise_after_playing, delays,
+                    burst_time_points, volume_changes, noise):
+    """Builds the dictionary returned by quality_measurement."""
     return {
         'artifacts': {
             'noise_before_playback': noise_before_playing,
@@ -927,3 +1073,224 @@ def quality_measurement(
         'volume_changes': volume_changes,
         'equivalent_noise_level': noise
     }
+
+
+def chunked_quality_measurement(
+        signal,
+        rate,
+        dominant_frequency=None,
+        chunk_secs=DEFAULT_CHUNK_SECS,
+        block_size_secs=DEFAULT_BLOCK_SIZE_SECS,
+        frequency_error_threshold=DEFAULT_FREQUENCY_ERROR,
+        delay_amplitude_threshold=DEFAULT_DELAY_AMPLITUDE_THRESHOLD,
+        noise_amplitude_threshold=DEFAULT_NOISE_AMPLITUDE_THRESHOLD,
+        burst_amplitude_threshold=DEFAULT_BURST_AMPLITUDE_THRESHOLD,
+        volume_changing_amplitude_threshold=DEFAULT_VOLUME_CHANGE_AMPLITUDE):
+    """Detects artifacts like quality_measurement, reading chunk by chunk.
+
+    quality_measurement holds several arrays of the length of the signal,
+    which does not fit in memory for recordings of hours. This function only
+    reads chunk_secs of the signal at a time, so the signal may be a
+    memory-mapped recording, e.g. an audio_analysis.NormalizedSignal.
+
+    The Hilbert analysis and the block averages only depend on the nearby
+    samples, so each chunk is analyzed together with enough of its
+    neighbours to get the same values as for the whole signal. The signal is
+    read three times: to find the sine wave, to find its average amplitude
+    and teager value, and to detect the artifacts.
+
+    Args:
+        signal: A 1-D array-like object for one-channel PCM data, normalized
+                   to [-1, 1].
+        rate: Sampling rate in samples per second. Example inputs: 44100,
+        48000
+        dominant_frequency: Dominant frequency of signal. Set None to
+                               recalculate the frequency by
+                               audio_analysis.chunked_spectral_analysis.
+        chunk_secs: The length in seconds of the chunks read at a time.
+        Others: Refer to quality_measurement.
+
+    Returns:
+        The same dictionary as quality_measurement.
+
+    Raises:
+        SineWaveNotFound: There is no sine wave in the signal.
+
+    """
+    # Calculates the block size, from seconds to samples.
+    block_size = int(block_size_secs * rate)
+    padding = int(rate * APPEND_ZEROS_SECS)
+    length = len(signal) + 2 * padding
+
+    # Finds the dominant frequency.
+    if not dominant_frequency:
+        dominant_frequency = audio_analysis.chunked_spectral_analysis(
+            signal, rate, int(chunk_secs * rate))[0][0]
+
+    # The block averages of every chunk leave out the first value of the
+    # whole arrays, see find_block_average_value.
+    amplitude, frequency = hilbert_analysis(
+        _read_padded(signal, padding, 0, min(length, 2 * block_size)), rate,
+        block_size)
+    first_values = (amplitude[0], abs(frequency[0] - dominant_frequency))
+
+    def chunks(start=0, end=length, block_averages=True):
+        return _quality_chunks(signal, rate, block_size, chunk_secs,
+                               dominant_frequency, first_values, start, end,
+                               block_averages)
+
+    # Finds start and end index of sine wave.
+    first_index, last_index = None, None
+    for chunk in chunks():
+        frequency_error = chunk.block_frequency_delta / dominant_frequency
+        indices = numpy.flatnonzero(frequency_error < frequency_error_threshold)
+        if len(indices):
+            if first_index is None:
+                first_index = chunk.offset + indices[0]
+            last_index = chunk.offset + indices[-1]
+    if first_index is None:
+        raise SineWaveNotFound('No sine wave found in signal')
+    # The frequency arrays are one shorter than the signal.
+    start_index, end_index = _start_end_index(first_index, last_index,
+                                              length - 1, block_size)
+
+    logging.debug('Found sine wave: start: %s, end: %s',
+                  float(start_index) / rate - APPEND_ZEROS_SECS,
+                  float(end_index) / rate - APPEND_ZEROS_SECS)
+
+    # Finds average amplitude and teager value of sine wave.
+    sum_of_amplitude, sum_of_teager_value = 0.0, 0.0
+    for chunk in chunks(int(start_index), int(end_index), False):
+        chunk_start = max(chunk.offset, int(start_index))
+        chunk_end = min(chunk.offset + len(chunk.amplitude), int(end_index))
+        sum_of_amplitude += numpy.sum(
+            chunk.amplitude[chunk_start - chunk.offset:chunk_end -
+                            chunk.offset])
+        # Teager values need the samples on both sides, but are only summed
+        # within the sine wave.
+        chunk_start = max(chunk_start, int(start_index) + 1)
+        chunk_end = min(chunk_end, int(end_index) - 1)
+        if chunk_start < chunk_end:
+            sum_of_teager_value += _teager_sum(
+                _read_padded(signal, padding, chunk_start - 1, chunk_end + 1))
+    average_amplitude = sum_of_amplitude / (end_index - start_index)
+    teager_value = ((sum_of_teager_value /
+                     (int(end_index) - int(start_index))) /
+                    (average_amplitude**2))
+
+    # Finds artifacts and volume changes chunk by chunk.
+    same_event_samples = rate * DEFAULT_SAME_EVENT_SECS
+    noises, delays, bursts, risings, fallings = [
+        _EventGrouper(same_event_samples) for _ in range(5)
+    ]
+    for chunk in chunks():
+        index = chunk.offset + numpy.arange(len(chunk.block_amplitude))
+        noises.add(index[_noise_mask(
+            index, length, start_index, end_index, chunk.block_amplitude,
+            average_amplitude, rate, noise_amplitude_threshold)])
+
+        window = slice(
+            max(0, int(start_index) - chunk.offset),
+            max(0, int(end_index) - chunk.offset))
+        index = index[window]
+        block = chunk.block_amplitude[window]
+        left = chunk.left_block_amplitude[window]
+        right = chunk.right_block_amplitude[window]
+        delta = chunk.block_frequency_delta[window]
+        delays.add(index[_delay_mask(
+            index, start_index, end_index, block, average_amplitude,
+            dominant_frequency, rate, left, right, delta,
+            delay_amplitude_threshold, frequency_error_threshold)])
+        bursts.add(index[_burst_mask(
+            index, start_index, end_index, block, average_amplitude,
+            dominant_frequency, rate, left, right, delta,
+            burst_amplitude_threshold, frequency_error_threshold)])
+        is_rising, is_falling = _volume_change_masks(
+            index, start_index, end_index, average_amplitude, rate, left,
+            right, volume_changing_amplitude_threshold)
+        risings.add(index[is_rising])
+        fallings.add(index[is_falling])
+
+    noise_before_playing, noise_after_playing = _noise_result(
+        noises.events, start_index, rate)
+    noise = noise_level(average_amplitude, dominant_frequency, rate,
+                        teager_value)
+
+    return _quality_report(
+        noise_before_playing, noise_after_playing,
+        _delay_result(delays.events, rate),
+        _burst_result(bursts.events, rate),
+        _volume_change_result(risings.events, fallings.events, rate), noise)
+
+
+def _read_padded(signal, padding, start, end):
+    """Reads [start, end) of the signal with padding zeros on both sides.
+
+    Args:
+        signal: A 1-D array-like object for one-channel PCM data.
+        padding: The number of zeros before and after the signal.
+        start: The start index in the padded signal.
+        end: The end index in the padded signal.
+
+    Returns:
+        A numpy array of float.
+
+    """
+    chunk = numpy.zeros(end - start)
+    signal_start = max(start, padding)
+    signal_end = min(end, padding + len(signal))
+    if signal_start < signal_end:
+        chunk[signal_start - start:signal_end - start] = signal[
+            signal_start - padding:signal_end - padding]
+    return chunk
+
+
+def _quality_chunks(signal, rate, block_size, chunk_secs, dominant_frequency,
+                    first_values, start, end, block_averages):
+    """Analyzes the zero padded signal chunk by chunk.
+
+    Args:
+        signal: A 1-D array-like object for one-channel PCM data.
+        rate: Sampling rate in samples per second.
+        block_size: Block size in samples.
+        chunk_secs: The length in seconds of the chunks.
+        dominant_frequency: Dominant frequency of signal.
+        first_values: The first value of the amplitude and the frequency delta
+                         of the whole signal.
+        start: The index in the padded signal of the first sample to analyze.
+        end: The index in the padded signal after the last sample to analyze.
+        block_averages: False to only compute the amplitude.
+
+    Yields:
+        A _Chunk for each chunk overlapping [start, end), in order. Chunks
+            start on the blocks of hilbert_analysis, so they may begin before
+            start.
+
+    """
+    padding = int(rate * APPEND_ZEROS_SECS)
+    length = len(signal) + 2 * padding
+    hilbert_block = block_size // 2
+    # The samples on each side of a chunk which the Hilbert transform, the
+    # frequency and the side blocks of its samples depend on.
+    margin = 2 * block_size + hilbert_block + hilbert_block // 2 + 1
+    margin = -(-margin // hilbert_block) * hilbert_block
+    chunk_size = max(1, int(chunk_secs * rate) // hilbert_block) * hilbert_block
+
+    for offset in range(start // hilbert_block * hilbert_block, end,
+                        chunk_size):
+        read_start = max(0, offset - margin)
+        read_end = min(length, offset + chunk_size + margin)
+        amplitude, frequency = hilbert_analysis(
+            _read_padded(signal, padding, read_start, read_end), rate,
+            block_size)
+        owned = slice(offset - read_start, offset + chunk_size - read_start)
+        if not block_averages:
+            yield _Chunk(offset, amplitude[owned], None, None, None, None)
+            continue
+        left, right, block = _block_average_values(amplitude, block_size * 2,
+                                                   block_size, first_values[0])
+        _, _, block_frequency_delta = _block_average_values(
+            abs(frequency - dominant_frequency), block_size * 2, block_size,
+            first_values[1])
+        yield _Chunk(offset, amplitude[owned], left[owned], right[owned],
+                     block[owned], block_frequency_delta[owned])
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Analyzes the channels of several audio files in parallel.
+
+Every channel of every file is analyzed in its own worker process. Files are
+memory-mapped, and the samples of each channel are copied once from the
+mapping into shared memory, so the workers read them in place instead of
+receiving a pickled copy. Only a few channels per worker are in shared memory
+at once.
+
+Shared memory needs Python 3.8 or later. On older versions the channels are
+analyzed one after the other in the calling process.
+
+Usage:
+    checkers = batch_analysis.batch_quality_analysis(
+        ['left.raw', 'right.raw'], bit_width=32, rate=48000, channel=2)
+    for filename, checker in checkers.items():
+        checker.check_freqs([1000, 2000], 5)
+        checker.check_quality()
+"""
+
+import collections
+import concurrent.futures
+import logging
+import numpy
+import os
+import pprint
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # multiprocessing.shared_memory is new in Python 3.8.
+    shared_memory = None
+
+import acts.test_utils.audio_analysis_lib.audio_data as audio_data
+import acts.test_utils.audio_analysis_lib.check_quality as check_quality
+
+# Describes the samples of one channel in shared memory.
+SharedChannel = collections.namedtuple('SharedChannel',
+                                       ['name', 'dtype', 'length'])
+
+# Number of channels per worker submitted ahead of the results, which bounds
+# the shared memory in use.
+CHANNELS_IN_FLIGHT_PER_WORKER = 2
+
+# Holder for the analysis result of one channel. spectral is None if the
+# channel has no data, error is the message of the exception raised by the
+# quality measurement, if any.
+ChannelResult = collections.namedtuple('ChannelResult',
+                                       ['spectral', 'quality', 'error'])
+
+
+def share_channel(signal):
+    """Copies the samples of one channel into shared memory.
+
+    Args:
+        signal: The samples of the channel.
+
+    Returns:
+        A tuple (shm, shared_channel) where shm is the SharedMemory object
+            owning the samples, to be closed and unlinked by the caller, and
+            shared_channel is a SharedChannel to pass to the workers.
+
+    """
+    signal = numpy.asarray(signal)
+    shm = shared_memory.SharedMemory(
+        create=True, size=max(1, signal.nbytes))
+    shared_signal = numpy.ndarray(
+        signal.shape, dtype=signal.dtype, buffer=shm.buf)
+    shared_signal[:] = signal
+    return shm, SharedChannel(shm.name, signal.dtype.str, len(signal))
+
+
+def analyze_shared_channel(shared_channel, rate, saturate_value,
+                           ignore_high_freq, check_quality_params,
+                           chunk_secs=None):
+    """Analyzes one channel whose samples are in shared memory.
+
+    This runs in the worker processes.
+
+    Args:
+        shared_channel: A SharedChannel describing the samples.
+        rate: Sampling rate in samples per second.
+        saturate_value: The maximum value of the sample format.
+        ignore_high_freq: Ignore high frequencies above this threshold.
+        check_quality_params: A QualityParams object to check the quality
+                              of the channel, None to only do spectral
+                              analysis.
+        chunk_secs: If set, analyzes the channel chunk by chunk, reading this
+                    many seconds at a time.
+
+    Returns:
+        A ChannelResult object.
+
+    """
+    shm = shared_memory.SharedMemory(name=shared_channel.name)
+    try:
+        signal = numpy.ndarray(
+            (shared_channel.length, ),
+            dtype=numpy.dtype(shared_channel.dtype),
+            buffer=shm.buf)
+        try:
+            return _analyze_channel(signal, rate, saturate_value,
+                                    ignore_high_freq, check_quality_params,
+                                    chunk_secs)
+        finally:
+            # The buffer can not be closed while an array still uses it.
+            del signal
+    finally:
+        shm.close()
+
+
+def _analyze_channel(signal, rate, saturate_value, ignore_high_freq,
+                     check_quality_params, chunk_secs):
+    """Analyzes one channel the way QualityChecker.do_spectral_analysis does.
+
+    Args:
+        See analyze_shared_channel.
+
+    Returns:
+        A ChannelResult object.
+
+    """
+    if check_quality.get_max_abs(signal, rate, chunk_secs) == 0:
+        return ChannelResult(None, None, None)
+    normalized_signal, spectral = check_quality.analyze_channel_spectral(
+        signal, rate, saturate_value, ignore_high_freq, chunk_secs)
+    if check_quality_params is None:
+        return ChannelResult(spectral, None, None)
+    try:
+        quality = check_quality.analyze_channel_quality(
+            normalized_signal, rate, spectral[0][0], check_quality_params,
+            chunk_secs)
+    except Exception as error:
+        return ChannelResult(spectral, None, str(error))
+    return ChannelResult(spectral, quality, None)
+
+
+def batch_quality_analysis(
+        filenames,
+        bit_width,
+        rate,
+        channel,
+        ignore_high_freq=5000,
+        spectral_only=False,
+        quality_params=None,
+        chunk_secs=None,
+        max_workers=None):
+    """Analyzes the channels of several audio files in parallel.
+
+    The result of each channel is the same as with
+    check_quality.QualityChecker.do_spectral_analysis.
+
+    Args:
+        filenames: The wav or raw files to analyze.
+        bit_width: For raw files. Bit width of a sample.
+        rate: For raw files. Sampling rate in samples per second.
+        channel: For raw files. Number of channels.
+        ignore_high_freq: Frequency threshold in Hz to be ignored for high
+                          frequency.
+        spectral_only: Only do spectral analysis on each channel.
+        quality_params: A QualityParams object for quality measurement. The
+                        check_quality defaults are used if None.
+        chunk_secs: If set, analyzes each channel chunk by chunk, reading
+                    this many seconds at a time.
+        max_workers: The number of worker processes. Defaults to the number
+                     of processors.
+
+    Returns:
+        An OrderedDict mapping each filename to a QualityChecker holding the
+            results of its channels, to check and dump as with
+            check_quality.quality_analysis.
+
+    """
+    if quality_params is None:
+        quality_params = check_quality.get_quality_params(
+            check_quality.DEFAULT_QUALITY_BLOCK_SIZE_SECS,
+            check_quality.DEFAULT_FREQUENCY_ERROR_THRESHOLD,
+            check_quality.DEFAULT_DELAY_AMPLITUDE_THRESHOLD,
+            check_quality.DEFAULT_NOISE_AMPLITUDE_THRESHOLD,
+            check_quality.DEFAULT_BURST_AMPLITUDE_THRESHOLD)
+    check_quality_params = None if spectral_only else quality_params
+
+    checkers = collections.OrderedDict()
+    channels = _read_channels(filenames, bit_width, rate, channel,
+                              chunk_secs, checkers)
+    analysis_args = (ignore_high_freq, check_quality_params, chunk_secs)
+    if shared_memory is None:
+        logging.warning('Shared memory needs Python 3.8, analyzing the '
+                        'channels in this process.')
+        for filename, channel_idx, signal, file_rate, saturate_value in (
+                channels):
+            _add_result(checkers[filename], filename, channel_idx,
+                        _analyze_channel(signal, file_rate, saturate_value,
+                                         *analysis_args))
+        return checkers
+
+    max_workers = max_workers or os.cpu_count() or 1
+    in_flight = collections.deque()
+
+    def _collect_oldest():
+        filename, channel_idx, shm, future = in_flight.popleft()
+        try:
+            _add_result(checkers[filename], filename, channel_idx,
+                        future.result())
+        finally:
+            shm.close()
+            shm.unlink()
+
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers) as executor:
+            for filename, channel_idx, signal, file_rate, saturate_value in (
+                    channels):
+                if len(in_flight) >= (
+                        max_workers * CHANNELS_IN_FLIGHT_PER_WORKER):
+                    _collect_oldest()
+                shm, shared_channel = share_channel(signal)
+                try:
+                    future = executor.submit(
+                        analyze_shared_channel, shared_channel, file_rate,
+                        saturate_value, *analysis_args)
+                except:
+                    shm.close()
+                    shm.unlink()
+                    raise
+                in_flight.append((filename, channel_idx, shm, future))
+            while in_flight:
+                _collect_oldest()
+    finally:
+        for _, _, shm, _ in in_flight:
+            shm.close()
+            shm.unlink()
+    return checkers
+
+
+def _read_channels(filenames, bit_width, rate, channel, chunk_secs,
+                   checkers):
+    """Memory-maps audio files and yields their channels.
+
+    Args:
+        filenames: The wav or raw files to read.
+        bit_width: For raw files. Bit width of a sample.
+        rate: For raw files. Sampling rate in samples per second.
+        channel: For raw files. Number of channels.
+        chunk_secs: The chunk size of the QualityCheckers.
+        checkers: An OrderedDict a QualityChecker is added to for each file,
+                  when the file is read.
+
+    Yields:
+        A (filename, channel index, samples, rate, saturate value) tuple for
+        each channel of each file, in order.
+
+    """
+    for filename in filenames:
+        raw_data, file_rate = check_quality.read_audio_file(
+            filename, channel, bit_width, rate, memmap=True)
+        checkers[filename] = check_quality.QualityChecker(
+            raw_data, file_rate, chunk_secs=chunk_secs)
+        saturate_value = audio_data.get_maximum_value_from_sample_format(
+            raw_data.sample_format)
+        for channel_idx, signal in enumerate(raw_data.channel_data):
+            yield filename, channel_idx, signal, file_rate, saturate_value
+
+
+def _add_result(checker, filename, channel_idx, result):
+    """Adds the result of one channel to the QualityChecker of its file.
+
+    Args:
+        checker: The QualityChecker of the file.
+        filename: The name of the file.
+        channel_idx: The index of the channel in the file.
+        result: The ChannelResult of the channel.
+
+    """
+    if result.spectral is None:
+        logging.info('No data on channel %d of %s, skip this channel',
+                     channel_idx, filename)
+        return
+    logging.info('Channel %d of %s spectral:\n%s', channel_idx, filename,
+                 pprint.pformat(result.spectral))
+    if result.error is not None:
+        logging.warning('Failed to analyze channel %d of %s with error: %s',
+                        channel_idx, filename, result.error)
+        return
+    checker.add_result(result.spectral, result.quality)
@@ -17,12 +17,14 @@
 
 import argparse
 import collections
+import functools
 import json
 import logging
 import math
 import numpy
 import os
 import pprint
+import struct
 import subprocess
 import tempfile
 import wave
@@ -65,16 +67,20 @@ class WaveFile(object):
 
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, memmap=False):
         """Inits a wave file.
 
         Args:
             filename: file name of the wave file.
+            memmap: Memory-maps the samples instead of reading them, for
+                    recordings too large to fit in memory.
 
         """
         self.raw_data = None
         self.rate = None
 
+        self._memmap = memmap
+        self._filename = None
         self._wave_reader = None
         self._n_channels = None
         self._sample_width_bits = None
@@ -128,6 +134,7 @@ class WaveFile(object):
 
         """
         try:
+            self._filename = filename
             self._wave_reader = wave.open(filename, 'r')
             self._read_wave_header()
             self._read_wave_binary()
@@ -164,13 +171,135 @@ class WaveFile(object):
 
     def _read_wave_binary(self):
         """Reads in samples in wave file."""
-        self._binary = self._wave_reader.readframes(self._n_frames)
         format_str = 'S%d_LE' % self._sample_width_bits
+        if self._memmap:
+            self.raw_data = audio_data.AudioRawData(
+                binary=None,
+                channel=self._n_channels,
+                sample_format=format_str)
+            self.raw_data.read_file(self._filename,
+                                    self._find_data_offset(), self._n_frames)
+            return
+        self._binary = self._wave_reader.readframes(self._n_frames)
         self.raw_data = audio_data.AudioRawData(
             binary=self._binary,
             channel=self._n_channels,
             sample_format=format_str)
 
+    def _find_data_offset(self):
+        """Finds the offset of the samples in the wave file.
+
+        Returns:
+            The offset in bytes of the data chunk content.
+
+        @raises WaveFileException: wave file has no data chunk.
+
+        """
+        with open(self._filename, 'rb') as f:
+            # Skips the RIFF header: 'RIFF', file size, 'WAVE'.
+            f.seek(12)
+            while True:
+                chunk_header = f.read(8)
+                if len(chunk_header) < 8:
+                    raise WaveFileException('No data chunk in wave file.')
+                chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+                if chunk_id == b'data':
+                    return f.tell()
+                # Chunks are padded to an even size.
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+
+def get_max_abs(signal, rate, chunk_secs=None):
+    """Gets the maximum absolute value of a channel.
+
+    Args:
+        signal: The samples of the channel.
+        rate: Sampling rate in samples per second.
+        chunk_secs: If set, reads the samples this many seconds at a time.
+
+    Returns:
+        The maximum absolute value of the samples.
+
+    """
+    if not chunk_secs:
+        return max(numpy.abs(signal))
+    chunk_size = max(1, int(chunk_secs * rate))
+    max_abs = 0
+    for i in range(0, len(signal), chunk_size):
+        chunk = signal[i:i + chunk_size]
+        max_abs = max(max_abs, numpy.max(numpy.abs(chunk)))
+    return max_abs
+
+
+def analyze_channel_spectral(signal, rate, saturate_value, ignore_high_freq,
+                             chunk_secs=None):
+    """Runs the spectral analysis of one channel.
+
+    Args:
+        signal: The samples of the channel.
+        rate: Sampling rate in samples per second.
+        saturate_value: The maximum value of the sample format.
+        ignore_high_freq: Ignore high frequencies above this threshold.
+        chunk_secs: If set, analyzes the channel chunk by chunk, reading this
+                    many seconds at a time.
+
+    Returns:
+        A tuple (normalized_signal, spectral) where normalized_signal is the
+            signal scaled to [-1, 1] and spectral is the list of
+            (frequency, coefficient) below ignore_high_freq.
+
+    """
+    if chunk_secs:
+        normalized_signal = audio_analysis.NormalizedSignal(
+            signal, saturate_value)
+        spectral = audio_analysis.chunked_spectral_analysis(
+            normalized_signal, rate, int(chunk_secs * rate))
+    else:
+        normalized_signal = audio_analysis.normalize_signal(
+            signal, saturate_value)
+        logging.debug('max signal after normalized: %f',
+                      max(normalized_signal))
+        spectral = audio_analysis.spectral_analysis(normalized_signal, rate)
+
+    logging.debug('Spectral:\n%s', pprint.pformat(spectral))
+
+    # Ignore high frequencies above the threshold.
+    spectral = [(f, c) for (f, c) in spectral if f < ignore_high_freq]
+    return normalized_signal, spectral
+
+
+def analyze_channel_quality(normalized_signal, rate, dominant_frequency,
+                            quality_params, chunk_secs=None):
+    """Runs the quality measurement of one channel.
+
+    Args:
+        normalized_signal: The normalized samples of the channel, as returned
+                           by analyze_channel_spectral.
+        rate: Sampling rate in samples per second.
+        dominant_frequency: The dominant frequency of the channel.
+        quality_params: A QualityParams object for quality measurement.
+        chunk_secs: If set, analyzes the channel chunk by chunk, reading this
+                    many seconds at a time.
+
+    Returns:
+        The quality measurement result of the channel.
+
+    """
+    quality_measurement = audio_quality_measurement.quality_measurement
+    if chunk_secs:
+        quality_measurement = functools.partial(
+            audio_quality_measurement.chunked_quality_measurement,
+            chunk_secs=chunk_secs)
+    return quality_measurement(
+        signal=normalized_signal,
+        rate=rate,
+        dominant_frequency=dominant_frequency,
+        block_size_secs=quality_params.block_size_secs,
+        frequency_error_threshold=quality_params.frequency_error_threshold,
+        delay_amplitude_threshold=quality_params.delay_amplitude_threshold,
+        noise_amplitude_threshold=quality_params.noise_amplitude_threshold,
+        burst_amplitude_threshold=quality_params.burst_amplitude_threshold)
+
 
 class QualityCheckerError(Exception):
     """Error in QualityChecker."""
@@ -190,17 +319,21 @@ class QualityFailure(QualityCheckerError):
 class QualityChecker(object):
     """Quality checker controls the flow of checking quality of raw data."""
 
-    def __init__(self, raw_data, rate):
+    def __init__(self, raw_data, rate, chunk_secs=None):
         """Inits a quality checker.
 
         Args:
             raw_data: An audio_data.AudioRawData object.
             rate: Sampling rate in samples per second. Example inputs: 44100,
             48000
+            chunk_secs: If set, analyzes the channels chunk by chunk, reading
+                        this many seconds at a time. For long recordings
+                        whose raw_data is memory-mapped.
 
         """
         self._raw_data = raw_data
         self._rate = rate
+        self._chunk_secs = chunk_secs
         self._spectrals = []
         self._quality_result = []
 
@@ -215,9 +348,12 @@ class QualityChecker(object):
 
         """
         self.has_data()
+        saturate_value = audio_data.get_maximum_value_from_sample_format(
+            self._raw_data.sample_format)
+        logging.debug('saturate_value: %f', saturate_value)
         for channel_idx in range(self._raw_data.channel):
             signal = self._raw_data.channel_data[channel_idx]
-            max_abs = max(numpy.abs(signal))
+            max_abs = get_max_abs(signal, self._rate, self._chunk_secs)
             logging.debug('Channel %d max abs signal: %f', channel_idx,
                           max_abs)
             if max_abs == 0:
@@ -225,51 +361,40 @@ class QualityChecker(object):
                              channel_idx)
                 continue
 
-            saturate_value = audio_data.get_maximum_value_from_sample_format(
-                self._raw_data.sample_format)
-            normalized_signal = audio_analysis.normalize_signal(
-                signal, saturate_value)
-            logging.debug('saturate_value: %f', saturate_value)
-            logging.debug('max signal after normalized: %f',
-                          max(normalized_signal))
-            spectral = audio_analysis.spectral_analysis(
-                normalized_signal, self._rate)
-
-            logging.debug('Channel %d spectral:\n%s', channel_idx,
-                          pprint.pformat(spectral))
-
-            # Ignore high frequencies above the threshold.
-            spectral = [(f, c) for (f, c) in spectral if f < ignore_high_freq]
-
+            normalized_signal, spectral = analyze_channel_spectral(
+                signal, self._rate, saturate_value, ignore_high_freq,
+                self._chunk_secs)
             logging.info('Channel %d spectral after ignoring high frequencies '
                          'above %f:\n%s', channel_idx, ignore_high_freq,
                          pprint.pformat(spectral))
 
             try:
+                quality = None
                 if check_quality:
-                    quality = audio_quality_measurement.quality_measurement(
-                        signal=normalized_signal,
-                        rate=self._rate,
-                        dominant_frequency=spectral[0][0],
-                        block_size_secs=quality_params.block_size_secs,
-                        frequency_error_threshold=quality_params.
-                        frequency_error_threshold,
-                        delay_amplitude_threshold=quality_params.
-                        delay_amplitude_threshold,
-                        noise_amplitude_threshold=quality_params.
-                        noise_amplitude_threshold,
-                        burst_amplitude_threshold=quality_params.
-                        burst_amplitude_threshold)
-
+                    quality = analyze_channel_quality(
+                        normalized_signal, self._rate, spectral[0][0],
+                        quality_params, self._chunk_secs)
                     logging.debug('Channel %d quality:\n%s', channel_idx,
                                   pprint.pformat(quality))
-                    self._quality_result.append(quality)
-                self._spectrals.append(spectral)
+                self.add_result(spectral, quality)
             except Exception as error:
                 logging.warning(
                     "Failed to analyze channel {} with error: {}".format(
                         channel_idx, error))
 
+    def add_result(self, spectral, quality=None):
+        """Adds the analysis result of the next channel.
+
+        Args:
+            spectral: The spectral analysis result of the channel.
+            quality: The quality measurement result of the channel, None if
+                     its quality is not checked.
+
+        """
+        if quality is not None:
+            self._quality_result.append(quality)
+        self._spectrals.append(spectral)
+
     def has_data(self):
         """Checks if data has been set.
 
@@ -426,7 +551,7 @@ class CheckQualityError(Exception):
     pass
 
 
-def read_audio_file(filename, channel, bit_width, rate):
+def read_audio_file(filename, channel, bit_width, rate, memmap=False):
     """Reads audio file.
 
     Args:
@@ -435,6 +560,7 @@ def read_audio_file(filename, channel, bit_width, rate):
         bit_width: For raw file. Bit width of a sample.
         rate: Sampling rate in samples per second. Example inputs: 44100,
         48000
+        memmap: Memory-maps the samples instead of reading them.
 
 
     Returns:
@@ -443,9 +569,13 @@ def read_audio_file(filename, channel, bit_width, rate):
 
     """
     if filename.endswith('.wav'):
-        wavefile = WaveFile(filename)
+        wavefile = WaveFile(filename, memmap=memmap)
         raw_data = wavefile.raw_data
         rate = wavefile.rate
+    elif filename.endswith('.raw') and memmap:
+        raw_data = audio_data.AudioRawData(
+            binary=None, channel=channel, sample_format='S%d_LE' % bit_width)
+        raw_data.read_file(filename)
     elif filename.endswith('.raw'):
         binary = None
         with open(filename, 'rb') as f:
@@ -505,6 +635,7 @@ def quality_analysis(
         quality_delay_amplitude_threshold=DEFAULT_DELAY_AMPLITUDE_THRESHOLD,
         quality_frequency_error_threshold=DEFAULT_FREQUENCY_ERROR_THRESHOLD,
         quality_noise_amplitude_threshold=DEFAULT_NOISE_AMPLITUDE_THRESHOLD,
+        chunk_secs=None,
 ):
     """ Runs various functions to measure audio quality base on user input.
 
@@ -529,12 +660,16 @@ def quality_analysis(
         threshold.
         quality_burst_amplitude_threshold: Input the burst aplitutde
         threshold.
+        chunk_secs: If set, memory-maps the file and analyzes it chunk by
+        chunk, reading this many seconds at a time. Use it for recordings
+        too long to fit in memory.
     """
     format = '%(asctime)-15s:%(levelname)s:%(pathname)s:%(lineno)d: %(message)s'
     logging.basicConfig(format=format, level=logging.INFO)
-    raw_data, rate = read_audio_file(filename, channel, bit_width, rate)
+    raw_data, rate = read_audio_file(
+        filename, channel, bit_width, rate, memmap=bool(chunk_secs))
 
-    checker = QualityChecker(raw_data, rate)
+    checker = QualityChecker(raw_data, rate, chunk_secs=chunk_secs)
 
     quality_params = get_quality_params(
         quality_block_size_secs, quality_frequency_error_threshold,
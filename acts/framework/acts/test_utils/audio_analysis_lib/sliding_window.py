@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""This module provides sliding window statistics over one-channel data.
+
+The window of index i covers [i - before, i + after) clipped to the data, so
+windows near the borders hold fewer samples. All windows are computed at once
+from one cumulative sum, in O(n) regardless of the window size.
+"""
+
+import numpy
+
+
+def _window_borders(length, before, after):
+    """Computes the clipped borders of the window of each index.
+
+    Args:
+        length: The number of samples.
+        before: The number of samples before the index in the window.
+        after: The number of samples from the index on in the window.
+
+    Returns:
+        A tuple of arrays (left_borders, right_borders), where the window of
+            index i is [left_borders[i], right_borders[i]).
+    """
+    index = numpy.arange(length)
+    left_borders = numpy.maximum(index - before, 0)
+    right_borders = numpy.minimum(index + after, length)
+    return left_borders, right_borders
+
+
+class SlidingWindows(object):
+    """Sliding window statistics of one array.
+
+    The cumulative sum of the array is computed once, so the statistics of
+    windows of several sizes come at the cost of indexing it.
+
+    Usage:
+        windows = SlidingWindows(amplitude)
+        left_average = windows.means(side_block_size, 1)
+        right_average = windows.means(0, side_block_size)
+
+    Attributes:
+        length: The number of samples.
+    """
+
+    def __init__(self, arr):
+        arr = numpy.asarray(arr, dtype=float)
+        self.length = len(arr)
+        self._cumulative_sum = numpy.concatenate(([0.0], numpy.cumsum(arr)))
+
+    def sums(self, before, after):
+        """For each index, finds the sum and size of its window.
+
+        Args:
+            before: The number of samples before the index in the window.
+            after: The number of samples from the index on in the window.
+
+        Returns:
+            A tuple of arrays (sums, counts).
+        """
+        left_borders, right_borders = _window_borders(self.length, before,
+                                                      after)
+        sums = (self._cumulative_sum[right_borders] -
+                self._cumulative_sum[left_borders])
+        return sums, right_borders - left_borders
+
+    def means(self, before, after):
+        """For each index, finds the average value of its window.
+
+        Args:
+            before: The number of samples before the index in the window.
+            after: The number of samples from the index on in the window.
+                Empty windows, i.e. before + after < 1, are not supported.
+
+        Returns:
+            An array of the average value of the window of each index.
+        """
+        if before + after < 1:
+            raise ValueError('The window must hold at least one sample.')
+        sums, counts = self.sums(before, after)
+        return sums / counts
+
+
+def strided_windows(arr, size, step=1):
+    """Views the windows of arr with the given size and step as rows.
+
+    The windows share the memory of arr, so no data is copied.
+
+    Args:
+        arr: The one-dimensional array to be viewed.
+        size: The number of samples in each window.
+        step: The number of samples between the starts of two windows.
+
+    Returns:
+        A read-only array of shape (count, size), where row i is
+            arr[i * step:i * step + size]. Windows which do not fit in arr
+            entirely are left out.
+    """
+    arr = numpy.asarray(arr)
+    count = max(0, (len(arr) - size) // step + 1)
+    return numpy.lib.stride_tricks.as_strided(
+        arr,
+        shape=(count, size),
+        strides=(arr.strides[0] * step, arr.strides[0]),
+        writeable=False)
@@ -230,19 +230,24 @@ def setup_multiple_devices_for_bt_test(android_devices):
             t.join()
 
         for a in android_devices:
-            d = a.droid
-            # TODO: Create specific RPC command to instantiate
-            # BluetoothConnectionFacade. This is just a workaround.
-            d.bluetoothStartConnectionStateChangeMonitor("")
-            setup_result = d.bluetoothSetLocalName(generate_id_by_size(4))
+            with a.droid.batch() as batch:
+                # TODO: Create specific RPC command to instantiate
+                # BluetoothConnectionFacade. This is just a workaround.
+                batch.bluetoothStartConnectionStateChangeMonitor("")
+                set_name_result = batch.bluetoothSetLocalName(
+                    generate_id_by_size(4))
+            setup_result = set_name_result.result()
             if not setup_result:
                 a.log.error("Failed to set device name.")
                 return setup_result
-            d.bluetoothDisableBLE()
-            bonded_devices = d.bluetoothGetBondedDevices()
-            for b in bonded_devices:
-                a.log.info("Removing bond for device {}".format(b['address']))
-                d.bluetoothUnbond(b['address'])
+            with a.droid.batch() as batch:
+                batch.bluetoothDisableBLE()
+                bonded_devices = batch.bluetoothGetBondedDevices()
+            with a.droid.batch() as batch:
+                for b in bonded_devices.result():
+                    a.log.info(
+                        "Removing bond for device {}".format(b['address']))
+                    batch.bluetoothUnbond(b['address'])
         for a in android_devices:
             a.adb.shell("setprop persist.bluetooth.btsnoopenable true")
             getprop_result = bool(
@@ -24,6 +24,7 @@ from acts import asserts
 from acts import base_test
 from acts import utils
 from acts.controllers import monsoon
+from acts.controllers.monsoon_lib import data_file
 from acts.test_utils.wifi import wifi_test_utils as wutils
 from acts.test_utils.wifi import wifi_power_test_utils as wputils
 
@@ -110,7 +111,12 @@ class PowerBaseTest(base_test.BaseTestClass):
         # Unpack the test/device specific parameters
         TEST_PARAMS = self.TAG + '_params'
         req_params = [TEST_PARAMS, 'custom_files']
-        self.unpack_userparams(req_params)
+        self.unpack_userparams(
+            req_params,
+            monsoon_reader_buffer_size=0,
+            monsoon_binary_data=False,
+            monsoon_stream_data=False)
+        self.mon.reader_buffer_size = self.monsoon_reader_buffer_size
         # Unpack the custom files based on the test configs
         for file in self.custom_files:
             if 'pass_fail_threshold_' + self.dut.model in file:
@@ -358,7 +364,14 @@ class PowerBaseTest(base_test.BaseTestClass):
 
         tag = '{}_{}_{}'.format(self.test_name, self.dut.model,
                                 self.dut.build_info['build_id'])
-        data_path = os.path.join(self.mon_info.data_path, '{}.txt'.format(tag))
+        # Streamed data is written in the binary format.
+        binary_data = self.monsoon_binary_data or self.monsoon_stream_data
+        if binary_data:
+            extension = data_file.FILE_EXTENSION
+        else:
+            extension = '.txt'
+        data_path = os.path.join(self.mon_info.data_path, tag + extension)
+        stream_path = data_path if self.monsoon_stream_data else None
         total_expected_samples = self.mon_info.freq * (
             self.mon_info.duration + self.mon_info.offset)
         min_required_samples = total_expected_samples * MIN_PERCENT_SAMPLE / 100
@@ -378,18 +391,30 @@ class PowerBaseTest(base_test.BaseTestClass):
                         format(retry_measure))
                     #Start the power measurement using monsoon
                     self.mon_info.dut.monsoon_usb_auto()
+                    if stream_path and os.path.exists(stream_path):
+                        # Drop the data streamed by a failed try.
+                        os.remove(stream_path)
                     result = self.mon_info.dut.measure_power(
                         self.mon_info.freq,
                         self.mon_info.duration,
                         tag=tag,
-                        offset=self.mon_info.offset)
+                        offset=self.mon_info.offset,
+                        stream_path=stream_path)
                     self.mon_info.dut.reconnect_dut()
                 # Reconnect to dut
                 else:
                     self.mon_info.dut.reconnect_dut()
                 # Reconnect and return measurement results if no error happens
                 avg_current = result.average_current
-                monsoon.MonsoonData.save_to_text_file([result], data_path)
+                if result.dropped_packets:
+                    self.log.warning('Monsoon lost at least {} packets'.format(
+                        result.dropped_packets))
+                # Streamed data is already saved in data_path.
+                if binary_data and not stream_path:
+                    monsoon.MonsoonData.save_to_binary_file([result],
+                                                            data_path)
+                elif not binary_data:
+                    monsoon.MonsoonData.save_to_text_file([result], data_path)
                 self.log.info('Power measurement done within {} try'.format(
                     retry_measure))
                 return data_path, avg_current
@@ -20,7 +20,6 @@
 import logging
 import os
 import re
-import shutil
 import traceback
 
 import acts.controllers.diag_logger
@@ -45,7 +44,6 @@ from acts.test_utils.tel.tel_test_utils import ensure_phones_idle
 from acts.test_utils.tel.tel_test_utils import print_radio_info
 from acts.test_utils.tel.tel_test_utils import reboot_device
 from acts.test_utils.tel.tel_test_utils import refresh_sl4a_session
-from acts.test_utils.tel.tel_test_utils import run_multithread_func
 from acts.test_utils.tel.tel_test_utils import setup_droid_properties
 from acts.test_utils.tel.tel_test_utils import set_phone_screen_on
 from acts.test_utils.tel.tel_test_utils import set_phone_silent_mode
@@ -357,21 +355,21 @@ class TelephonyBaseTest(BaseTestClass):
             return
         dev_num = getattr(self, "number_of_devices", None) or len(
             self.android_devices)
-        tasks = [(self._ad_take_bugreport, (ad, test_name, begin_time))
-                 for ad in self.android_devices[:dev_num]]
-        tasks.extend([(self._ad_take_extra_logs, (ad, test_name, begin_time))
-                      for ad in self.android_devices[:dev_num]])
-        run_multithread_func(self.log, tasks)
-        for ad in self.android_devices[:dev_num]:
-            if getattr(ad, "reboot_to_recover", False):
-                reboot_device(ad)
-                ad.reboot_to_recover = False
+        ads = self.android_devices[:dev_num]
+        futures = self._submit_bug_report(ads, test_name, begin_time)
+        # Devices to recover are rebooted once their logs are collected.
+        recovered_ads = [
+            ad for ad in ads if getattr(ad, "reboot_to_recover", False)
+        ]
+        self._get_diagnostics().wait([ad.serial for ad in recovered_ads])
+        self._wait_for_bug_report(ads)
+        for ad in recovered_ads:
+            reboot_device(ad)
+            ad.reboot_to_recover = False
         if not self.user_params.get("zip_log", False): return
         src_dir = os.path.join(self.log_path, test_name)
         file_name = "%s_%s" % (src_dir, begin_time)
-        self.log.info("Zip folder %s to %s.zip", src_dir, file_name)
-        shutil.make_archive(file_name, "zip", src_dir)
-        shutil.rmtree(src_dir)
+        self._get_diagnostics().compress(src_dir, file_name, after=futures)
 
     def _block_all_test_cases(self, tests):
         """Over-write _block_all_test_case in BaseTestClass."""
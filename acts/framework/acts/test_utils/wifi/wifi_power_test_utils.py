@@ -14,10 +14,15 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import json
 import logging
 import time
+
+import numpy as np
+
 from acts import utils
 from acts.controllers import monsoon
+from acts.controllers.monsoon_lib import envelope
 from acts.libs.proc import job
 from acts.controllers.ap_lib import bridge_interface as bi
 from acts.test_utils.wifi import wifi_test_utils as wutils
@@ -37,6 +42,35 @@ GET_FROM_PHONE = 'get_from_dut'
 GET_FROM_AP = 'get_from_ap'
 ENABLED_MODULATED_DTIM = 'gEnableModulatedDTIM='
 MAX_MODULATED_DTIM = 'gMaxLIModulatedDTIM='
+# Maximum number of points monsoon_data_plot shows at once.
+MAX_PLOT_POINTS = 5000
+# Maximum number of buckets of a level monsoon_data_plot embeds in the html
+# file, which keeps the file at a few MB. Finer levels are left out, so the
+# finest embedded level is the most detail zooming in can show.
+MAX_EMBEDDED_POINTS = 20000
+# Current percentiles saved in the summary of monsoon_data_plot.
+SUMMARY_PERCENTILES = [50, 90, 99]
+
+
+def _envelope_data(level, hz, begin=0, end=None):
+    """Returns the ColumnDataSource data of a monsoon_lib.envelope level.
+
+    Args:
+        level: An Envelope.
+        hz: The sample rate of the current data.
+        begin: The index of the first bucket to include.
+        end: The index after the last bucket to include. Defaults to all.
+    """
+    level = envelope.Envelope(level.bucket_size,
+                              *(array[begin:end] for array in level[1:]))
+    return dict(
+        x0=level.times.tolist(),
+        x1=(level.times + level.counts / hz).tolist(),
+        y0=(level.sums / level.counts).tolist(),
+        ymin=level.mins.tolist(),
+        ymax=level.maxs.tolist(),
+        sum=level.sums.tolist(),
+        count=level.counts.tolist())
 
 
 def monsoon_data_plot(mon_info, file_path, tag=""):
@@ -48,11 +82,21 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     bokeh callback java scripting is used. View a sample html output file:
     https://drive.google.com/open?id=0Bwp8Cq841VnpT2dGUUxLYWZvVjA
 
+    Instead of every sample, the plot holds the min/max/mean envelopes of
+    the current at a few levels of detail (see monsoon_lib.envelope). Levels
+    of up to MAX_EMBEDDED_POINTS buckets are embedded, and the plot shows the
+    buckets of the visible time range from the finest embedded level which
+    has at most MAX_PLOT_POINTS of them there, so zooming in shows more
+    detail. Statistics of selections are computed from the envelope sums, so
+    they are exact. A summary of the measurement is saved next to the plot
+    as JSON.
+
     Args:
         mon_info: obj with information of monsoon measurement, including
                   monsoon device object, measurement frequency, duration and
                   offset etc.
-        file_path: the path to the monsoon log file with current data
+        file_path: the path to the monsoon log file with current data, in
+                   text or binary format
 
     Returns:
         plot: the plotting object of bokeh, optional, will be needed if multiple
@@ -64,23 +108,24 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     log = logging.getLogger()
     log.info("Plot the power measurement data")
     #Get results as monsoon data object from the input file
-    results = monsoon.MonsoonData.from_text_file(file_path)
-    #Decouple current and timestamp data from the monsoon object
-    current_data = []
-    timestamps = []
+    results = monsoon.MonsoonData.from_file(file_path)
+    #Decouple current data from the monsoon object, in mA
     voltage = results[0].voltage
-    [current_data.extend(x.data_points) for x in results]
-    [timestamps.extend(x.timestamps) for x in results]
-    period = 1 / float(mon_info.freq)
-    time_relative = [x * period for x in range(len(current_data))]
+    current_data = np.concatenate([x.data_points for x in results]) * 1000
+    hz = float(mon_info.freq)
     #Calculate the average current for the test
-    current_data = [x * 1000 for x in current_data]
-    avg_current = sum(current_data) / len(current_data)
-    color = ['navy'] * len(current_data)
+    avg_current = float(np.mean(current_data, dtype=np.float64))
+    levels = envelope.select_levels(
+        envelope.build_pyramid(current_data, hz), MAX_EMBEDDED_POINTS)
 
     #Preparing the data and source link for bokehn java callback
+    shown, begin, end = envelope.select_window(
+        levels, 0, len(current_data) / hz, MAX_PLOT_POINTS)
     source = ColumnDataSource(
-        data=dict(x0=time_relative, y0=current_data, color=color))
+        data=_envelope_data(levels[shown], hz, begin, end))
+    level_sources = [
+        ColumnDataSource(data=_envelope_data(level, hz)) for level in levels
+    ]
     s2 = ColumnDataSource(
         data=dict(
             z0=[mon_info.duration],
@@ -92,7 +137,8 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     columns = [
         TableColumn(field='z0', title='Total Duration (s)'),
         TableColumn(field='y0', title='Average Current (mA)'),
-        TableColumn(field='x0', title='Average Power (4.2v) (mW)'),
+        TableColumn(
+            field='x0', title='Average Power ({}v) (mW)'.format(voltage)),
         TableColumn(field='z1', title='Average Energy (mW*s)'),
         TableColumn(field='z2', title='Normalized Average Energy (mA*s)')
     ]
@@ -101,6 +147,8 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
 
     plot_title = file_path[file_path.rfind('/') + 1:-4] + tag
     output_file("%s/%s.html" % (mon_info.data_path, plot_title))
+    _save_monsoon_summary(results, current_data, hz, "%s/%s_summary.json" %
+                          (mon_info.data_path, plot_title))
     TOOLS = ('box_zoom,box_select,pan,crosshair,redo,undo,reset,hover,save')
     # Create a new plot with the datatable above
     plot = figure(
@@ -111,50 +159,78 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
         output_backend="webgl")
     plot.add_tools(bokeh_tools.WheelZoomTool(dimensions="width"))
     plot.add_tools(bokeh_tools.WheelZoomTool(dimensions="height"))
+    plot.segment(
+        'x0', 'ymin', 'x0', 'ymax', source=source, color='navy', alpha=0.3)
     plot.line('x0', 'y0', source=source, line_width=2)
-    plot.circle('x0', 'y0', source=source, size=0.5, fill_color='color')
+    plot.circle('x0', 'y0', source=source, size=0.5)
     plot.xaxis.axis_label = 'Time (s)'
     plot.yaxis.axis_label = 'Current (mA)'
     plot.title.text_font_size = {'value': '15pt'}
 
-    #Callback Java scripting
+    #Callback Java scripting to show the visible buckets of the finest level
+    #fitting the view, as envelope.select_window does
+    level_args = dict(('level%d' % i, level_source)
+                      for i, level_source in enumerate(level_sources))
+    plot.x_range.callback = CustomJS(
+        args=dict(source=source, **level_args),
+        code="""
+    var levels = [%s];
+    var start = cb_obj.get('start');
+    var end = cb_obj.get('end');
+    function bisect(times, x, right) {
+      var lo = 0, hi = times.length;
+      while (lo < hi) {
+        var mid = (lo + hi) >> 1;
+        if (times[mid] < x || (right && times[mid] == x)) {lo = mid + 1;}
+        else {hi = mid;}
+      }
+      return lo;
+    }
+    var chosen, begin, stop;
+    for (var i = 0; i < levels.length; i++) {
+      var times = levels[i].get('data')['x0'];
+      chosen = i;
+      begin = Math.max(bisect(times, start, true) - 1, 0);
+      stop = Math.max(bisect(times, end, false), begin);
+      if (stop - begin <= %d) {break;}
+    }
+    var level_data = levels[chosen].get('data');
+    var data = {};
+    for (var key in level_data) {
+      data[key] = level_data[key].slice(begin, stop);
+    }
+    source.set('data', data);
+    source.trigger('change');
+    """ % (', '.join('level%d' % i for i in range(len(level_sources))),
+           MAX_PLOT_POINTS))
+
+    #Callback Java scripting for the statistics of the selected range
     source.callback = CustomJS(
         args=dict(mytable=dt),
         code="""
     var inds = cb_obj.get('selected')['1d'].indices;
     var d1 = cb_obj.get('data');
     var d2 = mytable.get('source').get('data');
-    ym = 0
-    ts = 0
-    d2['x0'] = []
-    d2['y0'] = []
-    d2['z1'] = []
-    d2['z2'] = []
-    d2['z0'] = []
-    min=max=d1['x0'][inds[0]]
     if (inds.length==0) {return;}
-    for (i = 0; i < inds.length; i++) {
-    ym += d1['y0'][inds[i]]
-    d1['color'][inds[i]] = "red"
-    if (d1['x0'][inds[i]] < min) {
-      min = d1['x0'][inds[i]]}
-    if (d1['x0'][inds[i]] > max) {
-      max = d1['x0'][inds[i]]}
+    var total = 0
+    var count = 0
+    var min = d1['x0'][inds[0]]
+    var max = d1['x1'][inds[0]]
+    for (var i = 0; i < inds.length; i++) {
+      total += d1['sum'][inds[i]]
+      count += d1['count'][inds[i]]
+      min = Math.min(min, d1['x0'][inds[i]])
+      max = Math.max(max, d1['x1'][inds[i]])
     }
-    ym /= inds.length
-    ts = max - min
-    dx0 = Math.round(ym*4.2*100.0)/100.0
-    dy0 = Math.round(ym*100.0)/100.0
-    dz1 = Math.round(ym*4.2*ts*100.0)/100.0
-    dz2 = Math.round(ym*ts*100.0)/100.0
-    dz0 = Math.round(ts*1000.0)/1000.0
-    d2['z0'].push(dz0)
-    d2['x0'].push(dx0)
-    d2['y0'].push(dy0)
-    d2['z1'].push(dz1)
-    d2['z2'].push(dz2)
+    var ym = total / count
+    var ts = max - min
+    d2['z0'] = [Math.round(ts*1000.0)/1000.0]
+    d2['x0'] = [Math.round(ym*%s*100.0)/100.0]
+    d2['y0'] = [Math.round(ym*100.0)/100.0]
+    d2['z1'] = [Math.round(ym*%s*ts*100.0)/100.0]
+    d2['z2'] = [Math.round(ym*ts*100.0)/100.0]
     mytable.trigger('change');
-    """)
+    """ % (voltage, voltage))
 
     #Layout the plot and the datatable bar
     l = layout([[dt], [plot]])
@@ -162,6 +238,35 @@ def monsoon_data_plot(mon_info, file_path, tag=""):
     return [plot, dt]
 
 
+def _save_monsoon_summary(results, current_data, hz, summary_path):
+    """Saves the summary statistics of a measurement as JSON.
+
+    Args:
+        results: The MonsoonData objects of the measurement.
+        current_data: The current of all the results, in mA.
+        hz: The sample rate of the current data.
+        summary_path: The path of the JSON file to write.
+    """
+    data = monsoon.MonsoonData(current_data / 1000, np.zeros(
+        len(current_data)), hz, results[0].voltage)
+    summary = {
+        'samples': len(current_data),
+        'duration_s': len(current_data) / hz,
+        'voltage_v': data.voltage,
+        'average_current_ma': data.average_current,
+        'average_power_mw': data.total_power,
+        'min_current_ma': float(current_data.min()),
+        'max_current_ma': float(current_data.max()),
+        'dropped_packets': sum(x.dropped_packets for x in results)
+    }
+    for percentile, value in zip(
+            SUMMARY_PERCENTILES,
+            data.get_percentiles(SUMMARY_PERCENTILES) * 1000):
+        summary['p%s_current_ma' % percentile] = float(value)
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+
+
 def change_dtim(ad, gEnableModulatedDTIM, gMaxLIModulatedDTIM=10):
     """Function to change the DTIM setting in the phone.
 
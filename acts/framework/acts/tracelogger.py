@@ -14,49 +14,91 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import inspect
+import logging
 import os
+import sys
 
 
 class TraceLogger():
-    def __init__(self, logger):
+    """A logger wrapper that appends the callers of each log call.
+
+    The callers are read from the frames of the interpreter stack, so no
+    source file is read. Nothing is done for levels that are disabled.
+
+    Attributes:
+        trace_depths: A dict of log level => number of calling frames to
+            append to messages of that level.
+    """
+
+    DEFAULT_TRACE_DEPTHS = {
+        logging.DEBUG: 3,
+        logging.INFO: 1,
+        logging.WARNING: 1,
+        logging.ERROR: 3,
+    }
+
+    def __init__(self, logger, trace_depth=None):
+        """Creates a TraceLogger.
+
+        Args:
+            logger: The logger or LoggerAdapter to log to.
+            trace_depth: The number of calling frames appended to every
+                message. Defaults to 3 for debug and error messages, and 1
+                for the others.
+        """
         self._logger = logger
+        if trace_depth is None:
+            self.trace_depths = dict(TraceLogger.DEFAULT_TRACE_DEPTHS)
+        else:
+            self.trace_depths = dict.fromkeys(
+                TraceLogger.DEFAULT_TRACE_DEPTHS, trace_depth)
 
     @staticmethod
-    def _get_trace_info(level=1):
-        # We want the stack frame above this and above the error/warning/info
-        inspect_stack = inspect.stack()
+    def _get_trace_info(level=1, offset=2):
+        """Returns the [file:function:line] of the calling frames.
+
+        Args:
+            level: The number of frames to describe.
+            offset: The number of frames between this call and the first
+                frame to describe. By default, the frame above the caller.
+        """
+        try:
+            frame = sys._getframe(offset)
+        except ValueError:
+            return ""
         trace_info = ""
-        for i in range(level):
-            try:
-                stack_frames = inspect_stack[2 + i]
-                info = inspect.getframeinfo(stack_frames[0])
-                trace_info = "%s[%s:%s:%s]" % (trace_info,
-                                               os.path.basename(info.filename),
-                                               info.function, info.lineno)
-            except IndexError:
+        for _ in range(level):
+            if frame is None:
                 break
+            code = frame.f_code
+            trace_info = "%s[%s:%s:%s]" % (trace_info,
+                                           os.path.basename(code.co_filename),
+                                           code.co_name, frame.f_lineno)
+            frame = frame.f_back
         return trace_info
 
+    def _log(self, level, log_method, msg, args, kwargs):
+        if not self._logger.isEnabledFor(level):
+            return
+        # Skip this frame and the frame of debug/info/etc.
+        trace_info = TraceLogger._get_trace_info(
+            level=self.trace_depths[level], offset=3)
+        log_method("%s %s" % (msg, trace_info), *args, **kwargs)
+
     def debug(self, msg, *args, **kwargs):
-        trace_info = TraceLogger._get_trace_info(level=3)
-        self._logger.debug("%s %s" % (msg, trace_info), *args, **kwargs)
+        self._log(logging.DEBUG, self._logger.debug, msg, args, kwargs)
 
     def error(self, msg, *args, **kwargs):
-        trace_info = TraceLogger._get_trace_info(level=3)
-        self._logger.error("%s %s" % (msg, trace_info), *args, **kwargs)
+        self._log(logging.ERROR, self._logger.error, msg, args, kwargs)
 
     def warn(self, msg, *args, **kwargs):
-        trace_info = TraceLogger._get_trace_info(level=1)
-        self._logger.warn("%s %s" % (msg, trace_info), *args, **kwargs)
+        self._log(logging.WARNING, self._logger.warn, msg, args, kwargs)
 
     def warning(self, msg, *args, **kwargs):
-        trace_info = TraceLogger._get_trace_info(level=1)
-        self._logger.warning("%s %s" % (msg, trace_info), *args, **kwargs)
+        self._log(logging.WARNING, self._logger.warning, msg, args, kwargs)
 
     def info(self, msg, *args, **kwargs):
-        trace_info = TraceLogger._get_trace_info(level=1)
-        self._logger.info("%s %s" % (msg, trace_info), *args, **kwargs)
+        self._log(logging.INFO, self._logger.info, msg, args, kwargs)
 
     def __getattr__(self, name):
         return getattr(self._logger, name)
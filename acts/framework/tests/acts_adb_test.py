@@ -17,6 +17,7 @@
 import unittest
 import mock
 from acts.controllers import adb
+from acts.controllers.adb_lib import adb_client
 
 
 class MockJob(object):
@@ -67,6 +68,114 @@ class ADBTest(unittest.TestCase):
         with mock.patch('acts.libs.proc.job.run', return_value=mock_job):
             MockAdbProxy()._exec_cmd(cmd)
 
+    def test_shell_uses_persistent_shell(self):
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SOME_SERIAL'
+        proxy._persistent_shell = mock.Mock()
+        proxy._persistent_shell.try_run.return_value = MockJob(
+            exit_status=0, stdout='FEEDACAB')
+        with mock.patch('acts.libs.proc.job.run') as job_run:
+            self.assertEqual(proxy.shell('SOME_SHELL_CMD'), 'FEEDACAB')
+        self.assertFalse(job_run.called)
+
+    def test_shell_falls_back_when_persistent_shell_busy(self):
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SOME_SERIAL'
+        proxy._persistent_shell = mock.Mock()
+        proxy._persistent_shell.try_run.return_value = None
+        mock_job = MockJob(exit_status=0, stdout='FEEDACAB')
+        with mock.patch('acts.libs.proc.job.run', return_value=mock_job):
+            self.assertEqual(proxy.shell('SOME_SHELL_CMD'), 'FEEDACAB')
+
+    def test_shell_persistent_shell_device_not_found(self):
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SOME_SERIAL'
+        proxy._persistent_shell = mock.Mock()
+        proxy._persistent_shell.try_run.return_value = MockJob(
+            exit_status=1, stderr='error: device not found')
+        with self.assertRaises(adb.AdbError):
+            proxy.shell('SOME_SHELL_CMD')
+
+    def test_shell_uses_adb_client(self):
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SOME_SERIAL'
+        proxy._adb_client = mock.Mock()
+        proxy._adb_client.shell.return_value = MockJob(
+            exit_status=0, stdout='FEEDACAB')
+        with mock.patch('acts.libs.proc.job.run') as job_run:
+            self.assertEqual(proxy.shell('SOME_SHELL_CMD'), 'FEEDACAB')
+        self.assertFalse(job_run.called)
+
+    def test_adb_client_error_falls_back_to_binary(self):
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SOME_SERIAL'
+        proxy._adb_client = mock.Mock()
+        proxy._adb_client.pull.side_effect = adb_client.AdbClientError()
+        mock_job = MockJob(exit_status=0, stdout='1 file pulled')
+        with mock.patch(
+                'acts.libs.proc.job.run', return_value=mock_job) as job_run:
+            self.assertEqual(proxy.pull('/sdcard/a /tmp'), '1 file pulled')
+        self.assertTrue(job_run.called)
+
+    def test_pull_with_options_uses_binary(self):
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SOME_SERIAL'
+        proxy._adb_client = mock.Mock()
+        mock_job = MockJob(exit_status=0, stdout='1 file pulled')
+        with mock.patch('acts.libs.proc.job.run', return_value=mock_job):
+            proxy.pull('-a /sdcard/a /tmp')
+        self.assertFalse(proxy._adb_client.pull.called)
+
+    def test_push_with_options_uses_transfer_timeout(self):
+        proxy = MockAdbProxy()
+        proxy.adb_str = 'adb -s SOME_SERIAL'
+        proxy._adb_client = mock.Mock()
+        mock_job = MockJob(exit_status=0, stdout='1 file pushed')
+        with mock.patch(
+                'acts.libs.proc.job.run', return_value=mock_job) as job_run:
+            proxy.push('--sync', '/tmp/a', '/sdcard')
+        self.assertFalse(proxy._adb_client.push.called)
+        self.assertEqual(job_run.call_args[1]['timeout'],
+                         adb.DEFAULT_ADB_PULL_TIMEOUT)
+
+    def test_getprop_caches_read_only_properties(self):
+        proxy = MockAdbProxy()
+        with mock.patch.object(
+                proxy, '_shell', return_value='value') as shell:
+            self.assertEqual(proxy.getprop('ro.build.id'), 'value')
+            self.assertEqual(proxy.getprop('ro.build.id'), 'value')
+            proxy.getprop('sys.boot_completed')
+            proxy.getprop('sys.boot_completed')
+        self.assertEqual(shell.call_count, 3)
+
+    def test_prefetch_properties(self):
+        proxy = MockAdbProxy()
+        output = '[ro.build.id]: [ABC]\n[sys.boot_completed]: [1]'
+        with mock.patch.object(proxy, '_shell', return_value=output):
+            proxy.prefetch_properties()
+        with mock.patch.object(proxy, '_shell') as shell:
+            self.assertEqual(proxy.getprop('ro.build.id'), 'ABC')
+        self.assertFalse(shell.called)
+
+    def test_root_clears_cached_user_id(self):
+        proxy = MockAdbProxy()
+        with mock.patch.object(proxy, '_shell', return_value='2000'):
+            self.assertFalse(proxy.is_root())
+        with mock.patch.object(proxy, '_shell', return_value='0'):
+            self.assertFalse(proxy.is_root())
+            with mock.patch.object(proxy, '_exec_adb_cmd'):
+                proxy.root()
+            self.assertTrue(proxy.is_root())
+
+    def test_wait_for_device_clears_cached_user_id(self):
+        proxy = MockAdbProxy()
+        with mock.patch.object(proxy, '_shell', return_value='0'):
+            self.assertTrue(proxy.is_root())
+        with mock.patch.object(proxy, '_exec_adb_cmd'):
+            proxy.wait_for_device()
+        with mock.patch.object(proxy, '_shell', return_value='2000'):
+            self.assertFalse(proxy.is_root())
+
 
 if __name__ == "__main__":
     unittest.main()
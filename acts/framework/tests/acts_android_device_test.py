@@ -23,6 +23,7 @@ import unittest
 
 from acts import logger
 from acts.controllers import android_device
+from acts.controllers.adb_lib import logcat_capture
 
 # Mock log path for a test run.
 MOCK_LOG_PATH = "/tmp/logs/MockTest/xx-xx-xx_xx-xx-xx/"
@@ -32,6 +33,10 @@ MOCK_ADB_LOGCAT_BEGIN_TIME = "1970-01-02 21:03:20.123"
 MOCK_ADB_LOGCAT_END_TIME = "1970-01-02 21:22:02.000"
 MOCK_ADB_EPOCH_BEGIN_TIME = 191000123
 
+# Mock lines of a standing logcat capture and of the device buffers.
+MOCK_CAPTURED_LOG_LINE = "1970-01-02 21:03:20.123   968  1001 D Tag: captured"
+MOCK_DEVICE_LOG_LINE = "1970-01-02 21:00:00.000   968  1001 D Tag: device"
+
 MOCK_SERIAL = 1
 MOCK_RELEASE_BUILD_ID = "ABC1.123456.007"
 MOCK_DEV_BUILD_ID = "ABC-MR1"
@@ -241,6 +246,38 @@ class ActsAndroidDeviceTest(unittest.TestCase):
         ads[1].clean_up.assert_called_once_with()
         ads[2].clean_up.assert_called_once_with()
 
+    @mock.patch.object(android_device, "BRING_UP_HOST_CONCURRENCY", new=1)
+    def test_start_services_on_ads_skips_after_failure(self):
+        """Makes sure devices are not brought up after one failed, and only
+        the started ones get cleaned up.
+        """
+        msg = "Some error happened."
+        ads = get_mock_ads(3)
+        ads[0].start_services = mock.MagicMock(
+            side_effect=android_device.AndroidDeviceError(msg))
+        with self.assertRaisesRegex(android_device.AndroidDeviceError, msg):
+            android_device._start_services_on_ads(ads)
+        started = [ad for ad in ads if ad.ensure_screen_on.called]
+        self.assertEqual(len(started), 1)
+        for ad in ads:
+            self.assertEqual(ad.clean_up.called, ad in started)
+
+    @mock.patch.object(android_device, "_start_services_on_ads")
+    @mock.patch.object(android_device, "list_adb_devices")
+    @mock.patch.object(android_device, "get_instances")
+    def test_create_lists_local_devices_once(self, get_instances_mock,
+                                             list_mock, start_mock):
+        """Makes sure local devices are checked with a single adb call."""
+        ads = get_mock_ads(3)
+        for ad in ads:
+            ad._ssh_connection = None
+        get_instances_mock.return_value = ads
+        list_mock.return_value = [0, 1, 2]
+        android_device.create(["0", "1", "2"])
+        list_mock.assert_called_once_with()
+        self.assertFalse(ads[0].is_connected.called)
+        start_mock.assert_called_once_with(ads)
+
     # Tests for android_device.AndroidDevice class.
     # These tests mock out any interaction with the OS and real android device
     # in AndroidDeivce.
@@ -264,6 +301,28 @@ class ActsAndroidDeviceTest(unittest.TestCase):
                                    "AndroidDevice%s" % MOCK_SERIAL)
         self.assertEqual(ad.log_path, expected_lp)
 
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    def test_AndroidDevice_waits_for_tasks_before_use(self, MockFastboot,
+                                                      MockAdbProxy):
+        """Verifies the task waiter is called before adb and SL4A are used.
+        """
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        waiter = mock.Mock()
+        ad.set_task_waiter(waiter)
+
+        ad.adb.getprop("ro.build.id")
+        ad.droid
+
+        self.assertEqual(waiter.call_count, 2)
+        ad.set_task_waiter(None)
+        ad.adb
+        self.assertEqual(waiter.call_count, 2)
+
     @mock.patch(
         'acts.controllers.adb.AdbProxy',
         return_value=MockAdbProxy(MOCK_SERIAL))
@@ -504,6 +563,65 @@ class ActsAndroidDeviceTest(unittest.TestCase):
         ad.adb.return_value = "bad return value error"
         self.assertEqual(None, ad.get_package_pid("some_package"))
 
+    def _start_logcat_capture(self, ad):
+        """Gives ad a mock standing logcat capture starting at
+        MOCK_ADB_EPOCH_BEGIN_TIME.
+        """
+        ad.adb_logcat_process = "process"
+        ad._logcat_capture = mock.Mock()
+        ad._logcat_capture.first_timestamp.return_value = (
+            logcat_capture.timestamp_from_epoch(MOCK_ADB_EPOCH_BEGIN_TIME))
+        ad._logcat_capture.wait_for_timestamp.return_value = True
+        ad._logcat_capture.read_range.return_value = [
+            MOCK_CAPTURED_LOG_LINE + "\n"
+        ]
+
+        def logcat(param, ignore_status=False):
+            if param.startswith("-b all -t 1"):
+                return MOCK_CAPTURED_LOG_LINE
+            return MOCK_DEVICE_LOG_LINE
+
+        ad.adb = mock.Mock()
+        ad.adb.logcat.side_effect = logcat
+
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    @mock.patch('acts.utils._assert_subprocess_running')
+    def test_search_logcat_reads_capture(self, check_proc_mock, FastbootProxy,
+                                         MockAdbProxy):
+        """Verifies that a search from a time the standing logcat capture
+        covers is served from the capture.
+        """
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        self._start_logcat_capture(ad)
+        result = ad.search_logcat("Tag", MOCK_ADB_EPOCH_BEGIN_TIME)
+        self.assertEqual([log["log_message"] for log in result],
+                         [MOCK_CAPTURED_LOG_LINE])
+
+    @mock.patch(
+        'acts.controllers.adb.AdbProxy',
+        return_value=MockAdbProxy(MOCK_SERIAL))
+    @mock.patch(
+        'acts.controllers.fastboot.FastbootProxy',
+        return_value=MockFastbootProxy(MOCK_SERIAL))
+    @mock.patch('acts.utils._assert_subprocess_running')
+    def test_search_logcat_before_capture_searches_device(
+            self, check_proc_mock, FastbootProxy, MockAdbProxy):
+        """Verifies that a search from before the standing logcat capture
+        started, or without a begin time, searches the device buffers.
+        """
+        ad = android_device.AndroidDevice(serial=MOCK_SERIAL)
+        self._start_logcat_capture(ad)
+        for begin_time in (MOCK_ADB_EPOCH_BEGIN_TIME - 1000, None):
+            result = ad.search_logcat("Tag", begin_time)
+            self.assertEqual([log["log_message"] for log in result],
+                             [MOCK_DEVICE_LOG_LINE])
+        self.assertFalse(ad._logcat_capture.read_range.called)
+
 
 if __name__ == "__main__":
     unittest.main()
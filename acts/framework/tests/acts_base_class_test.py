@@ -15,12 +15,16 @@
 #   limitations under the License.
 
 import mock
+import shutil
+import tempfile
+import threading
 import unittest
 
 from acts import asserts
 from acts import base_test
 from acts import signals
 from acts import test_runner
+from acts.libs.diagnostics import collector
 
 MSG_EXPECTED_EXCEPTION = "This is an expected exception."
 MSG_EXPECTED_TEST_FAILURE = "This is an expected test failure."
@@ -65,6 +69,42 @@ class ActsBaseClassTest(unittest.TestCase):
         self.assertIsNone(actual_record.details)
         self.assertIsNone(actual_record.extras)
 
+    def test_setup_proceeds_while_other_device_collects(self):
+        """Verifies that only the devices used wait for their bug reports."""
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir)
+        idle_ad = mock.MagicMock(serial='idle', skip_sl4a=False)
+        busy_ad = mock.MagicMock(serial='busy', skip_sl4a=False)
+        self.mock_test_cls_configs['android_devices'] = [idle_ad, busy_ad]
+        self.mock_test_cls_configs['user_params']['async_bug_report'] = True
+        bt_cls = base_test.BaseTestClass(self.mock_test_cls_configs)
+        bt_cls._diagnostics = collector.DiagnosticsCollector(
+            lock_dir=lock_dir)
+        release = threading.Event()
+
+        def take_bugreport(ad, *_):
+            if ad is busy_ad:
+                release.wait()
+
+        with mock.patch.object(bt_cls, '_ad_take_extra_logs'), \
+                mock.patch.object(bt_cls, '_ad_take_bugreport',
+                                  side_effect=take_bugreport):
+            bt_cls._take_bug_report('test_something', 0)
+            busy_ad.set_task_waiter.assert_called_once_with(mock.ANY)
+            busy_ad.droid.logV.reset_mock()
+
+            self.assertTrue(bt_cls._setup_test('test_other'))
+
+            self.assertTrue(idle_ad.droid.logV.called)
+            self.assertFalse(busy_ad.droid.logV.called)
+            self.assertTrue(bt_cls._diagnostics.is_busy('busy'))
+            threading.Timer(0.1, release.set).start()
+            # The device waits for its collection before its next use.
+            busy_ad.set_task_waiter.call_args[0][0]()
+            self.assertTrue(release.is_set())
+            bt_cls._shutdown_diagnostics()
+        busy_ad.set_task_waiter.assert_called_with(None)
+
     def test_self_tests_list(self):
         class MockBaseTest(base_test.BaseTestClass):
             def __init__(self, controllers):
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import io
+import mock
+import os
+import shutil
+import struct
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from acts.controllers import monsoon
+
+
+def frame_packet(packet_type, seq, records):
+    """Frames a packet with its length and checksum, as sent on serial."""
+    body = struct.pack('BBBB', 0x20 | seq, packet_type, 0, 0)
+    for record in records:
+        body += struct.pack('>hhhh', *record)
+    body += b'\x00'
+    data_len = len(body) + 1
+    checksum = (data_len + sum(body)) % 256
+    return bytes([data_len]) + body + bytes([checksum])
+
+
+class FakeSerial(io.BytesIO):
+    """A serial port replaying the bytes it was created with."""
+    name = '/dev/fake'
+    timeout = 0.1
+
+    @property
+    def in_waiting(self):
+        return len(self.getbuffer()) - self.tell()
+
+    def read(self, size):
+        data = super().read(size)
+        if not data:
+            time.sleep(self.timeout)
+        return data
+
+
+class MonsoonProxyTest(unittest.TestCase):
+    """Tests the monsoon.MonsoonProxy class."""
+
+    def make_proxy(self, *packets):
+        with mock.patch('serial.Serial') as serial_class:
+            serial_class.return_value = FakeSerial(b''.join(packets))
+            return monsoon.MonsoonProxy(device='/dev/fake')
+
+    def test_collect_data_array_calibrates_samples(self):
+        """Tests that data packets are calibrated with the last calibration."""
+        proxy = self.make_proxy(
+            frame_packet(1, 0, [(0, 0, 0, 0), (1, 0, 0, 0)]),
+            frame_packet(2, 1, [(332, 0, 0, 0), (289, 0, 0, 0)]),
+            frame_packet(0, 2, [(100, 0, 0, 0), (11, 0, 0, 0)]))
+
+        samples = proxy.CollectDataArray()
+
+        np.testing.assert_allclose(samples, [100 * 0.0001, (10 - 1) * 0.01])
+
+    def test_collect_data_array_batches_packets(self):
+        """Tests that packets are read until min_samples are collected."""
+        proxy = self.make_proxy(
+            frame_packet(1, 0, [(0, 0, 0, 0), (1, 0, 0, 0)]),
+            frame_packet(2, 1, [(332, 0, 0, 0), (289, 0, 0, 0)]),
+            frame_packet(0, 2, [(100, 0, 0, 0)] * 3),
+            frame_packet(1, 3, [(10, 0, 0, 0), (1, 0, 0, 0)]),
+            frame_packet(0, 4, [(110, 0, 0, 0)] * 3))
+
+        samples = proxy.CollectDataArray(min_samples=4)
+
+        # The second calibration changes the fine scale, not earlier samples.
+        np.testing.assert_allclose(samples,
+                                   [0.01] * 3 + [0.0332 / 322 * 100] * 3)
+
+    def test_collect_data_returns_list(self):
+        """Tests that CollectData still returns a list of floats."""
+        proxy = self.make_proxy(
+            frame_packet(1, 0, [(0, 0, 0, 0), (1, 0, 0, 0)]),
+            frame_packet(2, 1, [(332, 0, 0, 0), (289, 0, 0, 0)]),
+            frame_packet(0, 2, [(100, 0, 0, 0)]))
+
+        self.assertEqual(proxy.CollectData(), [0.01])
+
+    def test_collect_data_array_from_reader_thread(self):
+        """Tests that packets are read through the serial reader thread."""
+        proxy = self.make_proxy(
+            frame_packet(1, 0, [(0, 0, 0, 0), (1, 0, 0, 0)]),
+            frame_packet(2, 1, [(332, 0, 0, 0), (289, 0, 0, 0)]),
+            frame_packet(0, 2, [(100, 0, 0, 0)] * 3))
+
+        proxy.StartReader(buffer_size=16)
+        try:
+            samples = proxy.CollectDataArray(min_samples=3)
+        finally:
+            stalls = proxy.StopReader()
+
+        np.testing.assert_allclose(samples, [0.01] * 3)
+        self.assertGreater(stalls, 0)
+
+    def test_dropped_packets_are_counted(self):
+        """Tests that gaps in the sequence numbers are counted."""
+        proxy = self.make_proxy(
+            frame_packet(1, 1, [(0, 0, 0, 0), (1, 0, 0, 0)]),
+            frame_packet(2, 2, [(332, 0, 0, 0), (289, 0, 0, 0)]),
+            frame_packet(0, 5, [(100, 0, 0, 0)]))
+
+        proxy.CollectDataArray()
+
+        self.assertEqual(proxy.dropped_packets, 2)
+
+
+class MonsoonTest(unittest.TestCase):
+    """Tests the monsoon.Monsoon class."""
+
+    @mock.patch('acts.controllers.monsoon.MonsoonProxy')
+    def test_take_samples_averages_blocks(self, proxy_class):
+        """Tests that native samples are averaged down to sample_hz."""
+        proxy = proxy_class.return_value
+        proxy.GetVoltage.return_value = 4.2
+        proxy.GetStatus.return_value = {'sampleRate': 5}
+        proxy.CollectDataArray.side_effect = [
+            np.arange(i, i + 500, dtype=float) for i in range(0, 5000, 500)
+        ]
+        mon = monsoon.Monsoon(serial=1)
+
+        data = mon.take_samples(500, 20, sample_offset=5)
+
+        self.assertEqual(len(data._data_points), 25)
+        self.assertEqual(data._data_points[:2].tolist(), [4.5, 14.5])
+        self.assertEqual(data.offset, 5)
+        proxy.CollectDataArray.assert_called_with(min_samples=500)
+        self.assertFalse(proxy.StartReader.called)
+
+    @mock.patch('acts.controllers.monsoon.MonsoonProxy')
+    def test_take_samples_with_reader_thread(self, proxy_class):
+        """Tests that the reader thread runs while sampling."""
+        proxy = proxy_class.return_value
+        proxy.GetVoltage.return_value = 4.2
+        proxy.GetStatus.return_value = {'sampleRate': 5}
+        proxy.dropped_packets = 0
+        proxy.StopReader.return_value = 0
+
+        def collect_data_array(min_samples):
+            proxy.dropped_packets += 1
+            return np.ones(min_samples)
+
+        proxy.CollectDataArray.side_effect = collect_data_array
+        mon = monsoon.Monsoon(serial=1)
+        mon.reader_buffer_size = 1024
+
+        data = mon.take_samples(500, 100)
+
+        proxy.StartReader.assert_called_once_with(buffer_size=1024)
+        self.assertTrue(proxy.StopReader.called)
+        self.assertEqual(len(data), 100)
+        self.assertEqual(data.dropped_packets, 2)
+
+    @mock.patch('acts.controllers.monsoon.MonsoonProxy')
+    def test_take_samples_streams_to_file_and_listeners(self, proxy_class):
+        """Tests that batches are written to disk and published."""
+        proxy = proxy_class.return_value
+        proxy.GetVoltage.return_value = 4.2
+        proxy.GetStatus.return_value = {'sampleRate': 5}
+        proxy.dropped_packets = 0
+        proxy.StopReader.return_value = 0
+        proxy.CollectDataArray.side_effect = [
+            np.full(500, float(i)) for i in range(10)
+        ]
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        stream_path = os.path.join(tmp_dir, 'data.msd')
+        mon = monsoon.Monsoon(serial=1)
+        batches = []
+        mon.add_sample_listener(lambda c, t: batches.append(c.tolist()))
+        mon.add_sample_listener(mock.Mock(side_effect=ValueError()))
+
+        with mock.patch.object(monsoon, 'STREAM_CHUNK_SECONDS', .3):
+            data = mon.take_samples(
+                100, 100, sample_offset=0, stream_path=stream_path, tag='tag')
+
+        self.assertEqual(batches, [[float(i)] * 10 for i in range(10)])
+        self.assertEqual(data.tag, 'tag')
+        self.assertEqual(data.data_points.tolist(),
+                         [float(i) for i in range(10) for _ in range(10)])
+        self.assertIsInstance(data._data_points.base, np.memmap)
+        # The stream is written as a single record.
+        records = monsoon.data_file.read_records(stream_path)
+        self.assertEqual([header['count'] for header, _, _ in records], [100])
+        self.assertNotIn('streaming', records[0][0])
+        self.assertFalse(
+            os.path.exists(stream_path + monsoon.data_file.TIMESTAMPS_SUFFIX))
+
+
+class MonsoonDataTest(unittest.TestCase):
+    """Tests the monsoon.MonsoonData class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_data(self, tag='tag'):
+        data = monsoon.MonsoonData([0.5, 0.25, 0.125, 1.0], [10, 10, 11, 11],
+                                   2, 4.2, offset=1)
+        data.tag = tag
+        return data
+
+    def test_statistics(self):
+        """Tests the statistics properties skip the offset."""
+        data = self.make_data()
+
+        self.assertEqual(data.average_current, 458.333333)
+        self.assertEqual(data.total_charge, 0.190972)
+        self.assertEqual(data.total_power, 1924.999999)
+        self.assertEqual(len(data), 3)
+
+    def test_get_average_record(self):
+        """Tests the averages over the last n data points."""
+        data = self.make_data()
+
+        self.assertEqual(data.get_average_record(2), [0.25, 0.1875, 0.5625])
+
+    def test_update_offset_drops_cached_statistics(self):
+        """Tests that statistics follow the offset."""
+        data = self.make_data()
+        self.assertEqual(data.average_current, 458.333333)
+
+        data.update_offset(2)
+
+        self.assertEqual(data.average_current, 562.5)
+        self.assertEqual(data.get_percentiles(50), 0.5625)
+        with self.assertRaises(monsoon.MonsoonError):
+            data.update_offset(4)
+
+    def test_get_percentiles(self):
+        """Tests percentiles of the data points."""
+        data = self.make_data()
+
+        self.assertEqual(data.get_percentiles([0, 50, 100]).tolist(),
+                         [0.125, 0.25, 1.0])
+
+    def test_get_window_averages_and_energy(self):
+        """Tests that incomplete windows are left out."""
+        data = monsoon.MonsoonData([0.1, 0.3, 0.5, 0.7, 0.9], [0] * 5, 2, 2)
+
+        np.testing.assert_allclose(data.get_window_averages(1), [0.2, 0.6])
+        np.testing.assert_allclose(data.get_window_energy(1), [400, 1200])
+
+    def test_get_segments(self):
+        """Tests the data points and averages around events."""
+        data = monsoon.MonsoonData(list(range(10)), [0] * 10, 2, 2)
+
+        segments = data.get_segments([1, 3], before=0.5, after=1)
+
+        self.assertEqual(segments.tolist(), [[1, 2, 3], [5, 6, 7]])
+        np.testing.assert_allclose(
+            data.get_segment_averages([1, 3], before=0.5, after=1), [2, 6])
+        with self.assertRaises(monsoon.MonsoonError):
+            data.get_segments([4.5], before=0, after=1)
+
+    def test_get_data_with_timestamps(self):
+        """Tests that data points are paired with their timestamps."""
+        data = self.make_data()
+
+        self.assertEqual(data.get_data_with_timestamps(),
+                         [(10, 0.25), (11, 0.125), (11, 1.0)])
+
+    def test_binary_file_round_trip(self):
+        """Tests that data saved to a binary file is loaded back."""
+        file_path = os.path.join(self.tmp_dir, 'data.msd')
+        data = self.make_data()
+        data.dropped_packets = 3
+        monsoon.MonsoonData.save_to_binary_file([data, self.make_data('b')],
+                                                file_path)
+
+        results = monsoon.MonsoonData.from_binary_file(file_path)
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0].tag, 'tag')
+        self.assertEqual(results[1].tag, 'b')
+        self.assertEqual(results[0].dropped_packets, 3)
+        self.assertEqual(results[0].offset, 1)
+        self.assertEqual(results[0].hz, 2)
+        self.assertEqual(results[0].data_points.tolist(), [0.25, 0.125, 1.0])
+        self.assertEqual(results[0].timestamps.tolist(), [10, 11, 11])
+        self.assertEqual(str(results[0]), str(data))
+
+    def test_convert_text_file_to_binary(self):
+        """Tests that a text file is converted to an equivalent binary file."""
+        text_path = os.path.join(self.tmp_dir, 'data.txt')
+        binary_path = os.path.join(self.tmp_dir, 'data.msd')
+        monsoon.MonsoonData.save_to_text_file([self.make_data()], text_path)
+
+        monsoon.MonsoonData.convert_text_file_to_binary(text_path, binary_path)
+
+        text_results = monsoon.MonsoonData.from_file(text_path)
+        binary_results = monsoon.MonsoonData.from_file(binary_path)
+        self.assertEqual(len(binary_results), 1)
+        self.assertEqual(binary_results[0].average_current,
+                         text_results[0].average_current)
+        self.assertEqual(binary_results[0]._timestamps.tolist(),
+                         text_results[0]._timestamps.tolist())
+
+    def test_interrupted_stream_is_loaded(self):
+        """Tests that the complete chunks of an unclosed stream are loaded."""
+        file_path = os.path.join(self.tmp_dir, 'data.msd')
+        monsoon.MonsoonData.save_to_binary_file([self.make_data('a')],
+                                                file_path)
+        writer = monsoon.data_file.StreamWriter(
+            file_path, {
+                'hz': 2,
+                'voltage': 4.2,
+                'offset': 1,
+                'tag': 'tag',
+                'dropped_packets': 0
+            },
+            chunk_size=2)
+        writer.append([0.5, 0.25], [10, 10])
+        writer.header['dropped_packets'] = 1
+        writer.append([0.125, 1.0, 2.0], [11, 11, 11])
+        writer.append([3.0], [12])
+
+        results = monsoon.MonsoonData.from_binary_file(file_path)
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[1].data_points.tolist(),
+                         [0.25, 0.125, 1.0, 2.0])
+        self.assertEqual(results[1]._timestamps.tolist(), [10, 10, 11, 11, 11])
+        self.assertEqual(results[1].dropped_packets, 1)
+        self.assertEqual(writer.close(), (writer.offset, 6))
+        self.assertEqual(
+            monsoon.MonsoonData.from_binary_file(file_path)[1]
+            .data_points.tolist(), [0.25, 0.125, 1.0, 2.0, 3.0])
+
+    def test_invalid_binary_file_raises_monsoon_error(self):
+        """Tests that loading a text file as binary raises MonsoonError."""
+        file_path = os.path.join(self.tmp_dir, 'data.txt')
+        monsoon.MonsoonData.save_to_text_file([self.make_data()], file_path)
+
+        with self.assertRaises(monsoon.MonsoonError):
+            monsoon.MonsoonData.from_binary_file(file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
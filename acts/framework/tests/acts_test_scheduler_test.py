@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from acts import records
+from acts import test_scheduler
+
+PHONE_TESTBED = {'name': 'phone', 'AndroidDevice': ['serial1']}
+RVR_TESTBED = {
+    'name': 'rvr',
+    'AndroidDevice': '*',
+    'Attenuator': [{}, {}, {}, {}]
+}
+
+
+def _passed_result(test_cls_name):
+    record = records.TestResultRecord('test_something', test_cls_name)
+    record.test_begin()
+    record.test_pass()
+    result = records.TestResult()
+    result.add_record(record)
+    return result
+
+
+class TestSchedulerTest(unittest.TestCase):
+    """Tests the acts.test_scheduler module."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.history = test_scheduler.load_history(self.tmp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_longest_item_is_scheduled_first(self):
+        """Tests that items are handed out by decreasing past duration."""
+        self.history.record(('ShortTest', None), 10)
+        self.history.record(('LongTest', None), 100)
+        scheduler = test_scheduler.TestScheduler(
+            [('ShortTest', None), ('NewTest', None), ('LongTest', None)],
+            self.history)
+
+        order = [
+            scheduler.next_item(PHONE_TESTBED)[1][0] for _ in range(3)
+        ]
+
+        self.assertEqual(order, ['NewTest', 'LongTest', 'ShortTest'])
+
+    def test_incompatible_testbed_gets_no_item(self):
+        """Tests that requirements keep items off testbeds lacking them."""
+        scheduler = test_scheduler.TestScheduler(
+            [('WifiRvrTest', None), ('WifiTest', None)], self.history,
+            {'WifiRvr*': {'Attenuator': 4}})
+
+        self.assertEqual(scheduler.next_item(PHONE_TESTBED)[1][0], 'WifiTest')
+        self.assertIsNone(scheduler.next_item(PHONE_TESTBED))
+        self.assertEqual(scheduler.next_item(RVR_TESTBED)[1][0],
+                         'WifiRvrTest')
+
+    def test_unknown_device_count_is_compatible(self):
+        """Tests that "*" device configs satisfy any count."""
+        self.assertTrue(
+            test_scheduler.is_compatible({'AndroidDevice': 3}, RVR_TESTBED))
+        self.assertFalse(
+            test_scheduler.is_compatible({'AndroidDevice': 3}, PHONE_TESTBED))
+
+    def test_results_are_merged(self):
+        """Tests that results of all items end up in one TestResult."""
+        scheduler = test_scheduler.TestScheduler(
+            [('ATest', None), ('BTest', None), ('CTest', None)], self.history,
+            {'CTest': {'Monsoon': 1}})
+        a_id, _ = scheduler.next_item(PHONE_TESTBED)
+        b_id, _ = scheduler.next_item(RVR_TESTBED)
+
+        scheduler.complete(a_id, 5, _passed_result('ATest'))
+        scheduler.lost(b_id, 'Testbed rvr stopped.')
+        scheduler.skip_pending('No compatible testbed left to run on.')
+
+        self.assertTrue(scheduler.done)
+        self.assertEqual(len(scheduler.results.passed), 1)
+        self.assertEqual(len(scheduler.results.unknown), 1)
+        self.assertEqual(scheduler.results.skipped[0].test_class, 'CTest')
+
+    def test_requeued_item_is_handed_out_again(self):
+        """Tests that an item not started goes back in its place."""
+        self.history.record(('ShortTest', None), 10)
+        self.history.record(('LongTest', None), 100)
+        scheduler = test_scheduler.TestScheduler(
+            [('ShortTest', None), ('LongTest', None)], self.history)
+        long_id, _ = scheduler.next_item(RVR_TESTBED)
+
+        scheduler.requeue(long_id)
+
+        self.assertFalse(scheduler.done)
+        self.assertEqual(scheduler.next_item(PHONE_TESTBED),
+                         (long_id, ('LongTest', None)))
+        self.assertEqual(scheduler.next_item(PHONE_TESTBED)[1][0],
+                         'ShortTest')
+        self.assertEqual(len(scheduler.results.unknown), 0)
+
+    def test_history_is_saved_and_averaged(self):
+        """Tests that durations are kept across runs."""
+        self.history.record(('ATest', ['test_a']), 10)
+        self.history.record(('ATest', ['test_a']), 20)
+        self.history.save()
+
+        history = test_scheduler.load_history(self.tmp_dir)
+
+        self.assertEqual(history.get(('ATest', ['test_a'])), 15)
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(self.tmp_dir,
+                             test_scheduler.DURATIONS_FILE_NAME)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from acts import logger
+from acts import tracelogger
+
+
+def log_info(trace_logger):
+    trace_logger.info('message')
+
+
+class ActsTraceLoggerTest(unittest.TestCase):
+    """Verifies code in acts.tracelogger module.
+    """
+
+    def test_trace_info_names_the_caller(self):
+        base_logger = mock.Mock()
+        log_info(tracelogger.TraceLogger(base_logger))
+
+        message = base_logger.info.call_args[0][0]
+        self.assertEqual(
+            message, 'message [acts_tracelogger_test.py:log_info:30]')
+
+    def test_trace_depth_adds_callers(self):
+        base_logger = mock.Mock()
+        log_info(tracelogger.TraceLogger(base_logger, trace_depth=2))
+
+        message = base_logger.info.call_args[0][0]
+        self.assertTrue(
+            message.startswith(
+                'message [acts_tracelogger_test.py:log_info:30]'
+                '[acts_tracelogger_test.py:test_trace_depth_adds_callers:'))
+
+    def test_disabled_level_does_no_work(self):
+        base_logger = mock.Mock()
+        base_logger.isEnabledFor.return_value = False
+        trace_logger = tracelogger.TraceLogger(base_logger)
+
+        with mock.patch.object(tracelogger.TraceLogger,
+                               '_get_trace_info') as get_trace_info:
+            trace_logger.debug('message')
+
+        self.assertFalse(get_trace_info.called)
+        self.assertFalse(base_logger.debug.called)
+
+
+class ActsAsyncLoggingTest(unittest.TestCase):
+    """Verifies the async_logging option of acts.logger.setup_test_logger.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp_dir, 'logs')
+
+    def tearDown(self):
+        logger.kill_test_logger(logging.getLogger())
+        shutil.rmtree(self.tmp_dir)
+
+    def test_async_logging_writes_records_on_kill(self):
+        logger.setup_test_logger(self.log_path, async_logging=True)
+        logging.info('queued message')
+
+        logger.kill_test_logger(logging.getLogger())
+
+        with open(os.path.join(self.log_path, 'test_run_info.txt')) as f:
+            self.assertIn('INFO queued message', f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -142,6 +142,36 @@ class SpectralAnalysisTest(unittest.TestCase):
                 abs(spectral[0][0] - golden_frequency[channel]) < 5,
                 'Dominant frequency is not correct')
 
+    def testChunkedSpectralAnalysisRealData(self):
+        """Checks the chunked spectral analysis of a memory-mapped file."""
+        file_path = os.path.join(
+            os.path.dirname(__file__), 'test_data', '1k_2k.raw')
+        data = audio_data.AudioRawData(None, 2, 'S32_LE')
+        data.read_file(file_path)
+        binary_data = audio_data.AudioRawData(
+            open(file_path, 'rb').read(), 2, 'S32_LE')
+        numpy.testing.assert_array_equal(data.channel_data,
+                                         binary_data.channel_data)
+        saturate_value = audio_data.get_maximum_value_from_sample_format(
+            'S32_LE')
+        golden_frequency = [1000, 2000]
+        for channel in [0, 1]:
+            normalized_signal = audio_analysis.NormalizedSignal(
+                data.channel_data[channel], saturate_value)
+            spectral = audio_analysis.chunked_spectral_analysis(
+                normalized_signal, 48000, 4800, 0.02)
+            logging.debug('channel %s: %s', channel, spectral)
+            self.assertTrue(
+                abs(spectral[0][0] - golden_frequency[channel]) < 5,
+                'Dominant frequency is not correct')
+
+    def testChunkedNotMeaningfulData(self):
+        """Checks that chunked spectral analysis handles un-meaningful data."""
+        noise = numpy.random.standard_normal(48000) * (
+            audio_analysis.MEANINGFUL_RMS_THRESHOLD * 0.5)
+        results = audio_analysis.chunked_spectral_analysis(noise, 48000, 4800)
+        self.assertEqual([(0, 0)], results)
+
     def testNotMeaningfulData(self):
         """Checks that sepectral analysis handles un-meaningful data."""
         rate = 48000
@@ -167,6 +197,16 @@ class NormalizeTest(unittest.TestCase):
             self.assertEqual(expected[i], normalized_y[i])
 
 
+class NormalizedSignalTest(unittest.TestCase):
+    def testSlicesAreNormalized(self):
+        y = numpy.array([1, 2, 3, 4, 5])
+        normalized_y = audio_analysis.NormalizedSignal(y, 10)
+        self.assertEqual(len(normalized_y), 5)
+        numpy.testing.assert_array_equal(normalized_y[1:3], [0.2, 0.3])
+        numpy.testing.assert_array_equal(
+            normalized_y[:], audio_analysis.normalize_signal(y, 10))
+
+
 class AnomalyTest(unittest.TestCase):
     def setUp(self):
         """Creates a test signal of sine wave."""
@@ -351,6 +391,78 @@ class AnomalyTest(unittest.TestCase):
             self.check_anomaly()
 
 
+class PatternMatchingTest(unittest.TestCase):
+    """Checks the vectorized pattern matching against the sample loop."""
+
+    def setUp(self):
+        numpy.random.seed(0)
+        self.rate = 48000
+        self.freq = 1000
+        self.block_size = 120
+        self.golden = audio_analysis._generate_golden_pattern(
+            self.rate, self.freq, self.block_size)
+
+    def reference_anomaly_detection(self, signal):
+        """Detects anomalies one block and one offset at a time."""
+        results = []
+        for start in range(0, len(signal), int(self.block_size / 2)):
+            test_signal = signal[start:start + self.block_size]
+            correlations = []
+            for offset in range(len(self.golden) - len(test_signal) + 1):
+                try:
+                    correlations.append(
+                        audio_analysis._get_correlation_index(
+                            self.golden[offset:offset + len(test_signal)],
+                            test_signal))
+                except audio_analysis.TestSignalNormTooSmallError:
+                    correlations = [-1]
+                    break
+            if max(correlations) < audio_analysis.PATTERN_MATCHING_THRESHOLD:
+                results.append(float(start) / self.rate)
+        return results
+
+    def testSlidingDotProducts(self):
+        """The FFT dot products match numpy.correlate at every offset."""
+        blocks = numpy.random.standard_normal((5, self.block_size))
+        dot_products = audio_analysis._sliding_dot_products(
+            self.golden, blocks)
+        for block, row in zip(blocks, dot_products):
+            numpy.testing.assert_allclose(
+                row, numpy.correlate(self.golden, block, 'valid'), atol=1e-9)
+
+    def testSlidingNorms(self):
+        """The sliding norms match the norm of each window."""
+        norms = audio_analysis._sliding_norms(self.golden, self.block_size)
+        expected = [
+            numpy.linalg.norm(self.golden[i:i + self.block_size])
+            for i in range(len(self.golden) - self.block_size + 1)
+        ]
+        numpy.testing.assert_allclose(norms, expected)
+
+    def testSameResultsAsSampleLoop(self):
+        """Anomalies found match the one offset at a time computation."""
+        samples = int(0.2 * self.rate) + 37
+        x = numpy.arange(samples) / float(self.rate)
+        signal = numpy.sin(self.freq * 2.0 * numpy.pi * x)
+        signal += numpy.random.standard_normal(samples) * 0.5
+        signal[3000:3240] = 0
+        signal[6000:6100] = 2
+        expected = self.reference_anomaly_detection(signal)
+        self.assertTrue(expected)
+        self.assertEqual(
+            audio_analysis.anomaly_detection(signal, self.rate, self.freq,
+                                             self.block_size), expected)
+
+    def testMovingPatternMatching(self):
+        """A single block is matched like in anomaly_detection."""
+        self.assertTrue(
+            audio_analysis._moving_pattern_matching(
+                self.golden, self.golden[10:10 + self.block_size], 0.85))
+        self.assertFalse(
+            audio_analysis._moving_pattern_matching(
+                self.golden, numpy.zeros(self.block_size), 0.85))
+
+
 if __name__ == '__main__':
     logging.basicConfig(
         level=logging.DEBUG,
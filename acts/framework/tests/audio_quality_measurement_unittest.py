@@ -70,6 +70,25 @@ class ErrorTest(unittest.TestCase):
             self.assertTrue(abs(ret - error[i]) < 0.001)
 
 
+class FindBlockAverageValueTest(unittest.TestCase):
+    def testBlockAverageValues(self):
+        arr = numpy.random.RandomState(0).uniform(0, 1, 50)
+        side_block_size, block_size = 6, 5
+        left, right, block = audio_quality_measurement.find_block_average_value(
+            arr, side_block_size, block_size)
+        for i in range(len(arr)):
+            left_block = arr[max(0, i - side_block_size):i + 1]
+            right_block = arr[i:min(len(arr), i + side_block_size)]
+            left_border = max(0, i - block_size // 2)
+            right_border = min(len(arr), i + block_size - block_size // 2)
+            # The first sample is left out of the block sums.
+            block_sum = sum(arr[left_border:right_border]) - arr[0]
+            self.assertAlmostEqual(left[i], numpy.mean(left_block))
+            self.assertAlmostEqual(right[i], numpy.mean(right_block))
+            self.assertAlmostEqual(block[i],
+                                   block_sum / (right_border - left_border))
+
+
 class QualityMeasurementTest(unittest.TestCase):
     def setUp(self):
         """Creates a test signal of sine wave."""
@@ -264,5 +283,43 @@ class QualityMeasurementTest(unittest.TestCase):
                 self.volume_changing[i] == result['volume_changes'][i][1])
 
 
+
+class ChunkedQualityMeasurementTest(unittest.TestCase):
+    def setUp(self):
+        """Creates a sine wave with silence, noise, a delay and a burst."""
+        numpy.random.seed(0)
+        self.rate = 48000
+        t = numpy.arange(3 * self.rate) / float(self.rate)
+        self.y = numpy.sin(2.0 * math.pi * 440 * t)
+        self.y += 0.01 * numpy.random.standard_normal(len(t))
+        self.y[:int(0.2 * self.rate)] = 0
+        self.y[int(0.1 * self.rate):int(0.1005 * self.rate)] = 3
+        self.y[int(1.0 * self.rate):int(1.01 * self.rate)] = 0
+        self.y[int(2.0 * self.rate):int(2.001 * self.rate)] = 3
+        self.y[int(2.4 * self.rate):int(2.7 * self.rate)] *= 1.4
+
+    def testSameResultsAsQualityMeasurement(self):
+        expected = audio_quality_measurement.quality_measurement(
+            self.y, self.rate, 440)
+        self.assertTrue(expected['artifacts']['noise_before_playback'])
+        self.assertTrue(expected['artifacts']['delay_during_playback'])
+        self.assertTrue(expected['artifacts']['burst_during_playback'])
+        self.assertTrue(expected['volume_changes'])
+        # Chunks of less than a side block to more than the signal.
+        for chunk_secs in [0.002, 0.0517, 1, 10]:
+            result = audio_quality_measurement.chunked_quality_measurement(
+                self.y, self.rate, 440, chunk_secs=chunk_secs)
+            self.assertEqual(result['artifacts'], expected['artifacts'])
+            self.assertEqual(result['volume_changes'],
+                             expected['volume_changes'])
+            self.assertAlmostEqual(result['equivalent_noise_level'],
+                                   expected['equivalent_noise_level'], 2)
+
+    def testNoSineWave(self):
+        with self.assertRaises(audio_quality_measurement.SineWaveNotFound):
+            audio_quality_measurement.chunked_quality_measurement(
+                numpy.zeros(self.rate), self.rate, 440, chunk_secs=0.1)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import math
+import mock
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+import acts.test_utils.audio_analysis_lib.batch_analysis as batch_analysis
+import acts.test_utils.audio_analysis_lib.check_quality as check_quality
+
+
+@unittest.skipIf(shared_memory is None, 'Shared memory needs Python 3.8')
+class ShareChannelTest(unittest.TestCase):
+    def testSharedSamplesAreTheSame(self):
+        signal = numpy.arange(-5, 5, dtype=numpy.int32)
+        shm, shared_channel = batch_analysis.share_channel(signal[::2])
+        try:
+            attached_shm = shared_memory.SharedMemory(name=shared_channel.name)
+            shared_signal = numpy.ndarray(
+                (shared_channel.length, ),
+                dtype=numpy.dtype(shared_channel.dtype),
+                buffer=attached_shm.buf)
+            numpy.testing.assert_array_equal(shared_signal, signal[::2])
+            del shared_signal
+            attached_shm.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+class BatchQualityAnalysisTest(unittest.TestCase):
+    def setUp(self):
+        """Writes raw files with a sine wave, a silent channel and a delay."""
+        numpy.random.seed(0)
+        self.rate = 48000
+        self.tmp_dir = tempfile.mkdtemp()
+        t = numpy.arange(self.rate) / float(self.rate)
+        sine = 0.5 * numpy.sin(2.0 * math.pi * 1000 * t)
+        delayed_sine = 0.5 * numpy.sin(2.0 * math.pi * 2000 * t)
+        delayed_sine[self.rate // 2:self.rate // 2 + 480] = 0
+        self.filenames = []
+        for name, channels in [('sine.raw', [sine, delayed_sine]),
+                               ('silence.raw', [numpy.zeros(self.rate),
+                                                sine])]:
+            samples = (numpy.array(channels).T * 2**31).astype('<i4')
+            filename = os.path.join(self.tmp_dir, name)
+            samples.tofile(filename)
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _serial_results(self, filename, check_quality_params, chunk_secs):
+        raw_data, rate = check_quality.read_audio_file(filename, 2, 32,
+                                                       self.rate)
+        checker = check_quality.QualityChecker(raw_data, rate,
+                                               chunk_secs=chunk_secs)
+        checker.do_spectral_analysis(
+            ignore_high_freq=5000,
+            check_quality=check_quality_params is not None,
+            quality_params=check_quality_params)
+        return checker._spectrals, checker._quality_result
+
+    def testSameResultsAsQualityChecker(self):
+        quality_params = check_quality.get_quality_params(
+            check_quality.DEFAULT_QUALITY_BLOCK_SIZE_SECS,
+            check_quality.DEFAULT_FREQUENCY_ERROR_THRESHOLD,
+            check_quality.DEFAULT_DELAY_AMPLITUDE_THRESHOLD,
+            check_quality.DEFAULT_NOISE_AMPLITUDE_THRESHOLD,
+            check_quality.DEFAULT_BURST_AMPLITUDE_THRESHOLD)
+        for spectral_only in [False, True]:
+            for chunk_secs in [None, 0.1]:
+                checkers = batch_analysis.batch_quality_analysis(
+                    self.filenames,
+                    bit_width=32,
+                    rate=self.rate,
+                    channel=2,
+                    spectral_only=spectral_only,
+                    quality_params=quality_params,
+                    chunk_secs=chunk_secs,
+                    max_workers=2)
+                self.assertEqual(list(checkers), self.filenames)
+                for filename, checker in checkers.items():
+                    spectrals, quality_result = self._serial_results(
+                        filename, None if spectral_only else quality_params,
+                        chunk_secs)
+                    self.assertEqual(checker._spectrals, spectrals)
+                    self.assertEqual(
+                        len(checker._quality_result), len(quality_result))
+                    # The equivalent noise level is measured with random
+                    # noise, so only the detected events must be the same.
+                    for quality, expected in zip(checker._quality_result,
+                                                 quality_result):
+                        self.assertEqual(quality['artifacts'],
+                                         expected['artifacts'])
+                        self.assertEqual(quality['volume_changes'],
+                                         expected['volume_changes'])
+
+        sine_checker = checkers[self.filenames[0]]
+        sine_checker.check_freqs([1000, 2000], 5)
+        silence_checker = checkers[self.filenames[1]]
+        self.assertEqual(len(silence_checker._spectrals), 1)
+
+    def _assertSameSpectrals(self, checkers):
+        for filename, checker in checkers.items():
+            spectrals, _ = self._serial_results(filename, None, None)
+            self.assertEqual(checker._spectrals, spectrals)
+
+    @unittest.skipIf(shared_memory is None, 'Shared memory needs Python 3.8')
+    def testChannelsAreSubmittedInWaves(self):
+        alive = set()
+        max_alive = []
+
+        def _share_channel(signal):
+            shm, shared_channel = share_channel(signal)
+            alive.add(shm.name)
+            max_alive.append(len(alive))
+            unlink = shm.unlink
+
+            def _unlink():
+                alive.discard(shm.name)
+                unlink()
+
+            shm.unlink = _unlink
+            return shm, shared_channel
+
+        share_channel = batch_analysis.share_channel
+        with mock.patch.object(batch_analysis,
+                               'CHANNELS_IN_FLIGHT_PER_WORKER', 1), \
+                mock.patch.object(batch_analysis, 'share_channel',
+                                  side_effect=_share_channel):
+            checkers = batch_analysis.batch_quality_analysis(
+                self.filenames, bit_width=32, rate=self.rate, channel=2,
+                spectral_only=True, max_workers=1)
+        self.assertEqual(max_alive, [1, 1, 1, 1])
+        self.assertEqual(alive, set())
+        self._assertSameSpectrals(checkers)
+
+    def testWithoutSharedMemory(self):
+        with mock.patch.object(batch_analysis, 'shared_memory', None):
+            checkers = batch_analysis.batch_quality_analysis(
+                self.filenames, bit_width=32, rate=self.rate, channel=2,
+                spectral_only=True)
+        self._assertSameSpectrals(checkers)
+
+    def testDelayIsFound(self):
+        checkers = batch_analysis.batch_quality_analysis(
+            self.filenames[:1], bit_width=32, rate=self.rate, channel=2,
+            max_workers=2)
+        checker = checkers[self.filenames[0]]
+        with self.assertRaises(check_quality.QualityFailure):
+            checker.check_quality()
+
+
+if __name__ == '__main__':
+    unittest.main()
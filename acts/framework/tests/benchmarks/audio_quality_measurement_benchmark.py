@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures the cost of audio quality measurement on a long recording.
+
+Compares the per sample loop find_block_average_value used to run with the
+cumulative sum based one, and times quality_measurement on a noisy sine wave
+with delays and bursts, as recorded by the Bluetooth audio tests.
+
+Usage:
+    python3 tests/benchmarks/audio_quality_measurement_benchmark.py [--secs N]
+"""
+
+import argparse
+import time
+
+import numpy
+
+import acts.test_utils.audio_analysis_lib.audio_quality_measurement as \
+    audio_quality_measurement
+
+
+def legacy_block_average_value(arr, side_block_size, block_size):
+    length = len(arr)
+    left_border, right_border = 0, 1
+    left_block_sum = arr[0]
+    right_block_sum = arr[0]
+    left_average_array = numpy.zeros(length)
+    right_average_array = numpy.zeros(length)
+    block_average_array = numpy.zeros(length)
+    for index in range(0, length):
+        while left_border < index - side_block_size:
+            left_block_sum -= arr[left_border]
+            left_border += 1
+        while right_border < min(length, index + side_block_size):
+            right_block_sum += arr[right_border]
+            right_border += 1
+        left_average_array[index] = (float(left_block_sum) /
+                                     (index - left_border + 1))
+        right_average_array[index] = (float(right_block_sum) /
+                                      (right_border - index))
+        if index + 1 < length:
+            left_block_sum += arr[index + 1]
+        right_block_sum -= arr[index]
+    left_border, right_border = 0, 1
+    block_sum = 0
+    for index in range(0, length):
+        while left_border < index - block_size / 2:
+            block_sum -= arr[left_border]
+            left_border += 1
+        while right_border < min(length, index + block_size / 2):
+            block_sum += arr[right_border]
+            right_border += 1
+        block_average_array[index] = (float(block_sum) /
+                                      (right_border - left_border))
+    return (left_average_array, right_average_array, block_average_array)
+
+
+def recording(secs, rate, frequency):
+    """Generates a noisy sine wave with a delay and a burst every second."""
+    samples = int(secs * rate)
+    phase = 2.0 * numpy.pi * frequency * numpy.arange(samples) / rate
+    signal = numpy.sin(phase) + 0.01 * numpy.random.standard_normal(samples)
+    for second in range(1, int(secs) - 1):
+        delay = int((second + 0.2) * rate)
+        signal[delay:delay + rate // 500] = 0
+        burst = int((second + 0.6) * rate)
+        signal[burst:burst + rate // 1000] = 3
+    return signal
+
+
+def timed(name, function, *args):
+    start = time.time()
+    result = function(*args)
+    print('%-40s %10.3f ms' % (name, (time.time() - start) * 1000))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--secs', type=float, default=180)
+    parser.add_argument('--rate', type=int, default=48000)
+    parser.add_argument('--frequency', type=float, default=440)
+    args = parser.parse_args()
+
+    numpy.random.seed(0)
+    signal = recording(args.secs, args.rate, args.frequency)
+    block_size = int(audio_quality_measurement.DEFAULT_BLOCK_SIZE_SECS *
+                     args.rate)
+    amplitude = numpy.abs(signal)
+    # The legacy loop is too slow for a full recording, time a tenth of it.
+    tenth = amplitude[:len(amplitude) // 10]
+    timed('legacy find_block_average_value / 10', legacy_block_average_value,
+          tenth, block_size * 2, block_size)
+    timed('find_block_average_value / 10',
+          audio_quality_measurement.find_block_average_value, tenth,
+          block_size * 2, block_size)
+    timed('find_block_average_value',
+          audio_quality_measurement.find_block_average_value, amplitude,
+          block_size * 2, block_size)
+    timed('hilbert_analysis', audio_quality_measurement.hilbert_analysis,
+          signal, args.rate, block_size)
+    result = timed('quality_measurement',
+                   audio_quality_measurement.quality_measurement, signal,
+                   args.rate, args.frequency)
+    print('delays: %d, bursts: %d' %
+          (len(result['artifacts']['delay_during_playback']),
+           len(result['artifacts']['burst_during_playback'])))
+
+
+if __name__ == '__main__':
+    main()
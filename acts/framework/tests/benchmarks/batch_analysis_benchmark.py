@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures the speedup of the parallel batch audio analysis.
+
+Writes stereo raw recordings like the ones of the Bluetooth audio tests,
+analyzes them one channel after another with check_quality.QualityChecker,
+then with batch_analysis.batch_quality_analysis for an increasing number of
+worker processes, and reports the speedup of each.
+
+Usage:
+    python3 tests/benchmarks/batch_analysis_benchmark.py [--files N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+import numpy
+
+import acts.test_utils.audio_analysis_lib.batch_analysis as batch_analysis
+import acts.test_utils.audio_analysis_lib.check_quality as check_quality
+
+
+def write_recording(filename, secs, rate):
+    """Writes a 1kHz/2kHz stereo recording with a delay every second."""
+    samples = int(secs * rate)
+    t = numpy.arange(samples) / float(rate)
+    channels = []
+    for frequency in [1000, 2000]:
+        signal = 0.5 * numpy.sin(2.0 * numpy.pi * frequency * t)
+        signal += 0.005 * numpy.random.standard_normal(samples)
+        for second in range(1, int(secs) - 1):
+            delay = int((second + 0.2) * rate)
+            signal[delay:delay + rate // 500] = 0
+        channels.append(signal)
+    samples = (numpy.array(channels).T * 2**31).astype('<i4')
+    samples.tofile(filename)
+
+
+def serial_analysis(filenames, rate, quality_params):
+    for filename in filenames:
+        raw_data, rate = check_quality.read_audio_file(filename, 2, 32, rate)
+        checker = check_quality.QualityChecker(raw_data, rate)
+        checker.do_spectral_analysis(
+            ignore_high_freq=5000,
+            check_quality=True,
+            quality_params=quality_params)
+
+
+def timed(function, *args, **kwargs):
+    start = time.time()
+    function(*args, **kwargs)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--secs', type=float, default=30)
+    parser.add_argument('--rate', type=int, default=48000)
+    args = parser.parse_args()
+
+    numpy.random.seed(0)
+    quality_params = check_quality.get_quality_params(
+        check_quality.DEFAULT_QUALITY_BLOCK_SIZE_SECS,
+        check_quality.DEFAULT_FREQUENCY_ERROR_THRESHOLD,
+        check_quality.DEFAULT_DELAY_AMPLITUDE_THRESHOLD,
+        check_quality.DEFAULT_NOISE_AMPLITUDE_THRESHOLD,
+        check_quality.DEFAULT_BURST_AMPLITUDE_THRESHOLD)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        filenames = []
+        for i in range(args.files):
+            filename = os.path.join(tmp_dir, 'recording_%d.raw' % i)
+            write_recording(filename, args.secs, args.rate)
+            filenames.append(filename)
+
+        serial_secs = timed(serial_analysis, filenames, args.rate,
+                            quality_params)
+        print('%d files x 2 channels x %gs, %d cores' %
+              (args.files, args.secs, multiprocessing.cpu_count()))
+        print('%-10s %10.3f s' % ('serial', serial_secs))
+        workers = 1
+        while workers <= min(multiprocessing.cpu_count(), args.files * 2):
+            secs = timed(
+                batch_analysis.batch_quality_analysis,
+                filenames,
+                bit_width=32,
+                rate=args.rate,
+                channel=2,
+                quality_params=quality_params,
+                max_workers=workers)
+            print('%-10s %10.3f s  speedup %.2fx' %
+                  ('%d workers' % workers, secs, serial_secs / secs))
+            workers *= 2
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures the host cost of decoding and decimating Monsoon samples.
+
+Compares the struct.unpack decoder and error accumulator loop Monsoon used
+to run with the numpy based monsoon_lib.sampling helpers, on synthetic data
+packets.
+
+Usage:
+    python3 tests/benchmarks/monsoon_benchmark.py [--seconds N] [--hz N]
+"""
+
+import argparse
+import random
+import struct
+import time
+
+import numpy as np
+
+from acts.controllers import monsoon
+from acts.controllers.monsoon_lib import sampling
+
+NATIVE_HZ = 5000
+RECORDS_PER_PACKET = 10
+FINE_ZERO = COARSE_ZERO = 0
+FINE_SCALE = 0.0332 / 1000
+COARSE_SCALE = 2.88 / 1000
+
+
+def make_packets(count):
+    packets = []
+    for seq in range(count):
+        body = struct.pack('BBBB', 0x20 | (seq & 0xF), 0, 0, 0)
+        for _ in range(RECORDS_PER_PACKET):
+            body += struct.pack('>hhhh', random.randint(-1000, 1000), 0, 0, 0)
+        packets.append(bytearray(body + b'\x00'))
+    return packets
+
+
+def legacy_decode(packet):
+    data = [
+        struct.unpack(">hhhh", packet[x:x + 8])
+        for x in range(4,
+                       len(packet) - 8, 8)
+    ]
+    out = []
+    for main, usb, aux, voltage in data:
+        if main & 1:
+            out.append(((main & ~1) - COARSE_ZERO) * COARSE_SCALE)
+        else:
+            out.append((main - FINE_ZERO) * FINE_SCALE)
+    return out
+
+
+def legacy_take_samples(packets, sample_hz, sample_num):
+    packets = iter(packets)
+    emitted = offset = 0
+    collected = []
+    current_values = []
+    while emitted < sample_num:
+        need = int((NATIVE_HZ - offset + sample_hz - 1) / sample_hz)
+        if need > len(collected):
+            samples = legacy_decode(next(packets, b''))
+            if not samples:
+                break
+            collected.extend(samples)
+        else:
+            offset += need * sample_hz
+            while offset >= NATIVE_HZ:
+                current_values.append(sum(collected[:need]) / need)
+                offset -= NATIVE_HZ
+                emitted += 1
+            collected = collected[need:]
+    return current_values
+
+
+def numpy_take_samples(packets, sample_hz, sample_num):
+    """Mirrors Monsoon.take_samples and MonsoonProxy.CollectDataArray."""
+    decimator = sampling.Decimator(NATIVE_HZ, sample_hz)
+    batch = NATIVE_HZ // monsoon.SAMPLE_BATCHES_PER_SECOND
+    packets = iter(packets)
+    current_values = []
+    while len(current_values) < sample_num:
+        readings = []
+        collected = 0
+        for packet in packets:
+            readings.append(sampling.decode_records(packet)[:, 0])
+            collected += len(readings[-1])
+            if collected >= batch:
+                break
+        if not readings:
+            break
+        samples = sampling.calibrate(
+            np.concatenate(readings), FINE_ZERO, FINE_SCALE, COARSE_ZERO,
+            COARSE_SCALE)
+        values = decimator.decimate(
+            samples, limit=sample_num - len(current_values))
+        current_values.extend(values.tolist())
+    return current_values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=int, default=60)
+    parser.add_argument('--hz', type=int, default=500)
+    args = parser.parse_args()
+
+    packets = make_packets(args.seconds * NATIVE_HZ // RECORDS_PER_PACKET)
+    sample_num = args.seconds * args.hz
+    for name, take_samples in (('struct + loop', legacy_take_samples),
+                               ('numpy', numpy_take_samples)):
+        start = time.time()
+        values = take_samples(packets, args.hz, sample_num)
+        elapsed = time.time() - start
+        print('%-14s %8d samples %8.3f s (%6.1fx real time)' %
+              (name, len(values), elapsed, args.seconds / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures the cost of MonsoonData statistics on a long capture.
+
+Compares the deque based rolling average MonsoonData used to compute with
+the cumulative sum based one, and times the other analysis methods.
+
+Usage:
+    python3 tests/benchmarks/monsoon_data_benchmark.py [--samples N]
+"""
+
+import argparse
+import collections
+import time
+
+import numpy as np
+
+from acts.controllers import monsoon
+
+
+def legacy_average_record(data_points, n):
+    history_deque = collections.deque()
+    averages = []
+    for d in data_points:
+        history_deque.appendleft(d)
+        if len(history_deque) > n:
+            history_deque.pop()
+        avg = sum(history_deque) / len(history_deque)
+        averages.append(round(avg, monsoon.MonsoonData.lr))
+    return averages
+
+
+def timed(name, function, *args):
+    start = time.time()
+    function(*args)
+    print('%-32s %10.3f ms' % (name, (time.time() - start) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--samples', type=int, default=500 * 3600)
+    parser.add_argument('--window', type=int, default=500)
+    args = parser.parse_args()
+
+    data_points = np.random.random(args.samples) * 0.1
+    data = monsoon.MonsoonData(data_points, np.zeros(args.samples), 500, 4.2)
+    # The legacy loop is too slow for a full capture, time a tenth of it.
+    timed('legacy get_average_record / 10', legacy_average_record,
+          data_points[:args.samples // 10].tolist(), args.window)
+    timed('get_average_record', data.get_average_record, args.window)
+    timed('average_current (cached)', lambda: data.average_current)
+    timed('get_percentiles', data.get_percentiles, [50, 90, 99])
+    timed('get_percentiles (cached)', data.get_percentiles, [50, 90, 99])
+    timed('get_window_energy', data.get_window_energy, 1)
+    timed('get_segment_averages', data.get_segment_averages,
+          np.arange(10, 3000, 10), 1, 2)
+    timed('update_offset + average_current', lambda: (data.update_offset(
+        10), data.average_current))
+
+
+if __name__ == '__main__':
+    main()
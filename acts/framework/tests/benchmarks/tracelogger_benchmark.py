@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+"""Measures the cost of a TraceLogger call.
+
+Compares the inspect.stack() based trace info TraceLogger used to collect
+with the current implementation, for enabled and disabled log levels.
+
+Usage:
+    python3 tests/benchmarks/tracelogger_benchmark.py [--calls N]
+"""
+
+import argparse
+import inspect
+import logging
+import os
+import timeit
+
+from acts import tracelogger
+
+
+class InspectTraceLogger(tracelogger.TraceLogger):
+    """The previous TraceLogger, which walked the stack with inspect."""
+
+    @staticmethod
+    def _get_trace_info(level=1, offset=2):
+        inspect_stack = inspect.stack()
+        trace_info = ""
+        for i in range(level):
+            try:
+                stack_frames = inspect_stack[offset + i]
+                info = inspect.getframeinfo(stack_frames[0])
+                trace_info = "%s[%s:%s:%s]" % (trace_info,
+                                               os.path.basename(info.filename),
+                                               info.function, info.lineno)
+            except IndexError:
+                break
+        return trace_info
+
+    def debug(self, msg, *args, **kwargs):
+        # The previous TraceLogger did not check whether the level is enabled.
+        trace_info = self._get_trace_info(level=3, offset=2)
+        self._logger.debug("%s %s" % (msg, trace_info), *args, **kwargs)
+
+
+def measure(trace_logger, calls):
+    """Returns the average number of microseconds per debug() call."""
+    seconds = timeit.timeit(
+        lambda: trace_logger.debug('benchmark message'), number=calls)
+    return seconds / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+
+    base_logger = logging.getLogger('tracelogger_benchmark')
+    base_logger.propagate = False
+    base_logger.addHandler(logging.NullHandler())
+
+    for level_name, level in (('enabled', logging.DEBUG),
+                              ('disabled', logging.INFO)):
+        base_logger.setLevel(level)
+        for name, logger_class in (('inspect.stack', InspectTraceLogger),
+                                   ('sys._getframe', tracelogger.TraceLogger)):
+            cost = measure(logger_class(base_logger), args.calls)
+            print('%-14s debug() %-8s %10.2f us/call' % (name, level_name,
+                                                         cost))
+
+
+if __name__ == '__main__':
+    main()
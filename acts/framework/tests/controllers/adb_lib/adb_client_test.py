@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import os
+import re
+import shutil
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+from acts.controllers.adb_lib import adb_client
+from acts.libs.proc import job
+
+
+def _recv_exactly(sock, length):
+    data = b''
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise EOFError()
+        data += chunk
+    return data
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """A local server speaking the adb smart socket protocol.
+
+    The device files are kept in the files dict, and shell commands are
+    answered from the shell_results dict of command => (out, err, status).
+    The 'stream' command prints a line every 10ms until disconnected.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, features='shell_v2'):
+        super().__init__(('127.0.0.1', 0), FakeAdbHandler)
+        self.features = features
+        self.files = {}
+        self.shell_results = {}
+        self.requests = []
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeAdbHandler(socketserver.BaseRequestHandler):
+    def _read_request(self):
+        length = int(_recv_exactly(self.request, 4), 16)
+        request = _recv_exactly(self.request, length).decode('utf-8')
+        self.server.requests.append(request)
+        return request
+
+    def _okay(self):
+        self.request.sendall(b'OKAY')
+
+    def _fail(self, message):
+        self.request.sendall(b'FAIL%04x%s' % (len(message), message))
+
+    def handle(self):
+        try:
+            request = self._read_request()
+            if request.endswith(':features'):
+                self._okay()
+                features = self.server.features.encode('utf-8')
+                self.request.sendall(b'%04x%s' % (len(features), features))
+            elif ':forward:' in request or ':killforward:' in request:
+                self._okay()
+                self._okay()
+                if ':forward:tcp:0;' in request:
+                    self.request.sendall(b'000512345')
+            elif request.endswith(':wait-for-any-device'):
+                self._okay()
+                self._okay()
+            elif request.startswith('host:transport'):
+                self._okay()
+                self._handle_service(self._read_request())
+        except (EOFError, OSError):
+            pass
+
+    def _handle_service(self, service):
+        if service.endswith(':stream'):
+            self._okay()
+            while True:
+                self.request.sendall(b'line\n')
+                time.sleep(.01)
+        if service.startswith('shell,v2,raw:'):
+            command = service[len('shell,v2,raw:'):]
+            if command not in self.server.shell_results:
+                self._fail(b'unknown command')
+                return
+            self._okay()
+            out, err, status = self.server.shell_results[command]
+            self.request.sendall(
+                struct.pack('<BI', 1, len(out)) + out +
+                struct.pack('<BI', 2, len(err)) + err +
+                struct.pack('<BIB', 3, 1, status))
+        elif service.startswith('shell:'):
+            self._okay()
+            match = re.match(r'shell:\((.*)\n\)\necho (.*)\$\?$', service,
+                             re.DOTALL)
+            out, _, status = self.server.shell_results[match.group(1)]
+            self.request.sendall(out + b'%s%d\n' %
+                                 (match.group(2).encode('utf-8'), status))
+        elif service == 'sync:':
+            self._okay()
+            self._handle_sync()
+        else:
+            self._fail(b'unknown service')
+
+    def _handle_sync(self):
+        files = self.server.files
+        while True:
+            request_id, length = struct.unpack(
+                '<4sI', _recv_exactly(self.request, 8))
+            path = _recv_exactly(self.request, length).decode('utf-8')
+            if request_id == b'STAT':
+                if path in files:
+                    mode = stat.S_IFREG | 0o644
+                elif any(name.startswith(path + '/') for name in files):
+                    mode = stat.S_IFDIR | 0o755
+                else:
+                    mode = 0
+                self.request.sendall(struct.pack('<4sIII', b'STAT', mode, 0, 0))
+            elif request_id == b'RECV':
+                data = files[path]
+                for i in range(0, len(data), 3):
+                    chunk = data[i:i + 3]
+                    self.request.sendall(
+                        struct.pack('<4sI', b'DATA', len(chunk)) + chunk)
+                self.request.sendall(struct.pack('<4sI', b'DONE', 0))
+            elif request_id == b'SEND':
+                path = path.rsplit(',', 1)[0]
+                data = b''
+                while True:
+                    reply, length = struct.unpack(
+                        '<4sI', _recv_exactly(self.request, 8))
+                    if reply == b'DONE':
+                        break
+                    data += _recv_exactly(self.request, length)
+                files[path] = data
+                self.request.sendall(struct.pack('<4sI', b'OKAY', 0))
+            elif request_id == b'QUIT':
+                return
+
+
+class AdbClientTest(unittest.TestCase):
+    """Tests the adb_client.AdbClient class."""
+
+    def setUp(self):
+        self.server = FakeAdbServer()
+        self.client = adb_client.AdbClient('SERIAL', port=self.server.port)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_shell_v2_separates_streams_and_exit_status(self):
+        """Tests that shell v2 packets are split into stdout and stderr."""
+        self.server.shell_results['cmd'] = (b'out\n', b'err\n', 3)
+
+        result = self.client.shell('cmd')
+
+        self.assertEqual(result.stdout, 'out')
+        self.assertEqual(result.stderr, 'err')
+        self.assertEqual(result.exit_status, 3)
+        self.assertIn('host:transport:SERIAL', self.server.requests)
+
+    def test_shell_without_shell_v2(self):
+        """Tests the legacy shell service on devices without shell v2."""
+        self.server.features = 'cmd'
+        self.server.shell_results['cmd'] = (b'out\n', b'', 0)
+
+        result = self.client.shell('cmd')
+
+        self.assertEqual(result.stdout, 'out')
+        self.assertEqual(result.exit_status, 0)
+
+    def test_shell_without_shell_v2_reports_exit_status(self):
+        """Tests that the exit status is printed and parsed without v2."""
+        self.server.features = 'cmd'
+        self.server.shell_results['false'] = (b'no newline', b'', 1)
+
+        result = self.client.shell('false')
+
+        self.assertEqual(result.stdout, 'no newline')
+        self.assertEqual(result.exit_status, 1)
+
+    def test_shell_timeout_is_a_deadline(self):
+        """Tests that a command which keeps printing still times out."""
+        start_time = time.time()
+
+        with self.assertRaises(job.TimeoutError):
+            self.client.shell('stream', timeout=.3)
+
+        self.assertLess(time.time() - start_time, 2)
+
+    def test_failed_request_raises_adb_client_error(self):
+        """Tests that a FAIL reply raises AdbClientError."""
+        with self.assertRaises(adb_client.AdbClientError):
+            self.client.shell('unknown')
+
+    def test_unreachable_server_raises_adb_client_error(self):
+        """Tests that a missing adb server raises AdbClientError."""
+        self.server.stop()
+
+        with self.assertRaises(adb_client.AdbClientError):
+            self.client.shell('cmd')
+
+    def test_forward(self):
+        """Tests forward() and remove_forward()."""
+        self.client.forward('tcp:1', 'tcp:2')
+        self.client.remove_forward('tcp:1')
+
+        self.assertEqual(self.server.requests, [
+            'host-serial:SERIAL:forward:tcp:1;tcp:2',
+            'host-serial:SERIAL:killforward:tcp:1'
+        ])
+
+    def test_forward_to_any_port_returns_port(self):
+        """Tests that forwarding tcp:0 returns the chosen port."""
+        self.assertEqual(self.client.forward('tcp:0', 'tcp:2'), '12345')
+
+    def test_pull_into_directory(self):
+        """Tests that pull() copies a device file in chunks."""
+        self.server.files['/sdcard/file.txt'] = b'0123456789'
+
+        self.client.pull('/sdcard/file.txt', self.tmp_dir)
+
+        with open(os.path.join(self.tmp_dir, 'file.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'0123456789')
+
+    def test_pull_directory_raises_adb_client_error(self):
+        """Tests that directories are left to the adb binary."""
+        self.server.files['/sdcard/dir/file.txt'] = b'data'
+
+        with self.assertRaises(adb_client.AdbClientError):
+            self.client.pull('/sdcard/dir', self.tmp_dir)
+
+    def test_push_into_directory(self):
+        """Tests that push() sends a host file into a device directory."""
+        self.server.files['/sdcard/other'] = b''
+        local = os.path.join(self.tmp_dir, 'file.txt')
+        with open(local, 'wb') as f:
+            f.write(b'x' * (adb_client.SYNC_DATA_MAX + 1))
+
+        self.client.push(local, '/sdcard/')
+
+        self.assertEqual(
+            len(self.server.files['/sdcard/file.txt']),
+            adb_client.SYNC_DATA_MAX + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from acts.controllers.adb_lib import logcat_capture
+
+
+def _line(second, ms=0, message='message'):
+    return '2018-05-03 17:39:%02d.%03d   968  1001 D Tag: %s\n' % (second, ms,
+                                                                  message)
+
+
+class LogcatIndexTest(unittest.TestCase):
+    """Tests the logcat_capture.LogcatIndex class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmp_dir, 'adblog.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _append(self, *lines):
+        with open(self.file_path, 'a') as f:
+            f.writelines(lines)
+
+    def test_read_range_returns_lines_in_range(self):
+        """Tests that only lines between the timestamps are returned."""
+        self._append('--------- beginning of main\n', _line(1), _line(2, 500),
+                     _line(3), _line(4))
+        index = logcat_capture.LogcatIndex(self.file_path)
+
+        lines = list(
+            index.read_range('2018-05-03 17:39:02.000',
+                             '2018-05-03 17:39:03.000'))
+
+        self.assertEqual(lines, [_line(2, 500), _line(3)])
+
+    def test_read_range_seeks_to_the_begin_time(self):
+        """Tests that lines long before the range are not read."""
+        self._append(*[_line(second) for second in range(10)])
+        index = logcat_capture.LogcatIndex(self.file_path)
+        index.update()
+
+        offset = index.find_offset('2018-05-03 17:39:08.000')
+
+        with open(self.file_path) as f:
+            f.seek(offset)
+            self.assertEqual(f.readline(), _line(7))
+
+    def test_update_indexes_appended_lines_only(self):
+        """Tests that update() picks up lines appended after the last one."""
+        self._append(_line(1))
+        index = logcat_capture.LogcatIndex(self.file_path)
+        index.update()
+        self._append(_line(2))
+
+        lines = list(index.read_range('2018-05-03 17:39:02.000'))
+
+        self.assertEqual(lines, [_line(2)])
+        self.assertEqual(index._keys,
+                         ['2018-05-03 17:39:01', '2018-05-03 17:39:02'])
+
+    def test_incomplete_line_is_not_indexed(self):
+        """Tests that a partially written line is indexed once complete."""
+        self._append(_line(1), _line(2)[:10])
+        index = logcat_capture.LogcatIndex(self.file_path)
+        index.update()
+        self.assertEqual(len(index._keys), 1)
+
+        self._append(_line(2)[10:])
+        index.update()
+        self.assertEqual(len(index._keys), 2)
+
+    def test_index_is_reloaded_from_sidecar(self):
+        """Tests that a new LogcatIndex continues from the saved index."""
+        self._append(_line(1), _line(2))
+        logcat_capture.LogcatIndex(self.file_path).update()
+
+        index = logcat_capture.LogcatIndex(self.file_path)
+
+        self.assertEqual(index._keys,
+                         ['2018-05-03 17:39:01', '2018-05-03 17:39:02'])
+        self.assertEqual(index._indexed_offset,
+                         os.path.getsize(self.file_path))
+
+    def test_time_going_backwards_keeps_index_sorted(self):
+        """Tests that out of order lines do not break the index order."""
+        self._append(_line(5), _line(1), _line(6))
+        index = logcat_capture.LogcatIndex(self.file_path)
+        index.update()
+
+        self.assertEqual(index._keys, sorted(index._keys))
+
+
+class LogcatCaptureTest(unittest.TestCase):
+    """Tests the logcat_capture.LogcatCapture class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmp_dir, 'adblog.txt')
+        self.source = os.path.join(self.tmp_dir, 'source.txt')
+        with open(self.source, 'w') as f:
+            f.writelines([_line(second) for second in range(5)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _capture(self, ring_size):
+        capture = logcat_capture.LogcatCapture(
+            self.file_path, ring_size=ring_size)
+        with mock.patch('acts.utils.stop_standing_subprocess'):
+            capture.start('cat %s' % self.source)
+            self.assertTrue(
+                capture.wait_for_timestamp('2018-05-03 17:39:04.000'))
+            capture.stop()
+        return capture
+
+    def test_capture_writes_lines_to_file(self):
+        """Tests that the adb logcat output is appended to the file."""
+        self._capture(ring_size=0)
+
+        with open(self.file_path) as f, open(self.source) as source:
+            self.assertEqual(f.read(), source.read())
+
+    def test_read_range_uses_recent_lines(self):
+        """Tests that ranges covered by the recent lines skip the file."""
+        capture = self._capture(ring_size=3)
+
+        with mock.patch.object(capture.index, 'read_range') as read_file:
+            lines = list(capture.read_range('2018-05-03 17:39:03.000'))
+
+        self.assertEqual(lines, [_line(3), _line(4)])
+        self.assertFalse(read_file.called)
+
+    def test_read_range_falls_back_to_file(self):
+        """Tests that older ranges are read from the logcat file."""
+        capture = self._capture(ring_size=2)
+
+        lines = list(capture.read_range('2018-05-03 17:39:01.000'))
+
+        self.assertEqual(lines, [_line(second) for second in range(1, 5)])
+
+    def test_first_timestamp_is_first_line_of_file(self):
+        """Tests that the capture starts at the first line of its file."""
+        with open(self.file_path, 'w') as f:
+            f.writelines(['--------- beginning of main\n', _line(0, ms=5)])
+        capture = self._capture(ring_size=0)
+
+        self.assertEqual(capture.first_timestamp(), '2018-05-03 17:39:00.005')
+
+    def test_first_timestamp_of_empty_capture_is_none(self):
+        """Tests that a capture with nothing written has no first line."""
+        capture = logcat_capture.LogcatCapture(self.file_path)
+
+        self.assertIsNone(capture.first_timestamp())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from acts.controllers.adb_lib import persistent_shell
+from acts.libs.proc import job
+
+# Stands in for adb: `fake_adb shell` runs a local shell reading from stdin.
+FAKE_ADB = '#!/bin/sh\nexec sh\n'
+# Stands in for the adb of a device that ends its output lines with CRLF.
+FAKE_CRLF_ADB = '#!/bin/sh\nsh | sed -u "s/$/\\r/"\n'
+
+
+class PersistentShellTest(unittest.TestCase):
+    """Tests the persistent_shell.PersistentShell class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.shell = persistent_shell.PersistentShell(
+            self._write_adb('fake_adb', FAKE_ADB))
+
+    def tearDown(self):
+        self.shell.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_adb(self, name, script):
+        fake_adb = os.path.join(self.tmp_dir, name)
+        with open(fake_adb, 'w') as f:
+            f.write(script)
+        os.chmod(fake_adb, os.stat(fake_adb).st_mode | stat.S_IEXEC)
+        return fake_adb
+
+    def test_run_returns_output_and_exit_status(self):
+        """Tests that stdout, stderr and the exit status are separated."""
+        result = self.shell.try_run('echo out; echo err >&2; exit 3')
+
+        self.assertEqual(result.stdout, 'out')
+        self.assertEqual(result.stderr, 'err')
+        self.assertEqual(result.exit_status, 3)
+
+    def test_output_without_trailing_newline(self):
+        """Tests that output not ending in a newline is kept intact."""
+        result = self.shell.try_run('printf abc')
+
+        self.assertEqual(result._raw_stdout, b'abc')
+
+    def test_output_with_crlf_newlines(self):
+        """Tests that a CRLF echoed before the marker is removed entirely."""
+        self.shell.close()
+        self.shell = persistent_shell.PersistentShell(
+            self._write_adb('fake_crlf_adb', FAKE_CRLF_ADB))
+
+        result = self.shell.try_run('printf abc')
+
+        self.assertEqual(result._raw_stdout, b'abc')
+
+    def test_commands_reuse_the_shell_process(self):
+        """Tests that consecutive commands run in the same adb process."""
+        self.shell.try_run('true')
+        proc = self.shell._proc
+
+        result = self.shell.try_run('echo $PPID')
+
+        self.assertIs(self.shell._proc, proc)
+        self.assertEqual(result.exit_status, 0)
+
+    def test_commands_do_not_share_state(self):
+        """Tests that each command runs in its own device-side shell."""
+        self.shell.try_run('cd /; FOO=bar')
+
+        result = self.shell.try_run('echo "$FOO"')
+
+        self.assertEqual(result.stdout, '')
+
+    def test_timeout_kills_and_respawns_shell(self):
+        """Tests that a timed out command does not block later commands."""
+        with self.assertRaises(job.TimeoutError):
+            self.shell.try_run('sleep 10', timeout=.2)
+        self.assertFalse(self.shell.is_alive)
+
+        self.assertEqual(self.shell.try_run('echo back').stdout, 'back')
+
+    def test_respawns_after_shell_exits(self):
+        """Tests that the shell is restarted after it exits."""
+        self.shell.try_run('true')
+        self.shell._proc.kill()
+        self.shell._proc.wait()
+
+        self.assertEqual(self.shell.try_run('echo back').stdout, 'back')
+
+    def test_try_run_returns_none_when_busy(self):
+        """Tests that a busy shell does not queue up commands."""
+        self.shell._lock.acquire()
+        try:
+            self.assertIsNone(self.shell.try_run('true'))
+        finally:
+            self.shell._lock.release()
+
+
+if __name__ == '__main__':
+    unittest.main()
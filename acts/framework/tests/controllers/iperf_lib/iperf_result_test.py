@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import json
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from acts.controllers import iperf_server
+from acts.controllers.iperf_lib import iperf_result
+
+MBYTES = 8 * 1024 * 1024
+
+
+def make_run(rates, jitter='0.1'):
+    """Returns the -J output of a run with the given rates in MB/s."""
+    intervals = ',\n'.join(
+        '\t\t{"streams": [{"bits_per_second": %r}],\n'
+        '\t\t"sum": {"bits_per_second": %r, "jitter_ms": %s}}' %
+        (rate * MBYTES, rate * MBYTES, jitter) for rate in rates)
+    return ('{\n\t"start": {"version": "iperf 3.1.3", "note": "a \\"{\\""},\n'
+            '\t"intervals": [\n%s],\n'
+            '\t"end": {"sum_received": {"bits_per_second": %r}}\n}\n' %
+            (intervals, 2 * MBYTES))
+
+
+def make_stream_run(rates):
+    """Returns the --json-stream output of a run with the given rates."""
+    events = [{'event': 'start', 'data': {'version': 'iperf 3.17'}}]
+    events += [{
+        'event': 'interval',
+        'data': {
+            'sum': {
+                'bits_per_second': rate * MBYTES
+            }
+        }
+    } for rate in rates]
+    events.append({
+        'event': 'end',
+        'data': {
+            'sum_received': {
+                'bits_per_second': 2 * MBYTES
+            }
+        }
+    })
+    return ''.join(json.dumps(event) + '\n' for event in events)
+
+
+def legacy_std_deviation(rates, ignored_interval):
+    rates = rates[ignored_interval:-1]
+    avg_rate = math.fsum(rates) / len(rates)
+    return math.sqrt(
+        math.fsum((rate - avg_rate)**2 for rate in rates) / (len(rates) - 1))
+
+
+class JsonObjectStreamTest(unittest.TestCase):
+    """Tests the iperf_result.JsonObjectStream class."""
+
+    def test_feed_one_character_at_a_time(self):
+        """Tests that objects split anywhere are decoded once complete."""
+        text = 'iperf3: interrupt\n' + make_run([1, 2]) + make_run([3])
+        stream = iperf_result.JsonObjectStream()
+        objects = []
+        for c in text:
+            objects.extend(stream.feed(c))
+
+        expected = [
+            json.loads(make_run([1, 2])),
+            json.loads(make_run([3]))
+        ]
+        self.assertEqual(objects, expected)
+
+    def test_nan_is_read_as_zero(self):
+        """Tests that the -nan values iperf writes do not fail the parsing."""
+        text = make_run([1], jitter='-nan')
+        split = text.index('-nan') + 2
+        stream = iperf_result.JsonObjectStream()
+        objects = stream.feed(text[:split]) + stream.feed(text[split:])
+
+        self.assertEqual(objects[0]['intervals'][0]['sum']['jitter_ms'], 0)
+
+
+class IPerfLogReaderTest(unittest.TestCase):
+    """Tests the iperf_result.IPerfLogReader class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp_dir, 'iperf.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, text, mode='a'):
+        with open(self.log_path, mode) as f:
+            f.write(text)
+
+    def test_poll_json_stream_while_running(self):
+        """Tests that intervals are read as soon as they are written."""
+        lines = make_stream_run([1, 2, 3]).splitlines(True)
+        self.write('', 'w')
+        reader = iperf_result.IPerfLogReader(self.log_path)
+
+        self.write(''.join(lines[:2]) + lines[2][:10])
+        self.assertEqual(reader.poll().tolist(), [1])
+        self.assertEqual(reader.runs[0].interval_rates.tolist(), [1])
+        self.assertIsNone(reader.runs[0].instantaneous_rates)
+
+        self.write(lines[2][10:] + ''.join(lines[3:]))
+        self.assertEqual(reader.poll().tolist(), [2, 3])
+        self.assertEqual(reader.poll().tolist(), [])
+        run = reader.runs[0]
+        self.assertEqual(run.instantaneous_rates, [1, 2, 3])
+        self.assertEqual(run.avg_receive_rate, 2)
+        self.assertEqual(run.get_json()['start']['version'], 'iperf 3.17')
+
+    def test_read_multiple_runs(self):
+        """Tests that each run of a log gives its own IPerfRun."""
+        self.write(
+            make_run([1, 2, 3]) + make_stream_run([4, 5, 6]) +
+            make_run([7, 8, 9]), 'w')
+
+        runs = iperf_result.read_runs(self.log_path)
+
+        self.assertEqual([run.instantaneous_rates for run in runs],
+                         [[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+
+
+class IPerfRunTest(unittest.TestCase):
+    """Tests the iperf_result.IPerfRun class."""
+
+    def test_statistics_match_legacy_computation(self):
+        """Tests the rates and deviations against the former list code."""
+        rates = [1.5, 2.25, 3.0, 2.5, 2.0, 0.1]
+        run = iperf_result.IPerfRun(json.loads(make_run(rates)))
+
+        self.assertEqual(run.instantaneous_rates, rates)
+        self.assertAlmostEqual(run.std_deviation,
+                               legacy_std_deviation(rates, 0))
+        self.assertAlmostEqual(
+            run.get_std_deviation(2), legacy_std_deviation(rates, 2))
+        self.assertIs(run.instantaneous_rates, run.instantaneous_rates)
+
+    def test_statistics_are_updated_by_new_intervals(self):
+        """Tests that cached statistics are dropped when intervals arrive."""
+        run = iperf_result.IPerfRun()
+        run.add_event({'event': 'end', 'data': {'sum': {}}})
+        for rate in [1, 2, 3]:
+            run.add_event({
+                'event': 'interval',
+                'data': {
+                    'sum': {
+                        'bits_per_second': rate * MBYTES
+                    }
+                }
+            })
+        self.assertEqual(run.std_deviation, legacy_std_deviation([1, 2, 3],
+                                                                 0))
+
+        run.add_event({
+            'event': 'interval',
+            'data': {
+                'sum': {
+                    'bits_per_second': 10 * MBYTES
+                }
+            }
+        })
+
+        self.assertEqual(run.instantaneous_rates, [1, 2, 3, 10])
+        self.assertAlmostEqual(run.std_deviation,
+                               legacy_std_deviation([1, 2, 3, 10], 0))
+
+    def test_no_data(self):
+        """Tests that the statistics of a failed run are None."""
+        run = iperf_result.IPerfRun({'error': 'unable to connect'})
+
+        self.assertEqual(run.error, 'unable to connect')
+        self.assertIsNone(run.instantaneous_rates)
+        self.assertIsNone(run.std_deviation)
+        self.assertIsNone(run.avg_receive_rate)
+
+
+class IPerfResultTest(unittest.TestCase):
+    """Tests the iperf_server.IPerfResult class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp_dir, 'iperf.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_first_run_is_loaded(self):
+        """Tests that IPerfResult loads the first run of the log."""
+        with open(self.log_path, 'w') as f:
+            f.write('iperf3: interrupt - the server has terminated\n' +
+                    make_run([1, 2, 3]) + make_run([4, 5, 6]))
+
+        result = iperf_server.IPerfResult(self.log_path)
+
+        self.assertEqual(result.instantaneous_rates, [1, 2, 3])
+        self.assertEqual(result.avg_receive_rate, 2)
+
+    def test_incomplete_result(self):
+        """Tests that a log without a complete run raises ValueError."""
+        with open(self.log_path, 'w') as f:
+            f.write(make_run([1, 2, 3])[:-10])
+
+        with self.assertRaises(ValueError):
+            iperf_server.IPerfResult(self.log_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from acts.controllers.monsoon_lib import data_file
+
+
+class DataFileTest(unittest.TestCase):
+    """Tests the monsoon_lib.data_file module."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmp_dir,
+                                      'data' + data_file.FILE_EXTENSION)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, *records):
+        with open(self.file_path, 'ab') as f:
+            for header, currents, timestamps in records:
+                data_file.write_record(f, header, currents, timestamps)
+
+    def test_records_round_trip(self):
+        """Tests that several records are read back in order."""
+        self.write(({'tag': 'a'}, [0.5, 0.25], [10, 11]),
+                   ({'tag': 'b'}, [], []), ({'tag': 'c'}, [1.0], [12]))
+
+        records = data_file.read_records(self.file_path)
+
+        self.assertEqual([header['tag'] for header, _, _ in records],
+                         ['a', 'b', 'c'])
+        self.assertEqual([header['count'] for header, _, _ in records],
+                         [2, 0, 1])
+        self.assertEqual(records[0][1].tolist(), [0.5, 0.25])
+        self.assertEqual(records[0][2].tolist(), [10, 11])
+        self.assertEqual(records[2][1].tolist(), [1.0])
+
+    def test_arrays_are_memory_mapped(self):
+        """Tests that arrays are memory maps unless mmap is False."""
+        self.write(({}, [0.5], [10]))
+
+        _, currents, timestamps = data_file.read_records(self.file_path)[0]
+        _, in_memory, _ = data_file.read_records(
+            self.file_path, mmap=False)[0]
+
+        self.assertIsInstance(currents, np.memmap)
+        self.assertIsInstance(timestamps, np.memmap)
+        self.assertNotIsInstance(in_memory, np.memmap)
+        self.assertEqual(in_memory.tolist(), [0.5])
+
+    def test_arrays_are_aligned(self):
+        """Tests that the current array starts at an aligned offset."""
+        self.write(({'tag': 'x' * 5}, [0.5], [10]))
+
+        currents = data_file.read_records(self.file_path)[0][1]
+
+        self.assertEqual(currents.offset % 8, 0)
+
+    def test_text_file_is_not_a_data_file(self):
+        """Tests that text files are rejected."""
+        with open(self.file_path, 'w') as f:
+            f.write('\nMonsoon Measurement Data\n')
+
+        self.assertFalse(data_file.is_data_file(self.file_path))
+        with self.assertRaises(ValueError):
+            data_file.read_records(self.file_path)
+
+    def test_truncated_file_raises_value_error(self):
+        """Tests that a partially written record is reported."""
+        self.write(({}, [0.5, 0.25], [10, 11]))
+        with open(self.file_path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.file_path) - 1)
+
+        with self.assertRaises(ValueError):
+            data_file.read_records(self.file_path)
+
+    def test_stream_is_one_contiguous_record(self):
+        """Tests that a closed stream is read back as one record."""
+        self.write(({'tag': 'a'}, [0.5], [10]))
+        writer = data_file.StreamWriter(
+            self.file_path, {'tag': 'b'}, chunk_size=2)
+        for i in range(5):
+            writer.append([float(i)], [20 + i])
+
+        offset, count = writer.close()
+
+        header, currents, timestamps = data_file.read_record(
+            self.file_path, offset)
+        self.assertEqual(count, 5)
+        self.assertEqual(header['count'], 5)
+        self.assertEqual(currents.tolist(), [0.0, 1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(timestamps.tolist(), [20, 21, 22, 23, 24])
+        self.assertEqual(timestamps.offset, currents.offset + 5 * 4)
+        self.assertEqual(currents.offset % 8, 0)
+        self.assertEqual(
+            [header['tag'] for header, _, _ in data_file.read_records(
+                self.file_path)], ['a', 'b'])
+
+    def test_empty_stream_leaves_file_unchanged(self):
+        """Tests that closing a stream without samples writes nothing."""
+        self.write(({'tag': 'a'}, [0.5], [10]))
+        size = os.path.getsize(self.file_path)
+
+        writer = data_file.StreamWriter(self.file_path, {'tag': 'b'})
+
+        self.assertEqual(writer.close(), (size, 0))
+        self.assertEqual(os.path.getsize(self.file_path), size)
+        self.assertEqual(os.listdir(self.tmp_dir),
+                         [os.path.basename(self.file_path)])
+
+    def test_unclosed_stream_raises_value_error(self):
+        """Tests that an unclosed stream is only read if allowed."""
+        writer = data_file.StreamWriter(self.file_path, {}, chunk_size=1)
+        writer.append([0.5], [10])
+
+        with self.assertRaises(ValueError):
+            data_file.read_records(self.file_path)
+        records = data_file.read_records(
+            self.file_path, allow_truncated=True)
+        self.assertEqual(records[0][1].tolist(), [0.5])
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
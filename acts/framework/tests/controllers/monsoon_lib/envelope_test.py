@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import unittest
+
+import numpy as np
+
+from acts.controllers.monsoon_lib import envelope
+
+
+class EnvelopeTest(unittest.TestCase):
+    """Tests the monsoon_lib.envelope module."""
+
+    def test_build_pyramid_merges_buckets(self):
+        """Tests the min, max, sum and count of each level."""
+        values = np.arange(10, dtype=np.float32)
+
+        levels = envelope.build_pyramid(values, 2, factor=4, min_buckets=1)
+
+        self.assertEqual([level.bucket_size for level in levels], [1, 4, 16])
+        self.assertEqual(levels[1].mins.tolist(), [0, 4, 8])
+        self.assertEqual(levels[1].maxs.tolist(), [3, 7, 9])
+        self.assertEqual(levels[1].sums.tolist(), [6, 22, 17])
+        self.assertEqual(levels[1].counts.tolist(), [4, 4, 2])
+        self.assertEqual(levels[1].times.tolist(), [0, 2, 4])
+        self.assertEqual(levels[2].sums.tolist(), [45])
+        self.assertEqual(levels[2].counts.tolist(), [10])
+
+    def test_build_pyramid_keeps_spikes(self):
+        """Tests that a single sample spike shows in the coarsest level."""
+        values = np.zeros(10000)
+        values[1234] = 5
+
+        levels = envelope.build_pyramid(values, 1000, min_buckets=100)
+
+        self.assertLessEqual(len(levels[-1].sums), 100)
+        self.assertEqual(levels[-1].maxs.max(), 5)
+
+    def test_select_levels_keeps_coarsest(self):
+        """Tests that levels too large are dropped but the last is kept."""
+        levels = envelope.build_pyramid(
+            np.ones(100), 1, factor=2, min_buckets=10)
+
+        selected = envelope.select_levels(levels, 30)
+
+        self.assertEqual([len(level.sums) for level in selected], [25, 13, 7])
+        self.assertEqual(
+            len(envelope.select_levels(levels, 1)[-1].sums), 7)
+
+    def test_select_window_zooms_into_finer_levels(self):
+        """Tests that a narrow range is shown with a finer level."""
+        levels = envelope.build_pyramid(np.ones(10000), 1000, min_buckets=100)
+
+        self.assertEqual(
+            envelope.select_window(levels, 0, 10, 1000), (2, 0, 625))
+        self.assertEqual(
+            envelope.select_window(levels, 2, 2.5, 1000), (0, 2000, 2500))
+        self.assertEqual(
+            envelope.select_window(levels, 2.0005, 4, 1000), (1, 500, 1000))
+
+    def test_select_window_falls_back_to_coarsest(self):
+        """Tests that the coarsest level is used if none fits."""
+        levels = envelope.build_pyramid(np.ones(100), 1, min_buckets=10)
+
+        self.assertEqual(
+            envelope.select_window(levels, 0, 100, 2), (2, 0, 7))
+
+    def test_range_stats_is_exact(self):
+        """Tests that range averages match the average of the samples."""
+        values = np.random.RandomState(0).rand(1000)
+        level = envelope.build_pyramid(values, 100, min_buckets=10)[2]
+
+        mean, low, high, count = envelope.range_stats(level, 1.6, 6.4)
+
+        start, end = 160, 640
+        self.assertEqual(count, end - start)
+        self.assertAlmostEqual(mean, values[start:end].mean())
+        self.assertEqual(low, values[start:end].min())
+        self.assertEqual(high, values[start:end].max())
+
+    def test_range_stats_empty_range(self):
+        """Tests that a range without buckets returns None."""
+        levels = envelope.build_pyramid(np.ones(10), 1)
+
+        self.assertIsNone(envelope.range_stats(levels[0], 20, 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import random
+import struct
+import unittest
+
+from acts.controllers.monsoon_lib import sampling
+
+
+def legacy_decimate(samples, native_hz, sample_hz, sample_num):
+    """The error accumulator loop previously used by Monsoon.take_samples."""
+    emitted = offset = 0
+    collected = list(samples)
+    values = []
+    while emitted < sample_num:
+        need = int((native_hz - offset + sample_hz - 1) / sample_hz)
+        if need > len(collected):
+            break
+        offset += need * sample_hz
+        while offset >= native_hz:
+            values.append(sum(collected[:need]) / need)
+            offset -= native_hz
+            emitted += 1
+        collected = collected[need:]
+    return values[:sample_num]
+
+
+def make_packet(records, trailer=b'\x00'):
+    body = struct.pack('BBBB', 0x21, 0, 0, 0)
+    for record in records:
+        body += struct.pack('>hhhh', *record)
+    return bytearray(body + trailer)
+
+
+class DecodeRecordsTest(unittest.TestCase):
+    """Tests sampling.decode_records and sampling.calibrate."""
+
+    def test_decode_records_matches_struct(self):
+        """Tests that records are decoded like struct.unpack('>hhhh')."""
+        records = [(1, -2, 3, 4), (-32768, 32767, 0, 1), (7, 8, 9, 10)]
+
+        decoded = sampling.decode_records(make_packet(records))
+
+        self.assertEqual([tuple(r) for r in decoded.tolist()], records)
+
+    def test_decode_records_without_trailer(self):
+        """Tests that the last record needs a trailing byte to be decoded."""
+        records = [(1, 2, 3, 4), (5, 6, 7, 8)]
+
+        decoded = sampling.decode_records(make_packet(records, trailer=b''))
+
+        self.assertEqual([tuple(r) for r in decoded.tolist()], records[:1])
+
+    def test_calibrate_fine_and_coarse(self):
+        """Tests that the lowest bit selects the coarse calibration."""
+        currents = sampling.calibrate([10, 11], 2, 0.5, 4, 3.0)
+
+        self.assertEqual(currents.tolist(), [(10 - 2) * 0.5, (10 - 4) * 3.0])
+
+
+class DecimatorTest(unittest.TestCase):
+    """Tests the sampling.Decimator class."""
+
+    def assert_matches_legacy(self, native_hz, sample_hz, chunk_size):
+        random.seed(native_hz * sample_hz + chunk_size)
+        samples = [random.random() for _ in range(native_hz * 3)]
+        sample_num = sample_hz * 2
+        expected = legacy_decimate(samples, native_hz, sample_hz, sample_num)
+
+        decimator = sampling.Decimator(native_hz, sample_hz)
+        actual = []
+        for i in range(0, len(samples), chunk_size):
+            actual.extend(
+                decimator.decimate(
+                    samples[i:i + chunk_size],
+                    limit=sample_num - len(actual)).tolist())
+            if len(actual) == sample_num:
+                break
+
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            self.assertAlmostEqual(a, e, places=12)
+
+    def test_integer_ratio(self):
+        """Tests down-sampling by an integer factor."""
+        self.assert_matches_legacy(5000, 500, chunk_size=17)
+
+    def test_fractional_ratio(self):
+        """Tests rates that do not divide each other."""
+        self.assert_matches_legacy(5000, 300, chunk_size=11)
+        self.assert_matches_legacy(5000, 3, chunk_size=1000)
+
+    def test_up_sampling(self):
+        """Tests that samples are repeated when sample_hz > native_hz."""
+        self.assert_matches_legacy(30, 70, chunk_size=4)
+
+    def test_incomplete_block_is_kept(self):
+        """Tests that samples are kept until a block is complete."""
+        decimator = sampling.Decimator(4, 1)
+
+        self.assertEqual(decimator.decimate([1, 2, 3]).tolist(), [])
+        self.assertEqual(decimator.decimate([4, 5]).tolist(), [2.5])
+        self.assertEqual(decimator.consumed, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
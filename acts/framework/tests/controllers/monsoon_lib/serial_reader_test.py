@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import unittest
+
+import mock
+
+from acts.controllers.monsoon_lib import serial_reader
+
+
+class RingBufferTest(unittest.TestCase):
+    """Tests the serial_reader.RingBuffer class."""
+
+    def test_write_and_read_wrap_around(self):
+        """Tests that data wrapping around the end is read in order."""
+        ring = serial_reader.RingBuffer(8)
+        ring.write(b'abcdef')
+        self.assertEqual(ring.read(4), b'abcd')
+
+        ring.write(b'ghijk')
+
+        self.assertEqual(ring.available, 7)
+        self.assertEqual(ring.free, 1)
+        self.assertEqual(ring.read(10), b'efghijk')
+        self.assertEqual(ring.available, 0)
+
+
+class SerialReaderTest(unittest.TestCase):
+    """Tests the serial_reader.SerialReader class."""
+
+    def make_serial(self, *chunks):
+        ser = mock.Mock(in_waiting=0)
+        chunks = list(chunks)
+
+        def read(size):
+            return chunks.pop(0) if chunks else b''
+
+        ser.read.side_effect = read
+        return ser
+
+    def test_read_returns_bytes_read_by_thread(self):
+        """Tests that read() returns the bytes read by the thread."""
+        reader = serial_reader.SerialReader(
+            self.make_serial(b'abc', b'def'), buffer_size=16)
+        reader.start()
+        try:
+            self.assertEqual(reader.read(5), b'abcde')
+            self.assertEqual(reader.read(1), b'f')
+        finally:
+            reader.stop()
+
+    def test_read_times_out(self):
+        """Tests that read() returns what it has after the timeout."""
+        reader = serial_reader.SerialReader(
+            self.make_serial(b'ab'), buffer_size=16, timeout=0.1)
+        reader.start()
+        try:
+            self.assertEqual(reader.read(5), b'ab')
+        finally:
+            reader.stop()
+
+    def test_serial_error_is_raised_by_read(self):
+        """Tests that an error of the reader thread is raised by read()."""
+        ser = mock.Mock(in_waiting=0)
+        ser.read.side_effect = IOError('unplugged')
+        reader = serial_reader.SerialReader(ser)
+        reader.start()
+        try:
+            with self.assertRaises(IOError):
+                reader.read(1)
+        finally:
+            reader.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
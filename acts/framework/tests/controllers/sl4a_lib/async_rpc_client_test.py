@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import asyncio
+import json
+import unittest
+
+import mock
+
+from acts.controllers.sl4a_lib import async_rpc_client
+from acts.controllers.sl4a_lib import rpc_client
+from acts.controllers.sl4a_lib import sl4a_ports
+
+
+class FakeSl4aServer(object):
+    """A local server speaking the SL4A JSON-lines protocol.
+
+    Methods named 'delay<N>' respond after N hundredths of a second, so that
+    responses come back out of order. 'fail' responds with an error, and
+    'eventWait' returns the next queued event. 'long<N>' returns a string of N
+    characters.
+    """
+
+    def __init__(self, events=()):
+        self.events = list(events)
+        self.server = None
+        self.port = None
+        self.handlers = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        for handler in self.handlers:
+            handler.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    async def _handle(self, reader, writer):
+        self.handlers.append(asyncio.current_task())
+        handshake = json.loads((await reader.readline()).decode('utf8'))
+        writer.write(
+            json.dumps({
+                'status': True,
+                'uid': 1 if handshake['uid'] == -1 else handshake['uid']
+            }).encode('utf8') + b'\n')
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            request = json.loads(line.decode('utf8'))
+            asyncio.ensure_future(self._respond(writer, request))
+
+    async def _respond(self, writer, request):
+        method = request['method']
+        response = {'id': request['id'], 'result': None, 'error': None}
+        if method.startswith('delay'):
+            await asyncio.sleep(int(method[len('delay'):]) / 100)
+            response['result'] = method
+        elif method.startswith('long'):
+            response['result'] = 'x' * int(method[len('long'):])
+        elif method == 'fail':
+            response['error'] = 'failure'
+        elif method == 'eventWait':
+            response['result'] = self.events.pop(0) if self.events else None
+        else:
+            response['result'] = request['params']
+        writer.write(json.dumps(response).encode('utf8') + b'\n')
+
+
+class AsyncRpcClientTest(unittest.TestCase):
+    """Tests the async_rpc_client.AsyncRpcClient class."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_with_server(self, test_coroutine, events=()):
+        """Runs test_coroutine(client) against a FakeSl4aServer."""
+
+        async def run():
+            server = FakeSl4aServer(events)
+            await server.start()
+            client = async_rpc_client.AsyncRpcClient(
+                mock.Mock(), sl4a_ports.Sl4aPorts(0, server.port, 0))
+            try:
+                return await test_coroutine(client)
+            finally:
+                await client.close()
+                await server.stop()
+
+        return self.loop.run_until_complete(run())
+
+    def test_rpc_returns_result(self):
+        """Tests that an RPC returns the result sent back by SL4A."""
+
+        async def test(client):
+            return await client.echo('a', 1)
+
+        self.assertEqual(self.run_with_server(test), ['a', 1])
+
+    def test_handshake_sets_uid(self):
+        """Tests that the uid of a new session is taken from the handshake."""
+
+        async def test(client):
+            await client.open()
+            return client.uid
+
+        self.assertEqual(self.run_with_server(test), 1)
+
+    def test_concurrent_rpcs_share_socket_out_of_order(self):
+        """Tests that pipelined responses are matched by their ids."""
+
+        async def test(client):
+            return await asyncio.gather(client.delay10(), client.delay1(),
+                                        client.delay5())
+
+        self.assertEqual(
+            self.run_with_server(test), ['delay10', 'delay1', 'delay5'])
+
+    def test_rpc_error_raises_api_error(self):
+        """Tests that an error response raises Sl4aApiError."""
+
+        async def test(client):
+            with self.assertRaises(rpc_client.Sl4aApiError):
+                await client.fail()
+
+        self.run_with_server(test)
+
+    def test_response_longer_than_default_stream_limit(self):
+        """Tests that responses over the 64 KiB asyncio default are read."""
+
+        async def test(client):
+            return await client.long100000()
+
+        self.assertEqual(len(self.run_with_server(test)), 100000)
+
+    def test_response_over_stream_limit_fails_pending_rpcs(self):
+        """Tests that a line too long fails the RPCs instead of hanging."""
+
+        async def test(client):
+            with self.assertRaises(rpc_client.Sl4aConnectionError):
+                await client.rpc('long2000', timeout=5)
+            with self.assertRaises(rpc_client.Sl4aConnectionError):
+                await client.echo()
+
+        with mock.patch.object(async_rpc_client, 'STREAM_LIMIT', 1024):
+            self.run_with_server(test)
+
+    def test_events_yields_matching_events(self):
+        """Tests that events() filters the events by name."""
+        events = [{
+            'name': 'BleScanResult',
+            'data': 1
+        }, {
+            'name': 'WifiScan',
+            'data': 2
+        }, {
+            'name': 'BleScanFailed',
+            'data': 3
+        }]
+
+        async def test(client):
+            results = []
+            async with client.events('BleScan.*') as events:
+                async for event in events:
+                    results.append(event['data'])
+                    if len(results) == 2:
+                        break
+            return results
+
+        self.assertEqual(self.run_with_server(test, events), [1, 3])
+
+    def test_events_stop_after_timeout(self):
+        """Tests that the stream ends and closes once it timed out."""
+        events = [{'name': 'BleScanResult', 'data': 1}]
+
+        async def test(client):
+            stream = client.events('BleScan.*', timeout=.2)
+            results = []
+            async for event in stream:
+                results.append(event['data'])
+            return results, stream._stream
+
+        self.assertEqual(self.run_with_server(test, events), ([1], None))
+
+    def test_close_removes_forwarded_port(self):
+        """Tests that close() removes the port it owns."""
+        adb = mock.Mock()
+        client = async_rpc_client.AsyncRpcClient(adb,
+                                                 sl4a_ports.Sl4aPorts(0, 5, 0))
+
+        self.loop.run_until_complete(client.close())
+
+        adb.remove_tcp_forward.assert_called_once_with(5)
+
+
+    def test_close_threadsafe_on_loop_thread_does_not_block(self):
+        """Tests that closing from a loop callback schedules the close."""
+        adb = mock.Mock()
+        server = FakeSl4aServer()
+        self.loop.run_until_complete(server.start())
+        client = async_rpc_client.AsyncRpcClient(
+            adb, sl4a_ports.Sl4aPorts(0, server.port, 0))
+
+        async def test():
+            await client.open()
+            client.close_threadsafe(timeout=1)
+            self.assertTrue(client.is_open)
+            await asyncio.sleep(.1)
+            self.assertFalse(client.is_open)
+
+        try:
+            self.loop.run_until_complete(asyncio.wait_for(test(), 2))
+        finally:
+            self.loop.run_until_complete(server.stop())
+        adb.remove_tcp_forward.assert_called_once_with(server.port)
+
+
+class SyncRpcClientTest(unittest.TestCase):
+    """Tests the async_rpc_client.SyncRpcClient class."""
+
+    def test_rpc_runs_on_loop_thread(self):
+        """Tests that calls block until the loop thread returns a result."""
+        loop_thread = async_rpc_client.EventLoopThread()
+        server = FakeSl4aServer()
+        loop_thread.run(server.start())
+        client = async_rpc_client.SyncRpcClient(
+            async_rpc_client.AsyncRpcClient(
+                mock.Mock(), sl4a_ports.Sl4aPorts(0, server.port, 0)),
+            loop_thread=loop_thread)
+        try:
+            self.assertEqual(client.echo('value'), ['value'])
+        finally:
+            client.close()
+            loop_thread.run(server.stop())
+            loop_thread.loop.call_soon_threadsafe(loop_thread.loop.stop)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import queue
+import threading
+import time
+import unittest
+
+import mock
+
+from acts.controllers.sl4a_lib import event_dispatcher
+
+# Well below the 1 second polling interval of the old dispatcher.
+FAST_WAKEUP = .5
+
+
+def _event(name, event_time=0, data=None):
+    return {'name': name, 'time': event_time, 'data': data}
+
+
+class EventDispatcherTest(unittest.TestCase):
+    """Tests the event_dispatcher.EventDispatcher class."""
+
+    def setUp(self):
+        self.dispatcher = event_dispatcher.EventDispatcher(
+            'serial', mock.Mock())
+        # Pretend the dispatcher is polling without starting a poll thread.
+        self.dispatcher._started = True
+
+    def _store_later(self, event, delay=.05):
+        """Stores an event from another thread after a short delay."""
+
+        def store():
+            time.sleep(delay)
+            self.dispatcher._store_event(event, event['name'])
+
+        thread = threading.Thread(target=store)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_pop_event_returns_oldest_stored_event(self):
+        """Tests EventDispatcher.pop_event() on already stored events."""
+        self.dispatcher._store_event(_event('Event', 1), 'Event')
+        self.dispatcher._store_event(_event('Event', 2), 'Event')
+
+        self.assertEqual(self.dispatcher.pop_event('Event', 0)['time'], 1)
+        self.assertEqual(self.dispatcher.pop_event('Event', 0)['time'], 2)
+
+    def test_pop_event_wakes_up_on_arrival(self):
+        """Tests that pop_event() returns as soon as the event is stored."""
+        self._store_later(_event('Event'))
+
+        start = time.time()
+        event = self.dispatcher.pop_event('Event', 10)
+
+        self.assertEqual(event['name'], 'Event')
+        self.assertLess(time.time() - start, FAST_WAKEUP)
+
+    def test_pop_event_timeout(self):
+        """Tests that pop_event() raises queue.Empty on timeout."""
+        self._store_later(_event('OtherEvent'))
+
+        with self.assertRaises(queue.Empty):
+            self.dispatcher.pop_event('Event', .2)
+
+    def test_pop_event_not_started(self):
+        """Tests that pop_event() requires a started dispatcher."""
+        self.dispatcher._started = False
+
+        with self.assertRaises(event_dispatcher.IllegalStateError):
+            self.dispatcher.pop_event('Event', 0)
+
+    def test_wait_for_event_consumes_ignored_events(self):
+        """Tests that wait_for_event() drops events failing the predicate."""
+        for value in range(3):
+            self.dispatcher._store_event(_event('Event', data=value), 'Event')
+
+        event = self.dispatcher.wait_for_event(
+            'Event', lambda e: e['data'] == 1, timeout=0)
+
+        self.assertEqual(event['data'], 1)
+        remaining = self.dispatcher.pop_all('Event')
+        self.assertEqual([e['data'] for e in remaining], [2])
+
+    def test_wait_for_event_keeps_ignored_events_in_order(self):
+        """Tests wait_for_event() with consume_ignored_events=False."""
+        for value in range(3):
+            self.dispatcher._store_event(_event('Event', data=value), 'Event')
+
+        event = self.dispatcher.wait_for_event(
+            'Event',
+            lambda e: e['data'] == 1,
+            timeout=0,
+            consume_ignored_events=False)
+
+        self.assertEqual(event['data'], 1)
+        remaining = self.dispatcher.pop_all('Event')
+        self.assertEqual([e['data'] for e in remaining], [0, 2])
+
+    def test_wait_for_event_wakes_up_on_matching_arrival(self):
+        """Tests that wait_for_event() returns once a match is stored."""
+        self._store_later(_event('Event', data='match'))
+
+        start = time.time()
+        event = self.dispatcher.wait_for_event(
+            'Event', lambda e: e['data'] == 'match', timeout=10)
+
+        self.assertEqual(event['data'], 'match')
+        self.assertLess(time.time() - start, FAST_WAKEUP)
+
+    def test_wait_for_event_timeout(self):
+        """Tests that wait_for_event() raises queue.Empty on timeout."""
+        self._store_later(_event('Event', data='no match'))
+
+        with self.assertRaises(queue.Empty):
+            self.dispatcher.wait_for_event(
+                'Event', lambda e: e['data'] == 'match', timeout=.2)
+
+    def test_pop_events_returns_one_of_each_match_sorted_by_time(self):
+        """Tests that pop_events() pops one event from each matching name."""
+        self.dispatcher._store_event(_event('ScanB', 2), 'ScanB')
+        self.dispatcher._store_event(_event('ScanA', 1), 'ScanA')
+        self.dispatcher._store_event(_event('ScanA', 3), 'ScanA')
+        self.dispatcher._store_event(_event('Other', 0), 'Other')
+
+        events = self.dispatcher.pop_events('Scan.*', 0)
+
+        self.assertEqual([e['time'] for e in events], [1, 2])
+
+    def test_pop_events_wakes_up_on_arrival(self):
+        """Tests that pop_events() returns as soon as a match is stored."""
+        self._store_later(_event('BleScan1'))
+
+        start = time.time()
+        events = self.dispatcher.pop_events('BleScan.*', 10)
+
+        self.assertEqual(len(events), 1)
+        self.assertLess(time.time() - start, FAST_WAKEUP)
+
+    def test_pop_events_timeout(self):
+        """Tests that pop_events() raises queue.Empty on timeout."""
+        with self.assertRaises(queue.Empty):
+            self.dispatcher.pop_events('BleScan.*', .1)
+
+    def test_clear_events(self):
+        """Tests that clear_events() drops only the given event name."""
+        self.dispatcher._store_event(_event('Event'), 'Event')
+        self.dispatcher._store_event(_event('Other'), 'Other')
+
+        self.dispatcher.clear_events('Event')
+
+        self.assertEqual(self.dispatcher.pop_all('Event'), [])
+        self.assertEqual(len(self.dispatcher.pop_all('Other')), 1)
+
+    def test_per_name_limit_drops_oldest(self):
+        """Tests the per-name limit with the DROP_OLDEST policy."""
+        self.dispatcher.set_event_limits('Event', max_events=2)
+        for value in range(3):
+            self.dispatcher._store_event(_event('Event', data=value), 'Event')
+
+        remaining = self.dispatcher.pop_all('Event')
+        self.assertEqual([e['data'] for e in remaining], [1, 2])
+        self.assertEqual(self.dispatcher.get_event_stats()['dropped'],
+                         {'Event': 1})
+
+    def test_per_name_limit_drops_newest(self):
+        """Tests the per-name limit with the DROP_NEWEST policy."""
+        self.dispatcher.set_event_limits(
+            'Event',
+            max_events=2,
+            eviction_policy=event_dispatcher.DROP_NEWEST)
+        for value in range(3):
+            self.dispatcher._store_event(_event('Event', data=value), 'Event')
+
+        remaining = self.dispatcher.pop_all('Event')
+        self.assertEqual([e['data'] for e in remaining], [0, 1])
+        self.assertEqual(self.dispatcher.get_event_stats()['dropped'],
+                         {'Event': 1})
+
+    def test_global_limit_drops_oldest_across_names(self):
+        """Tests that the global limit evicts the oldest event of any name."""
+        self.dispatcher.max_events = 2
+        self.dispatcher._store_event(_event('A'), 'A')
+        self.dispatcher._store_event(_event('B'), 'B')
+        self.dispatcher._store_event(_event('C'), 'C')
+
+        self.assertEqual(self.dispatcher.pop_all('A'), [])
+        self.assertEqual(len(self.dispatcher.pop_all('B')), 1)
+        self.assertEqual(len(self.dispatcher.pop_all('C')), 1)
+        self.assertEqual(self.dispatcher.get_event_stats()['dropped'],
+                         {'A': 1})
+
+    def test_global_limit_tracks_consumed_events(self):
+        """Tests the global limit after events were popped and removed."""
+        self.dispatcher.max_events = 3
+        for name in ['A', 'B', 'A', 'C']:
+            self.dispatcher._store_event(_event(name), name)
+        # The first A was evicted by C, the second one is popped here.
+        self.dispatcher.pop_event('A', 0)
+        self.assertEqual(self.dispatcher.get_event_stats()['stored'], 2)
+
+        for name in ['D', 'E']:
+            self.dispatcher._store_event(_event(name), name)
+
+        self.assertEqual(self.dispatcher.get_event_stats()['stored'], 3)
+        self.assertEqual(self.dispatcher.pop_all('A'), [])
+        self.assertEqual(len(self.dispatcher.pop_all('C')), 1)
+        self.assertEqual(self.dispatcher.get_event_stats()['dropped'], {
+            'A': 1,
+            'B': 1
+        })
+
+    def test_global_limit_drops_newest(self):
+        """Tests that the global DROP_NEWEST policy discards new events."""
+        self.dispatcher.max_events = 1
+        self.dispatcher.eviction_policy = event_dispatcher.DROP_NEWEST
+        self.dispatcher._store_event(_event('A'), 'A')
+        self.dispatcher._store_event(_event('B'), 'B')
+
+        self.assertEqual(len(self.dispatcher.pop_all('A')), 1)
+        self.assertEqual(self.dispatcher.pop_all('B'), [])
+        self.assertEqual(self.dispatcher.get_event_stats()['stored'], 0)
+
+    def test_ttl_expires_unconsumed_events(self):
+        """Tests that events older than their ttl are never returned."""
+        self.dispatcher.set_event_limits('Event', ttl=10)
+        with mock.patch('time.time', return_value=100):
+            self.dispatcher._store_event(_event('Event', data=0), 'Event')
+        with mock.patch('time.time', return_value=105):
+            self.dispatcher._store_event(_event('Event', data=1), 'Event')
+
+        with mock.patch('time.time', return_value=112):
+            event = self.dispatcher.pop_event('Event', 0)
+
+        self.assertEqual(event['data'], 1)
+        self.assertEqual(self.dispatcher.get_event_stats()['expired'],
+                         {'Event': 1})
+
+    def test_invalid_eviction_policy(self):
+        """Tests that unknown eviction policies are rejected."""
+        with self.assertRaises(ValueError):
+            self.dispatcher.set_event_limits(
+                'Event', eviction_policy='drop_everything')
+
+    def test_close_logs_dropped_events(self):
+        """Tests that close() reports the dropped events."""
+        self.dispatcher._executor = mock.Mock()
+        self.dispatcher.log = mock.Mock()
+        self.dispatcher.set_event_limits('Event', max_events=0)
+        self.dispatcher._store_event(_event('Event'), 'Event')
+        self.dispatcher.log.reset_mock()
+
+        self.dispatcher.close()
+
+        self.assertTrue(self.dispatcher.log.warning.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,9 @@ import unittest
 import mock
 
 from acts.controllers.sl4a_lib import rpc_client
+from acts.controllers.sl4a_lib import rpc_connection
+from acts.controllers.sl4a_lib import rpc_multiplexer
+from acts.controllers.sl4a_lib import sl4a_ports
 
 
 class BreakoutError(Exception):
@@ -213,6 +216,221 @@ class RpcClientTest(unittest.TestCase):
             kwarg1=1,
             kwarg2=2)
 
+    def test_rpc_uses_multiplexer_when_enabled(self):
+        """Tests rpc_client.RpcClient.rpc.
+
+        Tests that non-blocking RPCs go over a multiplexed connection when
+        multiplexed_connections is set.
+        """
+        session = mock.Mock()
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            lambda _: mock.Mock(),
+            lambda _: mock.Mock(),
+            multiplexed_connections=1)
+        client._multiplexed_rpc = mock.Mock()
+        client._get_free_connection = mock.Mock(side_effect=BreakoutError())
+
+        client.rpc('someRpc', 'arg')
+
+        client._multiplexed_rpc.assert_called_with('someRpc', ('arg', ),
+                                                   None, 1)
+
+    def test_rpc_blocking_rpc_skips_multiplexer(self):
+        """Tests rpc_client.RpcClient.rpc.
+
+        Tests that blocking RPCs never go over a multiplexed connection.
+        """
+        session = mock.Mock()
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            lambda _: mock.Mock(),
+            lambda _: mock.Mock(),
+            multiplexed_connections=1)
+        client._multiplexed_rpc = mock.Mock()
+        client._get_free_connection = mock.Mock(side_effect=BreakoutError())
+
+        with self.assertRaises(BreakoutError):
+            client.rpc('eventWait', 1000)
+        self.assertFalse(client._multiplexed_rpc.called)
+
+    @mock.patch('acts.controllers.sl4a_lib.rpc_multiplexer.RpcMultiplexer')
+    def test_get_multiplexer_reuses_idle_multiplexer(self, multiplexer_cls):
+        """Tests rpc_client.RpcClient._get_multiplexer.
+
+        Tests that an idle multiplexer is reused instead of opening a new one.
+        """
+        session = mock.Mock()
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            lambda _: mock.Mock(),
+            lambda _: mock.Mock(),
+            multiplexed_connections=2)
+        idle = mock.Mock(is_alive=True, pending_count=0)
+        client._multiplexers = [idle]
+
+        self.assertEqual(client._get_multiplexer(), idle)
+        self.assertFalse(multiplexer_cls.called)
+
+    @mock.patch('acts.controllers.sl4a_lib.rpc_multiplexer.RpcMultiplexer')
+    def test_get_multiplexer_shares_least_busy_at_limit(self, multiplexer_cls):
+        """Tests rpc_client.RpcClient._get_multiplexer.
+
+        Tests that once the limit is reached, the least busy multiplexer is
+        shared, and dead multiplexers are replaced.
+        """
+        session = mock.Mock()
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            lambda _: mock.Mock(),
+            lambda _: mock.Mock(),
+            multiplexed_connections=2)
+        busy = mock.Mock(is_alive=True, pending_count=5)
+        less_busy = mock.Mock(is_alive=True, pending_count=2)
+        client._multiplexers = [busy, less_busy]
+
+        self.assertEqual(client._get_multiplexer(), less_busy)
+
+        less_busy.is_alive = False
+        self.assertEqual(client._get_multiplexer(),
+                         multiplexer_cls.return_value)
+        self.assertNotIn(less_busy, client._multiplexers)
+
+    def test_get_multiplexer_closes_dead_multiplexers(self):
+        """Tests rpc_client.RpcClient._get_multiplexer.
+
+        Tests that a multiplexer whose connection dropped is closed, which
+        removes its port forward, before it is replaced.
+        """
+        adb = mock.Mock()
+        socket_fd = mock.Mock()
+        socket_fd.readline.return_value = b''
+        connection = rpc_connection.RpcConnection(
+            adb, sl4a_ports.Sl4aPorts(0, 9999, 0), mock.Mock(), socket_fd,
+            uid=1)
+        dead = rpc_multiplexer.RpcMultiplexer(connection)
+        dead._reader.join(5)
+        self.assertFalse(dead.is_alive)
+        adb.remove_tcp_forward.assert_not_called()
+        new_connection = mock.Mock()
+        new_connection.get_response.return_value = b''
+        client = rpc_client.RpcClient(
+            1, adb.serial, lambda _: mock.Mock(), lambda _: new_connection,
+            multiplexed_connections=1)
+        client._multiplexers = [dead]
+
+        self.assertIsNot(client._get_multiplexer(), dead)
+
+        adb.remove_tcp_forward.assert_called_once_with(9999)
+        client.terminate()
+        adb.remove_tcp_forward.assert_called_once_with(9999)
+
+    def test_multiplexed_rpc_returns_result(self):
+        """Tests rpc_client.RpcClient._multiplexed_rpc.
+
+        Tests that the result of the matching response is returned.
+        """
+        session = mock.Mock()
+        client = rpc_client.RpcClient(
+            session.uid,
+            session.adb.serial,
+            lambda _: mock.Mock(),
+            lambda _: mock.Mock(),
+            multiplexed_connections=1)
+        future = mock.Mock()
+        future.result.return_value = {'id': 7, 'result': 123, 'error': None}
+        multiplexer = mock.Mock()
+        multiplexer.send.return_value = (7, future)
+        client._get_multiplexer = mock.Mock(return_value=multiplexer)
+
+        self.assertEqual(client._multiplexed_rpc('someRpc', (), None, 1), 123)
+
+    def test_batch_sends_all_calls_in_one_write(self):
+        """Tests rpc_client.RpcClient.batch.
+
+        Tests that all calls of a batch are written at once, and that each
+        future receives the result or error of its own call.
+        """
+        session = mock.Mock()
+        client = rpc_client.RpcClient(session.uid, session.adb.serial,
+                                      lambda _: mock.Mock(),
+                                      lambda _: mock.Mock())
+        client._log = mock.Mock()
+        connection = mock.Mock()
+        connection.get_new_ticket.side_effect = [1, 2, 3]
+        connection.get_response.side_effect = [
+            b'{"id": 2, "result": null, "error": "failed"}',
+            b'{"id": 1, "result": "name", "error": null}',
+            b'{"id": 3, "result": true, "error": null}',
+        ]
+        client._free_connections = [connection]
+
+        with client.batch() as batch:
+            name = batch.bluetoothGetLocalName()
+            failure = batch.someFailingRpc('arg')
+            enabled = batch.bluetoothCheckState()
+            self.assertFalse(connection.send_requests.called)
+
+        self.assertEqual(connection.send_requests.call_count, 1)
+        self.assertEqual(len(connection.send_requests.call_args[0][0]), 3)
+        self.assertEqual(name.result(), 'name')
+        self.assertEqual(enabled.result(), True)
+        with self.assertRaises(rpc_client.Sl4aApiError):
+            failure.result()
+        self.assertIn(connection, client._free_connections)
+
+    def test_batch_no_response_fails_all_calls(self):
+        """Tests rpc_client.RpcClient.batch.
+
+        Tests that if the server stops responding, every call of the batch
+        fails and the error is raised.
+        """
+        session = mock.Mock()
+        on_error = mock.Mock()
+        client = rpc_client.RpcClient(session.uid, session.adb.serial,
+                                      on_error, lambda _: mock.Mock())
+        client._log = mock.Mock()
+        connection = mock.Mock()
+        connection.get_new_ticket.side_effect = [1, 2]
+        connection.get_response.side_effect = [
+            b'{"id": 1, "result": 1, "error": null}', b''
+        ]
+        client._free_connections = [connection]
+
+        batch = client.batch()
+        first = batch.rpc('first')
+        second = batch.rpc('second')
+        with self.assertRaises(rpc_client.Sl4aProtocolError):
+            batch.execute()
+
+        self.assertTrue(on_error.called)
+        for future in (first, second):
+            with self.assertRaises(rpc_client.Sl4aProtocolError):
+                future.result()
+
+    def test_batch_not_sent_on_exception(self):
+        """Tests rpc_client.RpcBatch.__exit__.
+
+        Tests that a batch is cancelled when its block raises.
+        """
+        session = mock.Mock()
+        client = rpc_client.RpcClient(session.uid, session.adb.serial,
+                                      lambda _: mock.Mock(),
+                                      lambda _: mock.Mock())
+        client._send_batch = mock.Mock()
+
+        with self.assertRaises(BreakoutError):
+            with client.batch() as batch:
+                future = batch.someRpc()
+                raise BreakoutError()
+
+        self.assertFalse(client._send_batch.called)
+        self.assertTrue(future.cancelled())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import json
+import queue
+import unittest
+
+import mock
+
+from acts.controllers.sl4a_lib import rpc_client
+from acts.controllers.sl4a_lib import rpc_multiplexer
+
+WAIT_TIMEOUT = 5
+
+
+class FakeConnection(object):
+    """A fake RpcConnection whose responses are fed through a queue."""
+
+    def __init__(self):
+        self.adb = mock.Mock()
+        self.uid = 1
+        self.ports = mock.Mock()
+        self.requests = queue.Queue()
+        self.responses = queue.Queue()
+        self._ticket = 0
+
+    def get_new_ticket(self):
+        self._ticket += 1
+        return self._ticket
+
+    def set_timeout(self, timeout):
+        pass
+
+    def send_request(self, request):
+        self.requests.put(json.loads(request))
+
+    def get_response(self):
+        return self.responses.get()
+
+    def respond(self, ticket, result=None, error=None):
+        self.responses.put(
+            json.dumps({
+                'id': ticket,
+                'result': result,
+                'error': error
+            }).encode('utf8'))
+
+    def close(self):
+        self.responses.put(b'')
+
+
+class RpcMultiplexerTest(unittest.TestCase):
+    """Tests the rpc_multiplexer.RpcMultiplexer class."""
+
+    def setUp(self):
+        self.connection = FakeConnection()
+        self.multiplexer = rpc_multiplexer.RpcMultiplexer(self.connection)
+
+    def tearDown(self):
+        self.multiplexer.close()
+
+    def test_send_writes_request_with_ticket(self):
+        """Tests that send() writes a JSON request tagged with a new ticket."""
+        ticket, _ = self.multiplexer.send('someRpc', ('arg', ))
+
+        request = self.connection.requests.get(timeout=WAIT_TIMEOUT)
+        self.assertEqual(request['id'], ticket)
+        self.assertEqual(request['method'], 'someRpc')
+        self.assertEqual(request['params'], ['arg'])
+
+    def test_responses_out_of_order_resolve_matching_futures(self):
+        """Tests that responses are routed to futures by their id."""
+        ticket_1, future_1 = self.multiplexer.send('first', ())
+        ticket_2, future_2 = self.multiplexer.send('second', ())
+        self.assertEqual(self.multiplexer.pending_count, 2)
+
+        self.connection.respond(ticket_2, result='two')
+        self.connection.respond(ticket_1, result='one')
+
+        self.assertEqual(future_1.result(WAIT_TIMEOUT)['result'], 'one')
+        self.assertEqual(future_2.result(WAIT_TIMEOUT)['result'], 'two')
+        self.assertEqual(self.multiplexer.pending_count, 0)
+
+    def test_cancelled_response_is_discarded(self):
+        """Tests that a response for a cancelled ticket is ignored."""
+        ticket_1, future_1 = self.multiplexer.send('first', ())
+        ticket_2, future_2 = self.multiplexer.send('second', ())
+        self.multiplexer.cancel(ticket_1)
+
+        self.connection.respond(ticket_1, result='late')
+        self.connection.respond(ticket_2, result='two')
+
+        self.assertEqual(future_2.result(WAIT_TIMEOUT)['result'], 'two')
+        self.assertFalse(future_1.done())
+
+    def test_disconnect_fails_pending_requests(self):
+        """Tests that all pending futures fail when the socket closes."""
+        _, future = self.multiplexer.send('someRpc', ())
+
+        self.connection.close()
+
+        with self.assertRaises(rpc_client.Sl4aProtocolError):
+            future.result(WAIT_TIMEOUT)
+        self.assertFalse(self.multiplexer.is_alive)
+
+    def test_send_after_close_raises(self):
+        """Tests that send() refuses new requests once closed."""
+        self.multiplexer.close()
+
+        with self.assertRaises(rpc_client.Sl4aConnectionError):
+            self.multiplexer.send('someRpc', ())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -196,6 +196,39 @@ class Sl4aManagerTest(unittest.TestCase):
         except rpc_client.Sl4aConnectionError:
             pass
 
+    def test_start_sl4a_server_finds_port_in_one_call(self):
+        """Tests sl4a_manager.Sl4aManager.start_sl4a_server().
+
+        Tests that the server is launched and its port found with a single
+        adb shell call, skipping ports already known.
+        """
+        adb = mock.Mock()
+        adb.is_root = lambda: True
+        adb.shell = mock.Mock(return_value='12345\n67890\n')
+
+        manager = sl4a_manager.create_sl4a_manager(adb)
+        manager._sl4a_ports = {'12345'}
+
+        self.assertEqual(manager.start_sl4a_server(0), 67890)
+        self.assertEqual(adb.shell.call_count, 1)
+        command = adb.shell.call_args[0][0]
+        self.assertIn('LAUNCH_SERVER', command)
+        self.assertIn('grep -v -x -e 12345', command)
+
+    def test_get_all_ports_command_checks_root_once(self):
+        """Tests sl4a_manager.Sl4aManager._get_all_ports_command().
+
+        Tests that root is not checked again until sessions are terminated.
+        """
+        adb = mock.Mock()
+        adb.is_root = mock.Mock(return_value=True)
+
+        manager = sl4a_manager.create_sl4a_manager(adb)
+        manager._get_all_ports_command()
+        manager._get_all_ports_command()
+
+        self.assertEqual(adb.is_root.call_count, 1)
+
     def test_get_all_ports_command_uses_root_cmd(self):
         """Tests sl4a_manager.Sl4aManager._get_all_ports_command().
 
@@ -17,16 +17,23 @@
 import sys
 import unittest
 
+from tests.controllers.sl4a_lib import async_rpc_client_test
+from tests.controllers.sl4a_lib import event_dispatcher_test
 from tests.controllers.sl4a_lib import rpc_client_test
 from tests.controllers.sl4a_lib import rpc_connection_test
+from tests.controllers.sl4a_lib import rpc_multiplexer_test
 from tests.controllers.sl4a_lib import sl4a_manager_test
 from tests.controllers.sl4a_lib import sl4a_session_test
 
 
 def compile_suite():
     test_classes_to_run = [
+        async_rpc_client_test.AsyncRpcClientTest,
+        async_rpc_client_test.SyncRpcClientTest,
+        event_dispatcher_test.EventDispatcherTest,
         rpc_client_test.RpcClientTest,
         rpc_connection_test.RpcConnectionTest,
+        rpc_multiplexer_test.RpcMultiplexerTest,
         sl4a_manager_test.Sl4aManagerFactoryTest,
         sl4a_manager_test.Sl4aManagerTest,
         sl4a_session_test.Sl4aSessionTest,
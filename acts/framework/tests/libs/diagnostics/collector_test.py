@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from acts.libs.diagnostics import collector
+
+
+def _write(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+
+
+class LogSizeCounterTest(unittest.TestCase):
+    """Tests the collector.LogSizeCounter class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.device_dir = os.path.join(self.tmp_dir, 'device')
+        os.mkdir(self.device_dir)
+        _write(os.path.join(self.tmp_dir, 'test_log.txt'), 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_update_adds_growth_without_walking_the_tree(self):
+        """Tests that only the tracked directory is measured again."""
+        counter = collector.LogSizeCounter(self.tmp_dir)
+        self.assertEqual(counter.size, 100)
+        counter.track(self.device_dir)
+        _write(os.path.join(self.device_dir, 'bugreport.zip'), 50)
+
+        with mock.patch.object(
+                collector.utils,
+                'get_directory_size',
+                wraps=collector.utils.get_directory_size) as get_size:
+            counter.update(self.device_dir)
+            self.assertEqual(counter.size, 150)
+
+        get_size.assert_called_once_with(self.device_dir)
+
+    def test_size_is_resynced_after_the_interval(self):
+        """Tests that untracked growth is picked up by a resync."""
+        counter = collector.LogSizeCounter(self.tmp_dir, resync_interval=0)
+        self.assertEqual(counter.size, 100)
+        _write(os.path.join(self.tmp_dir, 'other.txt'), 20)
+
+        self.assertEqual(counter.size, 120)
+
+
+class DiagnosticsCollectorTest(unittest.TestCase):
+    """Tests the collector.DiagnosticsCollector class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_collector(self, **kwargs):
+        # The lock files are kept out of the lock directory of real runs.
+        return collector.DiagnosticsCollector(lock_dir=self.tmp_dir, **kwargs)
+
+    def test_wait_only_waits_for_the_given_keys(self):
+        """Tests that tasks of other devices keep running."""
+        diagnostics = self.make_collector(host_concurrency=2)
+        release = threading.Event()
+        slow = diagnostics.submit('slow', release.wait)
+        fast = diagnostics.submit('fast', lambda: 'done')
+
+        diagnostics.wait(['fast'])
+
+        self.assertEqual(fast.result(), 'done')
+        self.assertFalse(slow.done())
+        release.set()
+        diagnostics.shutdown()
+        self.assertTrue(slow.done())
+
+    def test_failed_task_is_logged(self):
+        """Tests that exceptions of tasks do not propagate to wait()."""
+        log = mock.Mock()
+        diagnostics = self.make_collector(log=log)
+
+        def _fail():
+            raise Exception('adb went away')
+
+        diagnostics.submit('serial', _fail)
+        diagnostics.shutdown()
+
+        self.assertTrue(log.error.called)
+
+    def test_compress_waits_for_the_tasks(self):
+        """Tests that a directory is zipped after the tasks writing it."""
+        src_dir = os.path.join(self.tmp_dir, 'test_something')
+        os.mkdir(src_dir)
+        diagnostics = self.make_collector()
+        task = diagnostics.submit(
+            'serial', _write, os.path.join(src_dir, 'bugreport.txt'), 10)
+
+        diagnostics.compress(src_dir, src_dir, after=[task])
+        diagnostics.shutdown()
+
+        self.assertFalse(os.path.exists(src_dir))
+        self.assertTrue(os.path.exists(src_dir + '.zip'))
+
+    def test_waiter_waits_for_the_key_outside_of_tasks(self):
+        """Tests that a waiter blocks callers but not the tasks themselves."""
+        diagnostics = self.make_collector()
+        waiter = diagnostics.waiter('serial')
+        release = threading.Event()
+
+        def _task():
+            waiter()
+            release.wait()
+
+        task = diagnostics.submit('serial', _task)
+        self.assertTrue(diagnostics.is_busy('serial'))
+        self.assertFalse(diagnostics.is_busy('other'))
+        threading.Timer(0.1, release.set).start()
+        waiter()
+
+        self.assertTrue(task.done())
+        diagnostics.shutdown()
+        self.assertTrue(os.listdir(self.tmp_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from acts.libs.proc import host_slot
+
+
+class HostSlotTest(unittest.TestCase):
+    """Tests the host_slot.HostSlot class."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _slot(self, name='adb'):
+        return host_slot.HostSlot(2, name, self.tmp_dir)
+
+    def test_slots_are_exclusive(self):
+        """Tests that no more than count slots are held at once."""
+        first = self._slot()
+        second = self._slot()
+        first.acquire()
+        second.acquire()
+        third = self._slot()
+        acquired = threading.Event()
+
+        def _acquire():
+            third.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=_acquire)
+        with mock.patch.object(host_slot, 'SLOT_POLL_INTERVAL', 0.01):
+            thread.start()
+            self.assertFalse(acquired.wait(0.1))
+            first.release()
+            self.assertTrue(acquired.wait(1))
+        thread.join()
+        second.release()
+        third.release()
+
+    def test_slots_of_other_names_are_independent(self):
+        """Tests that slots with different names do not block each other."""
+        with self._slot(), self._slot():
+            with self._slot('diagnostics'):
+                pass
+
+    def _deny(self, paths):
+        """Patches os.open to raise PermissionError for the given paths."""
+        real_open = os.open
+
+        def _open(path, *args):
+            if path in paths:
+                raise PermissionError(path)
+            return real_open(path, *args)
+
+        return mock.patch.object(host_slot.os, 'open', side_effect=_open)
+
+    def _path(self, index, lock_dir=None):
+        return os.path.join(lock_dir or self.tmp_dir,
+                            host_slot.SLOT_LOCK_NAME % ('adb', index))
+
+    def test_unopenable_lock_file_is_a_busy_slot(self):
+        """Tests that a lock file of another user is skipped."""
+        with self._deny([self._path(0)]):
+            with self._slot():
+                self.assertTrue(os.path.exists(self._path(1)))
+
+    def test_falls_back_to_user_lock_dir(self):
+        """Tests that the user's own slots are used if none can be opened."""
+        user_dir = os.path.join(self.tmp_dir,
+                                host_slot.USER_LOCK_DIR_NAME % os.getuid())
+        with self._deny([self._path(0), self._path(1)]):
+            with self._slot():
+                self.assertTrue(os.path.exists(self._path(0, user_dir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
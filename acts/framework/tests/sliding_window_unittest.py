@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+#
+#   Copyright 2018 - The Android Open Source Project
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+import numpy
+import unittest
+
+import acts.test_utils.audio_analysis_lib.sliding_window as sliding_window
+
+
+class SlidingWindowsTest(unittest.TestCase):
+    def testWindowsAreClippedToTheData(self):
+        arr = numpy.arange(10, dtype=float)
+        means = sliding_window.SlidingWindows(arr).means(2, 3)
+        for index in range(len(arr)):
+            window = arr[max(0, index - 2):min(len(arr), index + 3)]
+            self.assertAlmostEqual(means[index], numpy.mean(window))
+
+    def testWindowSumsCountTheSamples(self):
+        sums, counts = sliding_window.SlidingWindows([1, 1, 1, 1]).sums(1, 1)
+        self.assertEqual(sums.tolist(), [1, 2, 2, 2])
+        self.assertEqual(counts.tolist(), [1, 2, 2, 2])
+
+    def testEmptyWindowRaises(self):
+        with self.assertRaises(ValueError):
+            sliding_window.SlidingWindows([1, 2, 3]).means(0, 0)
+
+
+class StridedWindowsTest(unittest.TestCase):
+    def testWindowsAreRowsOfTheArray(self):
+        arr = numpy.arange(10)
+        windows = sliding_window.strided_windows(arr, 4, 3)
+        self.assertEqual(windows.tolist(),
+                         [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]])
+
+    def testWindowsAreReadOnlyViews(self):
+        arr = numpy.arange(10)
+        windows = sliding_window.strided_windows(arr, 4)
+        self.assertEqual(windows.shape, (7, 4))
+        self.assertTrue(numpy.shares_memory(windows, arr))
+        self.assertFalse(windows.flags.writeable)
+
+    def testArrayShorterThanWindow(self):
+        windows = sliding_window.strided_windows(numpy.arange(3), 4)
+        self.assertEqual(windows.shape, (0, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()